@@ -5,6 +5,7 @@ except ImportError:
     _has_watch_cursor = False
 from contextlib import asynccontextmanager
 from fastmcp import Context
+from fastmcp.server.dependencies import get_context
 from fastmcp.utilities.types import Image, Audio
 from src.voice import (
     VoiceLiveClient,
@@ -16,7 +17,13 @@ from src.voice import (
 from humancursor import SystemCursor
 from platform import system, release
 from markdownify import markdownify
-from src.desktop import Desktop
+from src.desktop import DeltaTracker, Desktop, ImageOptions, SelectorError, WalkBudget, describe_elements, initialize_uia_thread, parse_selector, render_diff, render_state
+from src.powershell import interop
+from src.caching import CachePolicy, ResultCache, Win32SignalSource, registry_tag, DEVICE, DISPLAY, NETWORK, POWER, SETTINGS
+from src.input import (
+    BATCH, CdpLoadEvent, Check, InjectionError, InputDispatcher, InputPacer, MacroError, MacroRunner, Not, Predicate, ProcessRunning, RegionStable,
+    TextInjector, UIATextTarget, Win32Clipboard, Win32Keyboard, compile_plan, summarize, wait_until,
+)
 from textwrap import dedent
 from fastmcp import FastMCP
 from typing import Literal, List, Optional
@@ -31,6 +38,8 @@ import pyperclip as pc
 import subprocess
 import requests
 import asyncio
+import functools
+import threading
 import ctypes
 import psutil
 import winreg
@@ -42,7 +51,10 @@ import os as os_module
 import re
 
 pg.FAILSAFE=False
-pg.PAUSE=1.0
+_KEY_NAMES=frozenset(pg.KEYBOARD_KEYS)
+# Input tools wait for the UI to settle through the pacer below instead of
+# pyautogui sleeping a fixed time after every call.
+pg.PAUSE=0
 
 os_name=system()
 version=release()
@@ -58,6 +70,59 @@ Visual Identity: Look for the Windows Clippy MCP logo (WC25.png) in the assets f
 ''')
 
 desktop=Desktop()
+# Read-only system tools answer from this cache until their TTL runs out or a
+# system signal (display, device, network, power, settings, registry) says
+# the answer changed. Every such tool takes refresh=True to bypass it.
+cache=ResultCache({
+    'Screen-Info-Tool': CachePolicy(ttl=300, tags=(DISPLAY,)),
+    'Taskbar-Tool': CachePolicy(ttl=300, tags=(DISPLAY, SETTINGS)),
+    'Bluetooth-Tool': CachePolicy(ttl=60, tags=(DEVICE, POWER)),
+    'Wifi-Tool': CachePolicy(ttl=15, tags=(NETWORK, DEVICE, POWER)),
+    'Registry-Tool': CachePolicy(ttl=60, max_entries=256),
+    'SystemInfo-Tool:os': CachePolicy(ttl=3600, tags=(SETTINGS,)),
+    'SystemInfo-Tool:disk': CachePolicy(ttl=30, tags=(DEVICE,)),
+})
+signals=Win32SignalSource()
+# Input and UI Automation work runs on one COM-initialized thread, queued by
+# priority with sessions taking turns, so concurrent clients never interleave
+# keystrokes. Tools that do no UI work stay off it, and so does Screenshot-Tool:
+# GDI capture and window enumeration need neither COM nor input ordering, and
+# a screenshot should not queue behind a macro.
+dispatcher=InputDispatcher(initializer=initialize_uia_thread)
+
+def _session_id():
+    try:
+        return get_context().session_id
+    except RuntimeError:
+        return None
+
+def _on_input_thread(func):
+    """Make a sync tool body an async tool that runs on the dispatcher thread."""
+    @functools.wraps(func)
+    async def tool(*args, **kwargs):
+        return await _on_input(func, *args, **kwargs)
+    return tool
+
+async def _on_input(func, *args, **kwargs):
+    """Run one input step on the dispatcher thread, for async tools that also do slow non-UI work.
+
+    PowerShell calls and waits stay on worker threads so they never hold up
+    other clients' input.
+    """
+    return await dispatcher.call(func, *args, session=_session_id(), **kwargs)
+
+def _ui_event_count() -> int:
+    return desktop.tree_cache.event_count if desktop.tree_cache else 0
+
+# Input actions settle on UI Automation events from the tree cache, else on a
+# stable screen, capped at max_settle. The report says which and how long.
+pacer=InputPacer(min_settle=0.02, max_settle=1.0, event_count=_ui_event_count)
+# Type-Tool sets the value through UI Automation, pastes long text or sends
+# Unicode key batches, whichever the focused control allows. A paste it
+# cannot read back settles before the old clipboard contents go back.
+injector=TextInjector(Win32Keyboard(), Win32Clipboard(), settle=pacer.settle)
+# Screenshot-Tool delta mode: per-session tile hashes of the last frame sent
+screen_deltas=DeltaTracker(tile=64)
 cursor=SystemCursor()
 watch_cursor=WatchCursor() if _has_watch_cursor else None
 ctypes.windll.user32.SetProcessDPIAware()
@@ -68,11 +133,27 @@ async def lifespan(app: FastMCP):
     try:
         if watch_cursor:
             watch_cursor.start()
+        desktop.start_tree_cache()
+        desktop.window_table.start()
+        desktop.powershell.start()
+        signals.start(cache.invalidate)
         await asyncio.sleep(1)
         yield
+        desktop.stop_tree_cache()
+        desktop.window_table.stop()
+        desktop.powershell.close()
+        signals.stop()
+        dispatcher.close()
+        desktop.capture.close()
         if watch_cursor:
             watch_cursor.stop()
     except Exception:
+        desktop.stop_tree_cache()
+        desktop.window_table.stop()
+        desktop.powershell.close()
+        signals.stop()
+        dispatcher.close()
+        desktop.capture.close()
         if watch_cursor:
             watch_cursor.stop()
 
@@ -80,12 +161,17 @@ mcp=FastMCP(name='windows-clippy-mcp',instructions=instructions,lifespan=lifespa
 
 # ==================== CDP HELPERS FOR EDGE-BROWSER-TOOL ====================
 
-def _cdp_send(ws_url: str, method: str, params: dict = None, timeout: int = 12) -> dict:
-    """Send a single CDP command over WebSocket and return the result dict."""
+def _cdp_connect(ws_url: str, timeout: int = 12):
+    """Open a WebSocket to a CDP target."""
     if not _has_websocket:
         raise RuntimeError('websocket-client not installed. Run: pip install websocket-client')
     ws = _ws_client.WebSocket()
     ws.connect(ws_url, timeout=timeout)
+    return ws
+
+def _cdp_send(ws_url: str, method: str, params: dict = None, timeout: int = 12) -> dict:
+    """Send a single CDP command over WebSocket and return the result dict."""
+    ws = _cdp_connect(ws_url, timeout)
     ws.send(json.dumps({'id': 1, 'method': method, 'params': params or {}}))
     deadline = time.time() + timeout
     try:
@@ -115,6 +201,15 @@ def _cdp_ws_for_tab(port: int = 9222, tab_index: int = 0) -> str:
 
 # ==================== END CDP HELPERS ====================
 
+def _cached_script(tool: str, script: str, timeout: float, refresh: bool) -> str:
+    """Output of a read-only PowerShell script, cached under the tool's policy. Failures are not cached."""
+    def run() -> str:
+        result = desktop.powershell.run(script, timeout=timeout)
+        if result.status != 0 and not result.output.strip():
+            raise RuntimeError(result.text or f'exit status {result.status}')
+        return result.output
+    return cache.get(tool, script, run, refresh)
+
 @mcp.tool(name='Launch-Tool', description='Launch an application from the Windows Start Menu by name (e.g., "notepad", "calculator", "chrome")')
 def launch_tool(name: str) -> str:
     _,status=desktop.launch_app(name)
@@ -123,45 +218,111 @@ def launch_tool(name: str) -> str:
     else:
         return f'Launched {name.title()}.'
 
-@mcp.tool(name='Powershell-Tool', description='Execute PowerShell commands and return the output with status code')
-def powershell_tool(command: str) -> str:
-    response,status=desktop.execute_command(command)
+def _output_progress(ctx:Optional[Context]):
+    """on_output callback that reports streamed command output as MCP progress."""
+    if ctx is None:
+        return None
+    lines=0
+
+    async def report(chunk:str)->None:
+        nonlocal lines
+        lines+=chunk.count('\n')
+        last=chunk.rstrip().rsplit('\n',1)[-1]
+        await ctx.report_progress(progress=lines,total=None,message=last[:200])
+    return report
+
+@mcp.tool(name='Powershell-Tool', description='Execute PowerShell commands and return the output with status code. Output lines are streamed as progress while the command runs; timeout is in seconds, and long output keeps its beginning and end.')
+async def powershell_tool(command: str, timeout: int = 30, ctx: Context = None) -> str:
+    response,status=await desktop.execute_command_async(command,timeout=timeout,on_output=_output_progress(ctx))
     return f'Status Code: {status}\nResponse: {response}'
 
-@mcp.tool(name='State-Tool',description='Capture comprehensive desktop state including focused/opened applications, interactive UI elements (buttons, text fields, menus), informative content (text, labels, status), and scrollable areas. Optionally includes visual screenshot when use_vision=True. Essential for understanding current desktop context and available UI interactions.')
-def state_tool(use_vision:bool=False)->str:
-    desktop_state=desktop.get_state(use_vision=use_vision)
-    interactive_elements=desktop_state.tree_state.interactive_elements_to_string()
-    informative_elements=desktop_state.tree_state.informative_elements_to_string()
-    scrollable_elements=desktop_state.tree_state.scrollable_elements_to_string()
-    apps=desktop_state.apps_to_string()
-    active_app=desktop_state.active_app_to_string()
-
-    state_text = dedent(f'''
-    Focused App:
-    {active_app}
-
-    Opened Apps:
-    {apps}
-
-    List of Interactive Elements:
-    {interactive_elements or 'No interactive elements found.'}
+@mcp.tool(name='Batch-Powershell-Tool', description='Run an ordered list of PowerShell commands in one call and return a JSON array with status, duration_ms, stdout and stderr per command. Commands run one after another on the same warm host and share its session, unless parallel=True spreads them over independent hosts. stop_on_error=True skips the commands after the first failure (sequential mode only). as_json=True pipes each command through ConvertTo-Json and returns the parsed value. timeout in seconds covers the whole batch.')
+async def batch_powershell_tool(commands: List[str], stop_on_error: bool = False, parallel: bool = False, as_json: bool = False, timeout: int = 60) -> str:
+    try:
+        results=await desktop.powershell.run_batch_async(commands,timeout=timeout,stop_on_error=stop_on_error,as_json=as_json,parallel=parallel)
+    except Exception as e:
+        return f'Error running batch: {str(e)}'
+    entries=[]
+    for index,(command,result) in enumerate(zip(commands,results)):
+        if result is None:
+            entries.append({'index':index,'command':command,'skipped':True})
+            continue
+        entry={'index':index,'command':command,'status':result.status,'duration_ms':round(result.duration_ms,1),'stdout':result.output,'stderr':result.errors}
+        if result.truncated:
+            entry['truncated']=True
+        if result.timed_out:
+            entry['timed_out']=True
+        if as_json and result.status==0 and result.output.strip():
+            try:
+                entry['value']=json.loads(result.output)
+                del entry['stdout']
+            except ValueError:
+                pass
+        entries.append(entry)
+    return json.dumps(entries,ensure_ascii=False,indent=1)
 
-    List of Informative Elements:
-    {informative_elements or 'No informative elements found.'}
+@mcp.tool(name='State-Tool',description='Capture comprehensive desktop state including focused/opened applications, interactive UI elements (buttons, text fields, menus), informative content (text, labels, status), and scrollable areas. With use_vision=True a screenshot is returned as image content, encoded as image_format (png, jpeg or webp) at image_quality and downscaled with area averaging so its longest side is at most max_image_dimension; grayscale=True drops color. max_depth controls how many levels below the focused window are walked. Set all_windows=True to walk every visible top-level window in parallel and list elements per window. When the cached tree is stale the walk is bounded by deadline seconds and walk_limit elements, visiting on-screen, enabled, focusable elements first and streaming progress; a partial result includes a continuation token to pass back as continuation to keep walking. Output is limited to the max_elements most relevant elements (focused, on-screen, enabled, interactive, recently changed) and max_chars characters; format selects text, json or compact tsv. Elements covered by other windows or scrolled off-screen are left out unless include_hidden=True. Every response starts with a snapshot token; pass it back as since to get only the elements added, removed, moved or changed since that snapshot. Essential for understanding current desktop context and available UI interactions.')
+async def state_tool(use_vision:bool=False,max_depth:int=8,since:Optional[str]=None,all_windows:bool=False,deadline:float=5.0,walk_limit:int=5000,continuation:Optional[str]=None,format:Literal['text','json','tsv']='text',max_chars:int=8000,max_elements:int=50,include_hidden:bool=False,image_format:Literal['png','jpeg','webp']='jpeg',image_quality:int=75,max_image_dimension:int=1568,grayscale:bool=False,ctx:Context=None)->list:
+    loop=asyncio.get_running_loop()
 
-    List of Scrollable Elements:
-    {scrollable_elements or 'No scrollable elements found.'}
-    ''').strip()
+    def on_progress(count:int,message:str)->None:
+        # Called on the walker thread; hand the notification to the event loop
+        if ctx is not None:
+            asyncio.run_coroutine_threadsafe(ctx.report_progress(progress=count,total=None,message=message),loop)
 
-    # Note: Image support would need to be handled differently in MCP
-    # For now, just return the text state
+    try:
+        image_options=ImageOptions(image_format,image_quality,max_image_dimension,grayscale)
+    except ValueError as e:
+        return [f'Invalid image options: {str(e)}']
+    budget=WalkBudget(deadline=deadline,walk_limit=walk_limit,max_depth=max_depth)
+    # A walk can take the whole deadline, so it queues behind single input actions
+    desktop_state=await dispatcher.call(desktop.get_state,use_vision=use_vision,max_depth=max_depth,all_windows=all_windows,budget=budget,continuation=continuation,on_progress=on_progress,include_hidden=include_hidden,image_options=image_options,priority=BATCH,session=_session_id())
+    snapshot=desktop_state.snapshot
+    token=desktop.snapshots.put(snapshot) if snapshot else None
+
+    notes=[]
+    if not desktop_state.complete:
+        notes.append(f'Partial Snapshot: walked {len(snapshot.elements)} elements in {snapshot.capture_ms:.0f} ms before the budget ran out. '
+                     f'Pass continuation={desktop_state.continuation} to keep walking.')
+    if desktop_state.expired_continuation:
+        notes.append(f'Continuation {continuation} has expired; a new walk was started.')
     if use_vision:
-        state_text += "\n\n[Screenshot capture requested but not supported in current MCP implementation]"
-
-    return state_text
+        screenshot=desktop_state.screenshot
+        notes.append(f'Screenshot: {screenshot.describe()}.' if screenshot else 'Screenshot capture failed.')
+
+    if since and token:
+        diff=desktop.snapshots.diff(since,token)
+        if diff is not None:
+            return _with_screenshot(render_diff(desktop_state,diff,format=format,max_chars=max_chars,max_elements=max_elements,notes=notes),desktop_state)
+        notes.insert(0,f'Snapshot {since} has expired; full state follows.')
+
+    changed=desktop.snapshots.recently_changed(token,snapshot.elements) if token else None
+    return _with_screenshot(render_state(desktop_state,format=format,max_chars=max_chars,max_elements=max_elements,token=token,changed=changed,notes=notes),desktop_state)
+
+def _with_screenshot(text:str,desktop_state)->list:
+    screenshot=desktop_state.screenshot
+    if screenshot is None:
+        return [text]
+    return [text,Image(data=screenshot.data,format=screenshot.format)]
+
+@mcp.tool(name='Find-Element-Tool',description='Find UI elements in the focused window with a CSS-like selector instead of reading the full State-Tool output. Match on ControlType (Button, Edit, ListItem, ...), [name=...] / [value=...] with = exact, *= contains, ^= prefix, $= suffix, ~= regex or %= fuzzy, #AutomationId, .ClassName, ancestor paths ("Pane > Button" for direct children, "Pane Button" for any descendant) and :first, :last or :nth(N). Example: Window > Pane Edit[name*=search]. Returns only the matching elements with click coordinates.')
+@_on_input_thread
+def find_element_tool(selector: str, limit: int = 10) -> str:
+    try:
+        snapshot, rows = desktop.find_elements(selector, limit=limit)
+    except SelectorError as e:
+        return f'Invalid selector: {str(e)}'
+    except Exception as e:
+        return f'Find failed: {str(e)}'
+    if not len(rows):
+        return f'No elements match {selector!r} in {snapshot.window_name}.'
+    result = f'{len(rows)} element(s) match {selector!r} in {snapshot.window_name}:\n{describe_elements(snapshot.elements, rows)}'
+    if len(rows) == limit:
+        result += f'\nShowing the first {limit}; there may be more. Refine the selector or raise limit.'
+    return result
 
 @mcp.tool(name='Clipboard-Tool',description='Copy text to clipboard or retrieve current clipboard content. Use "copy" mode with text parameter to copy, "paste" mode to retrieve.')
+@_on_input_thread
 def clipboard_tool(mode: Literal['copy', 'paste'], text: str = None)->str:
     if mode == 'copy':
         if text:
@@ -175,24 +336,45 @@ def clipboard_tool(mode: Literal['copy', 'paste'], text: str = None)->str:
     else:
         raise ValueError('Invalid mode. Use "copy" or "paste".')
 
-@mcp.tool(name='Click-Tool',description='Click on UI elements at specific coordinates. Supports left/right/middle mouse buttons and single/double/triple clicks. Use coordinates from State-Tool output.')
-def click_tool(x: int, y: int, button:Literal['left','right','middle']='left',clicks:int=1)->str:
-    pg.click(x=x, y=y, button=button, clicks=clicks)
-    control=desktop.get_element_under_cursor()
+def _target_element(x: int, y: int, snap: bool):
+    """Resolve the element at (x, y), optionally snapping onto the nearest interactive element."""
+    note = ''
+    if snap:
+        snapped_x, snapped_y, snapped = desktop.snap_to_interactive(x, y)
+        if snapped is not None:
+            note = f' Snapped from ({x},{y}) to nearest interactive element.'
+            x, y = snapped_x, snapped_y
+    element = desktop.element_at(x, y)
+    name, control_type = (element.name, element.control_type) if element else ('', 'Unknown')
+    return x, y, f'{name} Element with ControlType {control_type}', note
+
+@mcp.tool(name='Click-Tool',description='Click on UI elements at specific coordinates. Supports left/right/middle mouse buttons and single/double/triple clicks. Use coordinates from State-Tool output. Set snap=True to move slightly-off coordinates onto the nearest interactive element.')
+@_on_input_thread
+def click_tool(x: int, y: int, button:Literal['left','right','middle']='left',clicks:int=1,snap:bool=False)->str:
+    x, y, target, note = _target_element(x, y, snap)
+    report=pacer.run(pg.click, x=x, y=y, button=button, clicks=clicks)
     num_clicks={1:'Single',2:'Double',3:'Triple'}
-    return f'{num_clicks.get(clicks)} {button} Clicked on {control.Name} Element with ControlType {control.ControlTypeName} at ({x},{y}).'
-
-@mcp.tool(name='Type-Tool',description='Type text into input fields, text areas, or focused elements. Set clear=True to replace existing text, False to append. Click on target element coordinates first.')
-def type_tool(x: int, y: int, text:str,clear:bool=False) -> str:
-    pg.click(x=x, y=y)
-    control=desktop.get_element_under_cursor()
-    if clear:  # Fixed: compare boolean directly instead of string
-        pg.hotkey('ctrl','a')
-        pg.press('backspace')
-    pg.typewrite(text,interval=0.1)
-    return f'Typed "{text}" on {control.Name} Element with ControlType {control.ControlTypeName} at ({x},{y}).'
+    return f'{num_clicks.get(clicks)} {button} Clicked on {target} at ({x},{y}) ({report}).{note}'
+
+@mcp.tool(name='Type-Tool',description='Type text into input fields, text areas, or focused elements. Set clear=True to replace existing text, False to append. Click on target element coordinates first. Set snap=True to move slightly-off coordinates onto the nearest interactive element. Any Unicode text is supported; long text is set or pasted in one step and checked by reading the field back, and the reply names the method used and its characters per second.')
+@_on_input_thread
+def type_tool(x: int, y: int, text:str,clear:bool=False,snap:bool=False) -> str:
+    x, y, target, note = _target_element(x, y, snap)
+    reports=[pacer.run(pg.click, x=x, y=y)]
+    mark=pacer.mark()
+    try:
+        injection=injector.inject(_focused_text_target(), text, clear)
+    except InjectionError as e:
+        return f'Typing on {target} at ({x},{y}) failed: {str(e)}'
+    reports.append(pacer.settle(mark))
+    return f'Typed "{text}" on {target} at ({x},{y}): {injection} ({summarize(reports)}).{note}'
+
+def _focused_text_target() -> UIATextTarget:
+    initialize_uia_thread()
+    return UIATextTarget(ua.GetFocusedControl())
 
 @mcp.tool(name='Switch-Tool',description='Switch to a specific application window (e.g., "notepad", "calculator", "chrome", etc.) and bring to foreground.')
+@_on_input_thread
 def switch_tool(name: str) -> str:
     _,status=desktop.switch_app(name)
     if status!=0:
@@ -201,7 +383,15 @@ def switch_tool(name: str) -> str:
         return f'Switched to {name.title()} window.'
 
 @mcp.tool(name='Scroll-Tool',description='Scroll at specific coordinates or current mouse position. Use wheel_times to control scroll amount (1 wheel = ~3-5 lines). Essential for navigating lists, web pages, and long content.')
+@_on_input_thread
 def scroll_tool(x: int = None, y: int = None, direction:Literal['up','down','left','right']='down',wheel_times:int=3)->str:
+    if direction not in ('up','down','left','right'):
+        return f'Invalid direction "{direction}". Use: up, down, left, right.'
+    mark=pacer.mark()
+    _scroll(x, y, direction, wheel_times)
+    return f'Scrolled {direction} by {wheel_times} wheel times ({pacer.settle(mark)}).'
+
+def _scroll(x: Optional[int], y: Optional[int], direction: str, wheel_times: int) -> None:
     if x is not None and y is not None:
         pg.moveTo(x, y)
 
@@ -222,39 +412,168 @@ def scroll_tool(x: int = None, y: int = None, direction:Literal['up','down','lef
             ua.WheelDown(wheel_times)
             pg.sleep(0.05)
             pg.keyUp('shift')
-        case _:
-            return f'Invalid direction "{direction}". Use: up, down, left, right.'
-
-    return f'Scrolled {direction} by {wheel_times} wheel times.'
 
 @mcp.tool(name='Drag-Tool', description='Drag and drop operation from source coordinates to destination coordinates. Useful for moving files, resizing windows, or drag-and-drop interactions.')
+@_on_input_thread
 def drag_tool(from_x: int, from_y: int, to_x: int, to_y: int) -> str:
+    mark=pacer.mark()
+    _drag(from_x, from_y, to_x, to_y)
+    return f'Dragged element from ({from_x},{from_y}) to ({to_x},{to_y}) ({pacer.settle(mark)}).'
+
+def _drag(from_x: int, from_y: int, to_x: int, to_y: int) -> None:
     # Move to start position, press mouse down, drag to end, release
     pg.moveTo(from_x, from_y)
     pg.mouseDown()
     pg.moveTo(to_x, to_y, duration=0.5)
     pg.mouseUp()
-    return f'Dragged element from ({from_x},{from_y}) to ({to_x},{to_y}).'
 
 @mcp.tool(name='Move-Tool', description='Move mouse cursor to specific coordinates without clicking. Useful for hovering over elements or positioning cursor before other actions.')
+@_on_input_thread
 def move_tool(x: int, y: int) -> str:
-    pg.moveTo(x, y)
-    return f'Moved the mouse pointer to ({x},{y}).'
+    report=pacer.run(pg.moveTo, x, y)
+    return f'Moved the mouse pointer to ({x},{y}) ({report}).'
 
 @mcp.tool(name='Shortcut-Tool',description='Execute keyboard shortcuts using key combinations. Pass keys as list (e.g., ["ctrl", "c"] for copy, ["alt", "tab"] for app switching, ["win", "r"] for Run dialog).')
+@_on_input_thread
 def shortcut_tool(shortcut: List[str]):
-    pg.hotkey(*shortcut)
-    return f'Pressed {'+'.join(shortcut)}.'
+    report=pacer.run(pg.hotkey, *shortcut)
+    return f'Pressed {'+'.join(shortcut)} ({report}).'
 
 @mcp.tool(name='Key-Tool',description='Press individual keyboard keys. Supports special keys like "enter", "escape", "tab", "space", "backspace", "delete", arrow keys ("up", "down", "left", "right"), function keys ("f1"-"f12").')
+@_on_input_thread
 def key_tool(key:str='')->str:
-    pg.press(key)
-    return f'Pressed the key {key}.'
+    report=pacer.run(pg.press, key)
+    return f'Pressed the key {key} ({report}).'
+
+def _macro_type(text: str, x: Optional[int] = None, y: Optional[int] = None, clear: bool = False) -> str:
+    if x is not None and y is not None:
+        pacer.run(pg.click, x=x, y=y)
+    return str(injector.inject(_focused_text_target(), text, clear))
+
+def _window_titled(text: str) -> bool:
+    return any(text.lower() in window.title.lower() for window in desktop.window_table.windows())
+
+def _element_present(selector: str, deadline: Optional[float] = None, busy: bool = False) -> bool:
+    """Whether ``selector`` matches; ``busy`` is the answer when the dispatcher cannot check before ``deadline``."""
+    if not dispatcher.on_owner_thread():
+        # Wait-Until-Tool polls from a worker thread; Macro-Tool already runs on the owner
+        job = dispatcher.submit(_element_present, selector)
+        try:
+            return job.result(timeout=None if deadline is None else max(deadline - time.perf_counter(), 0.0))
+        except TimeoutError:
+            job.cancel()  # a macro is holding the dispatcher; do not queue up checks behind it
+            return busy
+    _, rows = desktop.find_elements(selector, limit=1)
+    return bool(len(rows))
+
+def _predicate(kind: str, target: str, deadline: Optional[float] = None) -> Predicate:
+    """Predicate for a window, element or process condition.
+
+    Window and process checks re-run as soon as a window event arrives and
+    element checks as soon as a UI Automation event does. An element check
+    that cannot get onto the dispatcher before ``deadline`` (a
+    ``time.perf_counter()`` value) counts as not met.
+    """
+    window_events = lambda: desktop.window_table.event_count
+    match kind:
+        case 'window' | 'window_gone':
+            predicate = Check(lambda: _window_titled(target), f'window {target!r}', version=window_events)
+        case 'element' | 'element_gone':
+            predicate = Check(lambda: _element_present(target, deadline, busy=kind.endswith('_gone')), f'element {target!r}', version=_ui_event_count)
+        case 'process' | 'process_gone':
+            predicate = ProcessRunning(target, version=window_events)
+        case _:
+            raise ValueError(f'Unknown condition {kind!r}')
+    return Not(predicate, f'{predicate.description} gone') if kind.endswith('_gone') else predicate
+
+def _wait_condition(condition: dict, timeout: float) -> bool:
+    """Block until a Macro-Tool wait_for or expect condition holds."""
+    (kind, target), = condition.items()
+    return wait_until(_predicate(kind, target), timeout).met
+
+# Macro-Tool plans run as single jobs on the dispatcher thread.
+macros=MacroRunner(
+    handlers={
+        'click': lambda x, y, button='left', clicks=1: pg.click(x=x, y=y, button=button, clicks=clicks),
+        'type': _macro_type,
+        'key': lambda key: pg.press(key),
+        'shortcut': lambda keys: pg.hotkey(*keys),
+        'scroll': lambda x=None, y=None, direction='down', amount=3: _scroll(x, y, direction, amount),
+        'drag': _drag,
+        'move': lambda x, y: pg.moveTo(x, y),
+    },
+    wait=_wait_condition,
+    pacer=pacer,
+)
 
-@mcp.tool(name='Wait-Tool',description='Pause execution for specified duration in seconds. Useful for waiting for applications to load, animations to complete, or adding delays between actions.')
-def wait_tool(duration:int)->str:
-    pg.sleep(duration)
-    return f'Waited for {duration} seconds.'
+@mcp.tool(name='Macro-Tool', description='Run an ordered plan of input steps in one call and return per-step status, detail and timing as JSON. Each step is an object with an action and its parameters: click (x, y, button, clicks), type (text, optional x, y, clear), key (key), shortcut (keys list), scroll (optional x, y, direction, amount), drag (from_x, from_y, to_x, to_y), move (x, y) or wait_for (condition, timeout seconds). A condition is {"element": selector}, {"element_gone": selector}, {"window": title text}, {"window_gone": title text} or {"process": executable name}; any step may also carry expect (a condition checked after it, within expect_timeout seconds) and a label. The whole plan is validated before anything runs. Steps wait for the UI to settle between them, and with stop_on_failure=True the first failed step or expect skips the rest. Example: [{"action": "click", "x": 400, "y": 300}, {"action": "type", "text": "Ada"}, {"action": "key", "key": "tab"}, {"action": "shortcut", "keys": ["ctrl", "s"], "expect": {"window": "Save"}}].')
+async def macro_tool(steps: List[dict], stop_on_failure: bool = True, ctx: Context = None) -> str:
+    try:
+        plan=compile_plan(steps, keys=_KEY_NAMES, validate_selector=parse_selector)
+    except MacroError as e:
+        return 'Invalid macro, nothing was run:\n' + '\n'.join(f'- {problem}' for problem in e.problems)
+    loop=asyncio.get_running_loop()
+    cancel=threading.Event()
+
+    def on_step(outcome, total):
+        if ctx is not None:
+            asyncio.run_coroutine_threadsafe(ctx.report_progress(progress=outcome.index, total=total, message=f'{outcome.step}: {outcome.status}'), loop)
+    try:
+        result=await dispatcher.call(macros.run, plan, stop_on_failure, on_step, cancel, priority=BATCH, session=_session_id())
+    except asyncio.CancelledError:
+        # A queued macro is dropped; a running one finishes its current step
+        # and skips the rest.
+        cancel.set()
+        raise
+    except Exception as e:
+        return f'Macro failed: {str(e)}'
+    return json.dumps(result.to_dict(), indent=1)
+
+@mcp.tool(name='Wait-Tool',description='Pause execution for specified duration in seconds. To wait for an application to load, a dialog to close or an animation to finish, prefer Wait-Until-Tool, which returns as soon as the condition holds.')
+async def wait_tool(duration:float)->str:
+    await asyncio.sleep(duration)
+    return f'Waited for {duration:g} seconds.'
+
+@mcp.tool(name='Wait-Until-Tool', description='Wait until a condition holds or timeout seconds pass, instead of sleeping a fixed time. condition: window / window_gone (a window title contains target), element / element_gone (the selector in target matches in the focused window, same syntax as Find-Element-Tool), process / process_gone (an executable named target is running), stable (the screen, or the x/y/width/height region, is unchanged for quiet seconds) or page_loaded (the Edge tab at tab_index on debug_port fires its load event or has finished loading). Checks back off from 10 ms to 250 ms and re-run immediately on window and UI Automation events. Reports whether the condition was met and how long it took.')
+async def wait_until_tool(
+    condition: Literal['window', 'window_gone', 'element', 'element_gone', 'process', 'process_gone', 'stable', 'page_loaded'],
+    target: str = None,
+    timeout: float = 10,
+    x: int = None,
+    y: int = None,
+    width: int = None,
+    height: int = None,
+    quiet: float = 0.5,
+    debug_port: int = 9222,
+    tab_index: int = 0,
+) -> str:
+    try:
+        if condition == 'stable':
+            region = None
+            if None not in (x, y, width, height):
+                region = (x, y, x + width, y + height)
+            predicate = RegionStable(region, quiet=quiet)
+        elif condition == 'page_loaded':
+            predicate = CdpLoadEvent(_cdp_ws_for_tab(debug_port, tab_index), _cdp_connect)
+        elif not target:
+            return f'target is required for condition="{condition}"'
+        else:
+            if condition.startswith('element'):
+                parse_selector(target)
+            predicate = _predicate(condition, target, time.perf_counter() + timeout)
+    except SelectorError as e:
+        return f'Invalid selector: {str(e)}'
+    except Exception as e:
+        return f'Wait failed: {str(e)}'
+    cancel = threading.Event()
+    try:
+        result = await asyncio.to_thread(wait_until, predicate, timeout, cancel=cancel)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+    except Exception as e:
+        return f'Wait failed: {str(e)}'
+    return str(result) if result.met else f'Timed out: {result}'
 
 @mcp.tool(name='Scrape-Tool',description='Fetch and convert webpage content to markdown format. Provide full URL including protocol (http/https). Returns structured text content suitable for analysis.')
 def scrape_tool(url:str)->str:
@@ -264,29 +583,35 @@ def scrape_tool(url:str)->str:
     return f'Scraped the contents of the entire webpage:\n{content}'
 
 @mcp.tool(name='Browser-Tool',description='Launch Microsoft Edge browser and navigate to a specified URL. If no URL is provided, opens Edge to the default home page.')
-def browser_tool(url: str = None) -> str:
+async def browser_tool(url: str = None) -> str:
     try:
         # Launch Edge
-        launch_result, status = desktop.launch_app("msedge")
+        before = {window.hwnd for window in desktop.window_table.windows()}
+        launch_result, status = await asyncio.to_thread(desktop.launch_app, "msedge")
         if status != 0:
             return f'Failed to launch Microsoft Edge.'
 
-        # Wait for Edge to load
-        pg.sleep(2)
+        # Wait for the new Edge window instead of a fixed 2 s
+        windows = desktop.window_table
+        new_window = Check(
+            lambda: any(window.hwnd not in before and 'edge' in window.title.lower() for window in windows.windows()),
+            'new Edge window',
+            version=lambda: windows.event_count,
+        )
+        await asyncio.to_thread(wait_until, new_window, 10)
 
         if url:
-            # Navigate to the specified URL
-            # Focus the address bar (Ctrl+L)
-            pg.hotkey('ctrl', 'l')
-            pg.sleep(0.5)
+            def navigate():
+                # Focus the address bar (Ctrl+L)
+                pacer.run(pg.hotkey, 'ctrl', 'l')
 
-            # Type the URL
-            pg.typewrite(url, interval=0.05)
-            pg.sleep(0.5)
+                # Type the URL
+                pacer.run(pg.typewrite, url, interval=0.05)
 
-            # Press Enter to navigate
-            pg.press('enter')
+                # Press Enter to navigate
+                pacer.run(pg.press, 'enter')
 
+            await _on_input(navigate)
             return f'Launched Microsoft Edge and navigated to {url}'
         else:
             return 'Launched Microsoft Edge with default home page'
@@ -296,16 +621,16 @@ def browser_tool(url: str = None) -> str:
 
 # Microsoft 365 & Power Platform Tools
 
-@mcp.tool(name='PAC-CLI-Tool', description='Execute Power Platform CLI (PAC) commands for managing Power Apps, Power Automate, and Dataverse environments. Common commands: pac auth list, pac solution list, pac app list, pac env list.')
-def pac_cli_tool(command: str) -> str:
+@mcp.tool(name='PAC-CLI-Tool', description='Execute Power Platform CLI (PAC) commands for managing Power Apps, Power Automate, and Dataverse environments. Common commands: pac auth list, pac solution list, pac app list, pac env list. Output is streamed as progress; timeout is in seconds and defaults to 5 minutes for long solution exports.')
+async def pac_cli_tool(command: str, timeout: int = 300, ctx: Context = None) -> str:
     """Execute PAC CLI commands for Power Platform management."""
     try:
         # Validate the command starts with 'pac'
         if not command.strip().lower().startswith('pac'):
             return 'Error: Command must start with "pac". Example: pac env list'
 
-        # Execute the PAC CLI command via PowerShell
-        response, status = desktop.execute_command(f'powershell.exe -Command "{command}"')
+        # Execute the PAC CLI command on a pooled PowerShell host
+        response, status = await desktop.execute_command_async(command, timeout=timeout, on_output=_output_progress(ctx))
 
         if status == 0:
             return f'PAC CLI executed successfully:\n{response}'
@@ -708,93 +1033,96 @@ def m365_copilot_tool(app: str, prompt: str, context: str = None) -> str:
 # ==================== NEW WINDOWS TOOLS ====================
 
 @mcp.tool(name='Window-Tool', description='Control window state: minimize, maximize, restore, close, or resize active/named window. Use action="minimize|maximize|restore|close|resize". For resize, provide width and height.')
+@_on_input_thread
 def window_tool(action: Literal['minimize', 'maximize', 'restore', 'close', 'resize'], window_name: str = None, width: int = None, height: int = None) -> str:
     try:
-        ps_script = '''
-        Add-Type -TypeDefinition @'
-        using System;
-        using System.Runtime.InteropServices;
-        public class WinAPI {
-            [DllImport("user32.dll")] public static extern IntPtr GetForegroundWindow();
-            [DllImport("user32.dll")] public static extern bool ShowWindow(IntPtr hWnd, int nCmdShow);
-            [DllImport("user32.dll")] public static extern bool MoveWindow(IntPtr hWnd, int X, int Y, int nWidth, int nHeight, bool bRepaint);
-            [DllImport("user32.dll")] public static extern bool GetWindowRect(IntPtr hWnd, out RECT lpRect);
-            [DllImport("user32.dll")] public static extern int SendMessage(IntPtr hWnd, int Msg, int wParam, int lParam);
-            [StructLayout(LayoutKind.Sequential)] public struct RECT { public int Left, Top, Right, Bottom; }
-        }
-'@
-        '''
-        
-        if window_name:
-            ps_script += f'''
-            $proc = Get-Process | Where-Object {{ $_.MainWindowTitle -like "*{window_name}*" -and $_.MainWindowHandle -ne 0 }} | Select-Object -First 1
-            if ($proc) {{ $hwnd = $proc.MainWindowHandle }} else {{ Write-Output "NOTFOUND"; exit }}
-            '''
-        else:
-            ps_script += '$hwnd = [WinAPI]::GetForegroundWindow()\n'
-        
-        action_map = {
-            'minimize': '[WinAPI]::ShowWindow($hwnd, 6) | Out-Null; Write-Output "Minimized"',
-            'maximize': '[WinAPI]::ShowWindow($hwnd, 3) | Out-Null; Write-Output "Maximized"',
-            'restore': '[WinAPI]::ShowWindow($hwnd, 9) | Out-Null; Write-Output "Restored"',
-            'close': '[WinAPI]::SendMessage($hwnd, 0x0010, 0, 0) | Out-Null; Write-Output "Closed"',
-        }
-        
-        if action == 'resize' and width and height:
-            ps_script += f'''
-            $rect = New-Object WinAPI+RECT
-            [WinAPI]::GetWindowRect($hwnd, [ref]$rect) | Out-Null
-            [WinAPI]::MoveWindow($hwnd, $rect.Left, $rect.Top, {width}, {height}, $true) | Out-Null
-            Write-Output "Resized to {width}x{height}"
-            '''
-        elif action in action_map:
-            ps_script += action_map[action]
-        else:
-            return 'Invalid action or missing width/height for resize'
-        
-        result = subprocess.run(['powershell', '-Command', ps_script], capture_output=True, text=True, timeout=10)
-        output = result.stdout.strip()
-        
-        if output == "NOTFOUND":
-            return f'Window "{window_name}" not found'
-        return f'Window action completed: {output}'
+        response, status = desktop.set_window_state(action, window_name, width, height)
+        if status != 0:
+            return response
+        return f'Window action completed: {response}'
     except Exception as e:
         return f'Window operation failed: {str(e)}'
 
-@mcp.tool(name='Screenshot-Tool', description='Capture screenshot of entire screen, specific region, or active window. Mode: "full", "region" (needs x,y,width,height), or "window". Returns base64 encoded PNG or saves to file.')
-def screenshot_tool(mode: Literal['full', 'region', 'window'] = 'full', x: int = None, y: int = None, width: int = None, height: int = None, save_path: str = None) -> str:
-    try:
-        import base64
-        from io import BytesIO
-        
-        if mode == 'full':
-            screenshot = pg.screenshot()
-        elif mode == 'region' and all([x is not None, y is not None, width, height]):
-            screenshot = pg.screenshot(region=(x, y, width, height))
-        elif mode == 'window':
-            # Capture active window
-            window = ua.GetForegroundWindow()
-            if window:
-                rect = window.BoundingRectangle
-                screenshot = pg.screenshot(region=(rect.left, rect.top, rect.width(), rect.height()))
-            else:
-                screenshot = pg.screenshot()
+def _capture_frame(mode: str, x: int, y: int, width: int, height: int, window_name: str, all_screens: bool):
+    """Capture the Screenshot-Tool target. Raises ValueError for a bad mode or window name."""
+    if mode == 'full':
+        return desktop.capture.screen(all_screens)
+    if mode == 'region' and all([x is not None, y is not None, width, height]):
+        return desktop.capture.region((x, y, x + width, y + height))
+    if mode == 'window':
+        if window_name:
+            matches = desktop.window_table.find(window_name)
+            if not matches:
+                raise ValueError(f'Window "{window_name}" not found')
+            hwnd = matches[0][1].hwnd
         else:
-            return 'Invalid mode or missing region parameters'
-        
-        if save_path:
-            screenshot.save(save_path)
-            return f'Screenshot saved to {save_path}'
+            hwnd = desktop.window_backend.foreground_window()
+        return desktop.capture.window(hwnd) if hwnd else desktop.capture.screen()
+    raise ValueError('Invalid mode or missing region parameters')
+
+def _capture_delta(session, full_every: int, *target):
+    frame = _capture_frame(*target)
+    return frame, screen_deltas.compare(session, frame, full_every)
+
+@mcp.tool(name='Screenshot-Tool', description='Capture screenshot of entire screen, specific region, or a window and return it as image content. Mode: "full" (primary monitor, or every monitor with all_screens=True), "region" (needs x,y,width,height), or "window" (the foreground window, or the best match for window_name; windows covered by others are captured too). image_format is png, jpeg or webp; quality (1-100) applies to jpeg and webp; max_dimension caps the longest side with area-averaged downscaling (a 4K PNG is several MB, a 1568-pixel JPEG about 100 KB); grayscale=True drops color. With save_path the encoded image is written to that file instead. delta="tiles" or "bbox" returns only what changed since this session\'s previous screenshot of the same target: the changed 64-pixel tiles merged into rectangles, or one crop of their bounding box, each with its screen position; a full frame is sent first and again after full_every deltas.')
+async def screenshot_tool(mode: Literal['full', 'region', 'window'] = 'full', x: int = None, y: int = None, width: int = None, height: int = None, save_path: str = None, window_name: str = None, all_screens: bool = False, image_format: Literal['png', 'jpeg', 'webp'] = 'png', quality: int = 80, max_dimension: int = None, grayscale: bool = False, delta: Literal['off', 'tiles', 'bbox'] = 'off', full_every: int = 10) -> list:
+    target = (mode, x, y, width, height, window_name, all_screens)
+    change = None
+    try:
+        options = ImageOptions(image_format, quality, max_dimension, grayscale)
+        if delta == 'off' or save_path:
+            frame = await asyncio.to_thread(_capture_frame, *target)
         else:
-            buffer = BytesIO()
-            screenshot.save(buffer, format='PNG')
-            b64_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            return f'Screenshot captured (base64 PNG, {len(b64_data)} chars). First 100 chars: {b64_data[:100]}...'
+            frame, change = await asyncio.to_thread(_capture_delta, _session_id(), max(full_every, 0), *target)
+        if change is None or change.kind == 'full':
+            encoded = await desktop.capture.encode_async(frame, options)
+        elif change.kind == 'delta':
+            regions = change.regions if delta == 'tiles' else [change.bbox]
+            crops = await asyncio.gather(*(
+                desktop.capture.encode_async(frame, options.for_crop((frame.width, frame.height), (right - left, bottom - top)), (left, top, right, bottom))
+                for left, top, right, bottom in regions
+            ))
+    except ValueError as e:
+        return [str(e)]
     except Exception as e:
-        return f'Screenshot failed: {str(e)}'
+        return [f'Screenshot failed: {str(e)}']
+    
+    left, top, right, bottom = frame.rect
+    summary = f'screen area ({left}, {top})-({right}, {bottom}) {"captured" if frame.grabbed else "reused"} in {frame.capture_ms:.0f} ms'
+    if change is not None and change.kind == 'unchanged':
+        return [f'Screenshot delta: nothing changed in the {summary} since the previous screenshot.']
+    if change is not None and change.kind == 'delta':
+        remaining = max(full_every - change.deltas_since_full, 0)
+        content = [
+            f'Screenshot delta: {change.changed_tiles} of {change.tiles} tiles changed in the {summary}. '
+            f'{len(crops)} region(s) follow, {sum(len(crop.data) for crop in crops) / 1024:.1f} KB in total; '
+            f'place each at its screen position over the previous screenshot. A full frame follows after {remaining} more delta(s).'
+        ]
+        for number, (region, crop) in enumerate(zip(regions, crops), 1):
+            region_left, region_top, region_right, region_bottom = change.screen_rect(region)
+            content.append(f'Region {number}: screen ({region_left}, {region_top})-({region_right}, {region_bottom}); {crop.describe()}.')
+            content.append(Image(data=crop.data, format=crop.format))
+        return content
+    if not frame.changed:
+        summary += ', unchanged since the last capture'
+    summary += f'; {encoded.describe()}'
+    if change is not None:
+        summary += f'. Full frame for delta mode ({change.reason})'
+    if save_path:
+        try:
+            with open(save_path, 'wb') as file:
+                file.write(encoded.data)
+        except OSError as e:
+            return [f'Screenshot failed: {str(e)}']
+        return [f'Screenshot saved to {save_path}: {summary}.']
+    return [f'Screenshot: {summary}.', Image(data=encoded.data, format=encoded.format)]
 
 @mcp.tool(name='Volume-Tool', description='Control system volume: mute, unmute, set volume level (0-100), increase/decrease by amount.')
-def volume_tool(action: Literal['mute', 'unmute', 'set', 'up', 'down', 'get'], level: int = None) -> str:
+async def volume_tool(action: Literal['mute', 'unmute', 'set', 'up', 'down', 'get'], level: int = None) -> str:
+    def press(key: str, times: int = 1) -> None:
+        for _ in range(times):
+            pacer.run(pg.press, key)
+
     try:
         if action == 'mute':
             ps_cmd = '''
@@ -802,90 +1130,33 @@ def volume_tool(action: Literal['mute', 'unmute', 'set', 'up', 'down', 'get'], l
             $obj.SendKeys([char]173)
             '''
             # Alternative: use nircmd or direct API
-            for _ in range(1):
-                pg.press('volumemute')
+            await _on_input(press, 'volumemute')
             return 'Volume muted'
         
         elif action == 'unmute':
-            pg.press('volumemute')  # Toggle
+            await _on_input(press, 'volumemute')  # Toggle
             return 'Volume unmuted (toggled)'
         
         elif action == 'set' and level is not None:
             # Set volume using PowerShell with audio API
-            ps_cmd = f'''
-            Add-Type -TypeDefinition @'
-            using System.Runtime.InteropServices;
-            [Guid("5CDF2C82-841E-4546-9722-0CF74078229A"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IAudioEndpointVolume {{
-                int _0(); int _1(); int _2(); int _3();
-                int SetMasterVolumeLevelScalar(float fLevel, System.Guid pguidEventContext);
-                int _5();
-                int GetMasterVolumeLevelScalar(out float pfLevel);
-            }}
-            [Guid("D666063F-1587-4E43-81F1-B948E807363F"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IMMDevice {{ int Activate(ref System.Guid iid, int dwClsCtx, IntPtr pActivationParams, [MarshalAs(UnmanagedType.IUnknown)] out object ppInterface); }}
-            [Guid("A95664D2-9614-4F35-A746-DE8DB63617E6"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IMMDeviceEnumerator {{ int GetDefaultAudioEndpoint(int dataFlow, int role, out IMMDevice ppDevice); }}
-            [ComImport, Guid("BCDE0395-E52F-467C-8E3D-C4579291692E")] class MMDeviceEnumeratorComObject {{ }}
-            public class Audio {{
-                static IAudioEndpointVolume Vol() {{
-                    var enumerator = new MMDeviceEnumeratorComObject() as IMMDeviceEnumerator;
-                    IMMDevice dev; enumerator.GetDefaultAudioEndpoint(0, 1, out dev);
-                    var iid = typeof(IAudioEndpointVolume).GUID; object o; dev.Activate(ref iid, 1, IntPtr.Zero, out o);
-                    return o as IAudioEndpointVolume;
-                }}
-                public static void SetVol(float v) {{ Vol().SetMasterVolumeLevelScalar(v, System.Guid.Empty); }}
-                public static float GetVol() {{ float v; Vol().GetMasterVolumeLevelScalar(out v); return v; }}
-            }}
-'@
-            [Audio]::SetVol({level/100})
-            Write-Output "Volume set to {level}%"
-            '''
-            result = subprocess.run(['powershell', '-Command', ps_cmd], capture_output=True, text=True, timeout=10)
-            return result.stdout.strip() or f'Volume set to {level}%'
+            ps_cmd = interop.invoke('Clippy-SetVolume', level=level)
+            result = await desktop.powershell.run_async(ps_cmd, timeout=10)
+            return result.output.strip() or f'Volume set to {level}%'
         
         elif action == 'up':
             times = level if level else 2
-            for _ in range(times):
-                pg.press('volumeup')
+            await _on_input(press, 'volumeup', times)
             return f'Volume increased by {times * 2}%'
         
         elif action == 'down':
             times = level if level else 2
-            for _ in range(times):
-                pg.press('volumedown')
+            await _on_input(press, 'volumedown', times)
             return f'Volume decreased by {times * 2}%'
         
         elif action == 'get':
-            ps_cmd = '''
-            Add-Type -TypeDefinition @'
-            using System.Runtime.InteropServices;
-            [Guid("5CDF2C82-841E-4546-9722-0CF74078229A"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IAudioEndpointVolume {
-                int _0(); int _1(); int _2(); int _3();
-                int SetMasterVolumeLevelScalar(float fLevel, System.Guid pguidEventContext);
-                int _5();
-                int GetMasterVolumeLevelScalar(out float pfLevel);
-            }
-            [Guid("D666063F-1587-4E43-81F1-B948E807363F"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IMMDevice { int Activate(ref System.Guid iid, int dwClsCtx, IntPtr pActivationParams, [MarshalAs(UnmanagedType.IUnknown)] out object ppInterface); }
-            [Guid("A95664D2-9614-4F35-A746-DE8DB63617E6"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
-            interface IMMDeviceEnumerator { int GetDefaultAudioEndpoint(int dataFlow, int role, out IMMDevice ppDevice); }
-            [ComImport, Guid("BCDE0395-E52F-467C-8E3D-C4579291692E")] class MMDeviceEnumeratorComObject { }
-            public class Audio {
-                public static float GetVol() {
-                    var enumerator = new MMDeviceEnumeratorComObject() as IMMDeviceEnumerator;
-                    IMMDevice dev; enumerator.GetDefaultAudioEndpoint(0, 1, out dev);
-                    var iid = typeof(IAudioEndpointVolume).GUID; object o; dev.Activate(ref iid, 1, IntPtr.Zero, out o);
-                    float v; (o as IAudioEndpointVolume).GetMasterVolumeLevelScalar(out v); return v;
-                }
-            }
-'@
-            $vol = [Audio]::GetVol() * 100
-            Write-Output "Current volume: $([math]::Round($vol))%"
-            '''
-            result = subprocess.run(['powershell', '-Command', ps_cmd], capture_output=True, text=True, timeout=10)
-            return result.stdout.strip() or 'Could not get volume level'
+            ps_cmd = interop.invoke('Clippy-GetVolume')
+            result = await desktop.powershell.run_async(ps_cmd, timeout=10)
+            return result.output.strip() or 'Could not get volume level'
         
         return 'Invalid action'
     except Exception as e:
@@ -894,29 +1165,8 @@ def volume_tool(action: Literal['mute', 'unmute', 'set', 'up', 'down', 'get'], l
 @mcp.tool(name='Notification-Tool', description='Display a Windows toast notification with title and message.')
 def notification_tool(title: str, message: str, duration: Literal['short', 'long'] = 'short') -> str:
     try:
-        # Escape special characters for PowerShell
-        title_escaped = title.replace("'", "''").replace('"', '`"')
-        message_escaped = message.replace("'", "''").replace('"', '`"')
-        
-        ps_script = f'''
-        [Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
-        [Windows.Data.Xml.Dom.XmlDocument, Windows.Data.Xml.Dom.XmlDocument, ContentType = WindowsRuntime] | Out-Null
-        $template = @"
-        <toast duration="{duration}">
-            <visual>
-                <binding template="ToastText02">
-                    <text id="1">{title_escaped}</text>
-                    <text id="2">{message_escaped}</text>
-                </binding>
-            </visual>
-        </toast>
-"@
-        $xml = New-Object Windows.Data.Xml.Dom.XmlDocument
-        $xml.LoadXml($template)
-        $toast = [Windows.UI.Notifications.ToastNotification]::new($xml)
-        [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("Darbot Windows MCP").Show($toast)
-        '''
-        result = subprocess.run(['powershell', '-Command', ps_script], capture_output=True, text=True, timeout=10)
+        ps_script = interop.invoke('Clippy-ShowToast', title=title, message=message, duration=duration)
+        result = desktop.powershell.run(ps_script, timeout=10)
         return f'Notification displayed: "{title}"'
     except Exception as e:
         return f'Notification failed: {str(e)}'
@@ -994,20 +1244,38 @@ def process_tool(action: Literal['list', 'kill'], name: str = None, pid: int = N
     except Exception as e:
         return f'Process operation failed: {str(e)}'
 
-@mcp.tool(name='SystemInfo-Tool', description='Get system information: CPU, memory, disk usage, OS details, network interfaces.')
-def system_info_tool(info_type: Literal['all', 'cpu', 'memory', 'disk', 'os', 'network', 'battery'] = 'all') -> str:
+def _os_info() -> tuple:
+    import platform
+    return (
+        "=== OS Information ===",
+        f"System: {platform.system()} {platform.release()}",
+        f"Version: {platform.version()}",
+        f"Machine: {platform.machine()}",
+        f"Processor: {platform.processor()}",
+        f"Computer Name: {os_module.environ.get('COMPUTERNAME', 'Unknown')}",
+        f"User: {os_module.environ.get('USERNAME', 'Unknown')}",
+    )
+
+def _disk_info() -> tuple:
+    result = ["\n=== Disk Information ==="]
+    for partition in psutil.disk_partitions():
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+            result.append(f"Drive {partition.device}:")
+            result.append(f"  Total: {usage.total / (1024**3):.2f} GB")
+            result.append(f"  Used: {usage.used / (1024**3):.2f} GB ({usage.percent}%)")
+            result.append(f"  Free: {usage.free / (1024**3):.2f} GB")
+        except:
+            pass
+    return tuple(result)
+
+@mcp.tool(name='SystemInfo-Tool', description='Get system information: CPU, memory, disk usage, OS details, network interfaces. OS and disk details are cached until the system changes; pass refresh=True to re-read them.')
+def system_info_tool(info_type: Literal['all', 'cpu', 'memory', 'disk', 'os', 'network', 'battery'] = 'all', refresh: bool = False) -> str:
     try:
         result = []
         
         if info_type in ['all', 'os']:
-            import platform
-            result.append("=== OS Information ===")
-            result.append(f"System: {platform.system()} {platform.release()}")
-            result.append(f"Version: {platform.version()}")
-            result.append(f"Machine: {platform.machine()}")
-            result.append(f"Processor: {platform.processor()}")
-            result.append(f"Computer Name: {os_module.environ.get('COMPUTERNAME', 'Unknown')}")
-            result.append(f"User: {os_module.environ.get('USERNAME', 'Unknown')}")
+            result.extend(cache.get('SystemInfo-Tool:os', None, _os_info, refresh))
         
         if info_type in ['all', 'cpu']:
             result.append("\n=== CPU Information ===")
@@ -1026,16 +1294,7 @@ def system_info_tool(info_type: Literal['all', 'cpu', 'memory', 'disk', 'os', 'n
             result.append(f"Used: {mem.used / (1024**3):.2f} GB ({mem.percent}%)")
         
         if info_type in ['all', 'disk']:
-            result.append("\n=== Disk Information ===")
-            for partition in psutil.disk_partitions():
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    result.append(f"Drive {partition.device}:")
-                    result.append(f"  Total: {usage.total / (1024**3):.2f} GB")
-                    result.append(f"  Used: {usage.used / (1024**3):.2f} GB ({usage.percent}%)")
-                    result.append(f"  Free: {usage.free / (1024**3):.2f} GB")
-                except:
-                    pass
+            result.extend(cache.get('SystemInfo-Tool:disk', None, _disk_info, refresh))
         
         if info_type in ['all', 'network']:
             result.append("\n=== Network Interfaces ===")
@@ -1059,37 +1318,37 @@ def system_info_tool(info_type: Literal['all', 'cpu', 'memory', 'disk', 'os', 'n
         return f'System info failed: {str(e)}'
 
 @mcp.tool(name='Search-Tool', description='Perform Windows Search for files, folders, or apps using the Windows search feature.')
+@_on_input_thread
 def search_tool(query: str, search_type: Literal['files', 'apps', 'settings', 'web'] = 'files') -> str:
     try:
         # Open Windows Search
-        pg.hotkey('win', 's')
-        pg.sleep(0.5)
+        pacer.run(pg.hotkey, 'win', 's')
         
         # Type the search query
-        pg.typewrite(query, interval=0.05)
-        pg.sleep(1)
+        pacer.run(pg.typewrite, query, interval=0.05)
         
         return f'Windows Search opened with query: "{query}". Use State-Tool to see results and Click-Tool to select.'
     except Exception as e:
         return f'Search failed: {str(e)}'
 
 @mcp.tool(name='TaskView-Tool', description='Open Task View for virtual desktop management or recent activities. Action: "open" to show task view, "new_desktop" to create virtual desktop, "switch_desktop" to switch between desktops.')
+@_on_input_thread
 def task_view_tool(action: Literal['open', 'new_desktop', 'close_desktop', 'switch_left', 'switch_right'] = 'open') -> str:
     try:
         if action == 'open':
-            pg.hotkey('win', 'tab')
+            pacer.run(pg.hotkey, 'win', 'tab')
             return 'Task View opened'
         elif action == 'new_desktop':
-            pg.hotkey('win', 'ctrl', 'd')
+            pacer.run(pg.hotkey, 'win', 'ctrl', 'd')
             return 'New virtual desktop created'
         elif action == 'close_desktop':
-            pg.hotkey('win', 'ctrl', 'f4')
+            pacer.run(pg.hotkey, 'win', 'ctrl', 'f4')
             return 'Current virtual desktop closed'
         elif action == 'switch_left':
-            pg.hotkey('win', 'ctrl', 'left')
+            pacer.run(pg.hotkey, 'win', 'ctrl', 'left')
             return 'Switched to desktop on the left'
         elif action == 'switch_right':
-            pg.hotkey('win', 'ctrl', 'right')
+            pacer.run(pg.hotkey, 'win', 'ctrl', 'right')
             return 'Switched to desktop on the right'
         return 'Invalid action'
     except Exception as e:
@@ -1143,26 +1402,27 @@ def settings_tool(page: str = 'main') -> str:
         return f'Failed to open settings: {str(e)}'
 
 @mcp.tool(name='Snip-Tool', description='Open Windows Snipping Tool or Snip & Sketch for screen capture with annotation capabilities.')
+@_on_input_thread
 def snip_tool(mode: Literal['snip', 'fullscreen', 'window', 'freeform', 'rectangle'] = 'snip') -> str:
     try:
         if mode == 'snip':
-            pg.hotkey('win', 'shift', 's')
+            pacer.run(pg.hotkey, 'win', 'shift', 's')
             return 'Snip & Sketch opened. Select area to capture.'
         elif mode == 'fullscreen':
-            pg.press('printscreen')
+            pacer.run(pg.press, 'printscreen')
             return 'Full screen captured to clipboard'
         elif mode == 'window':
-            pg.hotkey('alt', 'printscreen')
+            pacer.run(pg.hotkey, 'alt', 'printscreen')
             return 'Active window captured to clipboard'
         elif mode in ['freeform', 'rectangle']:
-            pg.hotkey('win', 'shift', 's')
+            pacer.run(pg.hotkey, 'win', 'shift', 's')
             return f'Snip & Sketch opened in {mode} mode. Select area to capture.'
         return 'Invalid snip mode'
     except Exception as e:
         return f'Snip operation failed: {str(e)}'
 
-@mcp.tool(name='Registry-Tool', description='Read Windows Registry values (read-only for safety). Provide full key path and optional value name.')
-def registry_tool(key_path: str, value_name: str = None) -> str:
+@mcp.tool(name='Registry-Tool', description='Read Windows Registry values (read-only for safety). Provide full key path and optional value name. Reads are cached until the key changes; pass refresh=True to bypass the cache.')
+def registry_tool(key_path: str, value_name: str = None, refresh: bool = False) -> str:
     try:
         # Parse the key path
         root_keys = {
@@ -1187,43 +1447,50 @@ def registry_tool(key_path: str, value_name: str = None) -> str:
             return f'Unknown root key: {root_name}'
         
         root = root_keys[root_name]
+        # One change watch per key, whichever alias named its root
+        canonical = next(name for name, handle in root_keys.items() if handle == root and name.startswith('HKEY_'))
+        tag = registry_tag(f'{canonical}\\{subkey}')
         
-        with winreg.OpenKey(root, subkey, 0, winreg.KEY_READ) as key:
-            if value_name:
-                value, value_type = winreg.QueryValueEx(key, value_name)
-                type_names = {
-                    winreg.REG_SZ: 'REG_SZ',
-                    winreg.REG_DWORD: 'REG_DWORD',
-                    winreg.REG_QWORD: 'REG_QWORD',
-                    winreg.REG_BINARY: 'REG_BINARY',
-                    winreg.REG_MULTI_SZ: 'REG_MULTI_SZ',
-                    winreg.REG_EXPAND_SZ: 'REG_EXPAND_SZ',
-                }
-                return f'Value: {value_name}\nType: {type_names.get(value_type, "Unknown")}\nData: {value}'
-            else:
-                # List all values in the key
-                result = [f"Values in {key_path}:"]
-                i = 0
-                while True:
-                    try:
-                        name, value, vtype = winreg.EnumValue(key, i)
-                        result.append(f"  {name}: {value}")
-                        i += 1
-                    except OSError:
-                        break
+        def read() -> str:
+            with winreg.OpenKey(root, subkey, 0, winreg.KEY_READ) as key:
+                if value_name:
+                    value, value_type = winreg.QueryValueEx(key, value_name)
+                    type_names = {
+                        winreg.REG_SZ: 'REG_SZ',
+                        winreg.REG_DWORD: 'REG_DWORD',
+                        winreg.REG_QWORD: 'REG_QWORD',
+                        winreg.REG_BINARY: 'REG_BINARY',
+                        winreg.REG_MULTI_SZ: 'REG_MULTI_SZ',
+                        winreg.REG_EXPAND_SZ: 'REG_EXPAND_SZ',
+                    }
+                    return f'Value: {value_name}\nType: {type_names.get(value_type, "Unknown")}\nData: {value}'
+                else:
+                    # List all values in the key
+                    result = [f"Values in {key_path}:"]
+                    i = 0
+                    while True:
+                        try:
+                            name, value, vtype = winreg.EnumValue(key, i)
+                            result.append(f"  {name}: {value}")
+                            i += 1
+                        except OSError:
+                            break
                 
-                # List subkeys
-                result.append("\nSubkeys:")
-                i = 0
-                while True:
-                    try:
-                        subkey_name = winreg.EnumKey(key, i)
-                        result.append(f"  {subkey_name}")
-                        i += 1
-                    except OSError:
-                        break
+                    # List subkeys
+                    result.append("\nSubkeys:")
+                    i = 0
+                    while True:
+                        try:
+                            subkey_name = winreg.EnumKey(key, i)
+                            result.append(f"  {subkey_name}")
+                            i += 1
+                        except OSError:
+                            break
                 
-                return "\n".join(result)
+                    return "\n".join(result)
+        
+        signals.watch_registry(root, subkey, tag)
+        return cache.get('Registry-Tool', (key_path, value_name), read, refresh, tags=(tag,))
     except FileNotFoundError:
         return f'Registry key not found: {key_path}'
     except PermissionError:
@@ -1231,20 +1498,21 @@ def registry_tool(key_path: str, value_name: str = None) -> str:
     except Exception as e:
         return f'Registry read failed: {str(e)}'
 
-@mcp.tool(name='Wifi-Tool', description='Manage WiFi connections: list networks, connect, disconnect, or get current connection info.')
-def wifi_tool(action: Literal['list', 'connect', 'disconnect', 'status'], network_name: str = None, password: str = None) -> str:
+@mcp.tool(name='Wifi-Tool', description='Manage WiFi connections: list networks, connect, disconnect, or get current connection info. list and status are cached briefly and refreshed on network changes; pass refresh=True to re-read them.')
+def wifi_tool(action: Literal['list', 'connect', 'disconnect', 'status'], network_name: str = None, password: str = None, refresh: bool = False) -> str:
     try:
         if action == 'list':
-            result = subprocess.run(['netsh', 'wlan', 'show', 'networks'], capture_output=True, text=True, timeout=15)
-            return f'Available WiFi Networks:\n{result.stdout}'
+            output = cache.get('Wifi-Tool', action, lambda: subprocess.run(['netsh', 'wlan', 'show', 'networks'], capture_output=True, text=True, timeout=15).stdout, refresh)
+            return f'Available WiFi Networks:\n{output}'
         
         elif action == 'status':
-            result = subprocess.run(['netsh', 'wlan', 'show', 'interfaces'], capture_output=True, text=True, timeout=10)
-            return f'WiFi Status:\n{result.stdout}'
+            output = cache.get('Wifi-Tool', action, lambda: subprocess.run(['netsh', 'wlan', 'show', 'interfaces'], capture_output=True, text=True, timeout=10).stdout, refresh)
+            return f'WiFi Status:\n{output}'
         
         elif action == 'connect' and network_name:
             # First check if profile exists
             result = subprocess.run(['netsh', 'wlan', 'connect', f'name={network_name}'], capture_output=True, text=True, timeout=15)
+            cache.invalidate(name='Wifi-Tool')
             if 'successfully' in result.stdout.lower():
                 return f'Connected to {network_name}'
             else:
@@ -1252,41 +1520,42 @@ def wifi_tool(action: Literal['list', 'connect', 'disconnect', 'status'], networ
         
         elif action == 'disconnect':
             result = subprocess.run(['netsh', 'wlan', 'disconnect'], capture_output=True, text=True, timeout=10)
+            cache.invalidate(name='Wifi-Tool')
             return 'WiFi disconnected'
         
         return 'Invalid action or missing parameters'
     except Exception as e:
         return f'WiFi operation failed: {str(e)}'
 
-@mcp.tool(name='Bluetooth-Tool', description='Open Bluetooth settings or toggle Bluetooth on/off.')
-def bluetooth_tool(action: Literal['settings', 'toggle', 'status'] = 'settings') -> str:
+@mcp.tool(name='Bluetooth-Tool', description='Open Bluetooth settings or toggle Bluetooth on/off. status is cached until devices change; pass refresh=True to re-read it.')
+async def bluetooth_tool(action: Literal['settings', 'toggle', 'status'] = 'settings', refresh: bool = False) -> str:
     try:
         if action == 'settings':
             subprocess.Popen(['explorer', 'ms-settings:bluetooth'])
             return 'Bluetooth settings opened'
         elif action == 'toggle':
             # Use Action Center to toggle
-            pg.hotkey('win', 'a')
-            pg.sleep(0.5)
+            await _on_input(pacer.run, pg.hotkey, 'win', 'a')
             return 'Action Center opened. Look for Bluetooth quick toggle.'
         elif action == 'status':
             ps_cmd = '''
             Get-PnpDevice -Class Bluetooth | Select-Object Status, FriendlyName | Format-Table -AutoSize
             '''
-            result = subprocess.run(['powershell', '-Command', ps_cmd], capture_output=True, text=True, timeout=15)
-            return f'Bluetooth Devices:\n{result.stdout}'
+            devices = await asyncio.to_thread(_cached_script, 'Bluetooth-Tool', ps_cmd, 15, refresh)
+            return f'Bluetooth Devices:\n{devices}'
         return 'Invalid action'
     except Exception as e:
         return f'Bluetooth operation failed: {str(e)}'
 
 @mcp.tool(name='ActionCenter-Tool', description='Open Windows Action Center (notifications) or Quick Settings panel.')
+@_on_input_thread
 def action_center_tool(panel: Literal['notifications', 'quick_settings'] = 'quick_settings') -> str:
     try:
         if panel == 'quick_settings':
-            pg.hotkey('win', 'a')
+            pacer.run(pg.hotkey, 'win', 'a')
             return 'Quick Settings opened'
         elif panel == 'notifications':
-            pg.hotkey('win', 'n')
+            pacer.run(pg.hotkey, 'win', 'n')
             return 'Notifications panel opened'
         return 'Invalid panel'
     except Exception as e:
@@ -1303,7 +1572,7 @@ def lock_tool(action: Literal['lock', 'signout', 'sleep', 'hibernate', 'shutdown
             return 'Signing out...'
         elif action == 'sleep':
             # Requires SetSuspendState
-            subprocess.run(['powershell', '-Command', 'Add-Type -Assembly System.Windows.Forms; [System.Windows.Forms.Application]::SetSuspendState("Suspend", $false, $false)'], timeout=10)
+            desktop.powershell.run('Add-Type -Assembly System.Windows.Forms; [System.Windows.Forms.Application]::SetSuspendState("Suspend", $false, $false)', timeout=10)
             return 'System going to sleep...'
         elif action == 'hibernate':
             subprocess.run(['shutdown', '/h'], timeout=10)
@@ -1316,14 +1585,14 @@ def lock_tool(action: Literal['lock', 'signout', 'sleep', 'hibernate', 'shutdown
     except Exception as e:
         return f'Lock/Power action failed: {str(e)}'
 
-@mcp.tool(name='Taskbar-Tool', description='Interact with Windows Taskbar: show/hide, pin/unpin apps, or get taskbar info.')
-def taskbar_tool(action: Literal['show', 'hide', 'info', 'start_menu', 'system_tray'] = 'info') -> str:
+@mcp.tool(name='Taskbar-Tool', description='Interact with Windows Taskbar: show/hide, pin/unpin apps, or get taskbar info. info is cached until the display or work area changes; pass refresh=True to re-read it.')
+async def taskbar_tool(action: Literal['show', 'hide', 'info', 'start_menu', 'system_tray'] = 'info', refresh: bool = False) -> str:
     try:
         if action == 'start_menu':
-            pg.press('win')
+            await _on_input(pacer.run, pg.press, 'win')
             return 'Start menu opened'
         elif action == 'system_tray':
-            pg.hotkey('win', 'b')
+            await _on_input(pacer.run, pg.hotkey, 'win', 'b')
             return 'System tray focused. Use arrow keys to navigate.'
         elif action == 'info':
             ps_cmd = '''
@@ -1333,8 +1602,7 @@ def taskbar_tool(action: Literal['show', 'hide', 'info', 'start_menu', 'system_t
             Write-Output "Work Area: $($screen.WorkingArea.Width) x $($screen.WorkingArea.Height)"
             Write-Output "Taskbar Height: $($screen.Bounds.Height - $screen.WorkingArea.Height) pixels"
             '''
-            result = subprocess.run(['powershell', '-Command', ps_cmd], capture_output=True, text=True, timeout=10)
-            return result.stdout or 'Could not get taskbar info'
+            return await asyncio.to_thread(_cached_script, 'Taskbar-Tool', ps_cmd, 10, refresh) or 'Could not get taskbar info'
         elif action in ['show', 'hide']:
             return f'Taskbar auto-hide can be configured in Settings > Personalization > Taskbar'
         return 'Invalid action'
@@ -1342,31 +1610,32 @@ def taskbar_tool(action: Literal['show', 'hide', 'info', 'start_menu', 'system_t
         return f'Taskbar operation failed: {str(e)}'
 
 @mcp.tool(name='Emoji-Tool', description='Open Windows Emoji picker for inserting emojis, GIFs, and symbols.')
+@_on_input_thread
 def emoji_tool() -> str:
     try:
-        pg.hotkey('win', '.')
+        pacer.run(pg.hotkey, 'win', '.')
         return 'Emoji picker opened. Use mouse or keyboard to select emoji.'
     except Exception as e:
         return f'Emoji picker failed: {str(e)}'
 
 @mcp.tool(name='Clipboard-History-Tool', description='Open Windows Clipboard History to view and paste previous clipboard items.')
+@_on_input_thread
 def clipboard_history_tool() -> str:
     try:
-        pg.hotkey('win', 'v')
+        pacer.run(pg.hotkey, 'win', 'v')
         return 'Clipboard History opened. Enable it in Settings if not already enabled.'
     except Exception as e:
         return f'Clipboard History failed: {str(e)}'
 
 @mcp.tool(name='Run-Dialog-Tool', description='Open Windows Run dialog and optionally execute a command.')
+@_on_input_thread
 def run_dialog_tool(command: str = None) -> str:
     try:
-        pg.hotkey('win', 'r')
-        pg.sleep(0.5)
+        pacer.run(pg.hotkey, 'win', 'r')
         
         if command:
-            pg.typewrite(command, interval=0.03)
-            pg.sleep(0.3)
-            pg.press('enter')
+            pacer.run(pg.typewrite, command, interval=0.03)
+            pacer.run(pg.press, 'enter')
             return f'Executed Run command: {command}'
         
         return 'Run dialog opened. Type command to execute.'
@@ -1475,8 +1744,8 @@ def cursor_position_tool() -> str:
     except Exception as e:
         return f'Failed to get cursor position: {str(e)}'
 
-@mcp.tool(name='Screen-Info-Tool', description='Get information about connected displays/monitors.')
-def screen_info_tool() -> str:
+@mcp.tool(name='Screen-Info-Tool', description='Get information about connected displays/monitors. Cached until the display configuration changes; pass refresh=True to re-read it.')
+def screen_info_tool(refresh: bool = False) -> str:
     try:
         ps_cmd = '''
         Add-Type -AssemblyName System.Windows.Forms
@@ -1493,89 +1762,97 @@ def screen_info_tool() -> str:
             $i++
         }
         '''
-        result = subprocess.run(['powershell', '-Command', ps_cmd], capture_output=True, text=True, timeout=10)
-        return result.stdout or 'Could not get screen info'
+        return _cached_script('Screen-Info-Tool', ps_cmd, 10, refresh) or 'Could not get screen info'
     except Exception as e:
         return f'Screen info failed: {str(e)}'
 
+@mcp.tool(name='Metrics-Tool', description='Report server performance counters as JSON: result-cache hits, misses, coalesced calls and invalidations per tool, PowerShell host pool usage, input settle waits per reason, input-thread queue depth and wait times, screen capture grabs, unchanged frames, encode times and sizes, and screenshot delta counts. Set reset_cache=True to drop every cached tool result.')
+def metrics_tool(reset_cache: bool = False) -> str:
+    try:
+        if reset_cache:
+            cache.invalidate()
+        return json.dumps({'cache': cache.stats(), 'powershell': desktop.powershell.stats(), 'input': pacer.stats(), 'dispatcher': dispatcher.stats(), 'capture': desktop.capture.stats(), 'screen_deltas': screen_deltas.stats()}, indent=1)
+    except Exception as e:
+        return f'Metrics failed: {str(e)}'
+
 @mcp.tool(name='Text-Select-Tool', description='Select text in the active element using keyboard shortcuts. Supports select all, word, line, or from cursor to start/end.')
+@_on_input_thread
 def text_select_tool(mode: Literal['all', 'word', 'line', 'to_start', 'to_end', 'left', 'right'] = 'all', count: int = 1) -> str:
     try:
+        mark = pacer.mark()
         if mode == 'all':
             pg.hotkey('ctrl', 'a')
-            return 'Selected all text'
+            return f'Selected all text ({pacer.settle(mark)})'
         elif mode == 'word':
             pg.hotkey('ctrl', 'shift', 'right')
-            return f'Selected word to the right'
+            return f'Selected word to the right ({pacer.settle(mark)})'
         elif mode == 'line':
             pg.press('home')
             pg.hotkey('shift', 'end')
-            return 'Selected current line'
+            return f'Selected current line ({pacer.settle(mark)})'
         elif mode == 'to_start':
             pg.hotkey('ctrl', 'shift', 'home')
-            return 'Selected from cursor to start'
+            return f'Selected from cursor to start ({pacer.settle(mark)})'
         elif mode == 'to_end':
             pg.hotkey('ctrl', 'shift', 'end')
-            return 'Selected from cursor to end'
+            return f'Selected from cursor to end ({pacer.settle(mark)})'
         elif mode == 'left':
             for _ in range(count):
                 pg.hotkey('shift', 'left')
-            return f'Selected {count} character(s) to the left'
+            return f'Selected {count} character(s) to the left ({pacer.settle(mark)})'
         elif mode == 'right':
             for _ in range(count):
                 pg.hotkey('shift', 'right')
-            return f'Selected {count} character(s) to the right'
+            return f'Selected {count} character(s) to the right ({pacer.settle(mark)})'
         return 'Invalid mode'
     except Exception as e:
         return f'Text selection failed: {str(e)}'
 
 @mcp.tool(name='Find-Replace-Tool', description='Open Find (Ctrl+F) or Find and Replace (Ctrl+H) dialog in the active application.')
+@_on_input_thread
 def find_replace_tool(action: Literal['find', 'replace'] = 'find', search_text: str = None) -> str:
     try:
         if action == 'find':
-            pg.hotkey('ctrl', 'f')
-            pg.sleep(0.3)
+            pacer.run(pg.hotkey, 'ctrl', 'f')
             if search_text:
-                pg.typewrite(search_text, interval=0.03)
+                pacer.run(pg.typewrite, search_text, interval=0.03)
             return 'Find dialog opened' + (f' with "{search_text}"' if search_text else '')
         elif action == 'replace':
-            pg.hotkey('ctrl', 'h')
-            pg.sleep(0.3)
+            pacer.run(pg.hotkey, 'ctrl', 'h')
             if search_text:
-                pg.typewrite(search_text, interval=0.03)
+                pacer.run(pg.typewrite, search_text, interval=0.03)
             return 'Find and Replace dialog opened' + (f' with "{search_text}"' if search_text else '')
         return 'Invalid action'
     except Exception as e:
         return f'Find/Replace failed: {str(e)}'
 
 @mcp.tool(name='Undo-Redo-Tool', description='Perform undo or redo operations in the active application.')
+@_on_input_thread
 def undo_redo_tool(action: Literal['undo', 'redo'], times: int = 1) -> str:
     try:
         for _ in range(times):
             if action == 'undo':
-                pg.hotkey('ctrl', 'z')
+                pacer.run(pg.hotkey, 'ctrl', 'z')
             elif action == 'redo':
-                pg.hotkey('ctrl', 'y')
-            pg.sleep(0.1)
+                pacer.run(pg.hotkey, 'ctrl', 'y')
         return f'{action.capitalize()} performed {times} time(s)'
     except Exception as e:
         return f'{action.capitalize()} failed: {str(e)}'
 
 @mcp.tool(name='Zoom-Tool', description='Zoom in/out or reset zoom in the active application using Ctrl+/- or Ctrl+0.')
+@_on_input_thread
 def zoom_tool(action: Literal['in', 'out', 'reset'], times: int = 1) -> str:
     try:
         if action == 'in':
             for _ in range(times):
-                pg.hotkey('ctrl', '=')  # Ctrl++ is typically Ctrl+=
-                pg.sleep(0.1)
+                pacer.run(pg.hotkey, 'ctrl', '=')  # Ctrl++ is typically Ctrl+=
             return f'Zoomed in {times} time(s)'
         elif action == 'out':
             for _ in range(times):
-                pg.hotkey('ctrl', '-')
-                pg.sleep(0.1)
+                pacer.run(pg.hotkey, 'ctrl', '-')
             return f'Zoomed out {times} time(s)'
         elif action == 'reset':
-            pg.hotkey('ctrl', '0')
+            pacer.run(pg.hotkey, 'ctrl', '0')
             return 'Zoom reset to 100%'
         return 'Invalid action'
     except Exception as e:
@@ -1645,16 +1922,16 @@ def edge_browser_tool(
             subprocess.Popen(args)
 
             # Poll until CDP is ready (up to 15 s)
-            for _ in range(15):
-                time.sleep(1)
-                try:
-                    requests.get(f'http://localhost:{debug_port}/json/version', timeout=2)
-                    return (
-                        f'Edge launched with CDP on port {debug_port}'
-                        + (f', navigating to {url}' if url else '')
-                    )
-                except Exception:
-                    pass
+            ready = wait_until(Check(
+                lambda: requests.get(f'http://localhost:{debug_port}/json/version', timeout=2).ok,
+                'CDP endpoint',
+            ), 15, maximum=0.5)
+            if ready.met:
+                return (
+                    f'Edge launched with CDP on port {debug_port}'
+                    + (f', navigating to {url}' if url else '')
+                    + f' (ready after {ready.waited_ms:.0f} ms)'
+                )
             return (
                 f'Edge launched but CDP not ready on port {debug_port} after 15 s. '
                 'Try action="status" in a moment.'
@@ -1724,9 +2001,12 @@ def edge_browser_tool(
         if action == 'navigate':
             if not url:
                 return 'Error: url is required for action="navigate"'
-            _cdp_send(ws_url, 'Page.navigate', {'url': url})
-            time.sleep(1)
-            return f'Navigated to {url}'
+            loaded = wait_until(CdpLoadEvent(
+                ws_url, _cdp_connect, already_loaded=False, commands=[('Page.navigate', {'url': url})],
+            ), 15)
+            if loaded.met:
+                return f'Navigated to {url} (loaded after {loaded.waited_ms:.0f} ms)'
+            return f'Navigated to {url}; the page was still loading after 15 s'
 
         elif action == 'back':
             _cdp_send(ws_url, 'Runtime.evaluate', {'expression': 'history.back()'})
@@ -0,0 +1,19 @@
+"""Cached results for read-only system tools.
+
+:class:`ResultCache` keeps tool results for a per-tool TTL with
+single-flight computation. Signal sources drop entries as soon as the
+display, devices, network, power state, settings or a watched registry
+key change.
+"""
+
+from .cache import CachePolicy, ResultCache
+from .signals import (
+    DEVICE, DISPLAY, NETWORK, POWER, SETTINGS,
+    ScriptedSignalSource, SignalSource, Win32SignalSource, registry_tag,
+)
+
+__all__ = [
+    'CachePolicy', 'ResultCache',
+    'DEVICE', 'DISPLAY', 'NETWORK', 'POWER', 'SETTINGS',
+    'ScriptedSignalSource', 'SignalSource', 'Win32SignalSource', 'registry_tag',
+]
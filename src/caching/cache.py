@@ -0,0 +1,189 @@
+"""TTL result cache for read-only system tools.
+
+Screen-Info, Taskbar, Bluetooth, Wifi, Registry and SystemInfo answers only
+change when the system does, yet agents poll them constantly and each call
+used to run a subprocess or PowerShell script. :class:`ResultCache` keeps
+their results for a per-tool TTL:
+
+- Each tool has a :class:`CachePolicy`: a TTL, a size bound and the tags
+  whose signals make its entries stale.
+- Concurrent identical calls are single-flight. One caller computes, and
+  the rest wait for that result instead of starting their own.
+- :meth:`ResultCache.invalidate` drops every entry carrying a tag. Signal
+  sources (:mod:`.signals`) call it on display, device, network, power,
+  settings and registry changes.
+- ``refresh=True`` bypasses the stored entry and replaces it.
+
+Failures are never cached: an exception from ``compute`` reaches every
+waiting caller and the next call tries again.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float
+    max_entries: int = 64
+    tags: Tuple[str, ...] = ()
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires: float
+    tags: frozenset
+
+
+class _Flight:
+    """One in-progress computation that other callers can wait for."""
+
+    def __init__(self, tags: frozenset):
+        self.tags = tags
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+_COUNTERS = ('hits', 'misses', 'coalesced', 'refreshes', 'invalidated', 'expired', 'evicted', 'errors')
+
+
+class ResultCache:
+    """Per-tool TTL cache with single-flight computation and tag invalidation.
+
+    ``clock`` is injectable for tests. Tools without a registered policy
+    are computed on every call.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, CachePolicy]] = None, clock: Callable[[], float] = time.monotonic):
+        self._policies: Dict[str, CachePolicy] = dict(policies or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, 'OrderedDict[Hashable, _Entry]'] = {}
+        self._flights: Dict[Tuple[str, Hashable], _Flight] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, policy: CachePolicy) -> None:
+        with self._lock:
+            self._policies[name] = policy
+            self._entries.pop(name, None)
+
+    def get(
+        self,
+        name: str,
+        key: Hashable,
+        compute: Callable[[], Any],
+        refresh: bool = False,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Cached ``compute()`` for ``(name, key)``.
+
+        ``tags`` are added to the policy's tags for this entry only, for
+        example the registry key a read depends on.
+        """
+        policy = self._policies.get(name)
+        if policy is None:
+            return compute()
+        flight_key = (name, key)
+        with self._lock:
+            stats = self._counters(name)
+            entries = self._entries.setdefault(name, OrderedDict())
+            entry = entries.get(key)
+            now = self._clock()
+            if entry is not None and not refresh:
+                if entry.expires > now:
+                    entries.move_to_end(key)
+                    stats['hits'] += 1
+                    return entry.value
+                del entries[key]
+                stats['expired'] += 1
+            flight = self._flights.get(flight_key)
+            if flight is not None:
+                stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[flight_key] = _Flight(frozenset(policy.tags) | frozenset(tags))
+                stats['refreshes' if refresh else 'misses'] += 1
+                leader = True
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.perf_counter()
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters(name)['errors'] += 1
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+            flight.done.set()
+            raise
+        with self._lock:
+            stats = self._counters(name)
+            stats['compute_ms'] += (time.perf_counter() - started) * 1000
+            # An invalidation while computing retires the flight; its result
+            # still goes to the callers waiting on it but is not stored.
+            if self._flights.get(flight_key) is flight:
+                del self._flights[flight_key]
+                entries = self._entries.setdefault(name, OrderedDict())
+                entries[key] = _Entry(flight.value, self._clock() + policy.ttl, flight.tags)
+                entries.move_to_end(key)
+                while len(entries) > policy.max_entries:
+                    entries.popitem(last=False)
+                    stats['evicted'] += 1
+        flight.done.set()
+        return flight.value
+
+    def invalidate(self, tag: Optional[str] = None, name: Optional[str] = None) -> int:
+        """Drop entries carrying ``tag`` and/or belonging to ``name``; everything if neither.
+
+        Returns the number of entries dropped.
+        """
+        dropped = 0
+        with self._lock:
+            for tool, entries in self._entries.items():
+                if name is not None and tool != name:
+                    continue
+                stale = [key for key, entry in entries.items() if tag is None or tag in entry.tags]
+                for key in stale:
+                    del entries[key]
+                if stale:
+                    self._counters(tool)['invalidated'] += len(stale)
+                    dropped += len(stale)
+            for flight_key, flight in list(self._flights.items()):
+                if name is not None and flight_key[0] != name:
+                    continue
+                if tag is None or tag in flight.tags:
+                    del self._flights[flight_key]
+        return dropped
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Counters per tool plus the current entry count and hit ratio."""
+        with self._lock:
+            report = {}
+            for name, counters in self._stats.items():
+                lookups = counters['hits'] + counters['misses'] + counters['coalesced']
+                report[name] = dict(
+                    counters,
+                    compute_ms=round(counters['compute_ms'], 1),
+                    entries=len(self._entries.get(name, ())),
+                    hit_ratio=round((counters['hits'] + counters['coalesced']) / lookups, 3) if lookups else 0.0,
+                )
+            return report
+
+    def _counters(self, name: str) -> Dict[str, float]:
+        counters = self._stats.get(name)
+        if counters is None:
+            counters = self._stats[name] = dict.fromkeys(_COUNTERS, 0)
+            counters['compute_ms'] = 0.0
+        return counters
@@ -0,0 +1,299 @@
+"""System change signals that invalidate cached tool results.
+
+A signal source calls its sink with a tag whenever the part of the system
+the tag names changes:
+
+- ``display``: resolution, monitor layout or work area,
+- ``device``: device nodes or volumes arriving or leaving,
+- ``network``: IP address changes (connect, disconnect, roam),
+- ``power``: AC/battery switches and resume from sleep,
+- ``settings``: system-wide setting broadcasts,
+- ``registry:<key>``: a value under a watched registry key changed.
+
+:class:`Win32SignalSource` receives the broadcasts on a hidden top-level
+window, since message-only windows do not get them. It waits on
+``NotifyAddrChange`` and ``RegNotifyChangeKeyValue`` events from the same
+thread. :class:`ScriptedSignalSource` lets tests and non-Windows runs emit
+the same tags by hand.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+
+DISPLAY = 'display'
+DEVICE = 'device'
+NETWORK = 'network'
+POWER = 'power'
+SETTINGS = 'settings'
+
+SignalSink = Callable[[str], object]
+
+
+def registry_tag(key_path: str) -> str:
+    """Tag for reads under ``key_path``, normalized like ``HKCU\\Software\\X``."""
+    return 'registry:' + key_path.replace('/', '\\').strip('\\').lower()
+
+
+class SignalSource:
+    """Delivers change tags to a sink until stopped."""
+
+    def start(self, sink: SignalSink) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+    def watch_registry(self, root: int, subkey: str, tag: str) -> None:
+        """Emit ``tag`` when anything under ``root\\subkey`` changes; a no-op by default."""
+
+
+class ScriptedSignalSource(SignalSource):
+    """In-process source driven by explicit :meth:`emit` calls."""
+
+    def __init__(self):
+        self._sink: Optional[SignalSink] = None
+        self.watched: List[Tuple[int, str, str]] = []
+
+    def start(self, sink: SignalSink) -> None:
+        self._sink = sink
+
+    def stop(self) -> None:
+        self._sink = None
+
+    def watch_registry(self, root: int, subkey: str, tag: str) -> None:
+        if (root, subkey, tag) not in self.watched:
+            self.watched.append((root, subkey, tag))
+
+    def emit(self, tag: str) -> None:
+        sink = self._sink
+        if sink is not None:
+            sink(tag)
+
+
+class Win32SignalSource(SignalSource):
+    """Window broadcasts, address changes and registry notifications on one thread.
+
+    Up to ``max_registry_watches`` keys are watched at a time; the least
+    recently requested one is dropped beyond that (a wait can cover at most
+    64 handles).
+    """
+
+    _WM_DISPLAYCHANGE = 0x007E
+    _WM_SETTINGCHANGE = 0x001A
+    _WM_DEVICECHANGE = 0x0219
+    _WM_POWERBROADCAST = 0x0218
+    _WM_QUIT = 0x0012
+    _WM_APP = 0x8000
+    _SPI_SETWORKAREA = 0x002F
+    _PBT_APMRESUMEAUTOMATIC = 0x0012
+    _QS_ALLINPUT = 0x04FF
+    _PM_REMOVE = 0x0001
+    _INFINITE = 0xFFFFFFFF
+    _WAIT_OBJECT_0 = 0
+    _KEY_NOTIFY = 0x0010
+    _REG_NOTIFY = 0x00000001 | 0x00000004  # subkey names, value writes
+
+    def __init__(self, max_registry_watches: int = 60):
+        self.max_registry_watches = max_registry_watches
+        self._sink: Optional[SignalSink] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._requests: List[Tuple[int, str, str]] = []
+
+    def start(self, sink: SignalSink) -> None:
+        if self._thread is not None:
+            return
+        self._sink = sink
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name='clippy-system-signals', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        if self._thread_id:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, self._WM_QUIT, 0, 0)
+        thread.join(timeout=5)
+        self._thread = None
+        self._thread_id = 0
+        self._sink = None
+
+    def watch_registry(self, root: int, subkey: str, tag: str) -> None:
+        with self._lock:
+            self._requests.append((root, subkey, tag))
+        if self._thread_id:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, self._WM_APP, 0, 0)
+
+    def _emit(self, *tags: str) -> None:
+        sink = self._sink
+        if sink is None:
+            return
+        for tag in tags:
+            with contextlib.suppress(Exception):
+                sink(tag)
+
+    def _run(self) -> None:
+        try:
+            self._pump()
+        finally:
+            self._ready.set()  # never leave start() waiting on a failed thread
+
+    def _pump(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        # Private DLL handles, so the prototypes below do not leak into the
+        # shared ctypes.windll objects other modules use.
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        advapi32 = ctypes.WinDLL('advapi32', use_last_error=True)
+        iphlpapi = ctypes.WinDLL('iphlpapi', use_last_error=True)
+
+        LRESULT = ctypes.c_ssize_t
+        WNDPROC = ctypes.WINFUNCTYPE(LRESULT, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+
+        class WNDCLASSW(ctypes.Structure):
+            _fields_ = [
+                ('style', wintypes.UINT), ('lpfnWndProc', WNDPROC),
+                ('cbClsExtra', ctypes.c_int), ('cbWndExtra', ctypes.c_int),
+                ('hInstance', wintypes.HINSTANCE), ('hIcon', wintypes.HICON),
+                ('hCursor', wintypes.HANDLE), ('hbrBackground', wintypes.HBRUSH),
+                ('lpszMenuName', wintypes.LPCWSTR), ('lpszClassName', wintypes.LPCWSTR),
+            ]
+
+        class OVERLAPPED(ctypes.Structure):
+            _fields_ = [
+                ('Internal', ctypes.c_void_p), ('InternalHigh', ctypes.c_void_p),
+                ('Offset', wintypes.DWORD), ('OffsetHigh', wintypes.DWORD), ('hEvent', wintypes.HANDLE),
+            ]
+
+        user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+        user32.DefWindowProcW.restype = LRESULT
+        user32.CreateWindowExW.argtypes = [
+            wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD,
+            ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+            wintypes.HWND, wintypes.HMENU, wintypes.HINSTANCE, wintypes.LPVOID,
+        ]
+        user32.CreateWindowExW.restype = wintypes.HWND
+        user32.MsgWaitForMultipleObjects.argtypes = [
+            wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.BOOL, wintypes.DWORD, wintypes.DWORD,
+        ]
+        kernel32.CreateEventW.restype = wintypes.HANDLE
+        kernel32.GetModuleHandleW.restype = wintypes.HMODULE
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        advapi32.RegOpenKeyExW.argtypes = [wintypes.HKEY, wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.POINTER(wintypes.HKEY)]
+        advapi32.RegNotifyChangeKeyValue.argtypes = [wintypes.HKEY, wintypes.BOOL, wintypes.DWORD, wintypes.HANDLE, wintypes.BOOL]
+        advapi32.RegCloseKey.argtypes = [wintypes.HKEY]
+        iphlpapi.NotifyAddrChange.argtypes = [ctypes.POINTER(wintypes.HANDLE), ctypes.POINTER(OVERLAPPED)]
+
+        self._thread_id = kernel32.GetCurrentThreadId()
+
+        def window_proc(hwnd, message, wparam, lparam):
+            if message == self._WM_DISPLAYCHANGE:
+                self._emit(DISPLAY)
+            elif message == self._WM_DEVICECHANGE:
+                self._emit(DEVICE)
+            elif message == self._WM_SETTINGCHANGE:
+                self._emit(SETTINGS)
+                if wparam == self._SPI_SETWORKAREA:  # taskbar moved or resized
+                    self._emit(DISPLAY)
+            elif message == self._WM_POWERBROADCAST:
+                if wparam == self._PBT_APMRESUMEAUTOMATIC:
+                    self._emit(POWER, DISPLAY, DEVICE, NETWORK)
+                else:
+                    self._emit(POWER)
+            return user32.DefWindowProcW(hwnd, message, wparam, lparam)
+
+        procedure = WNDPROC(window_proc)
+        instance = kernel32.GetModuleHandleW(None)
+        window_class = WNDCLASSW(lpfnWndProc=procedure, hInstance=instance, lpszClassName='ClippySignalWindow')
+        user32.RegisterClassW(ctypes.byref(window_class))
+        # A top-level window that is never shown; message-only windows miss broadcasts.
+        hwnd = user32.CreateWindowExW(0, 'ClippySignalWindow', 'Clippy signals', 0, 0, 0, 0, 0, None, None, instance, None)
+
+        address_event = kernel32.CreateEventW(None, False, False, None)
+        overlapped = OVERLAPPED(hEvent=address_event)
+        address_handle = wintypes.HANDLE()
+
+        def arm_address() -> None:
+            iphlpapi.NotifyAddrChange(ctypes.byref(address_handle), ctypes.byref(overlapped))
+
+        # tag -> (key handle, event handle, root, subkey), least recently requested first
+        watches: 'OrderedDict[str, Tuple[wintypes.HKEY, int, int, str]]' = OrderedDict()
+
+        def arm_key(tag: str) -> bool:
+            key, event, _, _ = watches[tag]
+            return advapi32.RegNotifyChangeKeyValue(key, True, self._REG_NOTIFY, event, True) == 0
+
+        def close_watch(tag: str) -> None:
+            key, event, _, _ = watches.pop(tag)
+            advapi32.RegCloseKey(key)
+            kernel32.CloseHandle(event)
+
+        def add_watches() -> None:
+            with self._lock:
+                requests, self._requests = self._requests, []
+            for root, subkey, tag in requests:
+                if tag in watches:
+                    watches.move_to_end(tag)
+                    continue
+                key = wintypes.HKEY()
+                if advapi32.RegOpenKeyExW(root, subkey, 0, self._KEY_NOTIFY, ctypes.byref(key)) != 0:
+                    continue
+                watches[tag] = (key, kernel32.CreateEventW(None, False, False, None), root, subkey)
+                if not arm_key(tag):
+                    close_watch(tag)
+                    continue
+                while len(watches) > self.max_registry_watches:
+                    close_watch(next(iter(watches)))
+
+        arm_address()
+        add_watches()
+        self._ready.set()
+
+        msg = wintypes.MSG()
+        try:
+            while True:
+                tags = list(watches)
+                handles = (wintypes.HANDLE * (len(tags) + 1))(address_event, *(watches[tag][1] for tag in tags))
+                result = user32.MsgWaitForMultipleObjects(len(handles), handles, False, self._INFINITE, self._QS_ALLINPUT)
+                index = result - self._WAIT_OBJECT_0
+                if index == 0:
+                    self._emit(NETWORK)
+                    arm_address()
+                elif 0 < index <= len(tags):
+                    tag = tags[index - 1]
+                    self._emit(tag)
+                    if not arm_key(tag):
+                        close_watch(tag)  # key deleted; the next read re-watches it
+                elif index != len(handles):
+                    break  # WAIT_FAILED
+                while user32.PeekMessageW(ctypes.byref(msg), None, 0, 0, self._PM_REMOVE):
+                    if msg.message == self._WM_QUIT:
+                        return
+                    if msg.message == self._WM_APP and not msg.hWnd:
+                        add_watches()
+                        continue
+                    user32.TranslateMessage(ctypes.byref(msg))
+                    user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            for tag in list(watches):
+                with contextlib.suppress(Exception):
+                    close_watch(tag)
+            with contextlib.suppress(Exception):
+                iphlpapi.CancelIPChangeNotify(ctypes.byref(overlapped))
+            kernel32.CloseHandle(address_event)
+            if hwnd:
+                user32.DestroyWindow(hwnd)
+            user32.UnregisterClassW('ClippySignalWindow', instance)
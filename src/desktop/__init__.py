@@ -1,3 +1,32 @@
-from .views import Desktop
+import importlib
 
-__all__ = ['Desktop']
\ No newline at end of file
+from .capture import CaptureBackend, CaptureError, FakeCaptureBackend, Frame, GdiCaptureBackend, ScreenCapture
+from .delta import Delta, DeltaTracker
+from .encode import EncodedImage, ImageOptions
+from .progressive import WalkBudget
+from .selector import SelectorError, describe as describe_elements, parse as parse_selector
+from .serialize import render_diff, render_state
+
+# These modules import uiautomation, which only exists on Windows. Loading
+# them on first use keeps the rest of the package (capture, windows,
+# selector, ...) importable elsewhere, e.g. by the tests.
+_UIA_EXPORTS = {
+    'Desktop': ('.views', 'Desktop'),
+    'initialize_uia_thread': ('.parallel', 'initialize_uia_thread'),
+}
+
+__all__ = [
+    'CaptureBackend', 'CaptureError', 'Delta', 'DeltaTracker', 'Desktop', 'EncodedImage', 'FakeCaptureBackend', 'Frame',
+    'GdiCaptureBackend', 'ImageOptions', 'ScreenCapture', 'SelectorError', 'WalkBudget', 'describe_elements',
+    'initialize_uia_thread', 'parse_selector', 'render_diff', 'render_state',
+]
+
+
+def __getattr__(name):
+    try:
+        module, attribute = _UIA_EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module, __name__), attribute)
+    globals()[name] = value
+    return value
@@ -0,0 +1,486 @@
+"""Screen capture into reused buffers, with a native backend and frame reuse.
+
+Screenshot-Tool and ``State-Tool(use_vision=True)`` used ``pg.screenshot()``,
+which goes through PIL's ``ImageGrab`` and allocates a new image on every
+call. On 4K multi-monitor setups that took 150-400 ms before encoding even
+started. :class:`ScreenCapture` instead:
+
+- grabs through a :class:`CaptureBackend` straight into NumPy buffers. Each
+  target (a screen, a region or a window) keeps two buffers, reallocated only
+  when its size changes or a frame handed out earlier still refers to the
+  one about to be written, so encoding or hashing a frame on another thread
+  never sees it overwritten;
+- compares each grab with the previous one for the same target. An unchanged
+  frame keeps its ``sequence``, so its encoded image is served from the cache
+  instead of being encoded again;
+- with ``max_age``, skips the grab entirely when the previous frame is that
+  recent and the ``version`` counter (window events, say) has not moved.
+
+:class:`GdiCaptureBackend` uses ``BitBlt`` for screens and regions and
+``PrintWindow`` for single windows, so a window covered by others can still
+be captured. :class:`FakeCaptureBackend` paints an in-memory screen for
+tests and benchmarks off Windows.
+
+Encoding (:mod:`.encode`) runs on a small thread pool through
+:meth:`ScreenCapture.encode_async`, so async tools keep the event loop free
+while PIL compresses.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from .encode import EncodedImage, ImageOptions, encode_image
+
+
+Rect = Tuple[int, int, int, int]  # left, top, right, bottom
+
+CHANNELS = 4  # pixels are BGRA, as GDI lays out 32-bit DIBs
+
+
+class CaptureError(RuntimeError):
+    """Raised when the backend cannot capture the requested target."""
+
+
+class CaptureBackend(ABC):
+    """Copy screen or window pixels into caller-owned BGRA buffers."""
+
+    @abstractmethod
+    def screen_rect(self, all_screens: bool = False) -> Rect:
+        """The primary monitor, or with ``all_screens`` the whole virtual screen."""
+
+    @abstractmethod
+    def window_rect(self, hwnd: int) -> Optional[Rect]:
+        """The window's rectangle in screen coordinates, None if it is gone."""
+
+    @abstractmethod
+    def grab(self, rect: Rect, out: np.ndarray) -> None:
+        """Copy the screen pixels in ``rect`` into ``out`` (height x width x 4)."""
+
+    @abstractmethod
+    def grab_window(self, hwnd: int, out: np.ndarray) -> None:
+        """Render the window into ``out`` even where other windows cover it."""
+
+    def close(self) -> None:
+        """Release native resources."""
+
+
+class GdiCaptureBackend(CaptureBackend):
+    """GDI through ctypes: BitBlt from the screen DC, PrintWindow for windows.
+
+    Pixels land in a DIB section that is kept while the size stays the same
+    and copied into the caller's buffer with one ``memcpy``.
+    """
+
+    _SRCCOPY = 0x00CC0020
+    _CAPTUREBLT = 0x40000000  # include layered windows
+    _PW_RENDERFULLCONTENT = 0x00000002  # DirectComposition content (browsers, UWP)
+    _DIB_RGB_COLORS = 0
+    _SM_CXSCREEN, _SM_CYSCREEN = 0, 1
+    _SM_XVIRTUALSCREEN, _SM_YVIRTUALSCREEN, _SM_CXVIRTUALSCREEN, _SM_CYVIRTUALSCREEN = 76, 77, 78, 79
+
+    def __init__(self):
+        self._api = None
+        self._lock = threading.Lock()
+        self._memory_dc = None
+        self._dib: Optional[Tuple[int, int, object, np.ndarray]] = None  # width, height, bitmap, view
+
+    def screen_rect(self, all_screens: bool = False) -> Rect:
+        user32, _ = self._dlls()
+        if all_screens:
+            left = user32.GetSystemMetrics(self._SM_XVIRTUALSCREEN)
+            top = user32.GetSystemMetrics(self._SM_YVIRTUALSCREEN)
+            return (left, top,
+                    left + user32.GetSystemMetrics(self._SM_CXVIRTUALSCREEN),
+                    top + user32.GetSystemMetrics(self._SM_CYVIRTUALSCREEN))
+        return (0, 0, user32.GetSystemMetrics(self._SM_CXSCREEN), user32.GetSystemMetrics(self._SM_CYSCREEN))
+
+    def window_rect(self, hwnd: int) -> Optional[Rect]:
+        from ctypes import byref, wintypes
+
+        user32, _ = self._dlls()
+        rect = wintypes.RECT()
+        if not user32.IsWindow(hwnd) or not user32.GetWindowRect(hwnd, byref(rect)):
+            return None
+        return (rect.left, rect.top, rect.right, rect.bottom)
+
+    def grab(self, rect: Rect, out: np.ndarray) -> None:
+        user32, gdi32 = self._dlls()
+        left, top = rect[0], rect[1]
+        height, width = out.shape[:2]
+        with self._lock:
+            view = self._select(width, height)
+            screen_dc = user32.GetDC(None)
+            if not screen_dc:
+                raise CaptureError('GetDC failed')
+            try:
+                done = gdi32.BitBlt(self._memory_dc, 0, 0, width, height, screen_dc, left, top, self._SRCCOPY | self._CAPTUREBLT)
+            finally:
+                user32.ReleaseDC(None, screen_dc)
+            if not done:
+                raise CaptureError('BitBlt failed; the desktop may be locked or on the secure desktop')
+            np.copyto(out, view)
+
+    def grab_window(self, hwnd: int, out: np.ndarray) -> None:
+        user32, _ = self._dlls()
+        if user32.IsIconic(hwnd):
+            raise CaptureError('the window is minimized')
+        height, width = out.shape[:2]
+        with self._lock:
+            view = self._select(width, height)
+            if not user32.PrintWindow(hwnd, self._memory_dc, self._PW_RENDERFULLCONTENT):
+                raise CaptureError('PrintWindow failed')
+            np.copyto(out, view)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._api is None:
+                return
+            _, gdi32 = self._api
+            if self._dib is not None:
+                gdi32.DeleteObject(self._dib[2])
+                self._dib = None
+            if self._memory_dc is not None:
+                gdi32.DeleteDC(self._memory_dc)
+                self._memory_dc = None
+
+    def _select(self, width: int, height: int) -> np.ndarray:
+        """Select a ``width`` x ``height`` DIB section into the memory DC and return a view of its bits."""
+        import ctypes
+        from ctypes import wintypes
+
+        if self._dib is not None and self._dib[:2] == (width, height):
+            return self._dib[3]
+        user32, gdi32 = self._dlls()
+        if self._memory_dc is None:
+            screen_dc = user32.GetDC(None)
+            try:
+                self._memory_dc = gdi32.CreateCompatibleDC(screen_dc)
+            finally:
+                user32.ReleaseDC(None, screen_dc)
+            if not self._memory_dc:
+                self._memory_dc = None
+                raise CaptureError('CreateCompatibleDC failed')
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG), ('biYPelsPerMeter', wintypes.LONG),
+                ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD),
+            ]
+
+        header = BITMAPINFOHEADER()
+        header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        header.biWidth = width
+        header.biHeight = -height  # negative: top-down rows, matching the array
+        header.biPlanes = 1
+        header.biBitCount = 32
+        bits = ctypes.c_void_p()
+        bitmap = gdi32.CreateDIBSection(self._memory_dc, ctypes.byref(header), self._DIB_RGB_COLORS, ctypes.byref(bits), None, 0)
+        if not bitmap or not bits.value:
+            raise CaptureError(f'CreateDIBSection failed for {width}x{height}')
+        gdi32.SelectObject(self._memory_dc, bitmap)
+        if self._dib is not None:
+            gdi32.DeleteObject(self._dib[2])  # deselected by the SelectObject above
+        buffer = (ctypes.c_uint8 * (width * height * CHANNELS)).from_address(bits.value)
+        view = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, CHANNELS)
+        self._dib = (width, height, bitmap, view)
+        return view
+
+    def _dlls(self):
+        if self._api is None:
+            import ctypes
+            from ctypes import wintypes
+
+            user32 = ctypes.WinDLL('user32', use_last_error=True)
+            gdi32 = ctypes.WinDLL('gdi32', use_last_error=True)
+            user32.GetDC.argtypes = (wintypes.HWND,)
+            user32.GetDC.restype = wintypes.HDC
+            user32.ReleaseDC.argtypes = (wintypes.HWND, wintypes.HDC)
+            user32.GetSystemMetrics.argtypes = (ctypes.c_int,)
+            user32.IsWindow.argtypes = (wintypes.HWND,)
+            user32.IsIconic.argtypes = (wintypes.HWND,)
+            user32.GetWindowRect.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.RECT))
+            user32.PrintWindow.argtypes = (wintypes.HWND, wintypes.HDC, wintypes.UINT)
+            gdi32.CreateCompatibleDC.argtypes = (wintypes.HDC,)
+            gdi32.CreateCompatibleDC.restype = wintypes.HDC
+            gdi32.CreateDIBSection.argtypes = (
+                wintypes.HDC, ctypes.c_void_p, wintypes.UINT, ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD,
+            )
+            gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+            gdi32.SelectObject.argtypes = (wintypes.HDC, wintypes.HGDIOBJ)
+            gdi32.SelectObject.restype = wintypes.HGDIOBJ
+            gdi32.BitBlt.argtypes = (
+                wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD,
+            )
+            gdi32.DeleteObject.argtypes = (wintypes.HGDIOBJ,)
+            gdi32.DeleteDC.argtypes = (wintypes.HDC,)
+            self._api = (user32, gdi32)
+        return self._api
+
+
+class FakeCaptureBackend(CaptureBackend):
+    """An in-memory screen and windows, for running capture logic off Windows.
+
+    Windows keep their own pixels, so they can be captured while the screen
+    shows something else over them, as with PrintWindow.
+    """
+
+    def __init__(self, width: int = 1920, height: int = 1080):
+        self.screen = np.zeros((height, width, CHANNELS), dtype=np.uint8)
+        self.windows: Dict[int, Tuple[Rect, np.ndarray]] = {}
+        self.grabs = 0
+
+    def paint(self, rect: Rect, color: Tuple[int, int, int]) -> None:
+        """Fill ``rect`` on the screen with an RGB color."""
+        left, top, right, bottom = rect
+        self.screen[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = (*color[::-1], 255)
+
+    def add_window(self, hwnd: int, rect: Rect, color: Tuple[int, int, int]) -> None:
+        left, top, right, bottom = rect
+        pixels = np.empty((bottom - top, right - left, CHANNELS), dtype=np.uint8)
+        pixels[:] = (*color[::-1], 255)
+        self.windows[hwnd] = (rect, pixels)
+
+    def screen_rect(self, all_screens: bool = False) -> Rect:
+        return (0, 0, self.screen.shape[1], self.screen.shape[0])
+
+    def window_rect(self, hwnd: int) -> Optional[Rect]:
+        window = self.windows.get(hwnd)
+        return window[0] if window else None
+
+    def grab(self, rect: Rect, out: np.ndarray) -> None:
+        self.grabs += 1
+        left, top, right, bottom = rect
+        out[:] = 0  # off-screen parts come back black, as from BitBlt
+        height, width = self.screen.shape[:2]
+        x0, y0, x1, y1 = max(left, 0), max(top, 0), min(right, width), min(bottom, height)
+        if x0 < x1 and y0 < y1:
+            out[y0 - top:y1 - top, x0 - left:x1 - left] = self.screen[y0:y1, x0:x1]
+
+    def grab_window(self, hwnd: int, out: np.ndarray) -> None:
+        self.grabs += 1
+        if hwnd not in self.windows:
+            raise CaptureError(f'no window {hwnd}')
+        np.copyto(out, self.windows[hwnd][1])
+
+
+@dataclass(frozen=True)
+class Frame:
+    """One capture. ``pixels`` is a BGRA view of a reused buffer.
+
+    The buffer is not written again while this frame, or an image made from
+    it, is still alive. Call :meth:`copy` to keep a frame around without
+    making later captures allocate.
+    """
+
+    pixels: np.ndarray
+    rect: Rect  # screen coordinates
+    key: Hashable  # the capture target
+    sequence: int  # bumps only when the content changed
+    changed: bool  # differs from the previous frame of this target
+    grabbed: bool  # False when the previous frame was served without grabbing
+    capture_ms: float
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def copy(self) -> 'Frame':
+        return replace(self, pixels=self.pixels.copy())
+
+    def to_image(self, box: Optional[Rect] = None):
+        """An RGB PIL image of the frame, or of ``box`` in frame pixels."""
+        from PIL import Image
+
+        pixels = self.pixels
+        if box is not None:
+            left, top, right, bottom = box
+            pixels = np.ascontiguousarray(pixels[top:bottom, left:right])
+        return Image.frombuffer('RGB', (pixels.shape[1], pixels.shape[0]), pixels, 'raw', 'BGRX', 0, 1)
+
+
+class _Target:
+    __slots__ = ('front', 'back', 'frame', 'at', 'version', 'encoded')
+
+    def __init__(self):
+        self.front: Optional[np.ndarray] = None
+        self.back: Optional[np.ndarray] = None
+        self.frame: Optional[Frame] = None
+        self.at = 0.0
+        self.version: Optional[int] = None
+        self.encoded: Dict[ImageOptions, EncodedImage] = {}  # for frame.sequence only
+
+
+class ScreenCapture:
+    """Capture screens, regions and windows with buffer and frame reuse.
+
+    ``version`` is a cheap counter that moves when the screen may have
+    changed. With it and a ``max_age`` in seconds, a frame younger than
+    ``max_age`` whose counter has not moved is returned without grabbing.
+    At most ``max_targets`` targets keep buffers, least recently used first out.
+    :meth:`encode_async` encodes on up to ``encode_workers`` threads.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CaptureBackend] = None,
+        version: Optional[Callable[[], int]] = None,
+        max_age: float = 0.0,
+        max_targets: int = 8,
+        encode_workers: int = 2,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.backend = backend or GdiCaptureBackend()
+        self.max_age = max_age
+        self.max_targets = max_targets
+        self.encode_workers = encode_workers
+        self._version = version
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._targets: 'collections.OrderedDict[Hashable, _Target]' = collections.OrderedDict()
+        self._counters = dict.fromkeys(('grabs', 'changed', 'unchanged', 'reused', 'encodes', 'encode_hits', 'buffers_held'), 0)
+        self._grab_ms = 0.0
+        self._encode_ms = 0.0
+        self._encoded_bytes = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def screen(self, all_screens: bool = False) -> Frame:
+        rect = self.backend.screen_rect(all_screens)
+        return self._capture(('screen', all_screens), rect, lambda out: self.backend.grab(rect, out))
+
+    def region(self, rect: Rect) -> Frame:
+        left, top, right, bottom = rect
+        if right <= left or bottom <= top:
+            raise CaptureError(f'empty region {rect}')
+        return self._capture(('region', rect), rect, lambda out: self.backend.grab(rect, out))
+
+    def window(self, hwnd: int) -> Frame:
+        rect = self.backend.window_rect(hwnd)
+        if rect is None or rect[2] <= rect[0] or rect[3] <= rect[1]:
+            raise CaptureError(f'window {hwnd} is gone or has no area')
+        return self._capture(('window', hwnd), rect, lambda out: self.backend.grab_window(hwnd, out))
+
+    def encode(self, frame: Frame, options: ImageOptions = ImageOptions(), box: Optional[Rect] = None) -> EncodedImage:
+        """Encode ``frame``, or the ``box`` part of it; whole frames are reused while unchanged."""
+        if box is not None:
+            encoded = encode_image(frame.to_image(box), options)
+            with self._lock:
+                self._counters['encodes'] += 1
+                self._encode_ms += encoded.encode_ms
+                self._encoded_bytes += len(encoded.data)
+            return encoded
+        with self._lock:
+            target = self._targets.get(frame.key)
+            if target is not None and target.frame is not None and target.frame.sequence == frame.sequence:
+                cached = target.encoded.get(options)
+                if cached is not None:
+                    self._counters['encode_hits'] += 1
+                    return replace(cached, cached=True)
+        encoded = encode_image(frame.to_image(), options)
+        with self._lock:
+            self._counters['encodes'] += 1
+            self._encode_ms += encoded.encode_ms
+            self._encoded_bytes += len(encoded.data)
+            target = self._targets.get(frame.key)
+            if target is not None and target.frame is not None and target.frame.sequence == frame.sequence:
+                if len(target.encoded) >= 4:
+                    target.encoded.clear()
+                target.encoded[options] = encoded
+        return encoded
+
+    async def encode_async(self, frame: Frame, options: ImageOptions = ImageOptions(), box: Optional[Rect] = None) -> EncodedImage:
+        """:meth:`encode` on the encoder pool."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.encode_workers, thread_name_prefix='clippy-encode')
+            pool = self._pool
+        return await asyncio.get_running_loop().run_in_executor(pool, self.encode, frame, options, box)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            grabs, encodes = self._counters['grabs'], self._counters['encodes']
+            return {
+                **self._counters,
+                'mean_grab_ms': round(self._grab_ms / grabs, 1) if grabs else 0.0,
+                'mean_encode_ms': round(self._encode_ms / encodes, 1) if encodes else 0.0,
+                'mean_encoded_kb': round(self._encoded_bytes / encodes / 1024, 1) if encodes else 0.0,
+                'targets': len(self._targets),
+                'buffer_mb': round(sum(
+                    array.nbytes for target in self._targets.values() for array in (target.front, target.back) if array is not None
+                ) / 2**20, 1),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._targets.clear()
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.backend.close()
+
+    def _capture(self, key: Hashable, rect: Rect, grab: Callable[[np.ndarray], None]) -> Frame:
+        shape = (rect[3] - rect[1], rect[2] - rect[0], CHANNELS)
+        with self._lock:
+            started = self._clock()
+            version = self._read_version()
+            target = self._targets.pop(key, None) or _Target()
+            self._targets[key] = target  # most recently used last
+            while len(self._targets) > self.max_targets:
+                self._targets.popitem(last=False)
+            previous = target.frame
+            if (
+                previous is not None and previous.rect == rect and self.max_age > 0
+                and version is not None and version == target.version
+                and started - target.at <= self.max_age
+            ):
+                self._counters['reused'] += 1
+                return replace(previous, changed=False, grabbed=False, capture_ms=(self._clock() - started) * 1000)
+            if target.back is None or target.back.shape != shape:
+                target.back = np.empty(shape, dtype=np.uint8)
+            elif sys.getrefcount(target.back) > 2:
+                # Beyond this attribute and the call's argument, an earlier
+                # frame still refers to the buffer, perhaps mid-encode on
+                # another thread. Leave it to that frame.
+                self._counters['buffers_held'] += 1
+                target.back = np.empty(shape, dtype=np.uint8)
+            grab(target.back)
+            elapsed = (self._clock() - started) * 1000
+            self._counters['grabs'] += 1
+            self._grab_ms += elapsed
+            target.at, target.version = started, version
+            if previous is not None and target.front is not None and target.front.shape == shape and np.array_equal(target.back, target.front):
+                # Same pixels: keep the sequence so encoded output can be reused.
+                self._counters['unchanged'] += 1
+                target.frame = replace(previous, rect=rect, changed=False, grabbed=True, capture_ms=elapsed)
+                return target.frame
+            target.front, target.back = target.back, target.front
+            target.encoded = {}
+            self._counters['changed'] += 1
+            sequence = previous.sequence + 1 if previous is not None else 1
+            target.frame = Frame(target.front, rect, key, sequence, True, True, elapsed)
+            return target.frame
+
+    def _read_version(self) -> Optional[int]:
+        if self._version is None:
+            return None
+        try:
+            return self._version()
+        except Exception:
+            return None
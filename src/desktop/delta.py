@@ -0,0 +1,221 @@
+"""Tile-based screenshot deltas.
+
+Most agent steps change a small part of the screen, yet every screenshot
+sent the whole of it again. :class:`DeltaTracker` keeps, per session and
+capture target, a grid of tile hashes from the last frame it saw. The next
+frame is compared tile by tile and only what changed needs to be sent:
+
+- :func:`tile_hashes` hashes every ``tile`` x ``tile`` block at once with
+  NumPy. BGRA pixel pairs are read as 64-bit words, and each tile gets a
+  weighted sum with random odd weights, modulo 2**64. That is about 15 ms
+  for a 4K frame, and a single changed pixel always changes its tile's hash;
+- changed tiles are merged into rectangles (:func:`merge_tiles`). Callers
+  send those rectangles or the one bounding box around them;
+- after ``full_every`` deltas, or when the target's size or position changes,
+  the next frame is a full one again, so a client that lost track recovers.
+
+Only the hashes are kept between calls, not the previous pixels, so a
+session costs a few kilobytes.
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .capture import CHANNELS, Frame, Rect
+
+
+FULL = 'full'
+DELTA = 'delta'
+UNCHANGED = 'unchanged'
+
+
+def _weights(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2**64 - 1, count, dtype=np.uint64, endpoint=True) | np.uint64(1)
+
+
+def tile_hashes(pixels: np.ndarray, tile: int, scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """A (rows, columns) uint64 hash per ``tile`` x ``tile`` block of a BGRA image.
+
+    Edge tiles are zero-padded. ``scratch`` is a reusable zeroed buffer of
+    the padded shape; one is allocated when it is missing or the wrong size.
+    """
+    if tile < 2 or tile % 2:
+        raise ValueError(f'tile must be an even number of pixels, not {tile}')
+    height, width = pixels.shape[:2]
+    rows, columns = -(-height // tile), -(-width // tile)
+    padded_shape = (rows * tile, columns * tile, CHANNELS)
+    if pixels.shape != padded_shape or not pixels.flags.c_contiguous:
+        if scratch is None or scratch.shape != padded_shape:
+            scratch = np.zeros(padded_shape, dtype=np.uint8)
+        scratch[:height, :width] = pixels
+        pixels = scratch
+    # Two BGRA pixels per 64-bit word; weighted sums along each tile row, then down each tile.
+    words = pixels.reshape(rows * tile, -1).view(np.uint64).reshape(rows * tile, columns, tile // 2)
+    row_hashes = words @ _weights(tile // 2, 1)
+    return (row_hashes.reshape(rows, tile, columns) * _weights(tile, 2)[None, :, None]).sum(axis=1)
+
+
+def merge_tiles(changed: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Merge a boolean tile grid into rectangles (row, column, end row, end column).
+
+    Runs of changed tiles in a row become strips, and a strip continues
+    downward while the next row has the same run.
+    """
+    rectangles: List[List[int]] = []
+    open_runs: Dict[Tuple[int, int], List[int]] = {}
+    for row, line in enumerate(changed):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], line.astype(np.int8), [0]))))
+        runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        still_open = {}
+        for run in runs:
+            rectangle = open_runs.get(run)
+            if rectangle is None:
+                rectangle = [row, run[0], row + 1, run[1]]
+                rectangles.append(rectangle)
+            else:
+                rectangle[2] = row + 1
+            still_open[run] = rectangle
+        open_runs = still_open
+    return [tuple(rectangle) for rectangle in rectangles]
+
+
+@dataclass
+class Delta:
+    """What changed in a frame since the previous one of the same session and target."""
+
+    kind: str  # FULL, DELTA or UNCHANGED
+    frame_rect: Rect  # screen coordinates of the whole frame
+    tile: int
+    tiles: int  # tiles in the frame
+    changed_tiles: int = 0
+    regions: List[Rect] = field(default_factory=list)  # changed rectangles in frame pixels
+    bbox: Optional[Rect] = None  # bounding box of the regions in frame pixels
+    deltas_since_full: int = 0
+    hash_ms: float = 0.0
+    reason: str = ''  # why a full frame was sent
+
+    def screen_rect(self, region: Rect) -> Rect:
+        """``region`` (frame pixels) in screen coordinates."""
+        left, top = self.frame_rect[:2]
+        return (region[0] + left, region[1] + top, region[2] + left, region[3] + top)
+
+
+class _Baseline:
+    __slots__ = ('rect', 'hashes', 'deltas')
+
+    def __init__(self, rect: Rect, hashes: np.ndarray):
+        self.rect = rect
+        self.hashes = hashes
+        self.deltas = 0
+
+
+class DeltaTracker:
+    """Per-session tile hashes and the delta of each new frame against them.
+
+    Sessions are kept least recently used first out, up to ``max_sessions``
+    baselines. ``max_regions`` caps the rectangles in a delta; beyond it the
+    delta is reported as the bounding box alone.
+    """
+
+    def __init__(self, tile: int = 64, max_sessions: int = 32, max_regions: int = 8):
+        self.tile = tile
+        self.max_sessions = max_sessions
+        self.max_regions = max_regions
+        self._lock = threading.Lock()
+        self._baselines: 'collections.OrderedDict[Hashable, _Baseline]' = collections.OrderedDict()
+        self._scratch: Optional[np.ndarray] = None
+        self._counters = dict.fromkeys((FULL, DELTA, UNCHANGED), 0)
+        self._hash_ms = 0.0
+        self._changed_fraction = 0.0
+
+    def compare(self, session: Hashable, frame: Frame, full_every: int = 10) -> Delta:
+        """Hash ``frame`` and compare it with the baseline for ``(session, frame.key)``.
+
+        The frame becomes the new baseline. A full frame is reported when
+        there is no baseline, the frame moved or resized, or ``full_every``
+        deltas have been sent since the last full frame.
+        """
+        key = (session, frame.key)
+        with self._lock:
+            started = time.perf_counter()
+            hashes = tile_hashes(frame.pixels, self.tile, self._scratch_for(frame))
+            hash_ms = (time.perf_counter() - started) * 1000
+            self._hash_ms += hash_ms
+            baseline = self._baselines.pop(key, None)
+            delta = Delta(FULL, frame.rect, self.tile, hashes.size, hash_ms=hash_ms)
+            if baseline is None:
+                delta.reason = 'no earlier frame in this session'
+            elif baseline.rect != frame.rect:
+                delta.reason = 'the captured area moved or resized'
+            elif baseline.deltas >= full_every:
+                delta.reason = f'{baseline.deltas} deltas since the last full frame'
+            else:
+                changed = hashes != baseline.hashes
+                delta.changed_tiles = int(changed.sum())
+                if delta.changed_tiles:
+                    baseline.deltas += 1
+                    delta.kind = DELTA
+                    delta.regions = self._regions(changed, frame)
+                    delta.bbox = (
+                        min(region[0] for region in delta.regions), min(region[1] for region in delta.regions),
+                        max(region[2] for region in delta.regions), max(region[3] for region in delta.regions),
+                    )
+                    if len(delta.regions) > self.max_regions:
+                        delta.regions = [delta.bbox]
+                else:
+                    delta.kind = UNCHANGED
+                delta.deltas_since_full = baseline.deltas
+            if delta.kind == FULL:
+                baseline = _Baseline(frame.rect, hashes)
+                delta.changed_tiles = hashes.size
+            else:
+                baseline.hashes = hashes
+            self._baselines[key] = baseline
+            while len(self._baselines) > self.max_sessions:
+                self._baselines.popitem(last=False)
+            self._counters[delta.kind] += 1
+            self._changed_fraction += delta.changed_tiles / hashes.size
+            return delta
+
+    def reset(self, session: Hashable) -> None:
+        """Forget every baseline of ``session``; its next frames are full."""
+        with self._lock:
+            for key in [key for key in self._baselines if key[0] == session]:
+                del self._baselines[key]
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            frames = sum(self._counters.values())
+            return {
+                'full_frames': self._counters[FULL],
+                'deltas': self._counters[DELTA],
+                'unchanged': self._counters[UNCHANGED],
+                'mean_hash_ms': round(self._hash_ms / frames, 1) if frames else 0.0,
+                'mean_changed_fraction': round(self._changed_fraction / frames, 3) if frames else 0.0,
+                'baselines': len(self._baselines),
+            }
+
+    def _scratch_for(self, frame: Frame) -> Optional[np.ndarray]:
+        """The padding buffer for frames whose size is not a multiple of the tile."""
+        tile = self.tile
+        shape = (-(-frame.height // tile) * tile, -(-frame.width // tile) * tile, CHANNELS)
+        if shape == frame.pixels.shape:
+            return None
+        if self._scratch is None or self._scratch.shape != shape:
+            self._scratch = np.zeros(shape, dtype=np.uint8)
+        return self._scratch
+
+    def _regions(self, changed: np.ndarray, frame: Frame) -> List[Rect]:
+        tile = self.tile
+        return [
+            (column * tile, row * tile, min(end_column * tile, frame.width), min(end_row * tile, frame.height))
+            for row, column, end_row, end_column in merge_tiles(changed)
+        ]
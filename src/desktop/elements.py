@@ -0,0 +1,340 @@
+"""Compact, COM-free storage for captured UI Automation elements.
+
+A capture used to produce one Python object per element, and before that a
+list of live ``ua.Control`` proxies that kept COM references alive for as long
+as the state object existed. :class:`ElementTable` stores a whole capture as
+parallel columns instead:
+
+- control types are interned into a small type table and referenced by a
+  ``uint16`` code per element,
+- names, automation ids and class names are ``sys.intern``-ed so repeated
+  strings ("Close", "", "Button") are shared across rows and snapshots,
+- bounding rectangles live in one ``(n, 4)`` ``int32`` NumPy array,
+- boolean state is packed into a ``uint8`` bit field.
+
+The table is filled once by :class:`ElementTableBuilder` during capture, after
+which no UIA object is referenced. Filtering, serialization and diffing all run
+on the columns; :class:`UIElement` rows are only materialized on demand.
+:class:`TreeSnapshot` pairs a table with the window it was captured from.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+
+# Every UIA control type, by the names uiautomation gives them
+# (``ua.ControlTypeNames``). Providers that report something else are stored
+# as plain 'Control'.
+CONTROL_TYPE_NAMES = (
+    'AppBarControl', 'ButtonControl', 'CalendarControl', 'CheckBoxControl', 'ComboBoxControl',
+    'CustomControl', 'DataGridControl', 'DataItemControl', 'DocumentControl', 'EditControl',
+    'GroupControl', 'HeaderControl', 'HeaderItemControl', 'HyperlinkControl', 'ImageControl',
+    'ListControl', 'ListItemControl', 'MenuBarControl', 'MenuControl', 'MenuItemControl',
+    'PaneControl', 'ProgressBarControl', 'RadioButtonControl', 'ScrollBarControl',
+    'SemanticZoomControl', 'SeparatorControl', 'SliderControl', 'SpinnerControl',
+    'SplitButtonControl', 'StatusBarControl', 'TabControl', 'TabItemControl', 'TableControl',
+    'TextControl', 'ThumbControl', 'TitleBarControl', 'ToolBarControl', 'ToolTipControl',
+    'TreeControl', 'TreeItemControl', 'WindowControl',
+)
+
+# Control types grouped the way State-Tool reports them.
+INTERACTIVE_CONTROL_TYPES = frozenset({
+    'ButtonControl', 'EditControl', 'ComboBoxControl', 'CheckBoxControl',
+})
+INFORMATIVE_CONTROL_TYPES = frozenset({
+    'TextControl',
+})
+SCROLLABLE_CONTROL_TYPES = frozenset({
+    'ScrollBarControl', 'ListControl',
+})
+
+# Bits of ElementTable.flags
+FLAG_ENABLED = 1 << 0
+FLAG_OFFSCREEN = 1 << 1
+FLAG_FOCUSED = 1 << 2
+FLAG_FOCUSABLE = 1 << 3
+
+
+@dataclass(slots=True)
+class UIElement:
+    """One row of an :class:`ElementTable`, detached from the table."""
+
+    name: str
+    control_type: str
+    rect: Tuple[int, int, int, int]  # left, top, right, bottom
+    value: str = ''
+    automation_id: str = ''
+    class_name: str = ''
+    runtime_id: Tuple[int, ...] = ()
+    is_enabled: bool = True
+    is_offscreen: bool = False
+    has_focus: bool = False
+    is_focusable: bool = False
+    depth: int = 0
+    parent: int = -1  # row index of the parent, -1 for the root
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        left, top, right, bottom = self.rect
+        return (left + right) // 2, (top + bottom) // 2
+
+
+def pack_flags(is_enabled: bool, is_offscreen: bool, has_focus: bool, is_focusable: bool) -> int:
+    return (
+        (FLAG_ENABLED if is_enabled else 0)
+        | (FLAG_OFFSCREEN if is_offscreen else 0)
+        | (FLAG_FOCUSED if has_focus else 0)
+        | (FLAG_FOCUSABLE if is_focusable else 0)
+    )
+
+
+class ElementTable:
+    """Struct-of-arrays snapshot of captured elements."""
+
+    __slots__ = (
+        'control_types', 'type_codes', 'names', 'values', 'automation_ids',
+        'class_names', 'runtime_ids', 'rects', 'flags', 'depths', 'parents',
+    )
+
+    def __init__(
+        self,
+        control_types: Tuple[str, ...],
+        type_codes: np.ndarray,
+        names: List[str],
+        values: List[str],
+        automation_ids: List[str],
+        class_names: List[str],
+        runtime_ids: List[Tuple[int, ...]],
+        rects: np.ndarray,
+        flags: np.ndarray,
+        depths: np.ndarray,
+        parents: np.ndarray,
+    ):
+        self.control_types = control_types
+        self.type_codes = type_codes
+        self.names = names
+        self.values = values
+        self.automation_ids = automation_ids
+        self.class_names = class_names
+        self.runtime_ids = runtime_ids
+        self.rects = rects
+        self.flags = flags
+        self.depths = depths
+        self.parents = parents
+
+    @classmethod
+    def empty(cls) -> 'ElementTable':
+        return ElementTableBuilder().build()
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[UIElement]) -> 'ElementTable':
+        builder = ElementTableBuilder()
+        for e in elements:
+            builder.append(
+                e.name, e.control_type, e.rect, e.value, e.automation_id, e.class_name,
+                e.runtime_id, pack_flags(e.is_enabled, e.is_offscreen, e.has_focus, e.is_focusable),
+                e.depth, e.parent,
+            )
+        return builder.build()
+
+    @classmethod
+    def concat(cls, tables: Sequence['ElementTable']) -> 'ElementTable':
+        """Stack tables row-wise, merging type tables and offsetting parents."""
+        if not tables:
+            return cls.empty()
+        control_types: Dict[str, int] = {}
+        type_codes, parents = [], []
+        offset = 0
+        for table in tables:
+            remap = np.asarray(
+                [control_types.setdefault(name, len(control_types)) for name in table.control_types],
+                dtype=np.uint16,
+            )
+            type_codes.append(remap[table.type_codes] if len(table) else table.type_codes)
+            parents.append(np.where(table.parents >= 0, table.parents + offset, -1).astype(np.int32))
+            offset += len(table)
+        return cls(
+            control_types=tuple(control_types),
+            type_codes=np.concatenate(type_codes),
+            names=[name for table in tables for name in table.names],
+            values=[value for table in tables for value in table.values],
+            automation_ids=[text for table in tables for text in table.automation_ids],
+            class_names=[text for table in tables for text in table.class_names],
+            runtime_ids=[rid for table in tables for rid in table.runtime_ids],
+            rects=np.concatenate([table.rects for table in tables]),
+            flags=np.concatenate([table.flags for table in tables]),
+            depths=np.concatenate([table.depths for table in tables]),
+            parents=np.concatenate(parents),
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> UIElement:
+        index = int(index)
+        flags = int(self.flags[index])
+        left, top, right, bottom = (int(v) for v in self.rects[index])
+        return UIElement(
+            name=self.names[index],
+            control_type=self.control_types[self.type_codes[index]],
+            rect=(left, top, right, bottom),
+            value=self.values[index],
+            automation_id=self.automation_ids[index],
+            class_name=self.class_names[index],
+            runtime_id=self.runtime_ids[index],
+            is_enabled=bool(flags & FLAG_ENABLED),
+            is_offscreen=bool(flags & FLAG_OFFSCREEN),
+            has_focus=bool(flags & FLAG_FOCUSED),
+            is_focusable=bool(flags & FLAG_FOCUSABLE),
+            depth=int(self.depths[index]),
+            parent=int(self.parents[index]),
+        )
+
+    def __iter__(self) -> Iterator[UIElement]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self, indices: Iterable[int]) -> List[UIElement]:
+        return [self[i] for i in indices]
+
+    def type_name(self, index: int) -> str:
+        return self.control_types[self.type_codes[index]]
+
+    def type_mask(self, types: Iterable[str]) -> np.ndarray:
+        wanted = set(types)
+        codes = [code for code, name in enumerate(self.control_types) if name in wanted]
+        return np.isin(self.type_codes, codes)
+
+    def indices_of(self, types: Iterable[str]) -> np.ndarray:
+        """Row indices, in capture order, of elements whose type is in ``types``."""
+        return np.flatnonzero(self.type_mask(types))
+
+    def flag_mask(self, flag: int) -> np.ndarray:
+        return (self.flags & flag) != 0
+
+    def centers(self) -> np.ndarray:
+        return (self.rects[:, :2] + self.rects[:, 2:]) // 2
+
+    def take(self, indices: Sequence[int]) -> 'ElementTable':
+        """Sub-table of the given rows; parents outside the subset become -1."""
+        indices = np.asarray(indices, dtype=np.int64)
+        remap = np.full(len(self) + 1, -1, dtype=np.int32)  # slot -1 maps missing parents
+        remap[indices] = np.arange(len(indices), dtype=np.int32)
+        rows = indices.tolist()
+        return ElementTable(
+            control_types=self.control_types,
+            type_codes=self.type_codes[indices],
+            names=[self.names[i] for i in rows],
+            values=[self.values[i] for i in rows],
+            automation_ids=[self.automation_ids[i] for i in rows],
+            class_names=[self.class_names[i] for i in rows],
+            runtime_ids=[self.runtime_ids[i] for i in rows],
+            rects=self.rects[indices],
+            flags=self.flags[indices],
+            depths=self.depths[indices],
+            parents=remap[self.parents[indices]],
+        )
+
+
+class ElementTableBuilder:
+    """Append-only builder that fills an :class:`ElementTable` during capture."""
+
+    def __init__(self):
+        self._type_codes: Dict[str, int] = {}
+        self._codes: List[int] = []
+        self._names: List[str] = []
+        self._values: List[str] = []
+        self._automation_ids: List[str] = []
+        self._class_names: List[str] = []
+        self._runtime_ids: List[Tuple[int, ...]] = []
+        self._rects: List[Tuple[int, int, int, int]] = []
+        self._flags: List[int] = []
+        self._depths: List[int] = []
+        self._parents: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def append(
+        self,
+        name: str,
+        control_type: str,
+        rect: Tuple[int, int, int, int],
+        value: str = '',
+        automation_id: str = '',
+        class_name: str = '',
+        runtime_id: Tuple[int, ...] = (),
+        flags: int = FLAG_ENABLED,
+        depth: int = 0,
+        parent: int = -1,
+    ) -> int:
+        """Add one element and return its row index."""
+        code = self._type_codes.get(control_type)
+        if code is None:
+            code = self._type_codes[control_type] = len(self._type_codes)
+        self._codes.append(code)
+        self._names.append(sys.intern(name))
+        self._values.append(value)
+        self._automation_ids.append(sys.intern(automation_id))
+        self._class_names.append(sys.intern(class_name))
+        self._runtime_ids.append(runtime_id)
+        self._rects.append(rect)
+        self._flags.append(flags)
+        self._depths.append(depth)
+        self._parents.append(parent)
+        return len(self._names) - 1
+
+    def flags(self, index: int) -> int:
+        return self._flags[index]
+
+    def build(self) -> ElementTable:
+        """Freeze the rows appended so far; the builder stays usable."""
+        count = len(self._names)
+        return ElementTable(
+            control_types=tuple(sys.intern(t) for t in self._type_codes),
+            type_codes=np.asarray(self._codes, dtype=np.uint16),
+            names=list(self._names),
+            values=list(self._values),
+            automation_ids=list(self._automation_ids),
+            class_names=list(self._class_names),
+            runtime_ids=list(self._runtime_ids),
+            rects=np.asarray(self._rects, dtype=np.int32).reshape(count, 4),
+            flags=np.asarray(self._flags, dtype=np.uint8),
+            depths=np.asarray(self._depths, dtype=np.int16),
+            parents=np.asarray(self._parents, dtype=np.int32),
+        )
+
+
+@dataclass
+class WindowCapture:
+    """Where one top-level window's rows sit in a merged snapshot, and what it cost."""
+
+    hwnd: int
+    name: str
+    start: int  # first row in TreeSnapshot.elements
+    stop: int  # one past the last row
+    capture_ms: float = 0.0
+    error: str = ''
+
+
+@dataclass
+class TreeSnapshot:
+    """One capture of the foreground window, or of several top-level windows."""
+
+    hwnd: int
+    window_name: str
+    elements: ElementTable
+    captured_at: float = field(default_factory=time.monotonic)
+    capture_ms: float = 0.0
+    generation: int = 0  # stamped by TreeCache when the snapshot is installed
+    windows: List[WindowCapture] = field(default_factory=list)  # set for multi-window captures
+
+    @classmethod
+    def empty(cls) -> 'TreeSnapshot':
+        return cls(hwnd=0, window_name='Unknown', elements=ElementTable.empty())
@@ -0,0 +1,123 @@
+"""Encoding captured frames for MCP image content.
+
+A 4K PNG is several megabytes, and those bytes dominate both transfer and
+model time. :class:`ImageOptions` lets callers trade fidelity for size:
+
+- ``format`` is ``png`` (lossless), ``jpeg`` or ``webp``, and ``quality``
+  (1-100) applies to the last two;
+- ``max_dimension`` caps the longest side. Downscaling averages areas (an
+  integer ``reduce`` followed by a box resize), so text stays legible
+  instead of aliasing as it would with nearest-neighbour sampling;
+- ``grayscale`` drops color before anything else, which also makes the
+  downscale and encode cheaper.
+
+:func:`encode_image` returns an :class:`EncodedImage` with the bytes, the
+encode time and the scale needed to map image coordinates back to the screen.
+"""
+
+from __future__ import annotations
+
+import io
+import time
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+
+FORMATS = ('png', 'jpeg', 'webp')
+
+_MIME_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    format: str = 'png'
+    quality: int = 80  # jpeg and webp only
+    max_dimension: Optional[int] = None  # longest side in pixels; None keeps the capture size
+    grayscale: bool = False
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f'format must be one of {", ".join(FORMATS)}, not {self.format!r}')
+        if not 1 <= self.quality <= 100:
+            raise ValueError(f'quality must be between 1 and 100, not {self.quality}')
+        if self.max_dimension is not None and self.max_dimension < 16:
+            raise ValueError(f'max_dimension must be at least 16, not {self.max_dimension}')
+
+    def for_crop(self, frame_size: Tuple[int, int], crop_size: Tuple[int, int]) -> 'ImageOptions':
+        """Options that scale a crop of a frame by the same ratio as the whole frame."""
+        if self.max_dimension is None or max(frame_size) <= self.max_dimension:
+            return replace(self, max_dimension=None)
+        ratio = self.max_dimension / max(frame_size)
+        return replace(self, max_dimension=max(16, round(max(crop_size) * ratio)))
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+    source_width: int
+    source_height: int
+    encode_ms: float
+    cached: bool = False  # served from the encode cache of an unchanged frame
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES[self.format]
+
+    @property
+    def scale(self) -> float:
+        """Screen pixels per image pixel."""
+        return self.source_width / self.width
+
+    def describe(self) -> str:
+        how = 'reused from an unchanged frame' if self.cached else f'encoded in {self.encode_ms:.0f} ms'
+        text = f'{self.width}x{self.height} {self.format.upper()}, {len(self.data) / 1024:.1f} KB, {how}'
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            text += (f'; downscaled from {self.source_width}x{self.source_height}, '
+                     f'multiply image coordinates by {self.scale:.3f} for screen pixels')
+        return text
+
+
+def downscale(image, max_dimension: int):
+    """Shrink ``image`` so its longest side is at most ``max_dimension``, averaging areas."""
+    from PIL import Image
+
+    width, height = image.size
+    longest = max(width, height)
+    if longest <= max_dimension:
+        return image
+    scale = max_dimension / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    factor = int(1 / scale)
+    if factor >= 2:
+        image = image.reduce(factor)  # whole-pixel box average, much cheaper than resampling
+    return image.resize(size, Image.Resampling.BOX)
+
+
+def encode_image(image, options: ImageOptions = ImageOptions()) -> EncodedImage:
+    """Encode a PIL image according to ``options``."""
+    started = time.perf_counter()
+    source_width, source_height = image.size
+    if options.grayscale:
+        image = image.convert('L')
+    if options.max_dimension is not None:
+        image = downscale(image, options.max_dimension)
+    buffer = io.BytesIO()
+    if options.format == 'png':
+        # Screen content compresses well even at the fastest deflate level.
+        image.save(buffer, format='PNG', compress_level=1)
+    elif options.format == 'jpeg':
+        image.save(buffer, format='JPEG', quality=options.quality)
+    else:
+        image.save(buffer, format='WEBP', quality=options.quality, method=4)
+    return EncodedImage(
+        data=buffer.getvalue(),
+        format=options.format,
+        width=image.width,
+        height=image.height,
+        source_width=source_width,
+        source_height=source_height,
+        encode_ms=(time.perf_counter() - started) * 1000,
+    )
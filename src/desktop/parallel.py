@@ -0,0 +1,185 @@
+"""Concurrent capture of every visible top-level window.
+
+UIA calls block on the target process, so walking windows one after another
+costs the sum of their capture times. :class:`ParallelCapture` hands each
+window handle to a small thread pool and merges the resulting element tables
+into one :class:`~.tree.TreeSnapshot`, costing roughly the slowest window.
+
+UIA objects are apartment-bound: a ``ua.Control`` created on one thread must
+not be used on another. Workers therefore receive window *handles*, resolve
+them with ``ControlFromHandle`` themselves, and every worker thread is COM
+initialized once through :func:`initialize_uia_thread`. Calling UIA from a
+thread that skipped this step is what produces the "CoInitialize has not been
+called" entries in ``@AutomationLog.txt``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set, Tuple
+
+import uiautomation as ua
+
+from .elements import ElementTable
+from .tree import TreeSnapshot, WindowCapture, automation
+
+
+# IUIAutomation constants (UIAutomationClient.h)
+_TREE_SCOPE_CHILDREN = 2
+_AUTOMATION_ELEMENT_MODE_NONE = 0
+
+_thread_state = threading.local()
+
+
+def initialize_uia_thread() -> None:
+    """COM-initialize the calling thread for UIA, once.
+
+    The initializer is parked in thread-local storage so it is released when
+    the thread exits. Safe to call repeatedly and on the main thread.
+    """
+    if getattr(_thread_state, 'initializer', None) is None:
+        _thread_state.initializer = ua.UIAutomationInitializerInThread()
+
+
+@dataclass
+class TopLevelWindow:
+    hwnd: int
+    name: str
+    process_id: int = 0
+
+
+def list_top_level_windows(max_windows: Optional[int] = None) -> List[TopLevelWindow]:
+    """Visible, named top-level windows, foreground window first.
+
+    Reads the desktop's direct children with one cache request instead of
+    querying each window's properties separately.
+    """
+    request = automation().CreateCacheRequest()
+    for property_id in (
+        ua.PropertyId.NameProperty,
+        ua.PropertyId.NativeWindowHandleProperty,
+        ua.PropertyId.ProcessIdProperty,
+        ua.PropertyId.IsOffscreenProperty,
+        ua.PropertyId.BoundingRectangleProperty,
+    ):
+        request.AddProperty(property_id)
+    request.TreeScope = _TREE_SCOPE_CHILDREN
+    request.AutomationElementMode = _AUTOMATION_ELEMENT_MODE_NONE
+    root = automation().GetRootElement().BuildUpdatedCache(request)
+    children = root.GetCachedChildren()
+
+    windows: List[TopLevelWindow] = []
+    for i in range(children.Length if children else 0):
+        element = children.GetElement(i)
+        rect = element.CachedBoundingRectangle
+        hwnd = element.CachedNativeWindowHandle
+        name = element.CachedName or ''
+        if not hwnd or not name or element.CachedIsOffscreen:
+            continue
+        if rect.right <= rect.left or rect.bottom <= rect.top:
+            continue
+        windows.append(TopLevelWindow(int(hwnd), name, int(element.CachedProcessId)))
+
+    foreground = ua.GetForegroundWindow()
+    windows.sort(key=lambda window: window.hwnd != foreground)  # stable: keeps z-order otherwise
+    return windows if max_windows is None else windows[:max_windows]
+
+
+class ParallelCapture:
+    """Walk several top-level windows concurrently into one merged snapshot.
+
+    ``capture_window(hwnd, max_depth, deadline)`` runs on a pool thread and
+    returns the window's :class:`ElementTable` and whether the walk finished
+    before ``deadline``, a ``time.perf_counter()`` value ``timeout`` seconds
+    after the capture started. Walks check it between round trips, so they
+    give their worker back on time unless a single provider call hangs.
+    Windows that fail, overrun ``timeout`` or find no free worker are reported
+    in :attr:`TreeSnapshot.windows` with an error; a walk cut short by the
+    deadline keeps the rows it read.
+    """
+
+    _GRACE = 0.25  # seconds past the deadline for a walk's last round trip
+
+    def __init__(
+        self,
+        capture_window: Callable[[int, Optional[int], float], Tuple[ElementTable, bool]],
+        max_workers: int = 4,
+        timeout: float = 10.0,
+        thread_initializer: Optional[Callable[[], None]] = initialize_uia_thread,
+    ):
+        self._capture_window = capture_window
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='clippy-uia-capture',
+            initializer=thread_initializer,
+        )
+        self._lock = threading.Lock()
+        self._stuck: Set[Future] = set()  # walks of earlier captures still holding a worker
+
+    def busy_workers(self) -> int:
+        """Workers still held by walks that timed out in an earlier capture."""
+        with self._lock:
+            return len(self._stuck)
+
+    def capture(self, windows: List[TopLevelWindow], max_depth: Optional[int] = None) -> TreeSnapshot:
+        """Capture ``windows``; the first one is reported as the focused window."""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        free = self.max_workers - self.busy_workers()
+        # Windows queued behind a hung walk would only wait out the timeout.
+        submitted = windows if free > 0 else []
+        futures = [self._executor.submit(self._timed, window.hwnd, max_depth, deadline) for window in submitted]
+        done, _ = wait(futures, timeout=self.timeout + self._GRACE)
+
+        tables: List[ElementTable] = []
+        captures: List[WindowCapture] = []
+        offset = 0
+        for i, window in enumerate(windows):
+            table, capture_ms, error = ElementTable.empty(), 0.0, ''
+            future = futures[i] if i < len(futures) else None
+            if future is None:
+                error = 'skipped: every capture worker is still busy with a timed-out walk'
+            elif future not in done:
+                if not future.cancel():
+                    self._hold(future)
+                capture_ms, error = self.timeout * 1000, 'timed out'
+            elif future.exception() is not None:
+                error = str(future.exception()) or type(future.exception()).__name__
+            else:
+                table, complete, capture_ms = future.result()
+                if not complete:
+                    error = f'timed out after {len(table)} elements; partial'
+            tables.append(table)
+            captures.append(WindowCapture(window.hwnd, window.name, offset, offset + len(table), capture_ms, error))
+            offset += len(table)
+
+        first = windows[0] if windows else TopLevelWindow(0, 'Unknown')
+        return TreeSnapshot(
+            hwnd=first.hwnd,
+            window_name=first.name,
+            elements=ElementTable.concat(tables),
+            capture_ms=(time.perf_counter() - started) * 1000,
+            windows=captures,
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _hold(self, future: Future) -> None:
+        with self._lock:
+            self._stuck.add(future)
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._stuck.discard(future)
+
+    def _timed(self, hwnd: int, max_depth: Optional[int], deadline: float):
+        started = time.perf_counter()
+        table, complete = self._capture_window(hwnd, max_depth, deadline)
+        return table, complete, (time.perf_counter() - started) * 1000
@@ -0,0 +1,243 @@
+"""Deadline- and element-budgeted tree traversal with continuation.
+
+The depth-first cache walk in :mod:`.tree` runs until every level down to
+``max_depth`` is read, however long that takes, and on very large trees
+(Visual Studio, Teams, big Explorer folders) what it has read when cut short
+is whatever subtree came first in document order. :class:`ProgressiveWalker`
+expands the tree one parent at a time as well, one ``FindAllBuildCache``
+round trip per parent, so it costs the same per element, but takes parents
+from a priority queue that favours on-screen, enabled and focusable elements,
+shallowest first. Between round trips it checks a time budget and an element
+budget; when either runs out it returns the rows gathered so far, which are
+the most useful ones, and parks the unexpanded frontier under a continuation
+token. Resuming with that token keeps appending to the same table.
+
+The frontier holds live UIA elements, and UIA objects must stay on the thread
+that created them, so every walk and every resume runs on one dedicated
+worker thread, initialized by the :class:`WalkSource`.
+:class:`UIAWalkSource` reads the foreground window; tests pass a fake.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .elements import FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_OFFSCREEN, ElementTableBuilder, TreeSnapshot
+
+
+ProgressCallback = Callable[[int, str], None]  # (elements so far, message)
+
+
+@dataclass
+class WalkBudget:
+    deadline: float = 5.0  # seconds per call, checked between round trips
+    walk_limit: int = 5000  # elements read per call; one parent's children may overshoot it
+    max_depth: int = 8
+
+
+@dataclass
+class ProgressiveResult:
+    snapshot: TreeSnapshot
+    complete: bool
+    continuation: Optional[str] = None  # resume token while the frontier is not empty
+    pending: int = 0  # unexpanded parents left in the frontier
+
+
+@dataclass
+class _WalkState:
+    hwnd: int
+    window_name: str
+    builder: ElementTableBuilder = field(default_factory=ElementTableBuilder)
+    frontier: List[Tuple[tuple, object, int, int]] = field(default_factory=list)  # (priority, element, depth, row)
+    elapsed_ms: float = 0.0
+    touched: float = field(default_factory=time.monotonic)
+
+
+def priority(flags: int, depth: int) -> Tuple[int, int, int, int]:
+    """Expansion order: on-screen, then enabled, then shallow, then focusable."""
+    return (
+        1 if flags & FLAG_OFFSCREEN else 0,
+        0 if flags & FLAG_ENABLED else 1,
+        depth,
+        0 if flags & FLAG_FOCUSABLE else 1,
+    )
+
+
+class WalkSource(ABC):
+    """The tree a :class:`ProgressiveWalker` reads, one parent at a time.
+
+    Every method runs on the walker's worker thread.
+    """
+
+    def initialize_thread(self) -> None:
+        """Prepare the worker thread, e.g. initialize COM."""
+
+    @abstractmethod
+    def root(self) -> Optional[Tuple[int, str, object]]:
+        """``(hwnd, window name, root element)`` of the window to walk, or None."""
+
+    @abstractmethod
+    def children(self, element) -> Sequence[object]:
+        """The element's children, ready for :meth:`append`. Raises if it went away."""
+
+    @abstractmethod
+    def append(self, builder: ElementTableBuilder, element, depth: int, parent: int) -> int:
+        """Append ``element`` to ``builder``; returns its row."""
+
+
+class UIAWalkSource(WalkSource):
+    """The foreground window, through UIA cache requests.
+
+    Full-mode cache requests keep frontier elements live so they can be
+    expanded later.
+    """
+
+    _TREE_SCOPE_CHILDREN = 2  # UIAutomationClient.h
+
+    def __init__(self):
+        self._request = None
+        self._condition = None
+
+    def initialize_thread(self) -> None:
+        from .parallel import initialize_uia_thread
+
+        initialize_uia_thread()
+
+    def root(self) -> Optional[Tuple[int, str, object]]:
+        import uiautomation as ua
+
+        from .tree import TreeWalker, automation
+
+        window = ua.GetForegroundControl()
+        if not window:
+            return None
+        if self._request is None:
+            self._request = TreeWalker.create_cache_request()
+            self._condition = automation().CreateTrueCondition()
+        return window.NativeWindowHandle, window.Name or 'Unknown', window.Element.BuildUpdatedCache(self._request)
+
+    def children(self, element) -> Sequence[object]:
+        children = element.FindAllBuildCache(self._TREE_SCOPE_CHILDREN, self._condition, self._request)
+        count = children.Length if children else 0
+        return [children.GetElement(i) for i in range(count)]
+
+    def append(self, builder: ElementTableBuilder, element, depth: int, parent: int) -> int:
+        from .tree import append_cached_element
+
+        return append_cached_element(builder, element, depth, parent)
+
+
+class ProgressiveWalker:
+    """Budgeted priority-BFS capture of the foreground window."""
+
+    def __init__(
+        self,
+        max_continuations: int = 8,
+        continuation_ttl: float = 120.0,
+        source: Optional[WalkSource] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.max_continuations = max_continuations
+        self.continuation_ttl = continuation_ttl
+        self.source = source or UIAWalkSource()
+        self._clock = clock
+        self._continuations: 'OrderedDict[str, _WalkState]' = OrderedDict()
+        self._counter = itertools.count(1)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='clippy-uia-progressive',
+            initializer=self.source.initialize_thread,
+        )
+
+    def start(self, budget: WalkBudget, on_progress: Optional[ProgressCallback] = None) -> ProgressiveResult:
+        return self._executor.submit(self._start, budget, on_progress).result()
+
+    def resume(self, token: str, budget: WalkBudget, on_progress: Optional[ProgressCallback] = None) -> ProgressiveResult:
+        """Continue a walk; raises KeyError if ``token`` is unknown or expired."""
+        with self._lock:
+            self._expire()
+            state = self._continuations.pop(token)
+        return self._executor.submit(self._run, state, budget, on_progress).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # -- worker thread -----------------------------------------------------
+
+    def _start(self, budget: WalkBudget, on_progress: Optional[ProgressCallback]) -> ProgressiveResult:
+        window = self.source.root()
+        if window is None:
+            return ProgressiveResult(TreeSnapshot.empty(), complete=True)
+        hwnd, name, root = window
+        state = _WalkState(hwnd, name)
+        row = self.source.append(state.builder, root, 0, -1)
+        if budget.max_depth > 0:
+            self._push(state, root, 0, row)
+        return self._run(state, budget, on_progress)
+
+    def _run(self, state: _WalkState, budget: WalkBudget, on_progress: Optional[ProgressCallback]) -> ProgressiveResult:
+        started = self._clock()
+        deadline = started + budget.deadline
+        limit = len(state.builder) + budget.walk_limit
+        builder = state.builder
+        while state.frontier and self._clock() < deadline and len(builder) < limit:
+            _, element, depth, parent = heapq.heappop(state.frontier)
+            try:
+                children = self.source.children(element)
+            except Exception:
+                continue  # the element went away since it was queued
+            for child in children:
+                try:
+                    row = self.source.append(builder, child, depth + 1, parent)
+                except Exception:
+                    continue
+                if depth + 1 < budget.max_depth:
+                    self._push(state, child, depth + 1, row)
+            if on_progress is not None and children:
+                on_progress(len(builder), f'{len(builder)} elements, {len(state.frontier)} parents queued, depth {depth + 1}')
+
+        state.elapsed_ms += (self._clock() - started) * 1000
+        snapshot = TreeSnapshot(
+            hwnd=state.hwnd,
+            window_name=state.window_name,
+            elements=builder.build(),
+            capture_ms=state.elapsed_ms,
+        )
+        if not state.frontier:
+            return ProgressiveResult(snapshot, complete=True)
+        return ProgressiveResult(snapshot, complete=False, continuation=self._park(state), pending=len(state.frontier))
+
+    def _push(self, state: _WalkState, element, depth: int, row: int) -> None:
+        key = priority(state.builder.flags(row), depth) + (next(self._seq),)
+        heapq.heappush(state.frontier, (key, element, depth, row))
+
+    # -- continuations -----------------------------------------------------
+
+    def _park(self, state: _WalkState) -> str:
+        with self._lock:
+            token = f"c{next(self._counter)}"
+            state.touched = time.monotonic()
+            self._continuations[token] = state
+            self._expire()
+            while len(self._continuations) > self.max_continuations:
+                self._release(self._continuations.popitem(last=False)[1])
+            return token
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.continuation_ttl
+        for token in [t for t, s in self._continuations.items() if s.touched < cutoff]:
+            self._release(self._continuations.pop(token))
+
+    def _release(self, state: _WalkState) -> None:
+        # Drop the frontier's UIA references on the thread that created them.
+        self._executor.submit(state.frontier.clear)
@@ -0,0 +1,368 @@
+"""CSS-like selectors evaluated against a captured :class:`ElementTable`.
+
+Grammar::
+
+    selector  := compound ( [ '>' ] compound )*      whitespace = descendant, '>' = child
+    compound  := [ type | '*' ] ( '#' id | '.' class | '[' attr op value ']' | ':' pseudo )*
+    attr      := name | value | id | class | type
+    op        := '=' exact | '*=' contains | '^=' prefix | '$=' suffix
+                 | '~=' regex | '%=' fuzzy (token-set ratio >= 80)
+    pseudo    := first | last | nth(N) | enabled | focused | focusable
+
+Types may be written with or without the ``Control`` suffix and in any case
+(``Button``, ``button`` or ``ButtonControl``); a type UIA does not define is a
+:class:`SelectorError`. Name, value, id and class comparisons are
+case-insensitive except for ``~=``, which uses the regex as given. Values may
+be quoted (``"Save as"``) or bare. ``:nth(N)`` is 1-based and, like
+``:first`` / ``:last``, picks from the matches of its compound in document
+order.
+
+Examples::
+
+    Button[name=Save]
+    Window > Pane Edit#SearchBox
+    List > ListItem[name*=report]:first
+    Text[name%="recieved mesage"]
+
+Exact name, automation id, class and type lookups go through hash indexes
+built once per snapshot, so a lookup only scans the rows that can match.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+from .elements import CONTROL_TYPE_NAMES, FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_FOCUSED, ElementTable
+
+
+FUZZY_THRESHOLD = 80
+
+_ATTRIBUTES = {
+    'name': 'name',
+    'value': 'value',
+    'id': 'automation_id',
+    'automationid': 'automation_id',
+    'class': 'class_name',
+    'classname': 'class_name',
+    'type': 'control_type',
+    'controltype': 'control_type',
+}
+_OPERATORS = ('*=', '^=', '$=', '~=', '%=', '=')
+_FLAG_PSEUDOS = {'enabled': FLAG_ENABLED, 'focused': FLAG_FOCUSED, 'focusable': FLAG_FOCUSABLE}
+_IDENT = re.compile(r'[A-Za-z0-9_\-]+')
+_CONTROL_TYPES = {name[:-len('Control')].lower(): name for name in CONTROL_TYPE_NAMES}
+
+
+class SelectorError(ValueError):
+    """Raised for a selector that does not parse."""
+
+    def __init__(self, message: str, selector: str, position: int):
+        super().__init__(f"{message} at position {position} in selector {selector!r}")
+        self.position = position
+
+
+@dataclass
+class Condition:
+    attribute: str  # one of the values of _ATTRIBUTES
+    operator: str
+    value: str
+
+
+@dataclass
+class Compound:
+    control_type: Optional[str] = None  # normalized '...Control' name, None for any
+    conditions: List[Condition] = field(default_factory=list)
+    flags: int = 0
+    pick: Optional[int] = None  # 0-based index into the matches; -1 for :last
+    combinator: str = ' '  # relation to the previous compound: ' ' descendant, '>' child
+
+
+def normalize_type(name: str) -> Optional[str]:
+    """The ``...Control`` name UIA uses for ``name``, or None if there is no such type."""
+    key = name.lower()
+    if key.endswith('control'):
+        key = key[:-len('control')]
+    return _CONTROL_TYPES.get(key)
+
+
+def parse(selector: str) -> List[Compound]:
+    """Parse ``selector`` into a chain of compounds; raises :class:`SelectorError`."""
+    return _Parser(selector).parse()
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def error(self, message: str) -> SelectorError:
+        return SelectorError(message, self.text, self.pos)
+
+    def peek(self) -> str:
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def skip_space(self) -> bool:
+        start = self.pos
+        while self.peek().isspace():
+            self.pos += 1
+        return self.pos > start
+
+    def ident(self) -> str:
+        match = _IDENT.match(self.text, self.pos)
+        if not match:
+            raise self.error("Expected an identifier")
+        self.pos = match.end()
+        return match.group()
+
+    def control_type(self, name: str, position: int) -> str:
+        control_type = normalize_type(name)
+        if control_type is None:
+            raise SelectorError(f"Unknown control type {name!r}", self.text, position)
+        return control_type
+
+    def parse(self) -> List[Compound]:
+        chain: List[Compound] = []
+        self.skip_space()
+        if not self.peek():
+            raise self.error("Empty selector")
+        combinator = ' '
+        while True:
+            compound = self.compound()
+            compound.combinator = combinator
+            chain.append(compound)
+            spaced = self.skip_space()
+            if not self.peek():
+                return chain
+            if self.peek() == '>':
+                self.pos += 1
+                self.skip_space()
+                combinator = '>'
+            elif spaced:
+                combinator = ' '
+            else:
+                raise self.error(f"Unexpected {self.peek()!r}")
+
+    def compound(self) -> Compound:
+        compound = Compound()
+        start = self.pos
+        if self.peek() == '*':
+            self.pos += 1
+        elif _IDENT.match(self.text, self.pos):
+            compound.control_type = self.control_type(self.ident(), start)
+        while True:
+            char = self.peek()
+            if char == '#':
+                self.pos += 1
+                compound.conditions.append(Condition('automation_id', '=', self.ident()))
+            elif char == '.':
+                self.pos += 1
+                compound.conditions.append(Condition('class_name', '=', self.ident()))
+            elif char == '[':
+                self.pos += 1
+                compound.conditions.append(self.attribute())
+            elif char == ':':
+                self.pos += 1
+                self.pseudo(compound)
+            else:
+                break
+        if self.pos == start:
+            raise self.error("Expected a type, '*', '#', '.', '[' or ':'")
+        return compound
+
+    def attribute(self) -> Condition:
+        self.skip_space()
+        name = self.ident().lower()
+        if name not in _ATTRIBUTES:
+            raise self.error(f"Unknown attribute {name!r}")
+        self.skip_space()
+        operator = next((op for op in _OPERATORS if self.text.startswith(op, self.pos)), None)
+        if operator is None:
+            raise self.error("Expected an operator")
+        self.pos += len(operator)
+        self.skip_space()
+        value_start = self.pos
+        value = self.value()
+        self.skip_space()
+        if self.peek() != ']':
+            raise self.error("Expected ']'")
+        self.pos += 1
+        attribute = _ATTRIBUTES[name]
+        if attribute == 'control_type' and operator == '=':
+            value = self.control_type(value, value_start)
+        elif operator == '~=':
+            try:
+                re.compile(value)
+            except re.error as e:
+                quoted = self.text[value_start] in ('"', "'")
+                raise SelectorError(f"Invalid regex: {e.msg}", self.text, value_start + quoted + (e.pos or 0)) from None
+        return Condition(attribute, operator, value)
+
+    def value(self) -> str:
+        quote = self.peek()
+        if quote in ('"', "'"):
+            end = self.text.find(quote, self.pos + 1)
+            if end < 0:
+                raise self.error("Unterminated string")
+            value = self.text[self.pos + 1:end]
+            self.pos = end + 1
+            return value
+        end = self.text.find(']', self.pos)
+        if end < 0:
+            raise self.error("Expected ']'")
+        value = self.text[self.pos:end].strip()
+        self.pos = end
+        return value
+
+    def pseudo(self, compound: Compound) -> None:
+        name = self.ident().lower()
+        if name in _FLAG_PSEUDOS:
+            compound.flags |= _FLAG_PSEUDOS[name]
+        elif name == 'first':
+            compound.pick = 0
+        elif name == 'last':
+            compound.pick = -1
+        elif name == 'nth':
+            match = re.compile(r'\(\s*(\d+)\s*\)').match(self.text, self.pos)
+            if not match or int(match.group(1)) < 1:
+                raise self.error("Expected :nth(N) with N >= 1")
+            self.pos = match.end()
+            compound.pick = int(match.group(1)) - 1
+        else:
+            raise self.error(f"Unknown pseudo-class ':{name}'")
+
+
+class SelectorIndex:
+    """Hash indexes over one :class:`ElementTable` for selector evaluation."""
+
+    def __init__(self, table: ElementTable):
+        self.table = table
+        self._columns: Dict[str, List[str]] = {
+            'name': table.names,
+            'value': table.values,
+            'automation_id': table.automation_ids,
+            'class_name': table.class_names,
+        }
+        self._lowered: Dict[str, List[str]] = {}
+        self._exact: Dict[str, Dict[str, np.ndarray]] = {}
+        for attribute in ('name', 'automation_id', 'class_name'):
+            buckets: Dict[str, List[int]] = {}
+            for row, text in enumerate(self.lowered(attribute)):
+                buckets.setdefault(text, []).append(row)
+            self._exact[attribute] = {text: np.asarray(rows, dtype=np.intp) for text, rows in buckets.items()}
+
+    def lowered(self, attribute: str) -> List[str]:
+        lowered = self._lowered.get(attribute)
+        if lowered is None:
+            lowered = self._lowered[attribute] = [text.casefold() for text in self._columns[attribute]]
+        return lowered
+
+    def select(self, selector: str, limit: Optional[int] = None) -> np.ndarray:
+        """Row indices matching ``selector``, in document order."""
+        rows: Optional[np.ndarray] = None
+        for compound in parse(selector):
+            matches = self._match(compound)
+            if rows is not None:
+                matches = self._related(matches, rows, compound.combinator)
+            if compound.pick is not None:
+                if not len(matches) or compound.pick >= len(matches):
+                    matches = matches[:0]
+                else:
+                    matches = matches[[compound.pick]]
+            rows = matches
+            if not len(rows):
+                break
+        return rows if limit is None else rows[:limit]
+
+    def _match(self, compound: Compound) -> np.ndarray:
+        table = self.table
+        candidates: Optional[np.ndarray] = None
+        remaining: List[Condition] = []
+        # Start from the narrowest exact-match index available.
+        for condition in compound.conditions:
+            if condition.operator == '=' and condition.attribute in self._exact:
+                hits = self._exact[condition.attribute].get(condition.value.casefold(), np.empty(0, dtype=np.intp))
+                candidates = hits if candidates is None else np.intersect1d(candidates, hits, assume_unique=True)
+            else:
+                remaining.append(condition)
+        if compound.control_type is not None:
+            remaining.append(Condition('control_type', '=', compound.control_type))
+        if candidates is None:
+            candidates = np.arange(len(table), dtype=np.intp)
+        for condition in remaining:
+            if not len(candidates):
+                break
+            candidates = candidates[self._test(condition, candidates)]
+        if compound.flags and len(candidates):
+            candidates = candidates[(table.flags[candidates] & compound.flags) == compound.flags]
+        return candidates
+
+    def _test(self, condition: Condition, rows: np.ndarray) -> np.ndarray:
+        if condition.attribute == 'control_type':
+            return self._test_type(condition, rows)
+        predicate = self._predicate(condition)
+        column = self._columns[condition.attribute] if condition.operator == '~=' else self.lowered(condition.attribute)
+        return np.fromiter((predicate(column[row]) for row in rows.tolist()), dtype=bool, count=len(rows))
+
+    def _test_type(self, condition: Condition, rows: np.ndarray) -> np.ndarray:
+        table = self.table
+        if condition.operator == '=':
+            return table.type_mask((condition.value,))[rows]
+        predicate = self._predicate(condition)
+        column = table.control_types if condition.operator == '~=' else [t.casefold() for t in table.control_types]
+        codes = [code for code, name in enumerate(column) if predicate(name)]
+        return np.isin(table.type_codes[rows], codes)
+
+    @staticmethod
+    def _predicate(condition: Condition) -> Callable[[str], bool]:
+        operator = condition.operator
+        if operator == '~=':
+            return re.compile(condition.value).search
+        value = condition.value.casefold()
+        if operator == '=':
+            return value.__eq__
+        if operator == '*=':
+            return lambda text: value in text
+        if operator == '^=':
+            return lambda text: text.startswith(value)
+        if operator == '$=':
+            return lambda text: text.endswith(value)
+        return lambda text: bool(text) and fuzz.token_set_ratio(value, text) >= FUZZY_THRESHOLD
+
+    def _related(self, rows: np.ndarray, ancestors: np.ndarray, combinator: str) -> np.ndarray:
+        """Keep ``rows`` whose parent (``>``) or any ancestor (`` ``) is in ``ancestors``."""
+        parents = self.table.parents
+        wanted = np.zeros(len(self.table), dtype=bool)
+        wanted[ancestors] = True
+        current = parents[rows]
+        if combinator == '>':
+            return rows[(current >= 0) & wanted[np.maximum(current, 0)]]
+        hit = np.zeros(len(rows), dtype=bool)
+        # Climb one level per iteration for all rows at once.
+        while True:
+            live = current >= 0
+            if not live.any():
+                break
+            hit |= live & wanted[np.maximum(current, 0)]
+            current = np.where(live & ~hit, parents[np.maximum(current, 0)], -1)
+        return rows[hit]
+
+
+def describe(table: ElementTable, rows: np.ndarray) -> str:
+    """One line per row: label, type, automation id, click point and bounds."""
+    lines = []
+    for row in rows.tolist():
+        element = table[row]
+        label = element.name or element.value or 'Unnamed'
+        automation_id = f" #{element.automation_id}" if element.automation_id else ''
+        x, y = element.center
+        left, top, right, bottom = element.rect
+        lines.append(
+            f"- {label} ({element.control_type}{automation_id}) at ({x}, {y}) "
+            f"rect=({left}, {top}, {right}, {bottom})"
+        )
+    return "\n".join(lines)
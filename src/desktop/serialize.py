@@ -0,0 +1,344 @@
+"""Budgeted, relevance-ranked rendering of State-Tool output.
+
+State-Tool output size drives model latency and cost per step, so the server
+decides deterministically what fits. Every reported element gets a relevance
+score, and the best ones are kept until ``max_elements`` or ``max_chars``
+would be exceeded. The survivors are then printed in capture order, so the
+listing still reads top to bottom. The score combines:
+
+- on-screen: the measured visible share of the element, or visible,
+  non-empty bounds when visibility was not measured,
+- enabled, and interactive or keyboard-focusable,
+- focus proximity: the focused element itself, then distance to it,
+- recent change: new or changed since the previous snapshot.
+
+Three encodings are available. ``text`` is the classic sectioned listing.
+``json`` is one object with an ``elements`` array. ``tsv`` has one row per
+element, with control types interned into a ``#types`` legend.
+
+Diffs against an earlier snapshot go through the same budgets and encodings
+with :func:`render_diff`: text changes are kept first, then additions, moves
+and removals.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .elements import FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_FOCUSED, FLAG_OFFSCREEN, INTERACTIVE_CONTROL_TYPES, ElementTable, UIElement
+from .snapshots import TreeDiff, text_changes
+from .state import DesktopState, TreeState
+
+
+FORMATS = ('text', 'json', 'tsv')
+
+_FOCUS_RADIUS = 400.0  # px over which focus proximity decays by 1/e
+
+_TSV_CATEGORIES = {'interactive': 'i', 'informative': 't', 'scrollable': 's'}
+
+_TSV_CHANGES = {'changed': 'c', 'added': 'a', 'moved': 'm', 'removed': 'r'}
+
+
+def relevance(
+    table: ElementTable,
+    rows: np.ndarray,
+    changed: Optional[np.ndarray] = None,
+    visible: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Score ``rows`` of ``table``; higher is more relevant.
+
+    ``visible`` is the visible share of every table row, if measured.
+    """
+    flags = table.flags[rows]
+    rects = table.rects[rows].astype(np.float64)
+    on_screen = ((flags & FLAG_OFFSCREEN) == 0) & (rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1])
+    score = 4.0 * (on_screen * visible[rows] if visible is not None else on_screen)
+    score += 1.0 * ((flags & FLAG_ENABLED) != 0)
+    score += 2.0 * table.type_mask(INTERACTIVE_CONTROL_TYPES)[rows]
+    score += 1.0 * ((flags & FLAG_FOCUSABLE) != 0)
+
+    focused = np.flatnonzero(table.flags & FLAG_FOCUSED)
+    if len(focused):
+        focus = table.rects[focused[-1]].astype(np.float64)  # innermost focused element
+        fx, fy = (focus[0] + focus[2]) / 2, (focus[1] + focus[3]) / 2
+        cx, cy = (rects[:, 0] + rects[:, 2]) / 2, (rects[:, 1] + rects[:, 3]) / 2
+        score += 3.0 * np.exp(-np.hypot(cx - fx, cy - fy) / _FOCUS_RADIUS)
+        score += 8.0 * ((flags & FLAG_FOCUSED) != 0)
+
+    if changed is not None and len(changed):
+        score += 3.0 * np.isin(rows, changed)
+    return score
+
+
+def rank(
+    table: ElementTable,
+    rows: np.ndarray,
+    changed: Optional[np.ndarray] = None,
+    visible: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """``rows`` ordered from most to least relevant; ties keep capture order."""
+    if not len(rows):
+        return rows
+    order = np.argsort(-relevance(table, rows, changed, visible), kind='stable')
+    return rows[order]
+
+
+def render_state(
+    state: DesktopState,
+    format: str = 'text',
+    max_chars: Optional[int] = None,
+    max_elements: Optional[int] = None,
+    token: Optional[str] = None,
+    changed: Optional[np.ndarray] = None,
+    notes: Sequence[str] = (),
+) -> str:
+    """Render ``state`` within the element and character budgets.
+
+    ``changed`` holds rows that are new or changed since the previous
+    snapshot. ``notes`` are appended verbatim (as a list in JSON).
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+    tree_state = state.tree_state
+    ranked = rank(tree_state.elements, tree_state.rows(), changed, tree_state.visible)
+    if max_elements is not None:
+        ranked = ranked[:max(max_elements, 0)]
+
+    def render(count: int) -> str:
+        keep = np.zeros(len(tree_state.elements), dtype=bool)
+        keep[ranked[:count]] = True
+        subset = tree_state.subset(keep)
+        omitted = len(tree_state.rows()) - count
+        return _RENDERERS[format](state, subset, omitted, token, notes)
+
+    return _fit(render, len(ranked), max_chars)
+
+
+def render_diff(
+    state: DesktopState,
+    diff: TreeDiff,
+    format: str = 'text',
+    max_chars: Optional[int] = None,
+    max_elements: Optional[int] = None,
+    notes: Sequence[str] = (),
+) -> str:
+    """Render the changes in ``diff`` within the element and character budgets."""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+    count = len(diff) if max_elements is None else min(len(diff), max(max_elements, 0))
+
+    def render(count: int) -> str:
+        return _DIFF_RENDERERS[format](state, diff.head(count), len(diff) - count, notes)
+
+    return _fit(render, count, max_chars)
+
+
+def _fit(render: Callable[[int], str], count: int, max_chars: Optional[int]) -> str:
+    """``render(n)`` for the largest ``n <= count`` whose output fits ``max_chars``."""
+    text = render(count)
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    # Largest prefix of the ranking that fits; output length grows with count.
+    low, high = 0, count - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(render(middle)) <= max_chars:
+            low = middle
+        else:
+            high = middle - 1
+    return render(low)
+
+
+def _render_text(state: DesktopState, subset: TreeState, omitted: int, token: Optional[str], notes: Sequence[str]) -> str:
+    sections = []
+    if token:
+        sections.append(f"Snapshot: {token}")
+    sections += [
+        f"Focused App:\n{state.active_app_to_string()}",
+        f"Opened Apps:\n{state.apps_to_string()}",
+        "List of Interactive Elements:\n" + (subset.interactive_elements_to_string() or 'No interactive elements found.'),
+        "List of Informative Elements:\n" + (subset.informative_elements_to_string() or 'No informative elements found.'),
+        "List of Scrollable Elements:\n" + (subset.scrollable_elements_to_string() or 'No scrollable elements found.'),
+    ]
+    if omitted:
+        sections.append(f"{omitted} less relevant elements omitted to fit the output budget.")
+    if subset.hidden:
+        sections.append(f"{subset.hidden} elements covered by other windows or off-screen were left out; pass include_hidden=True to list them.")
+    windows = _window_lines(state)
+    if windows:
+        sections.append("Captured Windows:\n" + "\n".join(windows))
+    sections += list(notes)
+    return "\n\n".join(sections)
+
+
+def _render_json(state: DesktopState, subset: TreeState, omitted: int, token: Optional[str], notes: Sequence[str]) -> str:
+    table = subset.elements
+    categories = _categories(subset)
+    elements = []
+    for row in subset.rows().tolist():
+        flags = int(table.flags[row])
+        element = {
+            'row': row,
+            'category': categories[row],
+            'type': table.type_name(row),
+            'name': table.names[row],
+            'rect': table.rects[row].tolist(),
+        }
+        if table.values[row]:
+            element['value'] = table.values[row]
+        if table.automation_ids[row]:
+            element['automation_id'] = table.automation_ids[row]
+        if not flags & FLAG_ENABLED:
+            element['enabled'] = False
+        if flags & FLAG_FOCUSED:
+            element['focused'] = True
+        if subset.visible is not None and subset.visible[row] < 1:
+            element['visible'] = round(float(subset.visible[row]), 2)
+        elements.append(element)
+    document: Dict[str, object] = {
+        'snapshot': token,
+        'focused_app': state.active_app,
+        'apps': state.apps,
+        'elements': elements,
+        'omitted': omitted,
+        'hidden': subset.hidden,
+    }
+    snapshot = state.snapshot
+    if snapshot is not None and snapshot.windows:
+        document['windows'] = [
+            {'name': w.name, 'hwnd': w.hwnd, 'rows': [w.start, w.stop], 'capture_ms': round(w.capture_ms, 1), 'error': w.error or None}
+            for w in snapshot.windows
+        ]
+    if notes:
+        document['notes'] = list(notes)
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+
+def _render_tsv(state: DesktopState, subset: TreeState, omitted: int, token: Optional[str], notes: Sequence[str]) -> str:
+    table = subset.elements
+    categories = _categories(subset)
+    rows = subset.rows().tolist()
+    used = sorted({int(table.type_codes[row]) for row in rows})
+    lines = [
+        f"#snapshot\t{token or ''}",
+        f"#focused\t{_clean(state.active_app)}",
+        *(f"#app\t{_clean(app)}" for app in state.apps),
+        "#types\t" + "\t".join(f"{code}={table.control_types[code].removesuffix('Control')}" for code in used),
+        "#cats\t" + "\t".join(f"{code}={name}" for name, code in _TSV_CATEGORIES.items()),
+        "#cols\trow\tcat\ttype\tx\ty\tw\th\tflags\tname\tvalue",
+    ]
+    for row in rows:
+        left, top, right, bottom = table.rects[row].tolist()
+        lines.append(
+            f"{row}\t{_TSV_CATEGORIES[categories[row]]}\t{table.type_codes[row]}\t{left}\t{top}\t{right - left}\t{bottom - top}"
+            f"\t{table.flags[row]}\t{_clean(table.names[row])}\t{_clean(table.values[row])}"
+        )
+    if omitted:
+        lines.append(f"#omitted\t{omitted}")
+    if subset.hidden:
+        lines.append(f"#hidden\t{subset.hidden}")
+    lines += [f"#window\t{line[2:]}" for line in _window_lines(state)]
+    lines += [f"#note\t{_clean(note)}" for note in notes]
+    return "\n".join(lines)
+
+
+_RENDERERS = {'text': _render_text, 'json': _render_json, 'tsv': _render_tsv}
+
+
+def _diff_header(diff: TreeDiff) -> str:
+    return f"Snapshot: {diff.token} (changes since {diff.base_token})"
+
+
+def _render_diff_text(state: DesktopState, diff: TreeDiff, omitted: int, notes: Sequence[str]) -> str:
+    sections = [_diff_header(diff), f"Focused App:\n{state.active_app_to_string()}"]
+    if not diff.is_empty() or not omitted:
+        sections.append(diff.to_string())
+    if omitted:
+        sections.append(f"{omitted} more changes omitted to fit the output budget.")
+    sections += list(notes)
+    return "\n\n".join(sections)
+
+
+def _render_diff_json(state: DesktopState, diff: TreeDiff, omitted: int, notes: Sequence[str]) -> str:
+    document: Dict[str, object] = {
+        'snapshot': diff.token,
+        'since': diff.base_token,
+        'focused_app': state.active_app,
+        'changed': [
+            {**_element_json(new), 'before': {k: v for k, v in (('name', old.name), ('value', old.value)) if v != getattr(new, k)}}
+            for old, new in diff.changed
+        ],
+        'added': [_element_json(e) for e in diff.added],
+        'moved': [{**_element_json(new), 'from': list(old.rect)} for old, new in diff.moved],
+        'removed': [_element_json(e) for e in diff.removed],
+        'omitted': omitted,
+    }
+    if notes:
+        document['notes'] = list(notes)
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+
+def _element_json(element: UIElement) -> Dict[str, object]:
+    document: Dict[str, object] = {'type': element.control_type, 'name': element.name, 'rect': list(element.rect)}
+    if element.value:
+        document['value'] = element.value
+    if element.automation_id:
+        document['automation_id'] = element.automation_id
+    return document
+
+
+def _render_diff_tsv(state: DesktopState, diff: TreeDiff, omitted: int, notes: Sequence[str]) -> str:
+    entries = [
+        *(('changed', new, text_changes(old, new)) for old, new in diff.changed),
+        *(('added', e, '') for e in diff.added),
+        *(('moved', new, '{},{}'.format(*old.rect[:2])) for old, new in diff.moved),
+        *(('removed', e, '') for e in diff.removed),
+    ]
+    codes: Dict[str, int] = {}
+    for _, element, _ in entries:
+        codes.setdefault(element.control_type, len(codes))
+    lines = [
+        f"#snapshot\t{diff.token}",
+        f"#since\t{diff.base_token}",
+        f"#focused\t{_clean(state.active_app)}",
+        "#types\t" + "\t".join(f"{code}={name.removesuffix('Control')}" for name, code in codes.items()),
+        "#changes\t" + "\t".join(f"{code}={name}" for name, code in _TSV_CHANGES.items()),
+        "#cols\tchange\ttype\tx\ty\tw\th\tname\tvalue\tbefore",
+    ]
+    for change, element, before in entries:
+        left, top, right, bottom = element.rect
+        lines.append(
+            f"{_TSV_CHANGES[change]}\t{codes[element.control_type]}\t{left}\t{top}\t{right - left}\t{bottom - top}"
+            f"\t{_clean(element.name)}\t{_clean(element.value)}\t{_clean(before)}"
+        )
+    if omitted:
+        lines.append(f"#omitted\t{omitted}")
+    lines += [f"#note\t{_clean(note)}" for note in notes]
+    return "\n".join(lines)
+
+
+_DIFF_RENDERERS = {'text': _render_diff_text, 'json': _render_diff_json, 'tsv': _render_diff_tsv}
+
+
+def _categories(state: TreeState) -> Dict[int, str]:
+    categories: Dict[int, str] = {}
+    for name, rows in (('scrollable', state.scrollable), ('informative', state.informative), ('interactive', state.interactive)):
+        categories.update(dict.fromkeys(rows.tolist(), name))
+    return categories
+
+
+def _window_lines(state: DesktopState) -> List[str]:
+    snapshot = state.snapshot
+    if snapshot is None:
+        return []
+    return [
+        f"- {w.name}: {w.stop - w.start} elements in {w.capture_ms:.0f} ms" + (f" ({w.error})" if w.error else '')
+        for w in snapshot.windows
+    ]
+
+
+def _clean(text: str) -> str:
+    return text.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
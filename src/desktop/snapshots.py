@@ -0,0 +1,250 @@
+"""Server-side snapshot store and RuntimeId-keyed tree diffs.
+
+State-Tool hands out a snapshot token with every response. Passing that token
+back as ``since`` returns only what changed: elements that appeared,
+disappeared, moved or changed text, matched across captures by their UIA
+RuntimeId. Snapshots are kept in a small LRU bounded both by count and by the
+total number of elements held, so a long-lived server does not grow without
+limit.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .elements import (
+    INFORMATIVE_CONTROL_TYPES,
+    INTERACTIVE_CONTROL_TYPES,
+    SCROLLABLE_CONTROL_TYPES,
+    ElementTable,
+    TreeSnapshot,
+    UIElement,
+)
+
+
+REPORTED_CONTROL_TYPES = INTERACTIVE_CONTROL_TYPES | INFORMATIVE_CONTROL_TYPES | SCROLLABLE_CONTROL_TYPES
+
+
+def element_keys(table: ElementTable) -> List[Hashable]:
+    """Identity of every row of ``table`` across captures.
+
+    UIA RuntimeIds are stable for the lifetime of an element. A few providers
+    return none, in which case the control type, name and the occurrence
+    number of that pair stand in.
+    """
+    keys: List[Hashable] = []
+    seen: Dict[Tuple[int, str], int] = {}
+    for i, runtime_id in enumerate(table.runtime_ids):
+        if runtime_id:
+            keys.append(runtime_id)
+            continue
+        pair = (int(table.type_codes[i]), table.names[i])
+        occurrence = seen.get(pair, 0)
+        seen[pair] = occurrence + 1
+        keys.append((table.type_name(i), table.names[i], occurrence))
+    return keys
+
+
+def _label(element: UIElement) -> str:
+    return f"{element.name or element.value or 'Unnamed'} ({element.control_type})"
+
+
+def text_changes(old: UIElement, new: UIElement) -> str:
+    """The text fields that differ, e.g. ``value: "a" -> "ab"``."""
+    changes = [
+        f'{field_name}: "{before}" -> "{after}"'
+        for field_name, before, after in (('name', old.name, new.name), ('value', old.value, new.value))
+        if before != after
+    ]
+    return "; ".join(changes)
+
+
+@dataclass
+class TreeDiff:
+    """Changes between two snapshots of the reported elements."""
+
+    base_token: str
+    token: str
+    added: List[UIElement] = field(default_factory=list)
+    removed: List[UIElement] = field(default_factory=list)
+    moved: List[Tuple[UIElement, UIElement]] = field(default_factory=list)
+    changed: List[Tuple[UIElement, UIElement]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.moved or self.changed)
+
+    def __len__(self) -> int:
+        return len(self.changed) + len(self.added) + len(self.moved) + len(self.removed)
+
+    def head(self, count: int) -> 'TreeDiff':
+        """The first ``count`` entries, taking text changes first, then
+        additions, moves and removals, each in capture order."""
+        head = TreeDiff(base_token=self.base_token, token=self.token)
+        for name in ('changed', 'added', 'moved', 'removed'):
+            entries = getattr(self, name)[:max(count, 0)]
+            setattr(head, name, entries)
+            count -= len(entries)
+        return head
+
+    def to_string(self) -> str:
+        if self.is_empty():
+            return f"No changes since snapshot {self.base_token}."
+        sections = []
+        if self.added:
+            lines = [f"- {_label(e)} at {e.rect[:2]}" for e in self.added]
+            sections.append("Added Elements:\n" + "\n".join(lines))
+        if self.removed:
+            lines = [f"- {_label(e)}" for e in self.removed]
+            sections.append("Removed Elements:\n" + "\n".join(lines))
+        if self.moved:
+            lines = [f"- {_label(new)} {old.rect[:2]} -> {new.rect[:2]}" for old, new in self.moved]
+            sections.append("Moved Elements:\n" + "\n".join(lines))
+        if self.changed:
+            lines = [
+                f"- {_label(new)} at {new.rect[:2]}: {text_changes(old, new)}"
+                for old, new in self.changed
+            ]
+            sections.append("Changed Elements:\n" + "\n".join(lines))
+        return "\n\n".join(sections)
+
+
+def diff_elements(old: ElementTable, new: ElementTable, base_token: str = '', token: str = '') -> TreeDiff:
+    """Compare two element tables by RuntimeId.
+
+    Text changes (name or value) win over moves: an element that both moved
+    and changed text is reported once, under ``changed``, at its new position.
+    Rect comparison is vectorized; rows are only materialized for reported
+    changes.
+    """
+    before = {key: i for i, key in enumerate(element_keys(old))}
+    added: List[int] = []
+    old_rows: List[int] = []
+    new_rows: List[int] = []
+    for j, key in enumerate(element_keys(new)):
+        i = before.pop(key, None)
+        if i is None:
+            added.append(j)
+        else:
+            old_rows.append(i)
+            new_rows.append(j)
+
+    diff = TreeDiff(base_token=base_token, token=token)
+    diff.added = new.rows(added)
+    diff.removed = old.rows(sorted(before.values()))
+    if old_rows:
+        text_changed = np.fromiter(
+            (
+                old.names[i] != new.names[j] or old.values[i] != new.values[j]
+                for i, j in zip(old_rows, new_rows)
+            ),
+            dtype=bool,
+            count=len(old_rows),
+        )
+        moved = np.any(old.rects[old_rows] != new.rects[new_rows], axis=1) & ~text_changed
+        diff.changed = [(old[old_rows[k]], new[new_rows[k]]) for k in np.flatnonzero(text_changed)]
+        diff.moved = [(old[old_rows[k]], new[new_rows[k]]) for k in np.flatnonzero(moved)]
+    return diff
+
+
+def changed_mask(old: ElementTable, new: ElementTable) -> np.ndarray:
+    """Boolean mask over ``new``: rows that are new or whose text or rect differ from ``old``."""
+    before = {key: i for i, key in enumerate(element_keys(old))}
+    mask = np.ones(len(new), dtype=bool)
+    for j, key in enumerate(element_keys(new)):
+        i = before.get(key)
+        if i is not None:
+            mask[j] = (
+                old.names[i] != new.names[j]
+                or old.values[i] != new.values[j]
+                or bool(np.any(old.rects[i] != new.rects[j]))
+            )
+    return mask
+
+
+class SnapshotStore:
+    """Bounded LRU of captured element tables, addressed by opaque tokens.
+
+    Only the element types State-Tool reports are retained. Re-storing the
+    snapshot that was stored last (e.g. a tree cache hit) returns the same
+    token instead of a duplicate entry.
+    """
+
+    def __init__(self, max_snapshots: int = 32, max_elements: int = 50_000):
+        self.max_snapshots = max_snapshots
+        self.max_elements = max_elements
+        self._entries: 'OrderedDict[str, ElementTable]' = OrderedDict()
+        self._total_elements = 0
+        self._counter = 0
+        self._last: Optional[Tuple[TreeSnapshot, str]] = None
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def put(self, snapshot: TreeSnapshot) -> str:
+        with self._lock:
+            if self._last is not None and self._last[0] is snapshot and self._last[1] in self._entries:
+                token = self._last[1]
+                self._entries.move_to_end(token)
+                return token
+            self._counter += 1
+            token = f"s{self._counter}"
+            table = snapshot.elements
+            elements = table.take(table.indices_of(REPORTED_CONTROL_TYPES))
+            self._entries[token] = elements
+            self._total_elements += len(elements)
+            self._last = (snapshot, token)
+            self._evict()
+            return token
+
+    def get(self, token: str) -> Optional[ElementTable]:
+        with self._lock:
+            elements = self._entries.get(token)
+            if elements is not None:
+                self._entries.move_to_end(token)
+            return elements
+
+    def previous(self, token: str) -> Optional[ElementTable]:
+        """The snapshot stored immediately before ``token``, if still held."""
+        with self._lock:
+            if token not in self._entries:
+                return None
+            ordered = sorted(self._entries, key=lambda t: int(t[1:]))
+            position = ordered.index(token)
+            return self._entries[ordered[position - 1]] if position > 0 else None
+
+    def recently_changed(self, token: str, table: ElementTable) -> Optional[np.ndarray]:
+        """Rows of ``table`` (the full capture stored as ``token``) that changed since the previous snapshot."""
+        old = self.previous(token)
+        new = self.get(token)
+        if old is None or new is None:
+            return None
+        return table.indices_of(REPORTED_CONTROL_TYPES)[changed_mask(old, new)]
+
+    def diff(self, since: str, token: str) -> Optional[TreeDiff]:
+        """Diff two stored snapshots; ``None`` if either has been evicted."""
+        old = self.get(since)
+        new = self.get(token)
+        if old is None or new is None:
+            return None
+        return diff_elements(old, new, base_token=since, token=token)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'snapshots': len(self._entries),
+                'elements': self._total_elements,
+                'evictions': self._evictions,
+            }
+
+    def _evict(self) -> None:
+        # Always keep the newest entry, even if it alone exceeds the budget.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_snapshots or self._total_elements > self.max_elements
+        ):
+            _, elements = self._entries.popitem(last=False)
+            self._total_elements -= len(elements)
+            self._evictions += 1
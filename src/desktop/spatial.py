@@ -0,0 +1,136 @@
+"""Uniform-grid spatial index over captured element bounds.
+
+Built once per :class:`~.tree.TreeSnapshot` and answering, without any COM
+traffic:
+
+- :meth:`SpatialIndex.at` -- the innermost element containing a point,
+- :meth:`SpatialIndex.nearest` -- the ``k`` elements closest to a point,
+- :meth:`SpatialIndex.within` -- elements inside (or overlapping) a rect.
+
+Elements are bucketed into square cells of ``cell_size`` pixels. Rects that
+would span more than ``max_cells`` cells (windows, panes, documents) are kept
+in a separate "large" list that every point query checks directly, so one
+full-screen pane does not land in every bucket.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .elements import FLAG_OFFSCREEN, ElementTable
+
+
+class SpatialIndex:
+    """Point, nearest-neighbour and range queries over an :class:`ElementTable`.
+
+    Zero-sized and offscreen elements are not indexed. Query results are row
+    indices into ``table``.
+    """
+
+    def __init__(self, table: ElementTable, cell_size: int = 64, max_cells: int = 64):
+        self.table = table
+        self.cell_size = cell_size
+        rects = table.rects
+        visible = (
+            (rects[:, 2] > rects[:, 0])
+            & (rects[:, 3] > rects[:, 1])
+            & ~table.flag_mask(FLAG_OFFSCREEN)
+        )
+        self._rows = np.flatnonzero(visible)
+        self._areas = (
+            (rects[:, 2].astype(np.int64) - rects[:, 0]) * (rects[:, 3].astype(np.int64) - rects[:, 1])
+        )
+
+        # Cell span per element; right/bottom edges are exclusive.
+        cells = np.empty((len(self._rows), 4), dtype=np.int64)
+        if len(self._rows):
+            cells[:, :2] = rects[self._rows, :2] // cell_size
+            cells[:, 2:] = (rects[self._rows, 2:] - 1) // cell_size
+        spans = (cells[:, 2] - cells[:, 0] + 1) * (cells[:, 3] - cells[:, 1] + 1)
+        large = spans > max_cells
+        self._large = self._rows[large]
+
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for row, (cx0, cy0, cx1, cy1) in zip(self._rows[~large].tolist(), cells[~large].tolist()):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    buckets.setdefault((cx, cy), []).append(row)
+        self._cells = {cell: np.asarray(rows, dtype=np.intp) for cell, rows in buckets.items()}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def at(self, x: int, y: int, types: Optional[Iterable[str]] = None) -> Optional[int]:
+        """Innermost element whose rect contains ``(x, y)``.
+
+        Among overlapping hits the smallest rect wins, then the deepest, then
+        the one captured last (UIA siblings later in document order are drawn
+        on top).
+        """
+        cell = self._cells.get((x // self.cell_size, y // self.cell_size))
+        candidates = self._large if cell is None else np.concatenate((cell, self._large))
+        if types is not None and len(candidates):
+            candidates = candidates[self.table.type_mask(types)[candidates]]
+        if not len(candidates):
+            return None
+        rects = self.table.rects[candidates]
+        hit = (rects[:, 0] <= x) & (x < rects[:, 2]) & (rects[:, 1] <= y) & (y < rects[:, 3])
+        hits = candidates[hit]
+        if not len(hits):
+            return None
+        # lexsort sorts by the last key first.
+        order = np.lexsort((-hits, -self.table.depths[hits].astype(np.int64), self._areas[hits]))
+        return int(hits[order[0]])
+
+    def nearest(
+        self,
+        x: int,
+        y: int,
+        k: int = 1,
+        types: Optional[Iterable[str]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[Tuple[int, float]]:
+        """Up to ``k`` ``(row, distance)`` pairs ordered by distance to the rect edge.
+
+        A point inside a rect has distance 0; ties go to the smaller rect.
+        """
+        rows = self._rows
+        if types is not None:
+            rows = rows[self.table.type_mask(types)[rows]]
+        if not len(rows) or k <= 0:
+            return []
+        rects = self.table.rects[rows].astype(np.int64)
+        dx = np.maximum(np.maximum(rects[:, 0] - x, 0), x - (rects[:, 2] - 1))
+        dy = np.maximum(np.maximum(rects[:, 1] - y, 0), y - (rects[:, 3] - 1))
+        distances = np.hypot(dx, dy)
+        if max_distance is not None:
+            keep = distances <= max_distance
+            rows, distances = rows[keep], distances[keep]
+        if len(rows) > k:
+            part = np.argpartition(distances, k - 1)[:k]
+            rows, distances = rows[part], distances[part]
+        order = np.lexsort((self._areas[rows], distances))
+        return [(int(rows[i]), float(distances[i])) for i in order]
+
+    def within(
+        self,
+        rect: Tuple[int, int, int, int],
+        overlap: bool = False,
+        types: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """Rows fully inside ``rect`` (left, top, right, bottom), in capture order.
+
+        With ``overlap=True`` any intersection counts.
+        """
+        left, top, right, bottom = rect
+        rows = self._rows
+        if types is not None:
+            rows = rows[self.table.type_mask(types)[rows]]
+        rects = self.table.rects[rows]
+        if overlap:
+            mask = (rects[:, 0] < right) & (rects[:, 2] > left) & (rects[:, 1] < bottom) & (rects[:, 3] > top)
+        else:
+            mask = (rects[:, 0] >= left) & (rects[:, 2] <= right) & (rects[:, 1] >= top) & (rects[:, 3] <= bottom)
+        return rows[mask]
@@ -0,0 +1,99 @@
+"""What State-Tool reports: the desktop and the captured elements worth listing.
+
+Both are plain data over a captured :class:`~.elements.ElementTable`, free
+of UI Automation objects, so they can be built, filtered and rendered
+(:mod:`.serialize`) without a live desktop.
+"""
+
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from .elements import ElementTable, TreeSnapshot, WindowCapture
+from .encode import EncodedImage
+
+
+def _no_rows() -> np.ndarray:
+    return np.empty(0, dtype=np.intp)
+
+
+@dataclass
+class TreeState:
+    """Reported elements as row indices into one captured :class:`ElementTable`."""
+    elements: ElementTable = field(default_factory=ElementTable.empty)
+    interactive: np.ndarray = field(default_factory=_no_rows)
+    informative: np.ndarray = field(default_factory=_no_rows)
+    scrollable: np.ndarray = field(default_factory=_no_rows)
+    windows: List[WindowCapture] = field(default_factory=list)  # multi-window captures only
+    visible: Optional[np.ndarray] = None  # visible share of every table row, when measured
+    hidden: int = 0  # occluded or off-screen elements left out of the lists above
+    
+    def interactive_elements_to_string(self) -> str:
+        table = self.elements
+        return self._lines(
+            self.interactive,
+            lambda i: f"- {table.names[i] or 'Unnamed'} ({table.type_name(i)}) at ({table.rects[i, 0]}, {table.rects[i, 1]})"
+        )
+    
+    def informative_elements_to_string(self) -> str:
+        table = self.elements
+        return self._lines(self.informative, lambda i: f"- {table.names[i] or table.values[i] or 'No text'}")
+    
+    def scrollable_elements_to_string(self) -> str:
+        table = self.elements
+        return self._lines(
+            self.scrollable,
+            lambda i: f"- {table.names[i] or 'Scrollable area'} at ({table.rects[i, 0]}, {table.rects[i, 1]})"
+        )
+    
+    def rows(self) -> np.ndarray:
+        """All reported rows, in capture order"""
+        return np.sort(np.concatenate((self.interactive, self.informative, self.scrollable)))
+    
+    def subset(self, keep: np.ndarray) -> 'TreeState':
+        """Same state restricted to rows where the boolean mask ``keep`` is set"""
+        return TreeState(
+            elements=self.elements,
+            interactive=self.interactive[keep[self.interactive]],
+            informative=self.informative[keep[self.informative]],
+            scrollable=self.scrollable[keep[self.scrollable]],
+            windows=self.windows,
+            visible=self.visible,
+            hidden=self.hidden,
+        )
+    
+    def _lines(self, rows: np.ndarray, line) -> str:
+        """Format rows, inserting a [window] heading wherever the owning window changes"""
+        if len(self.windows) < 2:
+            return "\n".join(line(i) for i in rows)
+        starts = [window.start for window in self.windows]
+        lines, current = [], None
+        for i in rows:
+            window = self.windows[bisect.bisect_right(starts, i) - 1]
+            if window is not current:
+                lines.append(f"[{window.name}]")
+                current = window
+            lines.append(line(i))
+        return "\n".join(lines)
+
+
+@dataclass 
+class DesktopState:
+    active_app: str
+    apps: List[str]
+    tree_state: TreeState
+    screenshot: Optional[EncodedImage] = None
+    snapshot: Optional[TreeSnapshot] = None
+    complete: bool = True  # False when a walk budget ran out before the tree did
+    continuation: Optional[str] = None  # pass back to get_state to keep walking
+    expired_continuation: bool = False  # the requested continuation was gone; walk restarted
+    
+    def active_app_to_string(self) -> str:
+        return self.active_app
+    
+    def apps_to_string(self) -> str:
+        return "\n".join(f"- {app}" for app in self.apps)
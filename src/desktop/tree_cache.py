@@ -0,0 +1,470 @@
+"""Event-driven background cache of the foreground UI Automation tree.
+
+Agents call State-Tool after almost every action, and each call used to walk
+the foreground window from scratch. :class:`TreeCache` keeps the latest
+:class:`~src.desktop.elements.TreeSnapshot` in memory and re-captures it on a
+background thread whenever an :class:`EventSource` reports that something
+changed (UIA structure / property / focus events, foreground window switches).
+
+Readers get the cached snapshot in O(1) while it is current. While a refresh is
+pending they wait briefly for it, and only fall back to a synchronous full walk
+if the cache is stale, too old, or not running.
+
+Event sources are pluggable: :class:`UIAEventSource` talks to Windows, and
+:class:`ScriptedEventSource` lets tests drive the cache from Linux.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, ContextManager, Dict, Optional
+
+from .elements import TreeSnapshot
+
+
+# Event kinds
+STRUCTURE_CHANGED = 'structure'
+PROPERTY_CHANGED = 'property'
+FOCUS_CHANGED = 'focus'
+FOREGROUND_CHANGED = 'foreground'
+INVALIDATED = 'invalidated'
+
+
+@dataclass(frozen=True)
+class TreeEvent:
+    """A notification that the cached tree may no longer match the screen."""
+
+    kind: str
+    hwnd: int = 0
+    timestamp: float = field(default_factory=time.monotonic)
+
+
+EventSink = Callable[[TreeEvent], None]
+
+
+class EventSource:
+    """Delivers :class:`TreeEvent` notifications to a sink until stopped."""
+
+    def start(self, sink: EventSink) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+
+class ScriptedEventSource(EventSource):
+    """In-process event source driven by explicit :meth:`emit` calls.
+
+    Used on Linux (and in tests) where there is no UI Automation to subscribe
+    to: the caller emits the same events Windows would.
+    """
+
+    def __init__(self):
+        self._sink: Optional[EventSink] = None
+
+    def start(self, sink: EventSink) -> None:
+        self._sink = sink
+
+    def stop(self) -> None:
+        self._sink = None
+
+    def emit(self, kind: str, hwnd: int = 0) -> None:
+        sink = self._sink
+        if sink is not None:
+            sink(TreeEvent(kind, hwnd))
+
+
+def winevent_api():
+    """Private ``user32``/``kernel32`` handles for a WinEvent message pump.
+
+    Returns ``(user32, kernel32, WinEventProc)`` with the hook, message loop
+    and thread-message prototypes declared, so window and hook handles are
+    passed and returned at full pointer width on 64-bit Python. The handles
+    are private, so the prototypes do not leak into the shared
+    ``ctypes.windll`` objects other modules use.
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    user32 = ctypes.WinDLL('user32', use_last_error=True)
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    WinEventProc = ctypes.WINFUNCTYPE(
+        None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+        wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD,
+    )
+    user32.SetWinEventHook.argtypes = (
+        wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc, wintypes.DWORD, wintypes.DWORD, wintypes.DWORD,
+    )
+    user32.SetWinEventHook.restype = wintypes.HANDLE
+    user32.UnhookWinEvent.argtypes = (wintypes.HANDLE,)
+    user32.UnhookWinEvent.restype = wintypes.BOOL
+    user32.GetMessageW.argtypes = (ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT)
+    user32.GetMessageW.restype = wintypes.BOOL
+    user32.TranslateMessage.argtypes = (ctypes.POINTER(wintypes.MSG),)
+    user32.DispatchMessageW.argtypes = (ctypes.POINTER(wintypes.MSG),)
+    user32.DispatchMessageW.restype = ctypes.c_ssize_t
+    user32.PostThreadMessageW.argtypes = (wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+    user32.GetForegroundWindow.argtypes = ()
+    user32.GetForegroundWindow.restype = wintypes.HWND
+    user32.GetAncestor.argtypes = (wintypes.HWND, wintypes.UINT)
+    user32.GetAncestor.restype = wintypes.HWND
+    kernel32.GetCurrentThreadId.argtypes = ()
+    kernel32.GetCurrentThreadId.restype = wintypes.DWORD
+    return user32, kernel32, WinEventProc
+
+
+class UIAEventSource(EventSource):
+    """Subscribe to UIA and WinEvent notifications on a dedicated thread.
+
+    StructureChanged and PropertyChanged handlers are scoped to the current
+    foreground window subtree and re-registered whenever the WinEvent
+    ``EVENT_SYSTEM_FOREGROUND`` hook fires; FocusChanged is desktop-wide. The
+    thread owns its COM apartment and pumps messages so both UIA and the
+    out-of-context WinEvent hook can deliver callbacks.
+    """
+
+    _EVENT_SYSTEM_FOREGROUND = 0x0003
+    _WINEVENT_OUTOFCONTEXT = 0x0000
+    _WM_QUIT = 0x0012
+    _TREE_SCOPE_SUBTREE = 7
+
+    def __init__(self):
+        self._sink: Optional[EventSink] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id = 0
+        self._ready = threading.Event()
+
+    def start(self, sink: EventSink) -> None:
+        if self._thread is not None:
+            return
+        self._sink = sink
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name='clippy-uia-events', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        if self._thread_id:
+            user32, _, _ = winevent_api()
+            user32.PostThreadMessageW(self._thread_id, self._WM_QUIT, 0, 0)
+        thread.join(timeout=5)
+        self._thread = None
+        self._thread_id = 0
+        self._sink = None
+
+    def _emit(self, kind: str, hwnd: int = 0) -> None:
+        sink = self._sink
+        if sink is not None:
+            sink(TreeEvent(kind, hwnd))
+
+    def _run(self) -> None:
+        try:
+            self._pump()
+        finally:
+            self._ready.set()  # never leave start() waiting on a failed thread
+
+    def _pump(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        import comtypes
+        import uiautomation as ua
+
+        from .tree import automation, automation_core
+
+        user32, kernel32, WinEventProc = winevent_api()
+        self._thread_id = kernel32.GetCurrentThreadId()
+
+        with ua.UIAutomationInitializerInThread():
+            core = automation_core()
+            uia = automation()
+            source = self
+
+            class _Handler(comtypes.COMObject):
+                _com_interfaces_ = [
+                    core.IUIAutomationStructureChangedEventHandler,
+                    core.IUIAutomationPropertyChangedEventHandler,
+                    core.IUIAutomationFocusChangedEventHandler,
+                ]
+
+                def HandleStructureChangedEvent(self, sender, changeType, runtimeId):
+                    source._emit(STRUCTURE_CHANGED)
+
+                def HandlePropertyChangedEvent(self, sender, propertyId, newValue):
+                    source._emit(PROPERTY_CHANGED)
+
+                def HandleFocusChangedEvent(self, sender):
+                    source._emit(FOCUS_CHANGED)
+
+            handler = _Handler()
+            properties = (ctypes.c_int * 5)(
+                ua.PropertyId.NameProperty,
+                ua.PropertyId.ValueValueProperty,
+                ua.PropertyId.BoundingRectangleProperty,
+                ua.PropertyId.IsEnabledProperty,
+                ua.PropertyId.IsOffscreenProperty,
+            )
+            scoped = {'element': None}
+
+            def watch_window(hwnd: int) -> None:
+                element = scoped['element']
+                if element is not None:
+                    with contextlib.suppress(Exception):
+                        uia.RemoveStructureChangedEventHandler(element, handler)
+                    with contextlib.suppress(Exception):
+                        uia.RemovePropertyChangedEventHandler(element, handler)
+                    scoped['element'] = None
+                if not hwnd:
+                    return
+                try:
+                    element = uia.ElementFromHandle(hwnd)
+                    uia.AddStructureChangedEventHandler(
+                        element, self._TREE_SCOPE_SUBTREE, None, handler)
+                    uia.AddPropertyChangedEventHandlerNativeArray(
+                        element, self._TREE_SCOPE_SUBTREE, None, handler, properties, len(properties))
+                    scoped['element'] = element
+                except Exception:
+                    pass
+
+            def on_foreground(hook, event, hwnd, id_object, id_child, thread, timestamp):
+                watch_window(hwnd or 0)
+                self._emit(FOREGROUND_CHANGED, hwnd or 0)
+
+            callback = WinEventProc(on_foreground)
+            hook = user32.SetWinEventHook(
+                self._EVENT_SYSTEM_FOREGROUND, self._EVENT_SYSTEM_FOREGROUND,
+                0, callback, 0, 0, self._WINEVENT_OUTOFCONTEXT,
+            )
+            with contextlib.suppress(Exception):
+                uia.AddFocusChangedEventHandler(None, handler)
+            watch_window(user32.GetForegroundWindow())
+            self._ready.set()
+
+            msg = wintypes.MSG()
+            try:
+                while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                    user32.TranslateMessage(ctypes.byref(msg))
+                    user32.DispatchMessageW(ctypes.byref(msg))
+            finally:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+                watch_window(0)
+                with contextlib.suppress(Exception):
+                    uia.RemoveFocusChangedEventHandler(handler)
+
+
+class TreeCache:
+    """Keep a :class:`TreeSnapshot` current from change events.
+
+    ``capture`` performs a full walk and is called on the cache's own thread
+    (entered through ``thread_initializer``, e.g.
+    ``ua.UIAutomationInitializerInThread``) or, on fallback, on the reader's
+    thread. Bursts of events are coalesced: a refresh starts once events have
+    been quiet for ``debounce`` seconds, or after ``max_delay`` seconds of
+    continuous churn. Snapshots older than ``max_age`` are never served even
+    without events, in case a notification was missed.
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], TreeSnapshot],
+        source: Optional[EventSource] = None,
+        debounce: float = 0.1,
+        max_delay: float = 1.0,
+        max_age: float = 10.0,
+        thread_initializer: Optional[Callable[[], ContextManager]] = None,
+    ):
+        self._capture = capture
+        self._source = source
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_age = max_age
+        self._thread_initializer = thread_initializer
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._snapshot: Optional[TreeSnapshot] = None
+        self._generation = 0
+        self._event_seq = 0
+        self._captured_seq = -1
+        self._pending_since: Optional[float] = None  # oldest event not reflected in the snapshot
+        self._last_event = 0.0
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._failures = 0
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._pending_since = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='clippy-tree-cache', daemon=True)
+        self._thread.start()
+        if self._source is not None:
+            self._source.start(self._on_event)
+
+    def stop(self) -> None:
+        if self._source is not None:
+            self._source.stop()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # -- counters ----------------------------------------------------------
+
+    @property
+    def generation(self) -> int:
+        """Number of snapshots installed so far; bumps on every refresh."""
+        return self._generation
+
+    @property
+    def event_count(self) -> int:
+        return self._event_seq
+
+    def staleness(self) -> float:
+        """Seconds since the oldest change the current snapshot does not reflect."""
+        with self._cond:
+            if self._pending_since is None:
+                return 0.0
+            return time.monotonic() - self._pending_since
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            snapshot = self._snapshot
+            now = time.monotonic()
+            return {
+                'running': self._running,
+                'generation': self._generation,
+                'events': self._event_seq,
+                'hits': self._hits,
+                'misses': self._misses,
+                'refreshes': self._refreshes,
+                'failures': self._failures,
+                'staleness_s': 0.0 if self._pending_since is None else round(now - self._pending_since, 3),
+                'age_s': None if snapshot is None else round(now - snapshot.captured_at, 3),
+                'last_capture_ms': None if snapshot is None else round(snapshot.capture_ms, 1),
+            }
+
+    # -- reads -------------------------------------------------------------
+
+    def get(self, max_staleness: float = 0.0, wait: float = 0.5) -> TreeSnapshot:
+        """Return a snapshot no more than ``max_staleness`` seconds behind events.
+
+        If the cache is dirty, wait up to ``wait`` seconds for the background
+        refresh to land before falling back to a synchronous full walk.
+        """
+        snapshot = self.wait_fresh(wait, max_staleness)
+        return snapshot if snapshot is not None else self.refresh()
+
+    def wait_fresh(self, wait: float = 0.5, max_staleness: float = 0.0) -> Optional[TreeSnapshot]:
+        """Like :meth:`get`, but return None instead of walking when no fresh snapshot lands in time."""
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while True:
+                if self._is_fresh(max_staleness):
+                    self._hits += 1
+                    return self._snapshot
+                remaining = deadline - time.monotonic()
+                if not self._running or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._misses += 1
+        return None
+
+    def is_fresh(self, max_staleness: float = 0.0) -> bool:
+        """True if :meth:`peek` would return a snapshot ``get`` would serve as-is."""
+        with self._cond:
+            return self._is_fresh(max_staleness)
+
+    def peek(self) -> Optional[TreeSnapshot]:
+        """Return the current snapshot without any freshness check."""
+        return self._snapshot
+
+    def refresh(self) -> TreeSnapshot:
+        """Run a full walk on the calling thread and install the result."""
+        with self._cond:
+            seq = self._event_seq
+        started = time.monotonic()
+        snapshot = self._capture()
+        self._install(snapshot, seq, started)
+        return snapshot
+
+    def invalidate(self) -> None:
+        self._on_event(TreeEvent(INVALIDATED))
+
+    # -- internals ---------------------------------------------------------
+
+    def _is_fresh(self, max_staleness: float) -> bool:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        now = time.monotonic()
+        if now - snapshot.captured_at > self.max_age:
+            return False
+        return self._pending_since is None or now - self._pending_since <= max_staleness
+
+    def _on_event(self, event: TreeEvent) -> None:
+        with self._cond:
+            self._event_seq += 1
+            self._last_event = event.timestamp
+            if self._pending_since is None:
+                self._pending_since = event.timestamp
+            self._cond.notify_all()
+
+    def _install(self, snapshot: TreeSnapshot, seq: int, started: float) -> None:
+        with self._cond:
+            self._refreshes += 1
+            if seq < self._captured_seq:
+                return  # a newer capture already landed
+            self._generation += 1
+            snapshot.generation = self._generation
+            self._snapshot = snapshot
+            self._captured_seq = seq
+            # Events that arrived mid-walk may not be reflected; keep the
+            # cache dirty from the moment the walk started.
+            self._pending_since = None if self._event_seq == seq else started
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        initializer = self._thread_initializer() if self._thread_initializer else contextlib.nullcontext()
+        with initializer:
+            while True:
+                with self._cond:
+                    while self._running and self._pending_since is None:
+                        self._cond.wait()
+                    # Coalesce bursts: wait for a quiet period, bounded by max_delay.
+                    while self._running and self._pending_since is not None:
+                        now = time.monotonic()
+                        quiet = now - self._last_event
+                        waited = now - self._pending_since
+                        if quiet >= self.debounce or waited >= self.max_delay:
+                            break
+                        self._cond.wait(min(self.debounce - quiet, self.max_delay - waited))
+                    if not self._running:
+                        return
+                    if self._pending_since is None:
+                        continue  # a reader's synchronous walk already caught up
+                try:
+                    self.refresh()
+                except Exception:
+                    with self._cond:
+                        self._failures += 1
+                        self._cond.wait(self.max_delay)
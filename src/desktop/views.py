@@ -1,82 +1,61 @@
 import subprocess
-import psutil
 import uiautomation as ua
 import pyautogui as pg
-from dataclasses import dataclass
+from dataclasses import replace
 from typing import Optional, Tuple, List
-from PIL import Image
-import io
-import base64
+import numpy as np
+import time
 
-
-@dataclass
-class TreeState:
-    interactive_elements: List[ua.Control]
-    informative_elements: List[ua.Control]
-    scrollable_elements: List[ua.Control]
-    
-    def interactive_elements_to_string(self) -> str:
-        if not self.interactive_elements:
-            return ""
-        elements = []
-        for elem in self.interactive_elements:
-            try:
-                x, y = elem.BoundingRectangle[:2]
-                elements.append(f"- {elem.Name or 'Unnamed'} ({elem.ControlTypeName}) at ({x}, {y})")
-            except:
-                continue
-        return "\n".join(elements)
-    
-    def informative_elements_to_string(self) -> str:
-        if not self.informative_elements:
-            return ""
-        elements = []
-        for elem in self.informative_elements:
-            try:
-                text = elem.Name or elem.Value or "No text"
-                elements.append(f"- {text}")
-            except:
-                continue
-        return "\n".join(elements)
-    
-    def scrollable_elements_to_string(self) -> str:
-        if not self.scrollable_elements:
-            return ""
-        elements = []
-        for elem in self.scrollable_elements:
-            try:
-                x, y = elem.BoundingRectangle[:2]
-                elements.append(f"- {elem.Name or 'Scrollable area'} at ({x}, {y})")
-            except:
-                continue
-        return "\n".join(elements)
-
-
-@dataclass 
-class DesktopState:
-    active_app: str
-    apps: List[str]
-    tree_state: TreeState
-    screenshot: Optional[bytes] = None
-    
-    def active_app_to_string(self) -> str:
-        return self.active_app
-    
-    def apps_to_string(self) -> str:
-        return "\n".join(f"- {app}" for app in self.apps)
+from ..powershell import OutputCallback, PowerShellError, PowerShellPool, prelude
+from .capture import CaptureBackend, ScreenCapture
+from .encode import ImageOptions
+from .elements import (
+    INFORMATIVE_CONTROL_TYPES,
+    INTERACTIVE_CONTROL_TYPES,
+    SCROLLABLE_CONTROL_TYPES,
+    ElementTable,
+    UIElement,
+)
+from .parallel import ParallelCapture, initialize_uia_thread, list_top_level_windows
+from .progressive import ProgressCallback, ProgressiveWalker, WalkBudget
+from .selector import SelectorIndex
+from .spatial import SpatialIndex
+from .tree import TreeSnapshot, TreeWalker, read_live_control
+from .tree_cache import EventSource, TreeCache, UIAEventSource
+from .visibility import VisibilityFilter
+from .windows import Win32WindowBackend, WindowBackend, WindowEventSource, WindowTable
+from .snapshots import SnapshotStore
+from .state import DesktopState, TreeState
 
 
 class Desktop:
-    def __init__(self):
+    def __init__(
+        self,
+        tree_depth: int = 8,
+        window_backend: Optional[WindowBackend] = None,
+        capture_backend: Optional[CaptureBackend] = None,
+    ):
         self.ua = ua
+        self.walker = TreeWalker(max_depth=tree_depth)
+        self.tree_cache: Optional[TreeCache] = None
+        self.snapshots = SnapshotStore()
+        self._spatial: Optional[Tuple[TreeSnapshot, SpatialIndex]] = None
+        self._selector: Optional[Tuple[TreeSnapshot, SelectorIndex]] = None
+        self._parallel: Optional[ParallelCapture] = None
+        self._progressive: Optional[ProgressiveWalker] = None
+        self.window_backend = window_backend or Win32WindowBackend()
+        self.window_table = WindowTable(self.window_backend, source=WindowEventSource())
+        # Reuse a frame under 100 ms old when no window has changed since
+        self.capture = ScreenCapture(capture_backend, version=lambda: self.window_table.event_count, max_age=0.1)
+        self.visibility = VisibilityFilter()
+        self.powershell = PowerShellPool(prelude=prelude())
         
     def launch_app(self, name: str) -> Tuple[str, int]:
         """Launch an application by name"""
         try:
             # Try different launch methods
-            result = subprocess.run(['powershell', '-Command', f'Start-Process "{name}"'], 
-                                  capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
+            result = self.powershell.run(f'Start-Process "{name}"', timeout=10)
+            if result.status == 0:
                 return f"Launched {name}", 0
             else:
                 # Try alternative method with explorer
@@ -87,180 +66,196 @@ class Desktop:
             return f"Failed to launch {name}: {str(e)}", 1
     
     def execute_command(self, command: str) -> Tuple[str, int]:
-        """Execute PowerShell command"""
+        """Execute PowerShell command on a pooled host"""
         try:
-            result = subprocess.run(['powershell', '-Command', command], 
-                                  capture_output=True, text=True, timeout=30)
-            return result.stdout or result.stderr, result.returncode
+            result = self.powershell.run(command, timeout=30)
+            return result.text, result.status
         except Exception as e:
             return str(e), 1
+
+    async def execute_command_async(
+        self, command: str, timeout: float = 30, on_output: Optional[OutputCallback] = None,
+    ) -> Tuple[str, int]:
+        """Execute PowerShell command on a pooled host, streaming output chunks to ``on_output``"""
+        try:
+            result = await self.powershell.run_async(command, timeout=timeout, on_output=on_output)
+        except PowerShellError as e:
+            return str(e), 1
+        return result.text, result.status
     
     def switch_app(self, name: str) -> Tuple[str, int]:
-        """Switch to an application window using PowerShell-based approach"""
+        """Bring the best-matching application window to the foreground"""
         try:
-            name_lower = name.lower().strip()
-            
-            # Create comprehensive PowerShell script for window switching
-            ps_command = f'''
-            # Define app name mappings for common applications
-            $appMappings = @{{
-                'calculator' = @('CalculatorApp', 'Calculator')
-                'calc' = @('CalculatorApp', 'Calculator')
-                'notepad' = @('Notepad')
-                'chrome' = @('chrome', 'Google Chrome')
-                'edge' = @('msedge', 'Microsoft Edge', 'MicrosoftEdge')
-                'firefox' = @('firefox', 'Mozilla Firefox')
-                'code' = @('Code', 'Visual Studio Code')
-                'vscode' = @('Code', 'Visual Studio Code')
-                'explorer' = @('explorer', 'File Explorer')
-                'powershell' = @('powershell', 'Windows PowerShell')
-                'cmd' = @('cmd', 'Command Prompt')
-            }}
-            
-            $targetName = "{name_lower}"
-            $searchTerms = @($targetName)
-            
-            # Add mapped terms if available
-            if ($appMappings.ContainsKey($targetName)) {{
-                $searchTerms += $appMappings[$targetName]
-            }}
-            
-            # Find processes with main windows
-            $candidates = @()
-            foreach ($term in $searchTerms) {{
-                $processes = Get-Process | Where-Object {{
-                    $_.MainWindowTitle -ne "" -and (
-                        $_.ProcessName -like "*$term*" -or 
-                        $_.MainWindowTitle -like "*$term*" -or
-                        $_.ProcessName -eq $term
-                    )
-                }}
-                $candidates += $processes
-            }}
-            
-            # Remove duplicates
-            $candidates = $candidates | Sort-Object Id -Unique
-            
-            if ($candidates.Count -gt 0) {{
-                $process = $candidates[0]
-                
-                # Import Win32 functions
-                Add-Type -TypeDefinition @'
-                using System;
-                using System.Runtime.InteropServices;
-                public class Win32 {{
-                    [DllImport("user32.dll")]
-                    public static extern bool SetForegroundWindow(IntPtr hWnd);
-                    [DllImport("user32.dll")]
-                    public static extern bool ShowWindow(IntPtr hWnd, int nCmdShow);
-                    [DllImport("user32.dll")]
-                    public static extern bool IsIconic(IntPtr hWnd);
-                }}
-'@
-                
-                try {{
-                    # Restore window if minimized
-                    if ([Win32]::IsIconic($process.MainWindowHandle)) {{
-                        [Win32]::ShowWindow($process.MainWindowHandle, 9) | Out-Null
-                    }}
-                    
-                    # Bring window to foreground
-                    $result = [Win32]::SetForegroundWindow($process.MainWindowHandle)
-                    
-                    if ($result) {{
-                        Write-Output "SUCCESS:$($process.MainWindowTitle)"
-                    }} else {{
-                        Write-Output "FAILED:Could not set foreground"
-                    }}
-                }} catch {{
-                    Write-Output "ERROR:$($_.Exception.Message)"
-                }}
-            }} else {{
-                Write-Output "NOTFOUND:No matching window found"
-            }}
-            '''
-            
-            result = subprocess.run(['powershell', '-Command', ps_command], 
-                                  capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0:
-                output = result.stdout.strip()
-                if output.startswith("SUCCESS:"):
-                    window_title = output.split("SUCCESS:", 1)[1]
-                    return f"Switched to {window_title}", 0
-                elif output.startswith("FAILED:"):
-                    error_msg = output.split("FAILED:", 1)[1]
-                    return f"Failed to switch to {name}: {error_msg}", 1
-                elif output.startswith("NOTFOUND:"):
-                    return f"Could not find window for {name}", 1
-                elif output.startswith("ERROR:"):
-                    error_msg = output.split("ERROR:", 1)[1]
-                    return f"Error switching to {name}: {error_msg}", 1
-            
-            return f"Could not find window for {name}", 1
-            
+            matches = self.window_table.find(name)
+            if not matches:
+                return f"Could not find window for {name}", 1
+            window = matches[0][1]
+            if not self.window_backend.activate(window.hwnd):
+                return f"Failed to switch to {name}: Could not set foreground", 1
+            return f"Switched to {window.title}", 0
         except Exception as e:
             return f"Failed to switch to {name}: {str(e)}", 1
     
-    def get_state(self, use_vision: bool = False) -> DesktopState:
-        """Get current desktop state"""
+    def set_window_state(
+        self,
+        action: str,
+        window_name: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> Tuple[str, int]:
+        """Minimize, maximize, restore, close or resize a window
+        
+        Acts on the best match for ``window_name``, or on the foreground window.
+        ``close`` refuses a name that several windows match equally well.
+        """
         try:
-            # Get active window
-            active_window = ua.GetForegroundWindow()
-            active_app = active_window.Name if active_window else "Unknown"
-            
-            # Get all open applications
-            apps = []
-            for proc in psutil.process_iter(['pid', 'name']):
+            if window_name:
+                matches = self.window_table.find(window_name)
+                if not matches:
+                    return f'Window "{window_name}" not found', 1
+                tied = [window for score, window in matches if score == matches[0][0]]
+                if action == 'close' and len(tied) > 1:
+                    titles = ', '.join(f'"{window.title}"' for window in tied[:5])
+                    return (f'"{window_name}" matches {len(tied)} windows equally ({titles}); '
+                            f'not closing any, use a more specific name'), 1
+                hwnd = matches[0][1].hwnd
+            else:
+                hwnd = self.window_backend.foreground_window()
+            if not hwnd:
+                return "No foreground window", 1
+            backend = self.window_backend
+            if action in ('minimize', 'maximize', 'restore'):
+                done = backend.show(hwnd, action)
+                message = {'minimize': 'Minimized', 'maximize': 'Maximized', 'restore': 'Restored'}[action]
+            elif action == 'close':
+                done, message = backend.close(hwnd), "Closed"
+            elif action == 'resize' and width and height:
+                done, message = backend.resize(hwnd, width, height), f"Resized to {width}x{height}"
+            else:
+                return "Invalid action or missing width/height for resize", 1
+            return (message, 0) if done else (f"{action.title()} failed", 1)
+        except Exception as e:
+            return f"Window operation failed: {str(e)}", 1
+    
+    def capture_tree(self, max_depth: Optional[int] = None) -> TreeSnapshot:
+        """Walk the foreground window into a detached snapshot"""
+        initialize_uia_thread()
+        started = time.perf_counter()
+        window = ua.GetForegroundControl()
+        if not window:
+            return TreeSnapshot.empty()
+        elements = self.walker.walk(window, max_depth=max_depth)
+        return TreeSnapshot(
+            hwnd=window.NativeWindowHandle,
+            window_name=window.Name or "Unknown",
+            elements=elements,
+            capture_ms=(time.perf_counter() - started) * 1000,
+        )
+    
+    def capture_all_windows(self, max_depth: Optional[int] = None, max_windows: int = 8) -> TreeSnapshot:
+        """Walk every visible top-level window concurrently into one merged snapshot"""
+        initialize_uia_thread()
+        if self._parallel is None:
+            self._parallel = ParallelCapture(self._capture_window)
+        return self._parallel.capture(list_top_level_windows(max_windows), max_depth=max_depth)
+    
+    def _capture_window(self, hwnd: int, max_depth: Optional[int], deadline: float) -> Tuple[ElementTable, bool]:
+        return self.walker.walk_within(ua.ControlFromHandle(hwnd), max_depth=max_depth, deadline=deadline)
+    
+    def start_tree_cache(self, source: Optional[EventSource] = None) -> TreeCache:
+        """Keep the foreground tree cached in the background, refreshed from UIA events"""
+        if self.tree_cache is None:
+            self.tree_cache = TreeCache(
+                self.capture_tree,
+                source or UIAEventSource(),
+                thread_initializer=ua.UIAutomationInitializerInThread,
+            )
+            self.tree_cache.start()
+        return self.tree_cache
+    
+    def stop_tree_cache(self) -> None:
+        if self.tree_cache is not None:
+            self.tree_cache.stop()
+            self.tree_cache = None
+    
+    def capture_progressive(
+        self,
+        budget: WalkBudget,
+        continuation: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        """Budgeted priority walk of the foreground window, or the continuation of one.
+        
+        Raises KeyError if ``continuation`` is unknown or has expired.
+        """
+        if self._progressive is None:
+            self._progressive = ProgressiveWalker()
+        if continuation:
+            return self._progressive.resume(continuation, budget, on_progress)
+        return self._progressive.start(budget, on_progress)
+    
+    def get_state(
+        self,
+        use_vision: bool = False,
+        max_depth: Optional[int] = None,
+        all_windows: bool = False,
+        budget: Optional[WalkBudget] = None,
+        continuation: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        include_hidden: bool = False,
+        image_options: Optional[ImageOptions] = None,
+    ) -> DesktopState:
+        """Get current desktop state
+        
+        With a ``budget``, a stale cache gets a short wait for its background
+        refresh; if that does not land, the window is walked within the
+        budget, on-screen, enabled and focusable parents first, and a walk that
+        overruns it leaves a ``continuation`` for the unfinished part.
+        Elements covered by other windows or outside the screen are left out
+        unless ``include_hidden`` is set. With ``use_vision`` the screen is
+        encoded according to ``image_options`` (PNG at full size by default).
+        """
+        try:
+            complete, next_continuation, expired = True, None, False
+            cacheable = max_depth in (None, self.walker.max_depth)
+            # Serve the cached tree when it is current, or becomes current
+            # shortly; otherwise walk now
+            snapshot = None
+            if all_windows:
+                snapshot = self.capture_all_windows(max_depth)
+            elif budget is None:
+                snapshot = self.tree_cache.get() if self.tree_cache is not None and cacheable else self.capture_tree(max_depth)
+            elif not continuation and self.tree_cache is not None and cacheable:
+                waited = time.perf_counter()
+                snapshot = self.tree_cache.wait_fresh(wait=min(0.5, budget.deadline / 4))
+                budget = replace(budget, deadline=max(0.0, budget.deadline - (time.perf_counter() - waited)))
+            if snapshot is None:
+                # Most useful parents first within the budget; an overrun leaves a continuation
                 try:
-                    if proc.info['name'].endswith('.exe'):
-                        app_name = proc.info['name'][:-4]  # Remove .exe
-                        if app_name not in apps:
-                            apps.append(app_name)
-                except:
-                    continue
-            
-            # Get UI elements
-            interactive_elements = []
-            informative_elements = []
-            scrollable_elements = []
+                    result = self.capture_progressive(budget, continuation, on_progress)
+                except KeyError:
+                    expired = True
+                    result = self.capture_progressive(budget, None, on_progress)
+                snapshot, complete, next_continuation = result.snapshot, result.complete, result.continuation
+            active_app = snapshot.window_name
             
-            try:
-                if active_window:
-                    # Find interactive elements (buttons, text fields, etc.)
-                    buttons = active_window.GetChildren(lambda x: x.ControlType in [
-                        ua.ControlType.ButtonControl, ua.ControlType.EditControl,
-                        ua.ControlType.ComboBoxControl, ua.ControlType.CheckBoxControl
-                    ])
-                    interactive_elements.extend(buttons[:20])  # Limit to prevent overflow
-                    
-                    # Find informative elements (text, labels)
-                    texts = active_window.GetChildren(lambda x: x.ControlType in [
-                        ua.ControlType.TextControl, ua.ControlType.StaticTextControl
-                    ])
-                    informative_elements.extend(texts[:20])
-                    
-                    # Find scrollable elements
-                    scrolls = active_window.GetChildren(lambda x: x.ControlType in [
-                        ua.ControlType.ScrollBarControl, ua.ControlType.ListControl
-                    ])
-                    scrollable_elements.extend(scrolls[:10])
-            except:
-                pass
+            # Applications with visible windows, from the maintained window table
+            apps = self.window_table.app_lines()
             
+            table = snapshot.elements
             tree_state = TreeState(
-                interactive_elements=interactive_elements,
-                informative_elements=informative_elements,
-                scrollable_elements=scrollable_elements
+                elements=table,
+                interactive=table.indices_of(INTERACTIVE_CONTROL_TYPES),
+                informative=table.indices_of(INFORMATIVE_CONTROL_TYPES),
+                scrollable=table.indices_of(SCROLLABLE_CONTROL_TYPES),
+                windows=snapshot.windows
             )
+            tree_state = self._filter_visible(snapshot, tree_state, include_hidden)
             
             screenshot_data = None
             if use_vision:
                 try:
-                    screenshot = pg.screenshot()
-                    img_buffer = io.BytesIO()
-                    screenshot.save(img_buffer, format='PNG')
-                    screenshot_data = img_buffer.getvalue()
+                    screenshot_data = self.capture.encode(self.capture.screen(), image_options or ImageOptions())
                 except:
                     pass
             
@@ -268,17 +263,99 @@ class Desktop:
                 active_app=active_app,
                 apps=apps,
                 tree_state=tree_state,
-                screenshot=screenshot_data
+                screenshot=screenshot_data,
+                snapshot=snapshot,
+                complete=complete,
+                continuation=next_continuation,
+                expired_continuation=expired
             )
         except Exception as e:
             # Return minimal state on error
             return DesktopState(
                 active_app="Error getting state",
                 apps=[],
-                tree_state=TreeState([], [], []),
+                tree_state=TreeState(),
                 screenshot=None
             )
     
+    def _filter_visible(self, snapshot: TreeSnapshot, tree_state: TreeState, include_hidden: bool) -> TreeState:
+        """Attach visible shares and drop hidden rows; unchanged if measuring fails"""
+        try:
+            visibility = self.visibility.measure(snapshot)
+        except Exception:
+            return tree_state
+        tree_state.visible = visibility.fraction
+        if include_hidden:
+            return tree_state
+        rows = tree_state.rows()
+        hidden = visibility.hidden
+        filtered = tree_state.subset(~hidden)
+        filtered.hidden = int(hidden[rows].sum())
+        return filtered
+    
+    def spatial_index(self, refresh: bool = False) -> Optional[SpatialIndex]:
+        """Spatial index over the current foreground snapshot.
+
+        Returns None when the cached snapshot is stale, unless ``refresh`` is
+        set, in which case the tree is walked first.
+        """
+        cache = self.tree_cache
+        if cache is not None and cache.is_fresh():
+            snapshot = cache.peek()
+        elif refresh:
+            snapshot = cache.get() if cache is not None else self.capture_tree()
+        else:
+            return None
+        spatial = self._spatial
+        if spatial is None or spatial[0] is not snapshot:
+            spatial = (snapshot, SpatialIndex(snapshot.elements))
+            self._spatial = spatial
+        return spatial[1]
+    
+    def element_at(self, x: int, y: int) -> Optional[UIElement]:
+        """Element at a screen point, from the cached snapshot when it is current"""
+        index = self.spatial_index()
+        if index is not None:
+            row = index.at(x, y)
+            if row is not None:
+                return index.table[row]
+        # Stale snapshot, or a point outside the foreground window
+        try:
+            initialize_uia_thread()
+            control = ua.ControlFromPoint(x, y)
+            return read_live_control(control) if control else None
+        except Exception:
+            return None
+    
+    def snap_to_interactive(self, x: int, y: int, radius: int = 40) -> Tuple[int, int, Optional[UIElement]]:
+        """Move a point onto the nearest interactive element within ``radius`` pixels.
+        
+        Returns the (possibly unchanged) point and the element snapped to, or
+        None if the point already hits an interactive element or none is near.
+        """
+        index = self.spatial_index(refresh=True)
+        if index is None or index.at(x, y, INTERACTIVE_CONTROL_TYPES) is not None:
+            return x, y, None
+        nearest = index.nearest(x, y, k=1, types=INTERACTIVE_CONTROL_TYPES, max_distance=radius)
+        if not nearest:
+            return x, y, None
+        element = index.table[nearest[0][0]]
+        cx, cy = element.center
+        return cx, cy, element
+    
+    def find_elements(self, selector: str, limit: Optional[int] = None) -> Tuple[TreeSnapshot, np.ndarray]:
+        """Evaluate a selector against the current foreground snapshot.
+        
+        Returns the snapshot and the matching row indices into its element table.
+        Raises SelectorError for a malformed selector.
+        """
+        snapshot = self.tree_cache.get() if self.tree_cache is not None else self.capture_tree()
+        cached = self._selector
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, SelectorIndex(snapshot.elements))
+            self._selector = cached
+        return snapshot, cached[1].select(selector, limit=limit)
+    
     def get_element_under_cursor(self) -> ua.Control:
         """Get UI element under current cursor position"""
         try:
@@ -0,0 +1,274 @@
+"""Visible area of captured elements, from window z-order and screen bounds.
+
+UIA's ``IsOffscreen`` only says whether a provider thinks an element is
+scrolled out of view. It says nothing about other windows stacked on top of
+it, and many providers never set it. :class:`VisibilityFilter` runs after
+capture and estimates how much of each element a user could actually see.
+
+- Every element rect is sampled on a small grid of points.
+- A point counts only if it lies on a monitor.
+- It must also lie inside the element's nearest scrolling viewport ancestor
+  (list, tree, grid, document), which catches rows scrolled out of view.
+- It must not be covered by a top-level window above the element's own
+  window in the z-order.
+
+All of this is NumPy broadcasting over ``(elements, samples, windows)``.
+Zero-size rects have no samples and are treated as off-screen.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .elements import ElementTable, TreeSnapshot
+
+
+Rect = Tuple[int, int, int, int]  # left, top, right, bottom
+
+# Containers whose bounds clip their descendants when scrolled.
+VIEWPORT_CONTROL_TYPES = frozenset({
+    'ListControl', 'TreeControl', 'DataGridControl', 'TableControl', 'DocumentControl',
+})
+
+
+_api = None
+
+
+def _dlls():
+    """Private ``user32``/``dwmapi`` handles with the prototypes used here.
+
+    Declaring handle arguments and results keeps HWNDs at full pointer width
+    on 64-bit Python; private handles keep the prototypes out of the shared
+    ``ctypes.windll`` objects.
+    """
+    global _api
+    if _api is None:
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        dwmapi = ctypes.WinDLL('dwmapi', use_last_error=True)
+        EnumWindowsProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        MonitorEnumProc = ctypes.WINFUNCTYPE(
+            wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC, ctypes.POINTER(wintypes.RECT), wintypes.LPARAM,
+        )
+        user32.EnumWindows.argtypes = (EnumWindowsProc, wintypes.LPARAM)
+        user32.EnumWindows.restype = wintypes.BOOL
+        user32.EnumDisplayMonitors.argtypes = (wintypes.HDC, ctypes.POINTER(wintypes.RECT), MonitorEnumProc, wintypes.LPARAM)
+        user32.EnumDisplayMonitors.restype = wintypes.BOOL
+        user32.IsWindowVisible.argtypes = (wintypes.HWND,)
+        user32.IsIconic.argtypes = (wintypes.HWND,)
+        user32.GetWindowLongW.argtypes = (wintypes.HWND, ctypes.c_int)
+        user32.GetWindowLongW.restype = wintypes.LONG
+        user32.GetWindowRect.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.RECT))
+        dwmapi.DwmGetWindowAttribute.argtypes = (wintypes.HWND, wintypes.DWORD, ctypes.c_void_p, wintypes.DWORD)
+        dwmapi.DwmGetWindowAttribute.restype = ctypes.c_long
+        _api = (user32, dwmapi, EnumWindowsProc, MonitorEnumProc)
+    return _api
+
+
+def enum_window_rects() -> List[Tuple[int, Rect]]:
+    """Visible, non-minimized, non-cloaked top-level windows, topmost first.
+
+    Rects are the DWM extended frame bounds, which exclude the invisible
+    resize borders that ``GetWindowRect`` includes on Windows 10 and later.
+    Click-through (``WS_EX_TRANSPARENT``) overlays do not occlude anything and
+    are skipped.
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    user32, dwmapi, EnumWindowsProc, _ = _dlls()
+    GWL_EXSTYLE = -20
+    WS_EX_TRANSPARENT = 0x00000020
+    DWMWA_EXTENDED_FRAME_BOUNDS = 9
+    DWMWA_CLOAKED = 14
+
+    windows: List[Tuple[int, Rect]] = []
+    rect = wintypes.RECT()
+    cloaked = wintypes.DWORD()
+
+    @EnumWindowsProc
+    def visit(hwnd, _):
+        if not user32.IsWindowVisible(hwnd) or user32.IsIconic(hwnd):
+            return True
+        if user32.GetWindowLongW(hwnd, GWL_EXSTYLE) & WS_EX_TRANSPARENT:
+            return True
+        if dwmapi.DwmGetWindowAttribute(hwnd, DWMWA_CLOAKED, ctypes.byref(cloaked), ctypes.sizeof(cloaked)) == 0 and cloaked.value:
+            return True
+        if dwmapi.DwmGetWindowAttribute(hwnd, DWMWA_EXTENDED_FRAME_BOUNDS, ctypes.byref(rect), ctypes.sizeof(rect)) != 0:
+            user32.GetWindowRect(hwnd, ctypes.byref(rect))
+        if rect.right > rect.left and rect.bottom > rect.top:
+            windows.append((int(hwnd), (rect.left, rect.top, rect.right, rect.bottom)))
+        return True
+
+    user32.EnumWindows(visit, 0)
+    return windows
+
+
+def monitor_rects() -> List[Rect]:
+    """Bounds of every attached monitor, in virtual-screen coordinates."""
+    user32, _, _, MonitorEnumProc = _dlls()
+    monitors: List[Rect] = []
+
+    @MonitorEnumProc
+    def visit(monitor, dc, rect, _):
+        r = rect.contents
+        monitors.append((r.left, r.top, r.right, r.bottom))
+        return True
+
+    user32.EnumDisplayMonitors(None, None, visit, 0)
+    return monitors
+
+
+@dataclass
+class Visibility:
+    """Per-row visibility of one :class:`ElementTable`."""
+
+    fraction: np.ndarray  # float32, share of sample points a user can see
+    offscreen: np.ndarray  # bool, no sample on a monitor inside the viewport
+    occluded: np.ndarray  # bool, on screen but every sample covered by windows above
+
+    @property
+    def hidden(self) -> np.ndarray:
+        return self.offscreen | self.occluded
+
+    @property
+    def visible(self) -> np.ndarray:
+        return ~self.hidden
+
+
+def row_windows(snapshot: TreeSnapshot) -> np.ndarray:
+    """Owning top-level window handle of every row of ``snapshot``."""
+    owners = np.full(len(snapshot.elements), snapshot.hwnd, dtype=np.int64)
+    for window in snapshot.windows:
+        owners[window.start:window.stop] = window.hwnd
+    return owners
+
+
+def viewport_bounds(table: ElementTable) -> np.ndarray:
+    """``(n, 4)`` clip rect of every row: the intersection of its viewport ancestors' rects.
+
+    Rows without a viewport ancestor get unbounded limits. Parents always
+    precede their children in depth order, so one vectorized pass per depth
+    level propagates the bounds down the tree.
+    """
+    n = len(table)
+    big = np.iinfo(np.int32).max
+    bounds = np.tile(np.array([-big, -big, big, big], dtype=np.int32), (n, 1))
+    if not n:
+        return bounds
+    parents = table.parents
+    clips = table.type_mask(VIEWPORT_CONTROL_TYPES)
+    rects = table.rects
+    sized = (rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1])
+    clips &= sized  # a viewport without bounds clips nothing
+    for depth in np.unique(table.depths):
+        rows = np.flatnonzero((table.depths == depth) & (parents >= 0))
+        if not len(rows):
+            continue
+        parent = parents[rows]
+        inherited = bounds[parent]
+        own = np.where(clips[parent][:, None], rects[parent], inherited)
+        bounds[rows, :2] = np.maximum(inherited[:, :2], own[:, :2])
+        bounds[rows, 2:] = np.minimum(inherited[:, 2:], own[:, 2:])
+    return bounds
+
+
+class VisibilityFilter:
+    """Estimate on-screen, unoccluded area for every row of a snapshot.
+
+    ``enumerate_windows`` returns ``(hwnd, rect)`` topmost first and
+    ``enumerate_monitors`` the monitor rects; both are injectable for tests.
+    ``samples`` is the grid size per axis. Rows whose window is missing from
+    the z-order are only checked against the screen, never dropped as
+    occluded.
+    """
+
+    def __init__(
+        self,
+        enumerate_windows: Callable[[], List[Tuple[int, Rect]]] = enum_window_rects,
+        enumerate_monitors: Callable[[], List[Rect]] = monitor_rects,
+        samples: int = 4,
+    ):
+        self._enumerate_windows = enumerate_windows
+        self._enumerate_monitors = enumerate_monitors
+        self.samples = samples
+
+    def measure(self, snapshot: TreeSnapshot) -> Visibility:
+        return self.compute(
+            snapshot.elements,
+            row_windows(snapshot),
+            self._enumerate_windows(),
+            self._enumerate_monitors(),
+        )
+
+    def compute(
+        self,
+        table: ElementTable,
+        owners: np.ndarray,
+        windows: List[Tuple[int, Rect]],
+        monitors: List[Rect],
+    ) -> Visibility:
+        n = len(table)
+        rects = table.rects.astype(np.float64)
+
+        # An s x s grid of sample points over each rect. The grid is separable,
+        # so rect tests compare s x and s y coordinates and combine them into
+        # (n, s, s) afterwards instead of comparing all s*s points.
+        steps = (np.arange(self.samples) + 0.5) / self.samples
+        width = rects[:, 2] - rects[:, 0]
+        height = rects[:, 3] - rects[:, 1]
+        xs = rects[:, 0, None] + width[:, None] * steps
+        ys = rects[:, 1, None] + height[:, None] * steps
+        sized = (width > 0) & (height > 0)
+
+        if monitors:
+            on_screen = _inside_any(xs, ys, np.asarray(monitors, dtype=np.float64).reshape(-1, 4))
+        else:  # monitor enumeration failed; do not drop everything
+            on_screen = np.ones((n, self.samples, self.samples), dtype=bool)
+        bounds = viewport_bounds(table).astype(np.float64)
+        on_screen &= _inside(xs, ys, bounds)
+        on_screen &= sized[:, None, None]
+
+        # Cover each owner window's rows by the windows stacked above it.
+        covered = np.zeros_like(on_screen)
+        z_order: Dict[int, int] = {}
+        for z, (hwnd, _) in enumerate(windows):
+            z_order.setdefault(hwnd, z)
+        window_rects = np.asarray([rect for _, rect in windows], dtype=np.float64).reshape(-1, 4)
+        for owner in np.unique(owners):
+            above = z_order.get(int(owner), 0)
+            if not above:
+                continue
+            rows = np.flatnonzero(owners == owner)
+            covered[rows] = _inside_any(xs[rows], ys[rows], window_rects[:above])
+
+        seen = (on_screen & ~covered).reshape(n, -1)
+        on_screen = on_screen.reshape(n, -1)
+        offscreen = ~on_screen.any(axis=1)
+        return Visibility(
+            fraction=seen.mean(axis=1, dtype=np.float32),
+            offscreen=offscreen,
+            occluded=~offscreen & ~seen.any(axis=1),
+        )
+
+
+def _inside(xs: np.ndarray, ys: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """(n, s, s) grid points of row i inside ``bounds[i]``; rows are (y, x)."""
+    inside_x = (xs >= bounds[:, 0, None]) & (xs < bounds[:, 2, None])
+    inside_y = (ys >= bounds[:, 1, None]) & (ys < bounds[:, 3, None])
+    return inside_y[:, :, None] & inside_x[:, None, :]
+
+
+def _inside_any(xs: np.ndarray, ys: np.ndarray, rects: np.ndarray) -> np.ndarray:
+    """(n, s, s) grid points inside at least one of the (m, 4) ``rects``."""
+    n, s = xs.shape
+    if not len(rects):
+        return np.zeros((n, s, s), dtype=bool)
+    inside_x = (xs[..., None] >= rects[:, 0]) & (xs[..., None] < rects[:, 2])  # (n, s, m)
+    inside_y = (ys[..., None] >= rects[:, 1]) & (ys[..., None] < rects[:, 3])
+    return (inside_y[:, :, None, :] & inside_x[:, None, :, :]).any(axis=-1)
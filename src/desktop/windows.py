@@ -0,0 +1,521 @@
+"""Top-level windows: a native backend, a maintained table and name matching.
+
+State-Tool used to build its "Opened Apps" list by scanning every process with
+``psutil.process_iter`` on every call, which mostly listed background services.
+:class:`WindowTable` instead enumerates top-level windows with ``EnumWindows``
+(about a millisecond), keeps the result until a :class:`WindowEventSource`
+reports that a window was created, destroyed, shown, hidden or renamed, and
+only resolves process names for PIDs that were not in the table before.
+
+Switch-Tool and Window-Tool used to find and move windows with a PowerShell
+``Get-Process`` scan. They now go through a :class:`WindowBackend`:
+:class:`Win32WindowBackend` calls user32 through ``ctypes``, and
+:class:`FakeWindowBackend` keeps windows in memory so the matching and
+window logic runs on any platform. :func:`rank_windows` resolves a spoken
+name ("calc", "vscode") to windows through :data:`APP_ALIASES` plus fuzzy
+title matching.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psutil
+from fuzzywuzzy import fuzz
+
+from .tree_cache import EventSource, TreeEvent, winevent_api
+
+
+WINDOWS_CHANGED = 'windows'
+
+RawWindow = Tuple[int, str, int]  # hwnd, title, pid
+Rect = Tuple[int, int, int, int]  # left, top, right, bottom
+
+# Process names and window titles to also try for common application names
+APP_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'calculator': ('CalculatorApp', 'Calculator'),
+    'calc': ('CalculatorApp', 'Calculator'),
+    'notepad': ('Notepad',),
+    'chrome': ('chrome', 'Google Chrome'),
+    'edge': ('msedge', 'Microsoft Edge', 'MicrosoftEdge'),
+    'firefox': ('firefox', 'Mozilla Firefox'),
+    'code': ('Code', 'Visual Studio Code'),
+    'vscode': ('Code', 'Visual Studio Code'),
+    'explorer': ('explorer', 'File Explorer'),
+    'powershell': ('powershell', 'Windows PowerShell'),
+    'cmd': ('cmd', 'Command Prompt'),
+}
+
+FUZZY_THRESHOLD = 70  # minimum fuzzy title score, out of 100
+MIN_PARTIAL_LENGTH = 3  # shorter queries only match a process name exactly
+
+
+@dataclass(frozen=True)
+class WindowInfo:
+    hwnd: int
+    title: str
+    pid: int
+    process_name: str
+
+
+def process_name(pid: int) -> str:
+    try:
+        name = psutil.Process(pid).name()
+    except (psutil.Error, OSError):
+        return 'unknown'
+    return name[:-4] if name.lower().endswith('.exe') else name
+
+
+class WindowBackend(ABC):
+    """Enumerate and manipulate top-level windows."""
+
+    @abstractmethod
+    def list_windows(self) -> List[RawWindow]:
+        """Switchable windows (Alt+Tab rules), topmost first."""
+
+    @abstractmethod
+    def process_name(self, pid: int) -> str:
+        """Executable name without ``.exe``, or ``'unknown'``."""
+
+    @abstractmethod
+    def foreground_window(self) -> int:
+        """Handle of the foreground window, 0 if none."""
+
+    @abstractmethod
+    def activate(self, hwnd: int) -> bool:
+        """Restore ``hwnd`` if minimized and bring it to the foreground."""
+
+    @abstractmethod
+    def show(self, hwnd: int, state: str) -> bool:
+        """Set ``state``: ``'minimize'``, ``'maximize'`` or ``'restore'``."""
+
+    @abstractmethod
+    def close(self, hwnd: int) -> bool:
+        """Ask the window to close, as its close button would."""
+
+    @abstractmethod
+    def resize(self, hwnd: int, width: int, height: int) -> bool:
+        """Resize keeping the top-left corner and z-order."""
+
+
+class Win32WindowBackend(WindowBackend):
+    """user32 calls through ctypes, each well under a millisecond.
+
+    The calls go through private ``WinDLL`` instances with their prototypes
+    declared, so window handles are passed as pointer-sized ``HWND`` values
+    and other modules' ctypes declarations cannot change them.
+    """
+
+    _SHOW_COMMANDS = {'maximize': 3, 'minimize': 6, 'restore': 9}
+    _WM_CLOSE = 0x0010
+    _SWP_NOMOVE = 0x0002
+    _SWP_NOZORDER = 0x0004
+    _SWP_NOACTIVATE = 0x0010
+    _GW_OWNER = 4
+    _GWL_EXSTYLE = -20
+    _WS_EX_TOOLWINDOW = 0x00000080
+    _DWMWA_CLOAKED = 14
+
+    def __init__(self):
+        self._api = None
+        self._enum_proc = None
+
+    def list_windows(self) -> List[RawWindow]:
+        """Visible, titled, unowned top-level windows in z-order (Alt+Tab rules)."""
+        import ctypes
+        from ctypes import wintypes
+
+        user32, _, dwmapi = self._dlls()
+        windows: List[RawWindow] = []
+        buffer = ctypes.create_unicode_buffer(512)
+        cloaked = wintypes.DWORD()
+        pid = wintypes.DWORD()
+
+        def visit(hwnd, _):
+            if not user32.IsWindowVisible(hwnd) or user32.GetWindow(hwnd, self._GW_OWNER):
+                return True
+            if user32.GetWindowLongW(hwnd, self._GWL_EXSTYLE) & self._WS_EX_TOOLWINDOW:
+                return True
+            # Suspended UWP frames and windows on other virtual desktops are cloaked.
+            if dwmapi.DwmGetWindowAttribute(hwnd, self._DWMWA_CLOAKED, ctypes.byref(cloaked), ctypes.sizeof(cloaked)) == 0 and cloaked.value:
+                return True
+            if not user32.GetWindowTextW(hwnd, buffer, len(buffer)):
+                return True
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            windows.append((int(hwnd), buffer.value, int(pid.value)))
+            return True
+
+        user32.EnumWindows(self._enum_proc(visit), 0)
+        return windows
+
+    def process_name(self, pid: int) -> str:
+        return process_name(pid)
+
+    def foreground_window(self) -> int:
+        user32, _, _ = self._dlls()
+        return int(user32.GetForegroundWindow() or 0)
+
+    def activate(self, hwnd: int) -> bool:
+        user32, kernel32, _ = self._dlls()
+        if user32.IsIconic(hwnd):
+            user32.ShowWindow(hwnd, self._SHOW_COMMANDS['restore'])
+        # Windows only lets the foreground thread hand over the foreground, so
+        # share its input state for the duration of the call.
+        foreground_thread = user32.GetWindowThreadProcessId(user32.GetForegroundWindow(), None)
+        current_thread = kernel32.GetCurrentThreadId()
+        attached = bool(foreground_thread) and foreground_thread != current_thread and bool(
+            user32.AttachThreadInput(current_thread, foreground_thread, True)
+        )
+        try:
+            user32.BringWindowToTop(hwnd)
+            return bool(user32.SetForegroundWindow(hwnd))
+        finally:
+            if attached:
+                user32.AttachThreadInput(current_thread, foreground_thread, False)
+
+    def show(self, hwnd: int, state: str) -> bool:
+        user32, _, _ = self._dlls()
+        user32.ShowWindow(hwnd, self._SHOW_COMMANDS[state])
+        return True  # ShowWindow returns the previous visibility, not success
+
+    def close(self, hwnd: int) -> bool:
+        user32, _, _ = self._dlls()
+        # Posted rather than sent: a "save changes?" prompt must not block us.
+        return bool(user32.PostMessageW(hwnd, self._WM_CLOSE, 0, 0))
+
+    def resize(self, hwnd: int, width: int, height: int) -> bool:
+        user32, _, _ = self._dlls()
+        flags = self._SWP_NOMOVE | self._SWP_NOZORDER | self._SWP_NOACTIVATE
+        return bool(user32.SetWindowPos(hwnd, None, 0, 0, width, height, flags))
+
+    def _dlls(self):
+        if self._api is None:
+            import ctypes
+            from ctypes import wintypes
+
+            user32 = ctypes.WinDLL('user32', use_last_error=True)
+            kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+            dwmapi = ctypes.WinDLL('dwmapi', use_last_error=True)
+            self._enum_proc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+            user32.EnumWindows.argtypes = (self._enum_proc, wintypes.LPARAM)
+            user32.IsWindowVisible.argtypes = (wintypes.HWND,)
+            user32.GetWindow.argtypes = (wintypes.HWND, wintypes.UINT)
+            user32.GetWindow.restype = wintypes.HWND
+            user32.GetWindowLongW.argtypes = (wintypes.HWND, ctypes.c_int)
+            user32.GetWindowLongW.restype = wintypes.LONG
+            user32.GetWindowTextW.argtypes = (wintypes.HWND, wintypes.LPWSTR, ctypes.c_int)
+            user32.GetWindowThreadProcessId.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.DWORD))
+            user32.GetWindowThreadProcessId.restype = wintypes.DWORD
+            user32.GetForegroundWindow.argtypes = ()
+            user32.GetForegroundWindow.restype = wintypes.HWND
+            user32.IsIconic.argtypes = (wintypes.HWND,)
+            user32.ShowWindow.argtypes = (wintypes.HWND, ctypes.c_int)
+            user32.AttachThreadInput.argtypes = (wintypes.DWORD, wintypes.DWORD, wintypes.BOOL)
+            user32.BringWindowToTop.argtypes = (wintypes.HWND,)
+            user32.SetForegroundWindow.argtypes = (wintypes.HWND,)
+            user32.PostMessageW.argtypes = (wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+            user32.SetWindowPos.argtypes = (
+                wintypes.HWND, wintypes.HWND, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int, wintypes.UINT,
+            )
+            kernel32.GetCurrentThreadId.restype = wintypes.DWORD
+            dwmapi.DwmGetWindowAttribute.argtypes = (wintypes.HWND, wintypes.DWORD, ctypes.c_void_p, wintypes.DWORD)
+            dwmapi.DwmGetWindowAttribute.restype = ctypes.c_long
+            self._api = (user32, kernel32, dwmapi)
+        return self._api
+
+
+@dataclass
+class FakeWindow:
+    hwnd: int
+    title: str
+    pid: int
+    process_name: str
+    rect: Rect = (0, 0, 800, 600)
+    state: str = 'restore'
+
+
+@dataclass
+class FakeWindowBackend(WindowBackend):
+    """In-memory windows, topmost first, for running window logic off Windows."""
+
+    windows: List[FakeWindow] = field(default_factory=list)
+    calls: List[Tuple[str, int]] = field(default_factory=list)
+
+    def list_windows(self) -> List[RawWindow]:
+        return [(w.hwnd, w.title, w.pid) for w in self.windows if w.state != 'closed']
+
+    def process_name(self, pid: int) -> str:
+        return next((w.process_name for w in self.windows if w.pid == pid), 'unknown')
+
+    def foreground_window(self) -> int:
+        return next((w.hwnd for w in self.windows if w.state != 'closed'), 0)
+
+    def activate(self, hwnd: int) -> bool:
+        window = self._get(hwnd)
+        if window is None:
+            return False
+        self.calls.append(('activate', hwnd))
+        if window.state == 'minimize':
+            window.state = 'restore'
+        self.windows.remove(window)
+        self.windows.insert(0, window)
+        return True
+
+    def show(self, hwnd: int, state: str) -> bool:
+        window = self._get(hwnd)
+        self.calls.append((state, hwnd))
+        if window is not None:
+            window.state = state
+        return window is not None
+
+    def close(self, hwnd: int) -> bool:
+        return self.show(hwnd, 'closed')
+
+    def resize(self, hwnd: int, width: int, height: int) -> bool:
+        window = self._get(hwnd)
+        self.calls.append(('resize', hwnd))
+        if window is None:
+            return False
+        left, top = window.rect[:2]
+        window.rect = (left, top, left + width, top + height)
+        return True
+
+    def _get(self, hwnd: int) -> Optional[FakeWindow]:
+        return next((w for w in self.windows if w.hwnd == hwnd and w.state != 'closed'), None)
+
+
+def rank_windows(
+    query: str,
+    windows: Iterable[WindowInfo],
+    aliases: Dict[str, Tuple[str, ...]] = APP_ALIASES,
+) -> List[Tuple[int, WindowInfo]]:
+    """Windows matching ``query``, best first, as ``(score, window)``.
+
+    The query and its aliases are tried against process names and titles.
+    An exact process name scores 100, a process name prefix 90, a substring
+    of the process name or title 80, and otherwise the fuzzy title score
+    counts if it reaches :data:`FUZZY_THRESHOLD`. Terms shorter than
+    :data:`MIN_PARTIAL_LENGTH` only match exactly, so "a" does not pick
+    whichever window has an "a" in its title. Ties keep z-order, so the most
+    recently used window comes first.
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    terms = [query, *(alias.lower() for alias in aliases.get(query, ()))]
+    ranked = []
+    for order, window in enumerate(windows):
+        process, title = window.process_name.lower(), window.title.lower()
+        score = 0
+        for term in terms:
+            if process == term:
+                score = max(score, 100)
+            elif len(term) < MIN_PARTIAL_LENGTH:
+                continue
+            elif process.startswith(term):
+                score = max(score, 90)
+            elif term in process or term in title:
+                score = max(score, 80)
+            else:
+                fuzzy = fuzz.partial_ratio(term, title)
+                if fuzzy >= FUZZY_THRESHOLD:
+                    score = max(score, min(fuzzy, 79))
+        if score:
+            ranked.append((score, order, window))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return [(score, window) for score, _, window in ranked]
+
+
+class WindowTable:
+    """Top-level windows with owning process names, refreshed on change.
+
+    With an event source running, the enumeration is reused until a window
+    event arrives or ``max_age`` seconds pass (in case an event was missed).
+    Without one, every read re-enumerates, which is still far cheaper than a
+    process scan. Process names are cached per PID and dropped when the PID
+    no longer owns a window.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[WindowBackend] = None,
+        source: Optional[EventSource] = None,
+        max_age: float = 30.0,
+    ):
+        self.backend = backend or Win32WindowBackend()
+        self._source = source
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._windows: List[WindowInfo] = []
+        self._names: Dict[int, str] = {}
+        self._dirty = True
+        self._refreshed_at = 0.0
+        self._watching = False
+        self._hits = 0
+        self._refreshes = 0
+        self._lookups = 0
+        self._events = 0
+
+    def start(self) -> None:
+        """Start listening for window events, if a source was given."""
+        if self._source is not None and not self._watching:
+            self._watching = True
+            self._source.start(self._on_event)
+
+    def stop(self) -> None:
+        if self._source is not None and self._watching:
+            self._source.stop()
+            self._watching = False
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._dirty = True
+
+    def windows(self) -> List[WindowInfo]:
+        with self._lock:
+            fresh = (
+                self._watching
+                and not self._dirty
+                and time.monotonic() - self._refreshed_at <= self.max_age
+            )
+            if fresh:
+                self._hits += 1
+                return self._windows
+            self._dirty = False  # events from here on dirty the next read
+        return self.refresh()
+
+    def refresh(self) -> List[WindowInfo]:
+        raw = self.backend.list_windows()
+        with self._lock:
+            pids = {pid for _, _, pid in raw}
+            for pid in self._names.keys() - pids:
+                del self._names[pid]
+            for pid in pids - self._names.keys():
+                self._names[pid] = self.backend.process_name(pid)
+                self._lookups += 1
+            self._windows = [WindowInfo(hwnd, title, pid, self._names[pid]) for hwnd, title, pid in raw]
+            self._refreshed_at = time.monotonic()
+            self._refreshes += 1
+            return self._windows
+
+    def find(self, query: str) -> List[Tuple[int, WindowInfo]]:
+        """Ranked matches for ``query``; re-enumerates once if the table has none."""
+        matches = rank_windows(query, self.windows())
+        return matches or rank_windows(query, self.refresh())
+
+    def app_lines(self) -> List[str]:
+        """One "process: title" entry per window, for State-Tool."""
+        return [f"{window.process_name}: {window.title}" for window in self.windows()]
+
+    @property
+    def event_count(self) -> int:
+        """Window events received so far; waiters poll it to notice changes cheaply."""
+        return self._events
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'windows': len(self._windows),
+                'processes': len(self._names),
+                'watching': self._watching,
+                'hits': self._hits,
+                'refreshes': self._refreshes,
+                'process_lookups': self._lookups,
+            }
+
+    def _on_event(self, event: TreeEvent) -> None:
+        with self._lock:
+            self._dirty = True
+            self._events += 1
+
+
+class WindowEventSource(EventSource):
+    """WinEvent hooks for top-level window create/destroy/show/hide/rename.
+
+    Out-of-context hooks deliver through the message queue of the thread that
+    installed them, so the hooks live on a dedicated thread pumping messages.
+    """
+
+    _EVENT_OBJECT_CREATE = 0x8000
+    _EVENT_OBJECT_HIDE = 0x8003  # CREATE, DESTROY, SHOW, HIDE are contiguous
+    _EVENT_OBJECT_NAMECHANGE = 0x800C
+    _WINEVENT_OUTOFCONTEXT = 0x0000
+    _OBJID_WINDOW = 0
+    _GA_ROOT = 2
+    _WM_QUIT = 0x0012
+
+    def __init__(self):
+        self._sink = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id = 0
+        self._ready = threading.Event()
+
+    def start(self, sink) -> None:
+        if self._thread is not None:
+            return
+        self._sink = sink
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name='clippy-window-events', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        if self._thread_id:
+            user32, _, _ = winevent_api()
+            user32.PostThreadMessageW(self._thread_id, self._WM_QUIT, 0, 0)
+        thread.join(timeout=5)
+        self._thread = None
+        self._thread_id = 0
+        self._sink = None
+
+    def _run(self) -> None:
+        try:
+            self._pump()
+        finally:
+            self._ready.set()  # never leave start() waiting on a failed thread
+
+    def _pump(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        user32, kernel32, WinEventProc = winevent_api()
+        self._thread_id = kernel32.GetCurrentThreadId()
+
+        def on_event(hook, event, hwnd, id_object, id_child, thread, timestamp):
+            if id_object != self._OBJID_WINDOW or id_child != 0 or not hwnd:
+                return
+            if user32.GetAncestor(hwnd, self._GA_ROOT) != hwnd:
+                return  # child window
+            sink = self._sink
+            if sink is not None:
+                sink(TreeEvent(WINDOWS_CHANGED, hwnd))
+
+        callback = WinEventProc(on_event)
+        hooks = [
+            user32.SetWinEventHook(low, high, 0, callback, 0, 0, self._WINEVENT_OUTOFCONTEXT)
+            for low, high in (
+                (self._EVENT_OBJECT_CREATE, self._EVENT_OBJECT_HIDE),
+                (self._EVENT_OBJECT_NAMECHANGE, self._EVENT_OBJECT_NAMECHANGE),
+            )
+        ]
+        self._ready.set()
+
+        msg = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            for hook in hooks:
+                if hook:
+                    with contextlib.suppress(Exception):
+                        user32.UnhookWinEvent(hook)
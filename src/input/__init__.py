@@ -0,0 +1,39 @@
+"""Synthesized keyboard and mouse input for the desktop tools.
+
+:class:`InputPacer` replaces pyautogui's fixed pause after every call with a
+wait that ends as soon as the target UI has settled. :class:`TextInjector`
+types text through UI Automation, the clipboard or Unicode ``SendInput``
+batches and checks it by reading the control back. :class:`MacroRunner`
+runs a validated plan of input steps (:func:`compile_plan`) on a dedicated
+input thread, and :func:`wait_until` replaces fixed sleeps with waits on
+window, element, process, screen and page-load conditions.
+:class:`InputDispatcher` owns the thread all of this input and UI Automation
+work runs on.
+"""
+
+from .pacing import (
+    INPUT_IDLE, SCREEN_STABLE, TIMEOUT, UI_EVENTS,
+    InputPacer, Mark, SettleReport, foreground_signature, summarize, wait_input_idle,
+)
+from .dispatch import BATCH, INTERACTIVE, DispatcherClosed, InputDispatcher
+from .macro import CONDITIONS, MacroError, MacroResult, MacroRunner, MacroStep, StepResult, compile_plan
+from .wait import (
+    CdpLoadEvent, Check, Not, Predicate, ProcessRunning, RegionStable, WaitResult, region_signature, wait_until,
+)
+from .text import (
+    CLIPBOARD, SENDINPUT, VALUE,
+    Clipboard, FakeTextField, InjectionError, InjectionReport, Keyboard, TextInjector, TextTarget,
+    UIATextTarget, Win32Clipboard, Win32Keyboard,
+)
+
+__all__ = [
+    'INPUT_IDLE', 'SCREEN_STABLE', 'TIMEOUT', 'UI_EVENTS',
+    'InputPacer', 'Mark', 'SettleReport', 'foreground_signature', 'summarize', 'wait_input_idle',
+    'BATCH', 'INTERACTIVE', 'DispatcherClosed', 'InputDispatcher',
+    'CONDITIONS', 'MacroError', 'MacroResult', 'MacroRunner', 'MacroStep', 'StepResult', 'compile_plan',
+    'CLIPBOARD', 'SENDINPUT', 'VALUE',
+    'Clipboard', 'FakeTextField', 'InjectionError', 'InjectionReport', 'Keyboard', 'TextInjector', 'TextTarget',
+    'UIATextTarget', 'Win32Clipboard', 'Win32Keyboard',
+    'CdpLoadEvent', 'Check', 'Not', 'Predicate', 'ProcessRunning', 'RegionStable', 'WaitResult', 'region_signature',
+    'wait_until',
+]
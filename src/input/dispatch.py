@@ -0,0 +1,233 @@
+"""One owner thread for synthesized input and UI Automation calls.
+
+FastMCP runs sync tools on whatever worker thread is free. Two clients
+clicking and typing at once interleaved their keystrokes, and UIA calls from
+threads that never called ``CoInitialize`` failed. :class:`InputDispatcher`
+runs all of that work on a single thread that initializes COM once:
+
+- Jobs are queued by priority, lower numbers first.
+- Within a priority, sessions take turns. A session that queues 50 steps
+  does not hold back another session's single click for all 50.
+- A queued job can be cancelled, and an awaiting caller that is cancelled
+  removes its job. A job that has started runs to completion; long jobs
+  take their own cancel event, as :class:`~.macro.MacroRunner` does.
+- :meth:`InputDispatcher.stats` reports queue depth and the time jobs waited
+  and ran.
+
+Tools that do no UI work stay off this thread, so they never wait behind it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+
+INTERACTIVE = 0  # single tool actions
+BATCH = 1  # macros and other multi-step work
+
+_SAMPLES = 512  # wait and run times kept for the percentiles
+
+
+class DispatcherClosed(RuntimeError):
+    """Raised for work submitted after :meth:`InputDispatcher.close`."""
+
+
+@dataclass(eq=False)  # jobs are matched by identity; args may not compare, e.g. arrays
+class _Job:
+    func: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    priority: int
+    session: Hashable
+    future: Future = field(default_factory=Future)
+    queued_at: float = 0.0
+
+
+class InputDispatcher:
+    """Serialized, prioritized, per-session-fair execution on one thread.
+
+    ``initializer`` runs once on the owner thread before any job, for
+    example to COM-initialize it for UI Automation.
+    """
+
+    def __init__(
+        self,
+        initializer: Optional[Callable[[], None]] = None,
+        name: str = 'clippy-input',
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self._initializer = initializer
+        self._name = name
+        self._clock = clock
+        self._cond = threading.Condition()
+        # priority -> session -> jobs; dict order is the sessions' turn order
+        self._queues: Dict[int, 'collections.OrderedDict[Hashable, Deque[_Job]]'] = {}
+        self._depth = 0
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id: Optional[int] = None
+        self._closed = False
+        self._running: Optional[_Job] = None
+        self._counters = dict.fromkeys(('submitted', 'completed', 'failed', 'cancelled'), 0)
+        self._max_depth = 0
+        self._waits: Deque[float] = collections.deque(maxlen=_SAMPLES)
+        self._runs: Deque[float] = collections.deque(maxlen=_SAMPLES)
+        self._sessions: Dict[Hashable, int] = collections.Counter()
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        *args,
+        priority: int = INTERACTIVE,
+        session: Hashable = None,
+        **kwargs,
+    ) -> Future:
+        """Queue ``func(*args, **kwargs)``; the future resolves with its result.
+
+        Called from the owner thread itself, ``func`` runs inline, since
+        queueing it would deadlock the job that is waiting for it.
+        """
+        job = _Job(func, args, kwargs, priority, session)
+        if self.on_owner_thread():
+            if job.future.set_running_or_notify_cancel():
+                self._execute(job)
+            return job.future
+        with self._cond:
+            if self._closed:
+                raise DispatcherClosed('the input dispatcher is closed')
+            self._ensure_thread()
+            job.queued_at = self._clock()
+            sessions = self._queues.setdefault(priority, collections.OrderedDict())
+            sessions.setdefault(session, collections.deque()).append(job)
+            self._depth += 1
+            self._max_depth = max(self._max_depth, self._depth)
+            self._counters['submitted'] += 1
+            self._sessions[session] += 1
+            self._cond.notify()
+        job.future.add_done_callback(lambda future: future.cancelled() and self._discard(job))
+        return job.future
+
+    async def call(
+        self,
+        func: Callable[..., Any],
+        *args,
+        priority: int = INTERACTIVE,
+        session: Hashable = None,
+        **kwargs,
+    ) -> Any:
+        """Await ``func`` on the owner thread. Cancelling the caller drops the job if it has not started."""
+        future = self.submit(func, *args, priority=priority, session=session, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def on_owner_thread(self) -> bool:
+        return self._thread_id is not None and threading.get_ident() == self._thread_id
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Cancel queued jobs, let the running one finish and stop the thread."""
+        with self._cond:
+            self._closed = True
+            pending = [job for sessions in self._queues.values() for jobs in sessions.values() for job in jobs]
+            self._cond.notify_all()
+        for job in pending:
+            job.future.cancel()
+        if self._thread is not None and not self.on_owner_thread():
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._counters,
+                'queue_depth': self._depth,
+                'max_queue_depth': self._max_depth,
+                'running': self._running is not None,
+                'wait_ms': _summary(self._waits),
+                'run_ms': _summary(self._runs),
+                'sessions': len(self._sessions),
+            }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=self._name, daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        self._thread_id = threading.get_ident()
+        if self._initializer is not None:
+            try:
+                self._initializer()
+            except Exception:
+                pass  # jobs that need it will fail with the real error
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None and not self._closed:
+                    self._cond.wait()
+                    job = self._next()
+                if job is None:
+                    return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            with self._cond:
+                self._waits.append((self._clock() - job.queued_at) * 1000)
+                self._running = job
+            self._execute(job)
+            with self._cond:
+                self._running = None
+
+    def _next(self) -> Optional[_Job]:
+        """Pop the next job: lowest priority number, then the session whose turn it is."""
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            while sessions:
+                session, jobs = next(iter(sessions.items()))
+                del sessions[session]
+                if not jobs:
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    sessions[session] = jobs  # back of the line
+                self._depth -= 1
+                return job
+        return None
+
+    def _execute(self, job: _Job) -> None:
+        started = self._clock()
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except BaseException as e:
+            job.future.set_exception(e)
+            outcome = 'failed'
+        else:
+            job.future.set_result(result)
+            outcome = 'completed'
+        with self._cond:
+            self._runs.append((self._clock() - started) * 1000)
+            self._counters[outcome] += 1
+
+    def _discard(self, job: _Job) -> None:
+        with self._cond:
+            self._counters['cancelled'] += 1
+            jobs = self._queues.get(job.priority, {}).get(job.session)
+            if jobs is not None and job in jobs:
+                jobs.remove(job)
+                self._depth -= 1
+
+
+def _summary(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    return {
+        'mean': round(sum(ordered) / len(ordered), 1),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        'max': round(ordered[-1], 1),
+    }
@@ -0,0 +1,305 @@
+"""Input macros: an ordered plan of pointer and keyboard steps run in one call.
+
+A form fill used to take one MCP round trip per click, keystroke and check.
+Macro-Tool takes the whole plan instead:
+
+- :func:`compile_plan` validates every step before anything runs, so a typo
+  in step 12 is reported before step 1 has clicked anything.
+- :class:`MacroRunner` runs a plan step by step. The server runs it as one
+  job on the :class:`~.dispatch.InputDispatcher` thread, so no other input
+  lands between its steps. Each step goes through the
+  :class:`~.pacing.InputPacer` and can carry an ``expect`` postcondition.
+- With ``stop_on_failure`` the first failed step or postcondition ends the
+  run and the remaining steps are reported as skipped.
+
+Steps are plain dicts such as ``{"action": "click", "x": 10, "y": 20}``. The
+runner does not know how to click; it calls the handler registered for each
+action, and a waiter (built on :func:`~.wait.wait_until`) for ``wait_for``
+and ``expect``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+
+from .pacing import InputPacer, SettleReport
+
+
+MAX_STEPS = 200
+DEFAULT_EXPECT_TIMEOUT = 5.0
+
+_NUMBER = (int, float)
+
+# action -> (required params, optional params); each maps a name to its type(s)
+_SCHEMA: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {
+    'click': ({'x': int, 'y': int}, {'button': str, 'clicks': int}),
+    'type': ({'text': str}, {'x': int, 'y': int, 'clear': bool}),
+    'key': ({'key': str}, {}),
+    'shortcut': ({'keys': list}, {}),
+    'scroll': ({}, {'x': int, 'y': int, 'direction': str, 'amount': int}),
+    'drag': ({'from_x': int, 'from_y': int, 'to_x': int, 'to_y': int}, {}),
+    'move': ({'x': int, 'y': int}, {}),
+    'wait_for': ({'condition': dict}, {'timeout': _NUMBER}),
+}
+_COMMON = {'expect': dict, 'expect_timeout': _NUMBER, 'label': str}
+_CHOICES = {
+    'button': ('left', 'right', 'middle'),
+    'direction': ('up', 'down', 'left', 'right'),
+}
+_RANGES = {'clicks': (1, 3), 'amount': (1, 100), 'timeout': (0, 120), 'expect_timeout': (0, 120)}
+
+# Condition kinds for wait_for and expect; each takes a string argument.
+CONDITIONS: Dict[str, str] = {
+    'element': 'a selector matches in the foreground window',
+    'element_gone': 'a selector no longer matches',
+    'window': 'a window title contains the text',
+    'window_gone': 'no window title contains the text',
+    'process': 'a process with this executable name is running',
+}
+
+
+class MacroError(ValueError):
+    """Raised by :func:`compile_plan` with every problem found in a plan."""
+
+    def __init__(self, problems: Sequence[str]):
+        self.problems = list(problems)
+        super().__init__('; '.join(self.problems))
+
+
+@dataclass(frozen=True)
+class MacroStep:
+    index: int
+    action: str
+    params: Dict[str, Any]
+    expect: Optional[Dict[str, Any]] = None
+    expect_timeout: float = DEFAULT_EXPECT_TIMEOUT
+    label: str = ''
+
+    def describe(self) -> str:
+        if self.label:
+            return self.label
+        shown = ', '.join(f'{name}={value!r}' for name, value in self.params.items())
+        return f'{self.action}({shown})'
+
+
+@dataclass
+class StepResult:
+    index: int
+    action: str
+    step: str  # the step's label or a short rendering of it
+    status: str  # 'ok', 'failed' or 'skipped'
+    detail: str = ''
+    elapsed_ms: float = 0.0
+    settle: Optional[SettleReport] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {'index': self.index, 'action': self.action, 'step': self.step, 'status': self.status, 'elapsed_ms': round(self.elapsed_ms, 1)}
+        if self.detail:
+            result['detail'] = self.detail
+        if self.settle is not None:
+            result['settle'] = str(self.settle)
+        return result
+
+
+@dataclass
+class MacroResult:
+    steps: List[StepResult] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(step.status == 'ok' for step in self.steps)
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = lambda status: sum(step.status == status for step in self.steps)
+        return {
+            'ok': self.ok,
+            'elapsed_ms': round(self.elapsed_ms, 1),
+            'succeeded': count('ok'),
+            'failed': count('failed'),
+            'skipped': count('skipped'),
+            'steps': [step.to_dict() for step in self.steps],
+        }
+
+
+def _check_type(value: Any, expected: Any) -> bool:
+    # bool is an int subclass, but True is not a coordinate.
+    if isinstance(value, bool) and expected is not bool:
+        return False
+    return isinstance(value, expected)
+
+
+def _type_name(expected: Any) -> str:
+    if isinstance(expected, tuple):
+        return 'a number'
+    return {int: 'an integer', str: 'a string', bool: 'a boolean', list: 'a list', dict: 'an object'}[expected]
+
+
+def _check_condition(where: str, condition: Any, validate_selector: Optional[Callable[[str], None]]) -> List[str]:
+    if not isinstance(condition, dict) or len(condition) != 1:
+        return [f'{where} must be an object with exactly one of: {", ".join(CONDITIONS)}']
+    (kind, argument), = condition.items()
+    if kind not in CONDITIONS:
+        return [f'{where} has unknown condition {kind!r}; use one of: {", ".join(CONDITIONS)}']
+    if not isinstance(argument, str) or not argument:
+        return [f'{where}.{kind} must be a non-empty string']
+    if kind in ('element', 'element_gone') and validate_selector is not None:
+        try:
+            validate_selector(argument)
+        except ValueError as e:
+            return [f'{where}.{kind}: {e}']
+    return []
+
+
+def compile_plan(
+    steps: Sequence[Dict[str, Any]],
+    keys: Optional[Collection[str]] = None,
+    validate_selector: Optional[Callable[[str], None]] = None,
+) -> List[MacroStep]:
+    """Validate a whole plan and turn it into :class:`MacroStep` objects.
+
+    ``keys`` is the set of key names ``key`` and ``shortcut`` steps may use,
+    and ``validate_selector`` raises ValueError for a malformed selector.
+    Raises MacroError listing every problem, not just the first.
+    """
+    problems: List[str] = []
+    if not steps:
+        raise MacroError(['the plan has no steps'])
+    if len(steps) > MAX_STEPS:
+        raise MacroError([f'the plan has {len(steps)} steps; the limit is {MAX_STEPS}'])
+    compiled = []
+    for index, raw in enumerate(steps, 1):
+        where = f'step {index}'
+        if not isinstance(raw, dict):
+            problems.append(f'{where} must be an object')
+            continue
+        action = raw.get('action')
+        if action not in _SCHEMA:
+            problems.append(f'{where} has unknown action {action!r}; use one of: {", ".join(_SCHEMA)}')
+            continue
+        required, optional = _SCHEMA[action]
+        allowed = {**required, **optional, **_COMMON}
+        for name in required:
+            if name not in raw:
+                problems.append(f'{where} ({action}) is missing {name!r}')
+        for name, value in raw.items():
+            if name == 'action':
+                continue
+            if name not in allowed:
+                problems.append(f'{where} ({action}) does not take {name!r}')
+            elif not _check_type(value, allowed[name]):
+                problems.append(f'{where} ({action}): {name} must be {_type_name(allowed[name])}')
+            elif name in _CHOICES and value not in _CHOICES[name]:
+                problems.append(f'{where} ({action}): {name} must be one of {", ".join(_CHOICES[name])}')
+            elif name in _RANGES and not _RANGES[name][0] <= value <= _RANGES[name][1]:
+                low, high = _RANGES[name]
+                problems.append(f'{where} ({action}): {name} must be between {low} and {high}')
+        if action in ('type', 'scroll') and ('x' in raw) != ('y' in raw):
+            problems.append(f'{where} ({action}) needs both x and y or neither')
+        names = raw.get('keys') if action == 'shortcut' else [raw.get('key')] if action == 'key' else []
+        if isinstance(names, list):
+            if action == 'shortcut' and not names:
+                problems.append(f'{where} (shortcut) has no keys')
+            for name in names:
+                if not isinstance(name, str) or (keys is not None and name.lower() not in keys):
+                    problems.append(f'{where} ({action}) has unknown key {name!r}')
+        if action == 'wait_for' and 'condition' in raw:
+            problems += _check_condition(f'{where} condition', raw['condition'], validate_selector)
+        if 'expect' in raw:
+            problems += _check_condition(f'{where} expect', raw['expect'], validate_selector)
+        params = {name: value for name, value in raw.items() if name not in _COMMON and name != 'action'}
+        compiled.append(MacroStep(
+            index=index,
+            action=action,
+            params=params,
+            expect=raw.get('expect'),
+            expect_timeout=float(raw.get('expect_timeout', DEFAULT_EXPECT_TIMEOUT)),
+            label=raw.get('label', ''),
+        ))
+    if problems:
+        raise MacroError(problems)
+    return compiled
+
+
+Handler = Callable[..., Optional[str]]
+ConditionWait = Callable[[Dict[str, Any], float], bool]
+StepCallback = Callable[[StepResult, int], None]
+
+
+class MacroRunner:
+    """Run compiled plans step by step.
+
+    ``handlers`` maps each action except ``wait_for`` to a function taking
+    the step's params as keyword arguments. It may return a detail string
+    and raises to fail the step. ``wait(condition, timeout)`` blocks until a
+    condition dict holds and returns False if it timed out, for ``wait_for``
+    and ``expect``.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        wait: ConditionWait,
+        pacer: Optional[InputPacer] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.handlers = dict(handlers)
+        self.wait = wait
+        self.pacer = pacer
+        self._clock = clock
+
+    def run(
+        self,
+        plan: Sequence[MacroStep],
+        stop_on_failure: bool = True,
+        on_step: Optional[StepCallback] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> MacroResult:
+        """Run ``plan`` on the calling thread. ``cancel`` stops it between steps."""
+        result = MacroResult()
+        started = self._clock()
+        stopping = ''
+        for step in plan:
+            if not stopping and cancel is not None and cancel.is_set():
+                stopping = 'cancelled'
+            if stopping:
+                outcome = StepResult(step.index, step.action, step.describe(), 'skipped', stopping)
+            else:
+                outcome = self._step(step)
+                if outcome.status == 'failed' and stop_on_failure:
+                    stopping = f'step {step.index} failed'
+            result.steps.append(outcome)
+            if on_step is not None:
+                on_step(outcome, len(plan))
+        result.elapsed_ms = (self._clock() - started) * 1000
+        return result
+
+    def _step(self, step: MacroStep) -> StepResult:
+        started = self._clock()
+        outcome = StepResult(step.index, step.action, step.describe(), 'ok')
+        try:
+            if step.action == 'wait_for':
+                timeout = float(step.params.get('timeout', DEFAULT_EXPECT_TIMEOUT))
+                if not self.wait(step.params['condition'], timeout):
+                    outcome.status, outcome.detail = 'failed', f'{_describe(step.params["condition"])} not met within {timeout:g} s'
+            else:
+                mark = self.pacer.mark() if self.pacer is not None else None
+                detail = self.handlers[step.action](**step.params)
+                if self.pacer is not None:
+                    outcome.settle = self.pacer.settle(mark)
+                outcome.detail = detail or ''
+                if step.expect is not None and not self.wait(step.expect, step.expect_timeout):
+                    outcome.status = 'failed'
+                    outcome.detail = f'postcondition {_describe(step.expect)} not met within {step.expect_timeout:g} s'
+        except Exception as e:
+            outcome.status, outcome.detail = 'failed', f'{type(e).__name__}: {e}'
+        outcome.elapsed_ms = (self._clock() - started) * 1000
+        return outcome
+
+
+def _describe(condition: Dict[str, Any]) -> str:
+    (kind, argument), = condition.items()
+    return f'{kind} {argument!r}'
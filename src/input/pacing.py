@@ -0,0 +1,263 @@
+"""Adaptive settling after synthesized input.
+
+``pg.PAUSE = 1.0`` made every pyautogui call sleep a full second, whether
+the target reacted in 5 ms or not at all. :class:`InputPacer` waits only
+until the UI has settled after an action:
+
+1. ``min_settle``: a floor, so the target can at least start reacting.
+2. Input idle: the foreground window's process has no pending start-up input
+   (``WaitForInputIdle``), and its thread answers a ``WM_NULL`` sent with a
+   timeout, which also catches a hung window.
+3. Quiet: when UI Automation events arrived after the action, wait until
+   none have arrived for ``quiet`` seconds. Without events, wait until two
+   screen signatures ``quiet`` seconds apart match.
+4. ``max_settle``: a cap. A window that keeps repainting, such as a video,
+   never settles.
+
+Every wait returns a :class:`SettleReport` saying which condition ended it
+and after how long. Tools add it to their reply.
+
+The probes are injectable, so the pacer runs off Windows with fakes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+INPUT_IDLE = 'input-idle'
+UI_EVENTS = 'ui-events'
+SCREEN_STABLE = 'screen-stable'
+TIMEOUT = 'timeout'
+
+
+_api = None
+
+
+def _dlls():
+    """Private ``user32``/``kernel32`` handles with the prototypes used here.
+
+    Declared handle types keep HWNDs and process handles at full pointer
+    width on 64-bit Python; private handles keep the prototypes out of the
+    shared ``ctypes.windll`` objects.
+    """
+    global _api
+    if _api is None:
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        user32.GetForegroundWindow.argtypes = ()
+        user32.GetForegroundWindow.restype = wintypes.HWND
+        user32.GetWindowThreadProcessId.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.DWORD))
+        user32.GetWindowThreadProcessId.restype = wintypes.DWORD
+        user32.GetWindowRect.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.RECT))
+        user32.WaitForInputIdle.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+        user32.WaitForInputIdle.restype = wintypes.DWORD
+        user32.SendMessageTimeoutW.argtypes = (
+            wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM,
+            wintypes.UINT, wintypes.UINT, ctypes.POINTER(ctypes.c_size_t),
+        )
+        user32.SendMessageTimeoutW.restype = ctypes.c_ssize_t
+        kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+        _api = (user32, kernel32)
+    return _api
+
+
+def wait_input_idle(timeout: float) -> bool:
+    """Wait until the foreground window's process and thread are idle; False on timeout."""
+    import ctypes
+    from ctypes import wintypes
+
+    user32, kernel32 = _dlls()
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    SYNCHRONIZE = 0x00100000
+    WAIT_TIMEOUT = 0x102
+    WM_NULL = 0x0000
+    SMTO_ABORTIFHUNG = 0x0002
+
+    hwnd = user32.GetForegroundWindow()
+    if not hwnd:
+        return True
+    started = time.perf_counter()
+    pid = wintypes.DWORD()
+    user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+    process = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION | SYNCHRONIZE, False, pid.value)
+    if process:
+        try:
+            if user32.WaitForInputIdle(process, int(timeout * 1000)) == WAIT_TIMEOUT:
+                return False
+        finally:
+            kernel32.CloseHandle(process)
+    remaining = max(timeout - (time.perf_counter() - started), 0.0)
+    result = ctypes.c_size_t()
+    return bool(user32.SendMessageTimeoutW(
+        hwnd, WM_NULL, 0, 0, SMTO_ABORTIFHUNG, max(int(remaining * 1000), 1), ctypes.byref(result),
+    ))
+
+
+def foreground_signature() -> bytes:
+    """Digest of a reduced grab of the foreground window, for change detection."""
+    import ctypes
+    from ctypes import wintypes
+    from PIL import ImageGrab
+
+    user32, _ = _dlls()
+    rect = wintypes.RECT()
+    hwnd = user32.GetForegroundWindow()
+    bbox = None
+    if hwnd and user32.GetWindowRect(hwnd, ctypes.byref(rect)) and rect.right > rect.left and rect.bottom > rect.top:
+        bbox = (rect.left, rect.top, rect.right, rect.bottom)
+    image = ImageGrab.grab(bbox=bbox, all_screens=True)
+    # A 1/8 reduction averages away cursor blink and subpixel noise but still
+    # shows a changed control.
+    return hashlib.blake2b(image.reduce(8).tobytes(), digest_size=16).digest()
+
+
+@dataclass(frozen=True)
+class SettleReport:
+    reason: str
+    waited_ms: float
+
+    def __str__(self) -> str:
+        if self.reason == TIMEOUT:
+            return f'did not settle within {self.waited_ms:.0f} ms'
+        return f'settled on {self.reason} after {self.waited_ms:.0f} ms'
+
+
+def summarize(reports: Iterable[SettleReport]) -> str:
+    """One line for the settle waits of a multi-step action."""
+    reports = list(reports)
+    if not reports:
+        return 'no settle wait'
+    if len(reports) == 1:
+        return str(reports[0])
+    total = sum(report.waited_ms for report in reports)
+    return f"settled {len(reports)} times in {total:.0f} ms ({', '.join(report.reason for report in reports)})"
+
+
+@dataclass(frozen=True)
+class Mark:
+    """UI event count just before an action, for :meth:`InputPacer.settle`."""
+
+    events: int
+
+
+class InputPacer:
+    """Wait for the UI to settle after each input action.
+
+    ``input_idle(timeout)`` returns False if the target did not go idle in
+    time. ``event_count()`` is a counter of UI Automation events received,
+    and ``signature()`` returns a comparable digest of the screen. Any of
+    them may be None to skip that probe. Probe failures count as "no
+    information", never as an error.
+    """
+
+    def __init__(
+        self,
+        min_settle: float = 0.02,
+        max_settle: float = 1.0,
+        quiet: float = 0.05,
+        poll: float = 0.02,
+        input_idle: Optional[Callable[[float], bool]] = wait_input_idle,
+        event_count: Optional[Callable[[], int]] = None,
+        signature: Optional[Callable[[], object]] = foreground_signature,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.min_settle = min_settle
+        self.max_settle = max_settle
+        self.quiet = quiet
+        self.poll = poll
+        self._input_idle = input_idle
+        self._event_count = event_count
+        self._signature = signature
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Tuple[int, float]] = {}
+
+    def mark(self) -> Mark:
+        return Mark(self._events())
+
+    def run(self, action: Callable, *args, **kwargs) -> SettleReport:
+        """Perform ``action(*args, **kwargs)`` and wait for the UI to settle."""
+        mark = self.mark()
+        action(*args, **kwargs)
+        return self.settle(mark)
+
+    def settle(self, mark: Optional[Mark] = None) -> SettleReport:
+        """Wait until the UI settles after the action that began at ``mark``.
+
+        Times are measured from this call, that is from the end of the action.
+        """
+        mark = mark or self.mark()
+        started = self._clock()
+        deadline = started + self.max_settle
+        if self.min_settle > 0:
+            self._sleep(self.min_settle)
+
+        if self._input_idle is not None:
+            try:
+                idle = self._input_idle(max(deadline - self._clock(), 0.0))
+            except Exception:
+                idle = True
+            if not idle:
+                return self._report(TIMEOUT, started)
+        if self._event_count is None and self._signature is None:
+            return self._report(INPUT_IDLE, started)
+
+        events, last_event = mark.events, None
+        previous, previous_at = None, None
+        while True:
+            now = self._clock()
+            count = self._events()
+            if count != events:
+                events, last_event = count, now
+            elif last_event is not None and now - last_event >= self.quiet:
+                return self._report(UI_EVENTS, started)
+            if last_event is None and self._signature is not None:
+                current = self._screen()
+                if current is not None and current == previous and now - previous_at >= self.quiet:
+                    return self._report(SCREEN_STABLE, started)
+                if current != previous:
+                    previous, previous_at = current, now
+            if now >= deadline:
+                return self._report(TIMEOUT, started)
+            self._sleep(min(self.poll, max(deadline - now, 0.0)))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Settle count and mean wait per reason."""
+        with self._lock:
+            return {
+                reason: {'count': count, 'mean_ms': round(total / count, 1)}
+                for reason, (count, total) in self._stats.items()
+            }
+
+    def _events(self) -> int:
+        if self._event_count is None:
+            return 0
+        try:
+            return int(self._event_count())
+        except Exception:
+            return 0
+
+    def _screen(self) -> object:
+        try:
+            return self._signature()
+        except Exception:
+            return None
+
+    def _report(self, reason: str, started: float) -> SettleReport:
+        waited = (self._clock() - started) * 1000
+        with self._lock:
+            count, total = self._stats.get(reason, (0, 0.0))
+            self._stats[reason] = (count + 1, total + waited)
+        return SettleReport(reason, waited)
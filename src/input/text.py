@@ -0,0 +1,582 @@
+"""Bulk text injection for Type-Tool.
+
+``pg.typewrite(text, interval=0.1)`` typed 10 characters a second and could
+not type anything outside ASCII. :class:`TextInjector` picks the fastest
+strategy the target allows and checks the result by reading it back:
+
+1. ``value``: UI Automation ``ValuePattern.SetValue`` writes the whole text
+   at once. It replaces the value rather than inserting at the caret, so it
+   is only used when clearing the field or when the field is empty.
+2. ``clipboard``: for text of at least ``paste_threshold`` characters, put
+   the text on the clipboard, press Ctrl+V and put the previous clipboard
+   contents back once the paste has landed. When the readback cannot
+   confirm that, the injector first waits for the target to process its
+   input (``settle``), since it reads the clipboard only then.
+3. ``sendinput``: ``SendInput`` with ``KEYEVENTF_UNICODE``, in batches of
+   ``batch_size`` characters per call. It types any character, including
+   surrogate pairs, whatever the keyboard layout.
+
+A strategy that fails before it changes the target falls through to the
+next. Keyboard strategies are never retried after they have typed, since a
+retry would insert the text twice. The :class:`InjectionReport` says which
+strategy ran, the throughput and whether the readback matched.
+
+:class:`TextTarget`, :class:`Keyboard` and :class:`Clipboard` are backends.
+:class:`FakeTextField` implements all three in memory so the engine runs
+off Windows.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+
+VALUE = 'value'
+CLIPBOARD = 'clipboard'
+SENDINPUT = 'sendinput'
+
+_LABELS = {VALUE: 'UIA ValuePattern', CLIPBOARD: 'clipboard paste', SENDINPUT: 'SendInput Unicode'}
+
+
+class InjectionError(Exception):
+    """Raised when no strategy could put the text into the target."""
+
+
+class TextTarget(ABC):
+    """The control receiving the text."""
+
+    @abstractmethod
+    def read(self) -> Optional[str]:
+        """Current text, or None when the control does not expose it."""
+
+    def can_set_value(self) -> bool:
+        return False
+
+    def set_value(self, text: str) -> None:
+        raise NotImplementedError
+
+
+class Keyboard(ABC):
+    @abstractmethod
+    def type_text(self, text: str, batch_size: int) -> None:
+        """Type ``text`` as Unicode key events."""
+
+    @abstractmethod
+    def paste(self) -> None:
+        """Press Ctrl+V."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Select all and delete in the focused control."""
+
+
+class Clipboard(ABC):
+    @abstractmethod
+    def save(self) -> object:
+        """Opaque snapshot of the current clipboard contents."""
+
+    @abstractmethod
+    def set_text(self, text: str) -> None: ...
+
+    @abstractmethod
+    def restore(self, saved: object) -> None: ...
+
+
+@dataclass(frozen=True)
+class InjectionReport:
+    strategy: str
+    chars: int
+    seconds: float
+    verified: Optional[bool]  # None when the target cannot be read back
+    skipped: Tuple[str, ...] = ()  # strategies that failed before this one
+
+    @property
+    def chars_per_second(self) -> float:
+        return self.chars / self.seconds if self.seconds > 0 else float(self.chars)
+
+    def __str__(self) -> str:
+        check = {True: 'verified by readback', False: 'readback did not match', None: 'not verifiable'}[self.verified]
+        text = (
+            f'{self.chars} characters by {_LABELS.get(self.strategy, self.strategy)} in '
+            f'{self.seconds * 1000:.0f} ms ({self.chars_per_second:.0f} chars/s), {check}'
+        )
+        if self.skipped:
+            text += f" after {', '.join(self.skipped)} failed"
+        return text
+
+
+def _normalize(text: str) -> str:
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class TextInjector:
+    """Put text into a target with the fastest strategy it allows.
+
+    ``strategies`` limits and orders the strategies to try. ``verify_timeout``
+    bounds the readback wait, since typed and pasted text reaches the control
+    only after its thread has processed the input. ``settle`` waits for that
+    processing, e.g. :meth:`~.pacing.InputPacer.settle`; it runs before the
+    clipboard is restored after a paste the readback did not confirm.
+    Without it the injector sleeps ``verify_timeout`` instead.
+    """
+
+    def __init__(
+        self,
+        keyboard: Keyboard,
+        clipboard: Optional[Clipboard] = None,
+        strategies: Sequence[str] = (VALUE, CLIPBOARD, SENDINPUT),
+        paste_threshold: int = 64,
+        batch_size: int = 64,
+        verify_timeout: float = 1.0,
+        poll: float = 0.01,
+        settle: Optional[Callable[[], object]] = None,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.keyboard = keyboard
+        self.clipboard = clipboard
+        self.strategies = tuple(strategies)
+        self.paste_threshold = paste_threshold
+        self.batch_size = batch_size
+        self.verify_timeout = verify_timeout
+        self.poll = poll
+        self._settle = settle
+        self._clock = clock
+        self._sleep = sleep
+
+    def inject(self, target: TextTarget, text: str, clear: bool = False) -> InjectionReport:
+        """Insert ``text`` at the caret of ``target``, replacing its contents if ``clear``.
+
+        Raises InjectionError when every applicable strategy failed.
+        """
+        before = self._read(target)
+        skipped: List[str] = []
+        errors: List[str] = []
+        mismatched = None
+        for strategy in self._plan(target, text, clear, before):
+            started = self._clock()
+            saved = None
+            try:
+                if strategy == CLIPBOARD:
+                    saved = self.clipboard.save()
+                    self.clipboard.set_text(text)
+                expected = self._run(strategy, target, text, clear, before)
+            except Exception as e:
+                self._restore_clipboard(saved)
+                skipped.append(strategy)
+                errors.append(f'{strategy}: {e}')
+                continue
+            verified = self._verify(target, text, expected, before)
+            # Restoring before the target has read the clipboard would paste the old contents.
+            if saved is not None and not verified:
+                self._await_paste(verified)
+            self._restore_clipboard(saved)
+            report = InjectionReport(strategy, len(text), self._clock() - started, verified, tuple(skipped))
+            if verified is False and strategy == VALUE:
+                # SetValue replaced the whole value, so typing over it is safe.
+                mismatched = report
+                skipped.append(strategy)
+                errors.append(f'{strategy}: readback did not match')
+                clear = True
+                continue
+            return report
+        if mismatched is not None:
+            return mismatched
+        raise InjectionError('; '.join(errors) or 'no text injection strategy is enabled')
+
+    def _plan(self, target: TextTarget, text: str, clear: bool, before: Optional[str]) -> List[str]:
+        plan = []
+        for strategy in self.strategies:
+            if strategy == VALUE:
+                if (clear or before == '') and self._settable(target):
+                    plan.append(VALUE)
+            elif strategy == CLIPBOARD:
+                if self.clipboard is not None and len(text) >= self.paste_threshold:
+                    plan.append(CLIPBOARD)
+            elif strategy == SENDINPUT:
+                plan.append(SENDINPUT)
+        return plan
+
+    def _run(self, strategy: str, target: TextTarget, text: str, clear: bool, before: Optional[str]) -> Optional[str]:
+        """Apply one strategy; returns the text the target should end up containing, if known."""
+        if strategy == VALUE:
+            value = text if clear else (before or '') + text
+            target.set_value(value)
+            return value
+        if clear:
+            self.keyboard.clear()
+        if strategy == CLIPBOARD:
+            self.keyboard.paste()
+        else:
+            self.keyboard.type_text(text, self.batch_size)
+        # The caret position is unknown, so only a cleared field has an exact
+        # expected value; otherwise the text must appear somewhere.
+        return text if clear else None
+
+    def _verify(self, target: TextTarget, text: str, expected: Optional[str], before: Optional[str]) -> Optional[bool]:
+        if before is None and self._read(target) is None:
+            return None
+        deadline = self._clock() + self.verify_timeout
+        while True:
+            current = self._read(target)
+            if current is not None and self._matches(current, text, expected, before):
+                return True
+            if self._clock() >= deadline:
+                return False
+            self._sleep(self.poll)
+
+    def _matches(self, current: str, text: str, expected: Optional[str], before: Optional[str]) -> bool:
+        current = _normalize(current)
+        if expected is not None:
+            return current == _normalize(expected)
+        return len(current) > len(_normalize(before or '')) and _normalize(text) in current
+
+    def _read(self, target: TextTarget) -> Optional[str]:
+        try:
+            return target.read()
+        except Exception:
+            return None
+
+    def _settable(self, target: TextTarget) -> bool:
+        try:
+            return target.can_set_value()
+        except Exception:
+            return False
+
+    def _await_paste(self, verified: Optional[bool]) -> None:
+        """Wait for the target to process a paste the readback could not confirm."""
+        if self._settle is not None:
+            try:
+                self._settle()
+            except Exception:
+                pass
+        elif verified is None:
+            # A mismatch has already waited verify_timeout in the readback.
+            self._sleep(self.verify_timeout)
+
+    def _restore_clipboard(self, saved: object) -> None:
+        if saved is not None:
+            try:
+                self.clipboard.restore(saved)
+            except Exception:
+                pass
+
+
+class UIATextTarget(TextTarget):
+    """A UI Automation control, read through ValuePattern or TextPattern."""
+
+    def __init__(self, control):
+        self.control = control
+
+    def read(self) -> Optional[str]:
+        import uiautomation as ua
+
+        control = self.control
+        if control.GetPropertyValue(ua.PropertyId.IsValuePatternAvailableProperty):
+            value = control.GetPropertyValue(ua.PropertyId.ValueValueProperty)
+            if isinstance(value, str):
+                return value
+        if control.GetPropertyValue(ua.PropertyId.IsTextPatternAvailableProperty):
+            return control.GetTextPattern().DocumentRange.GetText(-1)
+        return None
+
+    def can_set_value(self) -> bool:
+        import uiautomation as ua
+
+        control = self.control
+        return bool(
+            control.GetPropertyValue(ua.PropertyId.IsValuePatternAvailableProperty)
+            and not control.GetPropertyValue(ua.PropertyId.ValueIsReadOnlyProperty)
+        )
+
+    def set_value(self, text: str) -> None:
+        if not self.control.GetValuePattern().SetValue(text):
+            raise InjectionError('ValuePattern.SetValue failed')
+
+
+class Win32Keyboard(Keyboard):
+    """Key events through ``SendInput``."""
+
+    _INPUT_KEYBOARD = 1
+    _KEYEVENTF_KEYUP = 0x0002
+    _KEYEVENTF_UNICODE = 0x0004
+    _VK_BACK = 0x08
+    _VK_RETURN = 0x0D
+    _VK_CONTROL = 0x11
+    _VK_A = 0x41
+    _VK_V = 0x56
+
+    def __init__(self, batch_delay: float = 0.005):
+        # A short pause between batches keeps the target's input queue from
+        # overflowing on very long text.
+        self.batch_delay = batch_delay
+        self._send = None
+
+    def type_text(self, text: str, batch_size: int) -> None:
+        events: List[Tuple[int, int, int]] = []  # vk, scan, flags
+        for char in _normalize(text):
+            if char == '\n':
+                # A Unicode line feed is not an Enter press in most controls.
+                events += [(self._VK_RETURN, 0, 0), (self._VK_RETURN, 0, self._KEYEVENTF_KEYUP)]
+                continue
+            encoded = char.encode('utf-16-le')
+            for i in range(0, len(encoded), 2):
+                unit = int.from_bytes(encoded[i:i + 2], 'little')
+                events += [
+                    (0, unit, self._KEYEVENTF_UNICODE),
+                    (0, unit, self._KEYEVENTF_UNICODE | self._KEYEVENTF_KEYUP),
+                ]
+        step = max(batch_size, 1) * 2
+        for start in range(0, len(events), step):
+            if start:
+                time.sleep(self.batch_delay)
+            self._send_events(events[start:start + step])
+
+    def paste(self) -> None:
+        self._chord(self._VK_CONTROL, self._VK_V)
+
+    def clear(self) -> None:
+        self._chord(self._VK_CONTROL, self._VK_A)
+        self._chord(self._VK_BACK)
+
+    def _chord(self, *keys: int) -> None:
+        up = self._KEYEVENTF_KEYUP
+        self._send_events([(key, 0, 0) for key in keys] + [(key, 0, up) for key in reversed(keys)])
+
+    def _send_events(self, events: Sequence[Tuple[int, int, int]]) -> None:
+        if self._send is None:
+            self._send = self._bind()
+        self._send(events)
+
+    def _bind(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [
+                ('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t),
+            ]
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [
+                ('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t),
+            ]
+
+        class _INPUTUNION(ctypes.Union):
+            # The mouse member is the largest and sets the union's size.
+            _fields_ = [('mi', MOUSEINPUT), ('ki', KEYBDINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('u', _INPUTUNION)]
+
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        user32.SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+        user32.SendInput.restype = wintypes.UINT
+
+        def send(events: Sequence[Tuple[int, int, int]]) -> None:
+            inputs = (INPUT * len(events))()
+            for item, (vk, scan, flags) in zip(inputs, events):
+                item.type = self._INPUT_KEYBOARD
+                item.u.ki = KEYBDINPUT(vk, scan, flags, 0, 0)
+            sent = user32.SendInput(len(events), inputs, ctypes.sizeof(INPUT))
+            if sent != len(events):
+                # UIPI blocks input to windows of a higher integrity level.
+                raise InjectionError(f'SendInput accepted {sent} of {len(events)} events (error {ctypes.get_last_error()})')
+
+        return send
+
+
+class Win32Clipboard(Clipboard):
+    """The system clipboard, saved and restored format by format.
+
+    Formats held as GDI handles (bitmaps, metafiles, palettes) and
+    owner-drawn formats cannot be copied as memory and are not restored.
+    Windows synthesizes ``CF_BITMAP`` from the ``CF_DIB`` that is.
+    """
+
+    _CF_UNICODETEXT = 13
+    _HANDLE_FORMATS = frozenset({2, 3, 9, 14, 0x80, 0x82, 0x83, 0x8E})
+    _GMEM_MOVEABLE = 0x0002
+
+    def __init__(self, open_attempts: int = 10, retry_delay: float = 0.01):
+        self.open_attempts = open_attempts
+        self.retry_delay = retry_delay
+        self._api = None
+
+    def save(self) -> List[Tuple[int, bytes]]:
+        user32, kernel32 = self._dlls()
+        saved = []
+        with self._opened():
+            fmt = user32.EnumClipboardFormats(0)
+            while fmt:
+                if fmt not in self._HANDLE_FORMATS:
+                    handle = user32.GetClipboardData(fmt)
+                    data = self._copy_out(handle) if handle else None
+                    if data is not None:
+                        saved.append((fmt, data))
+                fmt = user32.EnumClipboardFormats(fmt)
+        return saved
+
+    def set_text(self, text: str) -> None:
+        self._replace([(self._CF_UNICODETEXT, (text + '\0').encode('utf-16-le'))])
+
+    def restore(self, saved: List[Tuple[int, bytes]]) -> None:
+        self._replace(saved)
+
+    def _replace(self, formats: Sequence[Tuple[int, bytes]]) -> None:
+        import ctypes
+
+        user32, kernel32 = self._dlls()
+        with self._opened():
+            user32.EmptyClipboard()
+            for fmt, data in formats:
+                handle = kernel32.GlobalAlloc(self._GMEM_MOVEABLE, max(len(data), 1))
+                if not handle:
+                    raise InjectionError('GlobalAlloc failed')
+                pointer = kernel32.GlobalLock(handle)
+                ctypes.memmove(pointer, data, len(data))
+                kernel32.GlobalUnlock(handle)
+                if not user32.SetClipboardData(fmt, handle):
+                    # Ownership only passes to the system on success.
+                    kernel32.GlobalFree(handle)
+
+    def _copy_out(self, handle) -> Optional[bytes]:
+        import ctypes
+
+        user32, kernel32 = self._dlls()
+        size = kernel32.GlobalSize(handle)
+        pointer = kernel32.GlobalLock(handle)
+        if not pointer:
+            return None
+        try:
+            return ctypes.string_at(pointer, size)
+        finally:
+            kernel32.GlobalUnlock(handle)
+
+    @contextlib.contextmanager
+    def _opened(self):
+        user32, _ = self._dlls()
+        # Another process may hold the clipboard for a moment.
+        for _ in range(self.open_attempts):
+            if user32.OpenClipboard(None):
+                break
+            time.sleep(self.retry_delay)
+        else:
+            raise InjectionError('the clipboard is in use by another application')
+        try:
+            yield
+        finally:
+            user32.CloseClipboard()
+
+    def _dlls(self):
+        if self._api is None:
+            import ctypes
+            from ctypes import wintypes
+
+            user32 = ctypes.WinDLL('user32', use_last_error=True)
+            kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+            user32.OpenClipboard.argtypes = (wintypes.HWND,)
+            user32.EnumClipboardFormats.argtypes = (wintypes.UINT,)
+            user32.EnumClipboardFormats.restype = wintypes.UINT
+            user32.GetClipboardData.argtypes = (wintypes.UINT,)
+            user32.GetClipboardData.restype = wintypes.HANDLE
+            user32.SetClipboardData.argtypes = (wintypes.UINT, wintypes.HANDLE)
+            user32.SetClipboardData.restype = wintypes.HANDLE
+            kernel32.GlobalAlloc.argtypes = (wintypes.UINT, ctypes.c_size_t)
+            kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+            kernel32.GlobalLock.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalLock.restype = wintypes.LPVOID
+            kernel32.GlobalUnlock.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalSize.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalSize.restype = ctypes.c_size_t
+            kernel32.GlobalFree.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalFree.restype = wintypes.HGLOBAL
+            self._api = (user32, kernel32)
+        return self._api
+
+
+class FakeTextField(TextTarget, Keyboard, Clipboard):
+    """An in-memory text box with its own keyboard and clipboard, for tests.
+
+    ``settable`` enables the ValuePattern strategy, ``readable=False`` hides
+    the value, ``single_line`` drops line breaks as a single-line edit does,
+    and ``lag`` is the number of reads before typed text shows up. A paste
+    reads the clipboard when it shows up, as a real control does when it
+    processes Ctrl+V; :meth:`flush` delivers pending input at once.
+    """
+
+    def __init__(self, value: str = '', settable: bool = True, readable: bool = True, single_line: bool = False, lag: int = 0):
+        self.value = value
+        self.caret = len(value)
+        self.settable = settable
+        self.readable = readable
+        self.single_line = single_line
+        self.lag = lag
+        self.clipboard_data: object = [(1, b'previous')]
+        self.calls: List[str] = []
+        self._pending: List[Optional[str]] = []  # None is a paste
+        self._reads = 0
+
+    def read(self) -> Optional[str]:
+        self._reads += 1
+        if self._pending and self._reads > self.lag:
+            self.flush()
+        return self.value if self.readable else None
+
+    def can_set_value(self) -> bool:
+        return self.settable
+
+    def set_value(self, text: str) -> None:
+        self.calls.append('set_value')
+        self.value = self._accept(text)
+        self.caret = len(self.value)
+
+    def type_text(self, text: str, batch_size: int) -> None:
+        self.calls.append('type_text')
+        self._queue(text)
+
+    def paste(self) -> None:
+        self.calls.append('paste')
+        self._queue(None)
+
+    def clear(self) -> None:
+        self.calls.append('clear')
+        self.value, self.caret = '', 0
+
+    def save(self) -> object:
+        return self.clipboard_data
+
+    def set_text(self, text: str) -> None:
+        self.clipboard_data = text
+
+    def restore(self, saved: object) -> None:
+        self.clipboard_data = saved
+
+    def flush(self) -> None:
+        """Process pending input, as the control's thread does once it runs."""
+        pending, self._pending = self._pending, []
+        for text in pending:
+            if text is None:
+                data = self.clipboard_data
+                text = data if isinstance(data, str) else ''
+            self._insert(text)
+
+    def _queue(self, text: Optional[str]) -> None:
+        self._reads = 0
+        self._pending.append(text)
+        if not self.lag:
+            self.read()
+
+    def _insert(self, text: str) -> None:
+        text = self._accept(text)
+        self.value = self.value[:self.caret] + text + self.value[self.caret:]
+        self.caret += len(text)
+
+    def _accept(self, text: str) -> str:
+        return _normalize(text).replace('\n', '') if self.single_line else text
@@ -0,0 +1,300 @@
+"""Waiting on conditions instead of fixed sleeps.
+
+A fixed sleep is either longer than needed, which wastes time, or shorter,
+which makes the next step fail and retry. :func:`wait_until` blocks until a
+:class:`Predicate` holds or the timeout passes:
+
+- The predicate is checked right away, then with exponential backoff from
+  ``initial`` to ``maximum`` seconds between checks, so a condition that
+  comes true quickly is seen quickly, and a slow one costs few checks.
+- A predicate can expose a cheap change counter (:meth:`Predicate.version`),
+  for example the count of UI Automation or window events. A change
+  triggers an immediate re-check and resets the backoff.
+- A predicate can also push: :meth:`Predicate.open` receives a ``wake``
+  callback for event sources such as a CDP ``Page.loadEventFired``.
+
+Predicates here are backend-neutral. The server builds them over its window
+table, tree cache, process list, screen grabs and CDP connection.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence, Tuple
+
+
+class Predicate:
+    """A condition to wait for. Subclasses override :meth:`check`."""
+
+    description = 'condition'
+
+    def check(self) -> bool:
+        raise NotImplementedError
+
+    def version(self) -> Optional[int]:
+        """A counter that changes when the answer may have changed, or None."""
+        return None
+
+    def open(self, wake: Callable[[], None]) -> None:
+        """Start event hooks; call ``wake`` when the answer may have changed."""
+
+    def close(self) -> None:
+        """Stop the hooks started by :meth:`open`."""
+
+
+class Check(Predicate):
+    """A predicate from a function, with an optional change counter."""
+
+    def __init__(self, check: Callable[[], bool], description: str, version: Optional[Callable[[], int]] = None):
+        self._check = check
+        self._version = version
+        self.description = description
+
+    def check(self) -> bool:
+        return bool(self._check())
+
+    def version(self) -> Optional[int]:
+        return self._version() if self._version is not None else None
+
+
+class Not(Predicate):
+    """The negation of another predicate, sharing its hooks."""
+
+    def __init__(self, inner: Predicate, description: Optional[str] = None):
+        self.inner = inner
+        self.description = description or f'not {inner.description}'
+
+    def check(self) -> bool:
+        return not self.inner.check()
+
+    def version(self) -> Optional[int]:
+        return self.inner.version()
+
+    def open(self, wake: Callable[[], None]) -> None:
+        self.inner.open(wake)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class ProcessRunning(Predicate):
+    """A process with the given executable name is running.
+
+    ``version`` is optional; a window event counter is a good hint, since
+    most processes worth waiting for open a window.
+    """
+
+    def __init__(self, name: str, version: Optional[Callable[[], int]] = None):
+        self.name = name.lower().removesuffix('.exe')
+        self._version = version
+        self.description = f'process {name!r} running'
+
+    def check(self) -> bool:
+        import psutil
+
+        for process in psutil.process_iter(['name']):
+            name = (process.info.get('name') or '').lower().removesuffix('.exe')
+            if name == self.name:
+                return True
+        return False
+
+    def version(self) -> Optional[int]:
+        return self._version() if self._version is not None else None
+
+
+def region_signature(bbox: Optional[Tuple[int, int, int, int]] = None) -> bytes:
+    """Digest of a reduced grab of a screen region (left, top, right, bottom), or of every screen."""
+    from PIL import ImageGrab
+
+    image = ImageGrab.grab(bbox=bbox, all_screens=True)
+    return hashlib.blake2b(image.reduce(4).tobytes(), digest_size=16).digest()
+
+
+class RegionStable(Predicate):
+    """A screen region has not changed for ``quiet`` seconds."""
+
+    def __init__(
+        self,
+        bbox: Optional[Tuple[int, int, int, int]] = None,
+        quiet: float = 0.5,
+        signature: Callable[[Optional[Tuple[int, int, int, int]]], object] = region_signature,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.bbox = bbox
+        self.quiet = quiet
+        self._signature = signature
+        self._clock = clock
+        self._last: object = None
+        self._since = 0.0
+        where = f'region {bbox}' if bbox else 'screen'
+        self.description = f'{where} unchanged for {quiet:g} s'
+
+    def check(self) -> bool:
+        current = self._signature(self.bbox)
+        now = self._clock()
+        if self._last is None or current != self._last:
+            self._last, self._since = current, now
+            return False
+        return now - self._since >= self.quiet
+
+
+class CdpLoadEvent(Predicate):
+    """A page fires ``Page.loadEventFired`` over the Chrome DevTools Protocol.
+
+    :meth:`open` connects to the tab's debugger WebSocket, enables page
+    events and reads them on a background thread. With ``already_loaded``
+    a page whose ``document.readyState`` is already ``complete`` also counts.
+    ``commands`` are ``(method, params)`` pairs sent once events are enabled,
+    such as a ``Page.navigate`` whose load should be awaited without a race.
+    ``connect(url)`` returns a websocket-client style connection.
+    """
+
+    def __init__(
+        self,
+        ws_url: str,
+        connect: Callable[[str], object],
+        already_loaded: bool = True,
+        commands: Sequence[Tuple[str, dict]] = (),
+    ):
+        self.ws_url = ws_url
+        self.already_loaded = already_loaded
+        self.commands = list(commands)
+        self._connect = connect
+        self._fired = threading.Event()
+        self._socket = None
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+        self.description = 'page load event'
+
+    def check(self) -> bool:
+        return self._fired.is_set()
+
+    def open(self, wake: Callable[[], None]) -> None:
+        self._socket = self._connect(self.ws_url)
+        self._socket.send(json.dumps({'id': 1, 'method': 'Page.enable', 'params': {}}))
+        if self.already_loaded:
+            self._socket.send(json.dumps({
+                'id': 2, 'method': 'Runtime.evaluate',
+                'params': {'expression': 'document.readyState', 'returnByValue': True},
+            }))
+        for number, (method, params) in enumerate(self.commands, 3):
+            self._socket.send(json.dumps({'id': number, 'method': method, 'params': params}))
+        self._thread = threading.Thread(target=self._read, args=(wake,), name='clippy-cdp-wait', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        socket, self._socket = self._socket, None
+        if socket is not None:
+            try:
+                socket.close()  # unblocks the reader
+            except Exception:
+                pass
+
+    def _read(self, wake: Callable[[], None]) -> None:
+        socket = self._socket
+        try:
+            while socket is not None and not self._fired.is_set():
+                message = json.loads(socket.recv())
+                if message.get('method') == 'Page.loadEventFired':
+                    self._fired.set()
+                elif message.get('id') == 2:
+                    value = message.get('result', {}).get('result', {}).get('value')
+                    if value == 'complete':
+                        self._fired.set()
+        except Exception as e:
+            if self._socket is not None:  # not closed by us
+                self.error = str(e)
+        wake()
+
+
+@dataclass(frozen=True)
+class WaitResult:
+    met: bool
+    description: str
+    waited_ms: float
+    checks: int
+    wakeups: int  # re-checks triggered by an event or change counter
+    cancelled: bool = False
+
+    def __str__(self) -> str:
+        if self.cancelled:
+            return f'Wait for {self.description} cancelled after {self.waited_ms:.0f} ms'
+        state = 'met' if self.met else 'not met'
+        return (
+            f'{self.description[0].upper()}{self.description[1:]} {state} after {self.waited_ms:.0f} ms '
+            f'({self.checks} checks, {self.wakeups} event wakeups)'
+        )
+
+
+def wait_until(
+    predicate: Predicate,
+    timeout: float,
+    initial: float = 0.01,
+    factor: float = 1.6,
+    maximum: float = 0.25,
+    tick: float = 0.01,
+    cancel: Optional[threading.Event] = None,
+    clock: Callable[[], float] = time.perf_counter,
+) -> WaitResult:
+    """Block until ``predicate`` holds, ``timeout`` seconds pass or ``cancel`` is set.
+
+    Between checks the wait grows from ``initial`` by ``factor`` up to
+    ``maximum``. Change counters and ``cancel`` are looked at every ``tick``
+    seconds. A predicate that raises counts as not holding.
+    """
+    started = clock()
+    deadline = started + timeout
+    woken = threading.Event()
+    checks = wakeups = 0
+    delay = initial
+
+    def result(met: bool, cancelled: bool = False) -> WaitResult:
+        return WaitResult(met, predicate.description, (clock() - started) * 1000, checks, wakeups, cancelled)
+
+    predicate.open(woken.set)
+    try:
+        last_version = _version(predicate)
+        watch = last_version is not None or cancel is not None
+        while True:
+            checks += 1
+            try:
+                if predicate.check():
+                    return result(True)
+            except Exception:
+                pass
+            now = clock()
+            if now >= deadline:
+                return result(False)
+            until = min(now + delay, deadline)
+            delay = min(delay * factor, maximum)
+            while True:
+                remaining = until - clock()
+                if remaining <= 0:
+                    break
+                if woken.wait(min(remaining, tick) if watch else remaining):
+                    woken.clear()
+                    wakeups += 1
+                    delay = initial
+                    break
+                if cancel is not None and cancel.is_set():
+                    return result(False, cancelled=True)
+                version = _version(predicate)
+                if version != last_version:
+                    last_version = version
+                    wakeups += 1
+                    delay = initial
+                    break
+    finally:
+        predicate.close()
+
+
+def _version(predicate: Predicate) -> Optional[int]:
+    try:
+        return predicate.version()
+    except Exception:
+        return None
+
@@ -0,0 +1,14 @@
+"""Pooled PowerShell hosts for the desktop tools.
+
+Every tool that used to shell out with ``powershell -Command`` goes through
+one :class:`PowerShellPool`, which keeps warm hosts and bounds each request
+by time and output size.
+"""
+
+from .interop import HELPERS, InteropHelper, invoke, prelude
+from .pool import OutputBuffer, OutputCallback, PowerShellError, PowerShellPool, PowerShellResult, default_argv
+
+__all__ = [
+    'HELPERS', 'InteropHelper', 'invoke', 'prelude',
+    'OutputBuffer', 'OutputCallback', 'PowerShellError', 'PowerShellPool', 'PowerShellResult', 'default_argv',
+]
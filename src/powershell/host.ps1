@@ -0,0 +1,144 @@
+# Request loop for a pooled PowerShell host (see pool.py).
+#
+# Reads one JSON request per line from stdin: {"id", "script", "max_output", "stream", "json", "global"}.
+# Writes one response per line to stdout, prefixed with the nonce from
+# CLIPPY_PS_NONCE so stray console writes can never be mistaken for a frame:
+#   <nonce> {"id", "status", "output", "errors", "truncated", "duration_ms"}
+# With "stream" set, output is sent as it is produced in chunk frames
+#   <nonce> {"id", "chunk"}
+# and the final frame carries only status and errors.
+#
+# A batch request {"id", "batch": [scripts], "max_output", "stop_on_error", "json"}
+# runs the scripts one after another and answers with a single frame
+#   <nonce> {"id", "status", "results": [{"status", "output", "errors", "truncated", "duration_ms"}]}
+# With "json" each script's output is piped through ConvertTo-Json. With
+# "stop_on_error" the scripts after the first failing one are not run.
+#
+# Scripts run in a second runspace, so `exit`, Write-Host and native command
+# output stay inside the request instead of ending or corrupting this loop.
+# That runspace lives as long as the host, but each script gets its own local
+# scope in it: variables and functions a script defines are gone when it
+# returns, and the location is reset before every script. Only a request with
+# "global" set (the pool's prelude) defines things for later requests, and the
+# Clippy-* functions it defines are made read-only. Explicit $global: writes,
+# environment variables and loaded assemblies still persist until the host is
+# recycled.
+
+$utf8 = New-Object System.Text.UTF8Encoding $false
+[Console]::OutputEncoding = $utf8
+$stdin = [Console]::In
+$stdout = [Console]::Out
+$nonce = $env:CLIPPY_PS_NONCE
+$start = (Get-Location).Path
+
+$runspace = [runspacefactory]::CreateRunspace()
+$runspace.Open()
+
+function Send-Frame($frame) {
+    $stdout.WriteLine($nonce + ' ' + (ConvertTo-Json -InputObject $frame -Compress -Depth 4))
+    $stdout.Flush()
+}
+
+function Limit-Text([string]$text, [int]$limit) {
+    if ($limit -gt 0 -and $text.Length -gt $limit) { return $text.Substring(0, $limit), $true }
+    return $text, $false
+}
+
+function Send-Chunk($id, $results, [int]$limit) {
+    $items = $results.ReadAll()
+    if ($items.Count -eq 0) { return }
+    $chunk, $cut = Limit-Text ($items | Out-String -Width 4096) $limit
+    Send-Frame @{ id = $id; chunk = $chunk }
+}
+
+# Make the Clippy-* functions a global request defined read-only, so a later
+# script cannot redefine them with `function global:Clippy-...`.
+function Protect-Functions {
+    $shell = [powershell]::Create()
+    $shell.Runspace = $runspace
+    [void]$shell.AddScript("Get-ChildItem function:Clippy-* | ForEach-Object { `$_.Options = `$_.Options -bor 'ReadOnly' }")
+    [void]$shell.Invoke()
+    $shell.Dispose()
+}
+
+# Run one script in the shared runspace, in a local scope unless $global is
+# set. $stream is the request id to send chunk frames for, or 0 to collect all
+# output into the result.
+function Invoke-Script([string]$script, [int]$limit, $stream = 0, [bool]$json = $false, [bool]$global = $false) {
+    $clock = [Diagnostics.Stopwatch]::StartNew()
+    $runspace.SessionStateProxy.Path.SetLocation($start) | Out-Null
+    $runspace.SessionStateProxy.SetVariable('LASTEXITCODE', 0)
+    $shell = [powershell]::Create()
+    $shell.Runspace = $runspace
+    [void]$shell.AddScript($script, -not $global)
+    if ($json) { [void]$shell.AddCommand('ConvertTo-Json').AddParameter('Depth', 4).AddParameter('Compress') }
+    $results = New-Object 'System.Management.Automation.PSDataCollection[psobject]'
+    $status = 0
+    $failure = ''
+    try {
+        if ($stream) {
+            $none = New-Object 'System.Management.Automation.PSDataCollection[psobject]'
+            $none.Complete()
+            $pending = $shell.BeginInvoke($none, $results)
+            while (-not $pending.AsyncWaitHandle.WaitOne(100)) {
+                Send-Chunk $stream $results $limit
+            }
+            Send-Chunk $stream $results $limit
+            [void]$shell.EndInvoke($pending)
+        } else {
+            [void]$shell.Invoke($null, $results)
+        }
+    } catch {
+        $inner = $_.Exception
+        while ($inner.InnerException) { $inner = $inner.InnerException }
+        if ($inner.GetType().Name -eq 'ExitException') {
+            $status = [int]$inner.Argument
+        } else {
+            $status = 1
+            $failure = $inner.Message
+        }
+    }
+    $exitCode = $runspace.SessionStateProxy.GetVariable('LASTEXITCODE')
+    if ($status -eq 0 -and $exitCode) { $status = [int]$exitCode }
+    if ($status -eq 0 -and $shell.HadErrors) { $status = 1 }
+
+    $output, $truncated = Limit-Text ($results | Out-String -Width 4096) $limit
+    $errors = (($shell.Streams.Error | Out-String -Width 4096) + $failure).Trim()
+    $errors, $errorsTruncated = Limit-Text $errors $limit
+    $shell.Dispose()
+    if ($global) { Protect-Functions }
+    return @{
+        status = $status
+        output = $output
+        errors = $errors
+        truncated = ($truncated -or $errorsTruncated)
+        duration_ms = $clock.Elapsed.TotalMilliseconds
+    }
+}
+
+Send-Frame @{ id = 0; status = 0; output = 'ready'; errors = ''; truncated = $false }
+
+while ($null -ne ($line = $stdin.ReadLine())) {
+    $request = ConvertFrom-Json -InputObject $line
+    if ($null -ne $request.batch) {
+        $completed = @()
+        $status = 0
+        foreach ($script in $request.batch) {
+            $result = Invoke-Script ([string]$script) $request.max_output 0 ([bool]$request.json)
+            $completed += $result
+            if ($result.status -ne 0) {
+                $status = $result.status
+                if ($request.stop_on_error) { break }
+            }
+        }
+        Send-Frame @{ id = $request.id; status = $status; results = $completed }
+        continue
+    }
+    $stream = 0
+    if ($request.stream) { $stream = $request.id }
+    $result = Invoke-Script ([string]$request.script) $request.max_output $stream ([bool]$request.json) ([bool]$request.global)
+    $result.id = $request.id
+    Send-Frame $result
+}
+
+$runspace.Close()
@@ -0,0 +1,159 @@
+"""Versioned registry of interop helpers preloaded into every pooled host.
+
+Volume and toast tools used to embed their C# in each script and run
+``Add-Type`` on every call. That is a compiler run each time, and a pooled
+host rejects a second, different definition of a type it already holds.
+Each :class:`InteropHelper` here contributes C# declarations and PowerShell
+functions.
+
+:func:`prelude` compiles all of the C# in one ``Add-Type`` when a host
+starts. After that, tools only call the functions by name through
+:func:`invoke`.
+
+Types live in a namespace that carries the helper's version, for example
+``Clippy.Interop.Audio1``. A changed declaration gets a new type name, and
+none of them can clash with types that Powershell-Tool scripts add. The
+loaded versions are recorded in ``$global:ClippyInterop``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class InteropHelper:
+    """C# declarations plus the PowerShell functions that wrap them.
+
+    ``{ns}`` in either source is replaced by :attr:`namespace`.
+    """
+
+    name: str
+    version: int
+    functions: Tuple[str, ...]
+    script: str
+    csharp: str = ''
+
+    @property
+    def namespace(self) -> str:
+        return f"Clippy.Interop.{self.name.title()}{self.version}"
+
+    def render_csharp(self) -> str:
+        if not self.csharp:
+            return ''
+        return f"namespace {self.namespace} {{\n{self.csharp.replace('{ns}', self.namespace)}\n}}"
+
+    def render_script(self) -> str:
+        return self.script.replace('{ns}', self.namespace)
+
+
+AUDIO = InteropHelper(
+    name='audio',
+    version=1,
+    functions=('Clippy-GetVolume', 'Clippy-SetVolume'),
+    csharp=r'''
+    [Guid("5CDF2C82-841E-4546-9722-0CF74078229A"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
+    interface IAudioEndpointVolume {
+        int _0(); int _1(); int _2(); int _3();
+        int SetMasterVolumeLevelScalar(float fLevel, System.Guid pguidEventContext);
+        int _5();
+        int GetMasterVolumeLevelScalar(out float pfLevel);
+    }
+    [Guid("D666063F-1587-4E43-81F1-B948E807363F"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
+    interface IMMDevice { int Activate(ref System.Guid iid, int dwClsCtx, IntPtr pActivationParams, [MarshalAs(UnmanagedType.IUnknown)] out object ppInterface); }
+    [Guid("A95664D2-9614-4F35-A746-DE8DB63617E6"), InterfaceType(ComInterfaceType.InterfaceIsIUnknown)]
+    interface IMMDeviceEnumerator { int GetDefaultAudioEndpoint(int dataFlow, int role, out IMMDevice ppDevice); }
+    [ComImport, Guid("BCDE0395-E52F-467C-8E3D-C4579291692E")] class MMDeviceEnumeratorComObject { }
+    public static class Volume {
+        static IAudioEndpointVolume Endpoint() {
+            var enumerator = new MMDeviceEnumeratorComObject() as IMMDeviceEnumerator;
+            IMMDevice dev; enumerator.GetDefaultAudioEndpoint(0, 1, out dev);
+            var iid = typeof(IAudioEndpointVolume).GUID; object o; dev.Activate(ref iid, 1, IntPtr.Zero, out o);
+            return o as IAudioEndpointVolume;
+        }
+        public static void Set(float v) { Endpoint().SetMasterVolumeLevelScalar(v, System.Guid.Empty); }
+        public static float Get() { float v; Endpoint().GetMasterVolumeLevelScalar(out v); return v; }
+    }''',
+    script=r'''
+function Clippy-GetVolume {
+    "Current volume: $([math]::Round([{ns}.Volume]::Get() * 100))%"
+}
+
+function Clippy-SetVolume([int]$Level) {
+    [{ns}.Volume]::Set([math]::Max(0, [math]::Min(100, $Level)) / 100)
+    "Volume set to $Level%"
+}
+''',
+)
+
+TOAST = InteropHelper(
+    name='toast',
+    version=1,
+    functions=('Clippy-ShowToast',),
+    script=r'''
+function Clippy-ShowToast([string]$Title, [string]$Message, [string]$Duration = 'short') {
+    [void][Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime]
+    [void][Windows.Data.Xml.Dom.XmlDocument, Windows.Data.Xml.Dom.XmlDocument, ContentType = WindowsRuntime]
+    $safeTitle = [System.Security.SecurityElement]::Escape($Title)
+    $safeMessage = [System.Security.SecurityElement]::Escape($Message)
+    $xml = New-Object Windows.Data.Xml.Dom.XmlDocument
+    $xml.LoadXml("<toast duration=`"$Duration`"><visual><binding template=`"ToastText02`"><text id=`"1`">$safeTitle</text><text id=`"2`">$safeMessage</text></binding></visual></toast>")
+    $toast = [Windows.UI.Notifications.ToastNotification]::new($xml)
+    [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier('Darbot Windows MCP').Show($toast)
+}
+''',
+)
+
+HELPERS: Dict[str, InteropHelper] = {helper.name: helper for helper in (AUDIO, TOAST)}
+
+_ENTRY_POINTS: Dict[str, InteropHelper] = {
+    function: helper for helper in HELPERS.values() for function in helper.functions
+}
+
+
+def prelude(helpers: Optional[Iterable[InteropHelper]] = None) -> str:
+    """Warm-up script: one ``Add-Type`` for all C#, then the helper functions."""
+    helpers = list(HELPERS.values() if helpers is None else helpers)
+    csharp = "\n".join(source for source in (helper.render_csharp() for helper in helpers) if source)
+    parts = []
+    if csharp:
+        parts.append(
+            "Add-Type -TypeDefinition @'\n"
+            "using System;\nusing System.Runtime.InteropServices;\n"
+            f"{csharp}\n'@"
+        )
+    parts += [helper.render_script() for helper in helpers]
+    versions = "; ".join(f"{helper.name} = {helper.version}" for helper in helpers)
+    parts.append(f"$global:ClippyInterop = @{{ {versions} }}")
+    return "\n".join(parts)
+
+
+def quote(value) -> str:
+    """A PowerShell literal for ``value``: strings single-quoted, lists as arrays."""
+    if isinstance(value, bool):
+        return '$true' if value else '$false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '@(' + ', '.join(quote(item) for item in value) + ')'
+    text = str(value)
+    # PowerShell also treats typographic single quotes as quote characters.
+    for mark in ("'", '‘', '’', '‚', '‛'):
+        text = text.replace(mark, mark * 2)
+    return f"'{text}'"
+
+
+def invoke(function: str, **params) -> str:
+    """Script calling a preloaded helper function; ``snake_case`` params become ``-PascalCase``.
+
+    Raises KeyError for a function no registered helper defines.
+    """
+    if function not in _ENTRY_POINTS:
+        raise KeyError(f"Unknown interop function {function!r}")
+    arguments = ''.join(
+        f" -{''.join(part.title() for part in name.split('_'))} {quote(value)}"
+        for name, value in params.items()
+        if value is not None
+    )
+    return function + arguments
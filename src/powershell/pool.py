@@ -0,0 +1,673 @@
+"""Pool of long-lived PowerShell hosts.
+
+Starting ``powershell -Command`` costs 300-1500 ms before the first line of
+the script runs, and most tools used to pay that on every call.
+:class:`PowerShellPool` keeps a few hosts running instead (``host.ps1``) and
+sends them scripts over stdin.
+
+The framing is one JSON request per line in, and one ``<nonce> <json>``
+response per line out. The nonce is random per host, so console output that
+escapes the request's runspace can never pass for a response.
+
+The pool bounds every request:
+
+- a semaphore caps how many requests run at once, one per host,
+- a host that times out, exits or breaks framing is killed and replaced,
+- a host is also recycled after ``max_requests`` requests,
+- output is capped at ``max_output`` characters, inside the host.
+
+Every script runs in its own local scope of the host's runspace, so what one
+request defines is gone for the next. The exception is the ``prelude``, which
+runs once in the global scope on every new host before it takes requests;
+Desktop uses it to preload the interop helpers from :mod:`.interop`.
+
+Requests can stream. The host then sends output in chunk frames while the
+script runs, and the pool passes each chunk to an ``on_output`` callback.
+Only the head and tail of streamed output are kept (:class:`OutputBuffer`),
+so a long export can run for minutes without its output growing the frame
+or the server's memory. :meth:`PowerShellPool.run_async` waits for frames
+on the event loop rather than on a worker thread, and cancelling it kills
+and replaces the host.
+
+``argv`` is injectable, so the pool can run against any process that speaks
+the same protocol, for example a Python stand-in on Linux.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import inspect
+import itertools
+import json
+import os
+import queue
+import secrets
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Union
+
+
+HOST_SCRIPT = Path(__file__).with_name('host.ps1')
+NONCE_VARIABLE = 'CLIPPY_PS_NONCE'
+
+OutputCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+
+class PowerShellError(RuntimeError):
+    """The pool is closed or a host could not be started."""
+
+
+@dataclass
+class PowerShellResult:
+    output: str
+    status: int
+    errors: str = ''
+    duration_ms: float = 0.0
+    truncated: bool = False
+    timed_out: bool = False
+    host_pid: int = 0
+
+    @property
+    def text(self) -> str:
+        """Output, or the error text when there is none (like stdout-or-stderr)."""
+        return self.output if self.output.strip() else self.errors
+
+
+class OutputBuffer:
+    """First ``head`` and last ``tail`` characters of a stream of chunks.
+
+    The tail is a ring of chunks trimmed from the left, so memory stays
+    bounded by ``head + tail`` plus one chunk however much is written.
+    """
+
+    def __init__(self, head: int, tail: int):
+        self.head_limit = head
+        self.tail_limit = tail
+        self._head: List[str] = []
+        self._head_size = 0
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+        self.dropped = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def write(self, text: str) -> None:
+        room = self.head_limit - self._head_size
+        if room > 0:
+            self._head.append(text[:room])
+            self._head_size += len(text[:room])
+            text = text[room:]
+        if not text:
+            return
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail_size > self.tail_limit:
+            excess = self._tail_size - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= excess:
+                self._tail.popleft()
+                self._tail_size -= len(first)
+                self.dropped += len(first)
+            else:
+                self._tail[0] = first[excess:]
+                self._tail_size -= excess
+                self.dropped += excess
+
+    def text(self) -> str:
+        head, tail = ''.join(self._head), ''.join(self._tail)
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n... {self.dropped} characters omitted ...\n{tail}"
+
+
+def default_argv() -> List[str]:
+    """Windows PowerShell (or pwsh) running the pooled request loop."""
+    executable = 'powershell' if shutil.which('powershell') or not shutil.which('pwsh') else 'pwsh'
+    encoded = base64.b64encode(HOST_SCRIPT.read_text(encoding='utf-8').encode('utf-16-le')).decode('ascii')
+    return [
+        executable, '-NoLogo', '-NoProfile', '-NonInteractive',
+        '-ExecutionPolicy', 'Bypass', '-EncodedCommand', encoded,
+    ]
+
+
+class _HostExited(Exception):
+    pass
+
+
+class _Host:
+    """One host process plus the thread that reads its framed responses."""
+
+    def __init__(self, argv: Sequence[str], env: Optional[Dict[str, str]] = None):
+        self.nonce = secrets.token_hex(8)
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._frames: 'queue.Queue[Optional[dict]]' = queue.Queue()
+        self._stray: deque = deque(maxlen=50)
+        self._notify: Optional[Callable[[], None]] = None
+        environment = dict(os.environ if env is None else env)
+        environment[NONCE_VARIABLE] = self.nonce
+        self.process = subprocess.Popen(
+            list(argv),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+            env=environment,
+            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+        )
+        self._reader = threading.Thread(target=self._read, name=f'clippy-ps-{self.process.pid}', daemon=True)
+        self._reader.start()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def wait_ready(self, timeout: float) -> None:
+        frame = self._next(timeout)
+        if frame.get('id') != 0:
+            raise _HostExited('unexpected first frame')
+
+    def request(self, request: dict, timeout: float, on_chunk: Optional[Callable[[str], None]] = None) -> dict:
+        """Send one request and wait for its response frame.
+
+        With ``on_chunk`` the request streams and every chunk frame is passed
+        to it. Raises TimeoutError, or _HostExited if the host died or broke
+        framing.
+        """
+        request_id = self._send(request, on_chunk is not None)
+        deadline = time.perf_counter() + timeout
+        while True:
+            frame = self._expect(request_id, self._next(max(deadline - time.perf_counter(), 0)))
+            if 'chunk' not in frame:
+                return frame
+            on_chunk(str(frame['chunk']))
+
+    async def request_async(
+        self, request: dict, timeout: float, on_chunk: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> dict:
+        """:meth:`request` that waits on the running event loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        arrived = asyncio.Event()
+        self._notify = lambda: loop.call_soon_threadsafe(arrived.set)
+        try:
+            request_id = self._send(request, on_chunk is not None)
+            deadline = time.perf_counter() + timeout
+            while True:
+                arrived.clear()
+                try:
+                    frame = self._frames.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise TimeoutError from None
+                    try:
+                        await asyncio.wait_for(arrived.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError from None
+                    continue
+                if frame is None:
+                    self._exited()
+                frame = self._expect(request_id, frame)
+                if 'chunk' not in frame:
+                    return frame
+                await on_chunk(str(frame['chunk']))
+        finally:
+            self._notify = None
+
+    def _send(self, request: dict, stream: bool) -> int:
+        request_id = next(self._ids)
+        self.requests += 1
+        request = dict(request, id=request_id)
+        if stream:
+            request['stream'] = True
+        try:
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise _HostExited(str(e)) from e
+        return request_id
+
+    @staticmethod
+    def _expect(request_id: int, frame: dict) -> dict:
+        if frame.get('id') != request_id:
+            raise _HostExited(f"response for request {frame.get('id')} while waiting for {request_id}")
+        return frame
+
+    def stray_output(self) -> str:
+        lines, self._stray = list(self._stray), deque(maxlen=50)
+        return ''.join(lines)
+
+    def kill(self) -> None:
+        if self.alive():
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def _next(self, timeout: float) -> dict:
+        try:
+            frame = self._frames.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+        if frame is None:
+            self._exited()
+        return frame
+
+    def _exited(self) -> None:
+        try:
+            code = self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            code = None
+        raise _HostExited(self.stray_output().strip() or f'exit code {code}')
+
+    def _read(self) -> None:
+        prefix = self.nonce + ' '
+        try:
+            for line in self.process.stdout:
+                if not line.startswith(prefix):
+                    self._stray.append(line)  # console writes and host stderr
+                    continue
+                try:
+                    self._frames.put(json.loads(line[len(prefix):]))
+                except ValueError:
+                    break  # a corrupt frame; treat the host as dead
+                self._wake()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._frames.put(None)
+            self._wake()
+
+    def _wake(self) -> None:
+        notify = self._notify
+        if notify is not None:
+            try:
+                notify()
+            except RuntimeError:
+                pass  # the waiting event loop has closed
+
+
+def _buffer(max_output: int) -> OutputBuffer:
+    return OutputBuffer(head=max_output // 2, tail=max_output - max_output // 2)
+
+
+def _script(script: str, max_output: int, as_json: bool = False, global_scope: bool = False) -> dict:
+    request = {'script': script, 'max_output': max_output}
+    if as_json:
+        request['json'] = True
+    if global_scope:
+        request['global'] = True
+    return request
+
+
+class PowerShellPool:
+    """Run PowerShell scripts on up to ``size`` long-lived hosts.
+
+    Hosts start on first use, or ahead of time through :meth:`start`.
+    ``timeout`` is the default per-request limit in seconds. ``start_timeout``
+    is the limit for a new host to report ready and again for it to run
+    ``prelude``. A failing prelude is counted in :meth:`stats` and the host
+    is used anyway, so plain scripts keep working.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        argv: Optional[Sequence[str]] = None,
+        timeout: float = 30.0,
+        start_timeout: float = 20.0,
+        max_output: int = 1_000_000,
+        max_requests: int = 500,
+        env: Optional[Dict[str, str]] = None,
+        prelude: Optional[str] = None,
+    ):
+        self.size = size
+        self._argv = list(argv) if argv is not None else None
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.max_output = max_output
+        self.max_requests = max_requests
+        self._env = env
+        self.prelude = prelude
+        self.prelude_error = ''
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: List[_Host] = []
+        self._busy: List[_Host] = []
+        self._closed = False
+        self._stats = {'requests': 0, 'spawned': 0, 'recycled': 0, 'timeouts': 0, 'crashes': 0, 'cancelled': 0, 'prelude_errors': 0}
+
+    def start(self, hosts: Optional[int] = None) -> None:
+        """Warm up ``hosts`` (default: all) in the background."""
+        count = self.size if hosts is None else min(hosts, self.size)
+        threading.Thread(target=self._warm, args=(count,), name='clippy-ps-warmup', daemon=True).start()
+
+    def run(
+        self,
+        script: str,
+        timeout: Optional[float] = None,
+        max_output: Optional[int] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        as_json: bool = False,
+    ) -> PowerShellResult:
+        """Run ``script`` on a pooled host and return its output and status.
+
+        Waiting for a free host counts against ``timeout``. With
+        ``on_output`` the request streams: each chunk is passed to it as the
+        script produces it, and the result keeps the head and tail of the
+        output. ``as_json`` pipes the output through ``ConvertTo-Json``.
+        Raises PowerShellError when the pool is closed or no host can be
+        started.
+        """
+        max_output = self.max_output if max_output is None else max_output
+        buffer = _buffer(max_output) if on_output is not None else None
+
+        def on_chunk(chunk: str) -> None:
+            buffer.write(chunk)
+            on_output(chunk)
+
+        return self._call(
+            _script(script, max_output, as_json), timeout, on_chunk if buffer is not None else None,
+            lambda host, frame, started: self._finish(host, frame, started, buffer),
+        )
+
+    async def run_async(
+        self,
+        script: str,
+        timeout: Optional[float] = None,
+        max_output: Optional[int] = None,
+        on_output: Optional[OutputCallback] = None,
+        as_json: bool = False,
+    ) -> PowerShellResult:
+        """:meth:`run` for the event loop; ``on_output`` may be a coroutine function.
+
+        No thread waits on the script, only on a host that has to be started.
+        Cancelling the call kills the host running the script and starts a
+        fresh one on the next request.
+        """
+        max_output = self.max_output if max_output is None else max_output
+        buffer = _buffer(max_output) if on_output is not None else None
+
+        async def on_chunk(chunk: str) -> None:
+            buffer.write(chunk)
+            result = on_output(chunk)
+            if inspect.isawaitable(result):
+                await result
+
+        return await self._call_async(
+            _script(script, max_output, as_json), timeout, on_chunk if buffer is not None else None,
+            lambda host, frame, started: self._finish(host, frame, started, buffer),
+        )
+
+    async def run_batch_async(
+        self,
+        scripts: Sequence[str],
+        timeout: Optional[float] = None,
+        max_output: Optional[int] = None,
+        stop_on_error: bool = False,
+        as_json: bool = False,
+        parallel: bool = False,
+    ) -> List[Optional[PowerShellResult]]:
+        """Run ``scripts`` and return one result per script, in order.
+
+        By default all scripts run one after another on a single host, in a
+        single round trip, and ``timeout`` covers the whole batch. A script
+        skipped by ``stop_on_error`` gets ``None``. If the batch as a whole
+        times out or its host dies, every script gets that failure, because
+        the host reports nothing until the batch ends. With ``parallel`` each
+        script is a separate request spread over the pool's hosts, so they
+        do not share state and ``stop_on_error`` does not apply.
+        """
+        if not scripts:
+            return []
+        max_output = self.max_output if max_output is None else max_output
+        if parallel:
+            return list(await asyncio.gather(*(
+                self.run_async(script, timeout, max_output, as_json=as_json) for script in scripts
+            )))
+        request = {'batch': list(scripts), 'max_output': max_output, 'stop_on_error': stop_on_error, 'json': as_json}
+        outcome = await self._call_async(request, timeout, None, self._finish_batch)
+        if isinstance(outcome, PowerShellResult):
+            return [outcome] * len(scripts)
+        return outcome + [None] * (len(scripts) - len(outcome))
+
+    def close(self) -> None:
+        """Stop all hosts; later calls to :meth:`run` raise PowerShellError."""
+        with self._lock:
+            self._closed = True
+            hosts, self._idle, self._busy = self._idle + self._busy, [], []
+        for host in hosts:
+            host.kill()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), busy=len(self._busy))
+
+    def _call(self, request: dict, timeout: Optional[float], on_chunk, finish):
+        """Send ``request`` to a pooled host; ``finish`` turns its frame into the result.
+
+        Timeouts and host failures come back as a failed PowerShellResult.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        if self._closed:
+            raise PowerShellError('PowerShell pool is closed')
+        if not self._slots.acquire(timeout=timeout):
+            return self._no_host(timeout)
+        try:
+            host = self._checkout()
+            remaining = max(timeout - (time.perf_counter() - started), 0.1)
+            try:
+                frame = host.request(request, remaining, on_chunk)
+            except TimeoutError:
+                return self._timed_out(host, started, timeout)
+            except _HostExited as e:
+                return self._crashed(host, started, e)
+            except BaseException:
+                self._discard(host, 'cancelled')  # the callback failed mid-request
+                raise
+            return finish(host, frame, started)
+        finally:
+            self._slots.release()
+
+    async def _call_async(self, request: dict, timeout: Optional[float], on_chunk, finish):
+        """:meth:`_call` waiting on the event loop."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        if self._closed:
+            raise PowerShellError('PowerShell pool is closed')
+        if not await self._acquire_async(timeout):
+            return self._no_host(timeout)
+        try:
+            host = await self._checkout_async()
+            remaining = max(timeout - (time.perf_counter() - started), 0.1)
+            try:
+                frame = await host.request_async(request, remaining, on_chunk)
+            except TimeoutError:
+                return self._timed_out(host, started, timeout)
+            except _HostExited as e:
+                return self._crashed(host, started, e)
+            except BaseException:
+                self._discard(host, 'cancelled')
+                raise
+            return finish(host, frame, started)
+        finally:
+            self._slots.release()
+
+    def _no_host(self, timeout: float) -> PowerShellResult:
+        return PowerShellResult('', 1, f'No PowerShell host became free within {timeout:g}s', timed_out=True)
+
+    def _timed_out(self, host: _Host, started: float, timeout: float) -> PowerShellResult:
+        self._discard(host, 'timeouts')
+        return PowerShellResult(
+            '', 1, f'Command timed out after {timeout:g}s',
+            duration_ms=(time.perf_counter() - started) * 1000, timed_out=True, host_pid=host.pid,
+        )
+
+    def _crashed(self, host: _Host, started: float, error: _HostExited) -> PowerShellResult:
+        self._discard(host, 'crashes')
+        return PowerShellResult(
+            '', 1, f'PowerShell host exited unexpectedly: {error}',
+            duration_ms=(time.perf_counter() - started) * 1000, host_pid=host.pid,
+        )
+
+    def _finish(self, host: _Host, frame: dict, started: float, buffer: Optional[OutputBuffer]) -> PowerShellResult:
+        self._checkin(host)
+        stray = host.stray_output()
+        output = buffer.text() if buffer is not None else str(frame.get('output') or '')
+        return PowerShellResult(
+            output=stray + output,
+            status=int(frame.get('status') or 0),
+            errors=str(frame.get('errors') or ''),
+            duration_ms=(time.perf_counter() - started) * 1000,
+            truncated=bool(frame.get('truncated')) or (buffer is not None and buffer.truncated),
+            host_pid=host.pid,
+        )
+
+    def _finish_batch(self, host: _Host, frame: dict, started: float) -> List[PowerShellResult]:
+        self._checkin(host)
+        stray = host.stray_output()
+        results = []
+        for item in frame.get('results') or []:
+            results.append(PowerShellResult(
+                output=str(item.get('output') or ''),
+                status=int(item.get('status') or 0),
+                errors=str(item.get('errors') or ''),
+                duration_ms=float(item.get('duration_ms') or 0.0),
+                truncated=bool(item.get('truncated')),
+                host_pid=host.pid,
+            ))
+        if results and stray:
+            results[0].output = stray + results[0].output
+        return results
+
+    async def _acquire_async(self, timeout: float) -> bool:
+        deadline = time.perf_counter() + timeout
+        while not self._slots.acquire(blocking=False):
+            if time.perf_counter() >= deadline:
+                return False
+            await asyncio.sleep(0.02)
+        return True
+
+    async def _checkout_async(self) -> _Host:
+        host = self._checkout_idle()
+        if host is not None:
+            return host
+        # Starting a host blocks; do it on a thread. If the caller is
+        # cancelled meanwhile, the new host goes back to the pool when ready.
+        spawning = asyncio.ensure_future(asyncio.to_thread(self._checkout))
+        try:
+            return await asyncio.shield(spawning)
+        except asyncio.CancelledError:
+            spawning.add_done_callback(
+                lambda done: self._checkin(done.result()) if not done.cancelled() and done.exception() is None else None
+            )
+            raise
+
+    def _checkout_idle(self) -> Optional[_Host]:
+        with self._lock:
+            while self._idle:
+                host = self._idle.pop()
+                if host.alive():
+                    self._busy.append(host)
+                    self._stats['requests'] += 1
+                    return host
+                self._stats['crashes'] += 1
+                host.kill()
+        return None
+
+    def _checkout(self) -> _Host:
+        host = self._checkout_idle()
+        if host is not None:
+            return host
+        host = self._spawn()
+        with self._lock:
+            if self._closed:
+                host.kill()
+                raise PowerShellError('PowerShell pool is closed')
+            self._busy.append(host)
+            self._stats['requests'] += 1
+        return host
+
+    def _checkin(self, host: _Host) -> None:
+        with self._lock:
+            if host in self._busy:
+                self._busy.remove(host)
+            if not self._closed and host.alive() and host.requests < self.max_requests:
+                self._idle.append(host)
+                return
+            if host.requests >= self.max_requests:
+                self._stats['recycled'] += 1
+        host.kill()
+
+    def _discard(self, host: _Host, reason: str) -> None:
+        with self._lock:
+            if host in self._busy:
+                self._busy.remove(host)
+            self._stats[reason] += 1
+        host.kill()
+
+    def _spawn(self) -> _Host:
+        argv = self._argv if self._argv is not None else default_argv()
+        try:
+            host = _Host(argv, self._env)
+        except OSError as e:
+            raise PowerShellError(f'Could not start PowerShell host {argv[0]!r}: {e}') from e
+        try:
+            host.wait_ready(self.start_timeout)
+            prelude = _script(self.prelude, self.max_output, global_scope=True) if self.prelude else None
+            frame = host.request(prelude, self.start_timeout) if prelude else None
+        except (TimeoutError, _HostExited) as e:
+            host.kill()
+            raise PowerShellError(f'PowerShell host did not start: {e or "timed out"}') from e
+        host.stray_output()  # start-up noise is not part of the first request's output
+        with self._lock:
+            self._stats['spawned'] += 1
+            if frame is not None and int(frame.get('status') or 0) != 0:
+                self._stats['prelude_errors'] += 1
+                self.prelude_error = str(frame.get('errors') or frame.get('output') or '')
+        return host
+
+    def _warm(self, count: int) -> None:
+        for _ in range(count):
+            # Hold a slot while spawning so warm-up never overshoots ``size``.
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                with self._lock:
+                    if self._closed or len(self._idle) + len(self._busy) >= count:
+                        return
+                try:
+                    host = self._spawn()
+                except PowerShellError:
+                    return
+                with self._lock:
+                    if not self._closed:
+                        self._idle.append(host)
+                        continue
+                host.kill()
+                return
+            finally:
+                self._slots.release()
@@ -0,0 +1,101 @@
+"""Python stand-in for ``host.ps1``, for testing PowerShellPool off Windows.
+
+It speaks the same framing: a ready frame, then one JSON request per line in
+and ``<nonce> <json>`` frames out, with chunk frames for streaming requests
+and one frame per batch. Scripts are a tiny line language instead of
+PowerShell:
+
+    echo TEXT         write TEXT as an output line
+    repeat N TEXT     write TEXT N times on one line
+    sleep SECONDS     wait
+    stray TEXT        write TEXT to stdout without the nonce
+    fail MESSAGE      write MESSAGE as an error; the script's status is 1
+    exit CODE         stop the script with status CODE
+    crash             end the host process
+"""
+
+import json
+import os
+import sys
+import time
+
+
+NONCE = os.environ['CLIPPY_PS_NONCE']
+
+
+def send(frame):
+    sys.stdout.write(NONCE + ' ' + json.dumps(frame) + '\n')
+    sys.stdout.flush()
+
+
+def limit(text, size):
+    if size and len(text) > size:
+        return text[:size], True
+    return text, False
+
+
+def run(script, max_output, stream=0):
+    started = time.perf_counter()
+    output, errors, status = [], [], 0
+    for line in script.splitlines():
+        command, _, argument = line.strip().partition(' ')
+        produced = None
+        if command == 'echo':
+            produced = argument
+        elif command == 'repeat':
+            count, _, text = argument.partition(' ')
+            produced = text * int(count)
+        elif command == 'sleep':
+            time.sleep(float(argument))
+        elif command == 'stray':
+            sys.stdout.write(argument + '\n')
+            sys.stdout.flush()
+        elif command == 'fail':
+            errors.append(argument)
+            status = 1
+        elif command == 'exit':
+            status = int(argument)
+            break
+        elif command == 'crash':
+            os._exit(3)
+        if produced is None:
+            continue
+        if stream:
+            send({'id': stream, 'chunk': limit(produced + '\n', max_output)[0]})
+        else:
+            output.append(produced + '\n')
+    text, truncated = limit(''.join(output), max_output)
+    error_text, errors_truncated = limit('\n'.join(errors), max_output)
+    return {
+        'status': status,
+        'output': text,
+        'errors': error_text,
+        'truncated': truncated or errors_truncated,
+        'duration_ms': (time.perf_counter() - started) * 1000,
+    }
+
+
+def main():
+    send({'id': 0, 'status': 0, 'output': 'ready', 'errors': '', 'truncated': False})
+    for line in sys.stdin:
+        request = json.loads(line)
+        max_output = request.get('max_output') or 0
+        if request.get('batch') is not None:
+            results, status = [], 0
+            for script in request['batch']:
+                result = run(script, max_output)
+                results.append(result)
+                if result['status']:
+                    status = result['status']
+                    if request.get('stop_on_error'):
+                        break
+            send({'id': request['id'], 'status': status, 'results': results})
+            continue
+        stream = request['id'] if request.get('stream') else 0
+        result = run(request['script'], max_output, stream)
+        result['id'] = request['id']
+        send(result)
+
+
+if __name__ == '__main__':
+    main()
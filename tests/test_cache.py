@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from src.caching import DISPLAY, CachePolicy, ResultCache, ScriptedSignalSource
+
+
+@pytest.fixture
+def clock():
+    return [0.0]
+
+
+@pytest.fixture
+def cache(clock):
+    return ResultCache({'screen': CachePolicy(ttl=10.0, max_entries=2, tags=(DISPLAY,))}, clock=lambda: clock[0])
+
+
+class Compute:
+    """A compute() that counts its calls and can be held until released."""
+
+    def __init__(self, value='v', error=None, hold=False):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return f'{self.value}{self.calls}'
+
+
+def in_threads(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_entries_expire_after_their_ttl(cache, clock):
+    compute = Compute()
+    assert cache.get('screen', 'info', compute) == 'v1'
+    clock[0] = 9.9
+    assert cache.get('screen', 'info', compute) == 'v1'
+    clock[0] = 10.0
+    assert cache.get('screen', 'info', compute) == 'v2'
+    stats = cache.stats()['screen']
+    assert (stats['hits'], stats['misses'], stats['expired']) == (1, 2, 1)
+
+
+def test_tools_without_a_policy_are_not_cached(cache):
+    compute = Compute()
+    cache.get('wifi', 'list', compute)
+    cache.get('wifi', 'list', compute)
+    assert compute.calls == 2
+
+
+def test_concurrent_callers_share_one_compute(cache):
+    compute = Compute(hold=True)
+    threads, results, errors = in_threads(4, lambda: cache.get('screen', 'info', compute))
+    wait_for(lambda: cache.stats().get('screen', {}).get('coalesced') == 3)
+    compute.release.set()
+    for thread in threads:
+        thread.join()
+    assert compute.calls == 1 and results == ['v1'] * 4 and errors == [None] * 4
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(cache):
+    compute = Compute(error=OSError('no display'), hold=True)
+    threads, results, errors = in_threads(3, lambda: cache.get('screen', 'info', compute))
+    wait_for(lambda: cache.stats().get('screen', {}).get('coalesced') == 2)
+    compute.release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(e, OSError) for e in errors) and compute.calls == 1
+    compute.error = None
+    assert cache.get('screen', 'info', compute) == 'v2'
+    assert cache.stats()['screen']['errors'] == 1
+
+
+def test_invalidation_during_a_compute_drops_its_result(cache):
+    compute = Compute(hold=True)
+    threads, results, _ = in_threads(1, lambda: cache.get('screen', 'info', compute))
+    assert compute.started.wait(5)
+    source = ScriptedSignalSource()
+    source.start(cache.invalidate)
+    source.emit(DISPLAY)
+    compute.release.set()
+    threads[0].join()
+    assert results == ['v1']  # the caller still gets its answer
+    assert cache.get('screen', 'info', compute) == 'v2'
+
+
+def test_invalidate_drops_only_tagged_entries(cache):
+    cache.register('wifi', CachePolicy(ttl=10.0))
+    cache.get('screen', 'info', Compute())
+    cache.get('wifi', 'list', Compute())
+    assert cache.invalidate(DISPLAY) == 1
+    assert cache.stats()['screen']['entries'] == 0 and cache.stats()['wifi']['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for key in ('a', 'b'):
+        cache.get('screen', key, Compute(key))
+    cache.get('screen', 'a', Compute('again'))  # a is now the most recent
+    cache.get('screen', 'c', Compute('c'))
+    assert cache.stats()['screen']['evicted'] == 1
+    assert cache.get('screen', 'a', Compute('again')) == 'a1'
+    assert cache.get('screen', 'b', Compute('b')) == 'b1' and cache.stats()['screen']['misses'] == 4
+
+
+def test_refresh_replaces_the_entry(cache):
+    compute = Compute()
+    cache.get('screen', 'info', compute)
+    assert cache.get('screen', 'info', compute, refresh=True) == 'v2'
+    assert cache.get('screen', 'info', compute) == 'v2'
@@ -0,0 +1,105 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.desktop import CaptureError, FakeCaptureBackend, ImageOptions, ScreenCapture
+
+
+RED, GREEN, BLUE = (255, 0, 0), (0, 255, 0), (0, 0, 255)
+
+
+@pytest.fixture
+def backend():
+    return FakeCaptureBackend(64, 32)
+
+
+def pixel(frame, x=0, y=0):
+    blue, green, red, _ = frame.pixels[y, x]
+    return int(red), int(green), int(blue)
+
+
+def test_unchanged_frame_keeps_its_sequence_and_encoding(backend):
+    capture = ScreenCapture(backend)
+    first = capture.screen()
+    encoded = capture.encode(first, ImageOptions())
+    second = capture.screen()
+    assert second.sequence == first.sequence and not second.changed
+    assert capture.encode(second, ImageOptions()).cached
+    assert encoded.width == 64 and capture.stats()['encode_hits'] == 1
+
+
+def test_changed_frame_bumps_the_sequence(backend):
+    capture = ScreenCapture(backend)
+    first = capture.screen()
+    backend.paint((0, 0, 8, 8), RED)
+    second = capture.screen()
+    assert second.changed and second.sequence == first.sequence + 1
+    assert pixel(second) == RED
+
+
+def test_held_frame_is_never_overwritten(backend):
+    capture = ScreenCapture(backend)
+    backend.paint((0, 0, 8, 8), RED)
+    held = capture.screen()
+    for color in (GREEN, BLUE, GREEN):
+        backend.paint((0, 0, 8, 8), color)
+        capture.screen()
+    assert pixel(held) == RED
+    assert capture.stats()['buffers_held'] >= 1
+
+
+def test_released_frames_reuse_the_buffers(backend):
+    capture = ScreenCapture(backend)
+    for color in (RED, GREEN, BLUE, RED):
+        backend.paint((0, 0, 8, 8), color)
+        assert pixel(capture.screen()) == color
+    assert capture.stats()['buffers_held'] == 0
+
+
+def test_frames_encoding_concurrently_with_captures_stay_intact(backend):
+    capture = ScreenCapture(backend, encode_workers=2)
+    colors = [RED, GREEN, BLUE] * 4
+
+    async def scenario():
+        jobs = []
+        for color in colors:
+            backend.paint((0, 0, 64, 32), color)
+            frame = capture.screen()
+            jobs.append(asyncio.ensure_future(capture.encode_async(frame, ImageOptions(), (0, 0, 1, 1))))
+        return await asyncio.gather(*jobs)
+
+    encoded = asyncio.run(scenario())
+    capture.close()
+    assert [Image.open(io.BytesIO(image.data)).getpixel((0, 0)) for image in encoded] == colors
+
+
+def test_recent_frame_is_reused_until_the_version_moves(backend):
+    clock = [0.0]
+    version = [0]
+    capture = ScreenCapture(backend, version=lambda: version[0], max_age=0.1, clock=lambda: clock[0])
+    capture.screen()
+    clock[0] = 0.05
+    assert not capture.screen().grabbed
+    version[0] += 1
+    assert capture.screen().grabbed
+    assert backend.grabs == 2
+
+
+def test_window_is_captured_even_when_covered(backend):
+    capture = ScreenCapture(backend)
+    backend.add_window(7, (10, 10, 30, 20), GREEN)
+    backend.paint((0, 0, 64, 32), RED)
+    frame = capture.window(7)
+    assert (frame.width, frame.height) == (20, 10) and pixel(frame) == GREEN
+    with pytest.raises(CaptureError):
+        capture.window(8)
+
+
+def test_region_pads_off_screen_parts_with_black(backend):
+    backend.paint((0, 0, 64, 32), BLUE)
+    frame = ScreenCapture(backend).region((60, 0, 70, 4))
+    assert pixel(frame, 0) == BLUE and pixel(frame, 9) == (0, 0, 0)
+    assert np.count_nonzero(frame.pixels[:, 4:, :3]) == 0
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from src.desktop import DeltaTracker, Frame
+from src.desktop.delta import DELTA, FULL, UNCHANGED, merge_tiles, tile_hashes
+
+
+def frame(pixels, left=0, top=0, key='screen'):
+    height, width = pixels.shape[:2]
+    return Frame(pixels, (left, top, left + width, top + height), key, 0, True, True, 0.0)
+
+
+def blank(width=256, height=128):
+    return np.zeros((height, width, 4), dtype=np.uint8)
+
+
+def test_first_frame_is_full_then_unchanged():
+    tracker = DeltaTracker()
+    first = tracker.compare('a', frame(blank()))
+    assert first.kind == FULL and first.changed_tiles == first.tiles == 8
+    again = tracker.compare('a', frame(blank()))
+    assert again.kind == UNCHANGED and again.changed_tiles == 0 and again.regions == []
+
+
+def test_one_changed_pixel_changes_one_tile():
+    tracker = DeltaTracker()
+    tracker.compare('a', frame(blank()))
+    pixels = blank()
+    pixels[70, 130, 1] = 1
+    delta = tracker.compare('a', frame(pixels, left=100, top=50))
+    assert delta.kind == FULL  # the frame moved
+    pixels = pixels.copy()
+    pixels[70, 130, 1] = 2
+    delta = tracker.compare('a', frame(pixels, left=100, top=50))
+    assert delta.kind == DELTA and delta.changed_tiles == 1
+    assert delta.regions == [(128, 64, 192, 128)] and delta.bbox == (128, 64, 192, 128)
+    assert delta.screen_rect(delta.regions[0]) == (228, 114, 292, 178)
+
+
+def test_edge_tiles_are_clipped_to_the_frame():
+    tracker = DeltaTracker()
+    tracker.compare('a', frame(blank(150, 100)))
+    pixels = blank(150, 100)
+    pixels[99, 149] = 255
+    delta = tracker.compare('a', frame(pixels))
+    assert delta.tiles == 6 and delta.changed_tiles == 1
+    assert delta.regions == [(128, 64, 150, 100)]
+
+
+def test_full_frame_again_after_full_every_deltas():
+    tracker = DeltaTracker()
+    pixels = blank()
+    kinds = []
+    for value in range(5):
+        pixels = pixels.copy()
+        pixels[0, 0, 0] = value
+        kinds.append(tracker.compare('a', frame(pixels), full_every=2).kind)
+    assert kinds == [FULL, DELTA, DELTA, FULL, DELTA]
+
+
+def test_resize_and_new_sessions_get_full_frames():
+    tracker = DeltaTracker()
+    tracker.compare('a', frame(blank()))
+    resized = tracker.compare('a', frame(blank(192, 128)))
+    assert resized.kind == FULL and 'resized' in resized.reason
+    assert tracker.compare('b', frame(blank(192, 128))).kind == FULL
+    tracker.reset('a')
+    assert tracker.compare('a', frame(blank(192, 128))).kind == FULL
+
+
+def test_many_regions_collapse_to_the_bounding_box():
+    tracker = DeltaTracker(max_regions=2)
+    tracker.compare('a', frame(blank()))
+    pixels = blank()
+    pixels[0, 0, 0] = pixels[0, 128, 0] = pixels[64, 64, 0] = 1
+    delta = tracker.compare('a', frame(pixels))
+    assert delta.changed_tiles == 3 and delta.regions == [(0, 0, 192, 128)]
+
+
+def test_tile_hashes_see_every_pixel():
+    pixels = blank(128, 64)
+    base = tile_hashes(pixels, 64)
+    assert base.shape == (1, 2)
+    for y, x, channel in ((0, 0, 0), (63, 63, 3), (10, 100, 2)):
+        changed = pixels.copy()
+        changed[y, x, channel] = 1
+        assert (tile_hashes(changed, 64) != base).sum() == 1
+    with pytest.raises(ValueError):
+        tile_hashes(pixels, 63)
+
+
+def test_merge_tiles_joins_runs_down_rows():
+    changed = np.array([
+        [1, 1, 0, 0],
+        [1, 1, 0, 1],
+        [0, 0, 0, 1],
+        [1, 1, 1, 0],
+    ], dtype=bool)
+    assert merge_tiles(changed) == [(0, 0, 2, 2), (1, 3, 3, 4), (3, 0, 4, 3)]
+    assert merge_tiles(np.zeros((2, 2), dtype=bool)) == []
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.input import BATCH, INTERACTIVE, DispatcherClosed, InputDispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = InputDispatcher()
+    yield dispatcher
+    dispatcher.close()
+
+
+def hold(dispatcher):
+    """Occupy the owner thread until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    future = dispatcher.submit(block)
+    assert started.wait(5)
+    return release, future
+
+
+def test_jobs_run_by_priority(dispatcher):
+    order = []
+    release, blocker = hold(dispatcher)
+    futures = [
+        dispatcher.submit(order.append, 'macro', priority=BATCH),
+        dispatcher.submit(order.append, 'click', priority=INTERACTIVE),
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ['click', 'macro']
+
+
+def test_sessions_take_turns(dispatcher):
+    order = []
+    release, _ = hold(dispatcher)
+    futures = [dispatcher.submit(order.append, f'a{i}', session='a') for i in range(3)]
+    futures.append(dispatcher.submit(order.append, 'b0', session='b'))
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ['a0', 'b0', 'a1', 'a2']
+
+
+def test_cancelled_job_leaves_the_queue(dispatcher):
+    ran = []
+    release, _ = hold(dispatcher)
+    # Comparing arrays does not give a bool, so jobs must be matched by identity
+    keep = dispatcher.submit(ran.append, np.zeros(4))
+    dropped = dispatcher.submit(ran.append, np.ones(4))
+    assert dropped.cancel()
+    assert dispatcher.stats()['queue_depth'] == 1
+    release.set()
+    keep.result(5)
+    assert len(ran) == 1
+    assert dispatcher.stats()['cancelled'] == 1
+
+
+def test_cancelled_caller_drops_its_job(dispatcher):
+    ran = []
+    release, _ = hold(dispatcher)
+
+    async def scenario():
+        task = asyncio.ensure_future(dispatcher.call(ran.append, 'late'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    release.set()
+    dispatcher.submit(lambda: None).result(5)
+    assert ran == []
+
+
+def test_submit_from_the_owner_thread_runs_inline(dispatcher):
+    def outer():
+        inner = dispatcher.submit(threading.get_ident)
+        assert inner.done()
+        return inner.result(), threading.get_ident()
+
+    inner, outer_thread = dispatcher.submit(outer).result(5)
+    assert inner == outer_thread != threading.get_ident()
+
+
+def test_errors_reach_the_caller_and_the_thread_survives(dispatcher):
+    with pytest.raises(ZeroDivisionError):
+        dispatcher.submit(lambda: 1 / 0).result(5)
+    assert dispatcher.submit(lambda: 'ok').result(5) == 'ok'
+    assert dispatcher.stats()['failed'] == 1
+
+
+def test_closed_dispatcher_refuses_work(dispatcher):
+    dispatcher.close()
+    with pytest.raises(DispatcherClosed):
+        dispatcher.submit(lambda: None)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.desktop.elements import FLAG_ENABLED, FLAG_FOCUSED, ElementTable, UIElement, pack_flags
+
+
+ELEMENTS = [
+    UIElement('Mail', 'WindowControl', (0, 0, 800, 600), runtime_id=(42, 1), depth=0, parent=-1),
+    UIElement('Toolbar', 'ToolBarControl', (0, 0, 800, 40), runtime_id=(42, 2), depth=1, parent=0),
+    UIElement('Send', 'ButtonControl', (10, 5, 60, 35), automation_id='SendButton', class_name='Button',
+              runtime_id=(42, 3), is_focusable=True, depth=2, parent=1),
+    UIElement('To', 'EditControl', (10, 50, 400, 70), value='ana@example.com', runtime_id=(42, 4),
+              has_focus=True, is_focusable=True, depth=1, parent=0),
+    UIElement('Draft', 'TextControl', (0, 0, 0, 0), is_enabled=False, is_offscreen=True, depth=1, parent=0),
+]
+
+
+def test_rows_round_trip_through_the_table():
+    table = ElementTable.from_elements(ELEMENTS)
+    assert len(table) == 5 and list(table) == ELEMENTS
+    assert table.rows([3, 0]) == [ELEMENTS[3], ELEMENTS[0]]
+    assert table.control_types == ('WindowControl', 'ToolBarControl', 'ButtonControl', 'EditControl', 'TextControl')
+    assert table.rects.shape == (5, 4) and table.centers()[2].tolist() == [35, 20]
+
+
+def test_flags_and_type_masks():
+    table = ElementTable.from_elements(ELEMENTS)
+    assert table.flags[3] == pack_flags(True, False, True, True)
+    assert table.flag_mask(FLAG_FOCUSED).tolist() == [False, False, False, True, False]
+    assert np.flatnonzero(~table.flag_mask(FLAG_ENABLED)).tolist() == [4]
+    assert table.indices_of({'ButtonControl', 'EditControl'}).tolist() == [2, 3]
+
+
+def test_take_keeps_rows_and_drops_parents_outside_the_subset():
+    table = ElementTable.from_elements(ELEMENTS)
+    subset = table.take([0, 2, 3])
+    assert [e.name for e in subset] == ['Mail', 'Send', 'To']
+    assert subset.parents.tolist() == [-1, -1, 0]  # Send's toolbar was left out
+    assert subset[2].value == 'ana@example.com' and subset[1].automation_id == 'SendButton'
+    assert len(table.take([])) == 0
+
+
+def test_concat_merges_types_and_offsets_parents():
+    first = ElementTable.from_elements(ELEMENTS[:3])
+    second = ElementTable.from_elements([
+        UIElement('Calc', 'WindowControl', (0, 0, 300, 400)),
+        UIElement('7', 'ButtonControl', (10, 100, 60, 150), depth=1, parent=0),
+    ])
+    merged = ElementTable.concat([first, second])
+    assert [e.name for e in merged] == ['Mail', 'Toolbar', 'Send', 'Calc', '7']
+    assert merged.parents.tolist() == [-1, 0, 1, -1, 3]
+    assert [merged.type_name(i) for i in range(5)] == ['WindowControl', 'ToolBarControl', 'ButtonControl', 'WindowControl', 'ButtonControl']
+    assert list(merged)[:3] == ELEMENTS[:3] and merged[4].rect == (10, 100, 60, 150)
+    assert len(ElementTable.concat([])) == 0
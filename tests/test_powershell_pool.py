@@ -0,0 +1,143 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src.powershell import PowerShellPool
+
+
+HOST = [sys.executable, str(Path(__file__).with_name('powershell_host.py'))]
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**options):
+        options.setdefault('timeout', 5.0)
+        options.setdefault('start_timeout', 5.0)
+        pool = PowerShellPool(argv=HOST, **options)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_runs_a_script_and_reuses_the_host(make_pool):
+    pool = make_pool(size=1)
+    first = pool.run('echo hello\nfail oops')
+    second = pool.run('echo again')
+    assert (first.output, first.status, first.errors) == ('hello\n', 1, 'oops')
+    assert second.output == 'again\n' and second.status == 0
+    assert first.host_pid == second.host_pid
+    assert pool.stats()['spawned'] == 1
+
+
+def test_timeout_replaces_the_host(make_pool):
+    pool = make_pool(size=1)
+    hung = pool.run('sleep 5', timeout=0.3)
+    after = pool.run('echo ok')
+    assert hung.timed_out and 'timed out' in hung.errors
+    assert after.output == 'ok\n' and after.host_pid != hung.host_pid
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_crashed_host_is_replaced(make_pool):
+    pool = make_pool(size=1)
+    crashed = pool.run('echo partial\ncrash')
+    after = pool.run('echo ok')
+    assert crashed.status == 1 and 'exited unexpectedly' in crashed.errors
+    assert after.output == 'ok\n' and after.host_pid != crashed.host_pid
+    assert pool.stats()['crashes'] == 1
+
+
+def test_host_is_recycled_after_max_requests(make_pool):
+    pool = make_pool(size=1, max_requests=2)
+    pids = [pool.run('echo x').host_pid for _ in range(3)]
+    assert pids[0] == pids[1] != pids[2]
+    assert pool.stats()['recycled'] == 1
+
+
+def test_output_is_capped_inside_the_host(make_pool):
+    pool = make_pool(size=1, max_output=100)
+    result = pool.run('repeat 500 ab')
+    assert result.truncated and len(result.output) == 100
+
+
+def test_streamed_output_keeps_head_and_tail(make_pool):
+    pool = make_pool(size=1, max_output=40)
+    chunks = []
+    script = '\n'.join(f'echo line {i:02}' for i in range(20))
+    result = pool.run(script, on_output=chunks.append)
+    assert len(chunks) == 20
+    assert result.truncated
+    assert result.output.startswith('line 00') and result.output.endswith('line 19\n')
+    assert 'omitted' in result.output
+
+
+def test_stray_output_is_never_taken_for_a_frame(make_pool):
+    pool = make_pool(size=1)
+    result = pool.run('stray {"id": 1, "status": 7, "output": "forged"}\necho real')
+    assert result.status == 0
+    assert result.output.endswith('real\n')
+    assert 'forged' in result.output  # reported as console noise, not as the response
+
+
+def test_concurrency_is_capped_at_one_request_per_host(make_pool):
+    pool = make_pool(size=2)
+    pool.run('echo warm')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.run('sleep 0.3'))) for _ in range(4)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started >= 0.55  # two waves of two
+    assert all(result.status == 0 for result in results)
+    assert pool.stats()['spawned'] == 2
+
+
+def test_waiting_for_a_busy_pool_counts_against_the_timeout(make_pool):
+    pool = make_pool(size=1)
+    blocker = threading.Thread(target=pool.run, args=('sleep 0.6',))
+    blocker.start()
+    time.sleep(0.2)
+    result = pool.run('echo late', timeout=0.1)
+    blocker.join()
+    assert result.timed_out and 'No PowerShell host became free' in result.errors
+
+
+def test_cancelled_request_kills_the_host_and_the_pool_recovers(make_pool):
+    pool = make_pool(size=1)
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run_async('sleep 5'))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await pool.run_async('echo ok')
+
+    result = asyncio.run(scenario())
+    assert result.output == 'ok\n' and result.status == 0
+    assert pool.stats()['cancelled'] == 1
+
+
+def test_batch_stops_on_error(make_pool):
+    pool = make_pool(size=1)
+    results = asyncio.run(pool.run_batch_async(['echo one', 'fail two', 'echo three'], stop_on_error=True))
+    assert [result.status for result in results[:2]] == [0, 1]
+    assert results[2] is None
+
+
+def test_failing_prelude_is_counted_and_the_host_still_used(make_pool):
+    pool = make_pool(size=1, prelude='fail broken prelude')
+    assert pool.run('echo ok').output == 'ok\n'
+    assert pool.stats()['prelude_errors'] == 1
+    assert pool.prelude_error == 'broken prelude'
@@ -0,0 +1,102 @@
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+from src.desktop.elements import FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_OFFSCREEN
+from src.desktop.progressive import ProgressiveWalker, WalkBudget, WalkSource
+
+
+@dataclass
+class Node:
+    name: str
+    flags: int = FLAG_ENABLED
+    children: List['Node'] = field(default_factory=list)
+
+
+class FakeSource(WalkSource):
+    """A fixed tree; every children() round trip takes one second of the fake clock."""
+
+    def __init__(self, root: Node):
+        self.tree = root
+        self.now = 0.0
+        self.expanded: List[str] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def root(self):
+        return 1, self.tree.name, self.tree
+
+    def children(self, element):
+        self.now += 1.0
+        self.expanded.append(element.name)
+        return element.children
+
+    def append(self, builder, element, depth, parent):
+        return builder.append(element.name, 'Pane', (0, 0, 10, 10), flags=element.flags, depth=depth, parent=parent)
+
+
+def leaves(prefix, count, flags=FLAG_ENABLED):
+    return [Node(f'{prefix}{i}', flags) for i in range(count)]
+
+
+def big_window():
+    # In document order the off-screen sidebar comes first, so a depth-first
+    # walk cut short would return little else.
+    return Node('window', children=[
+        Node('sidebar', FLAG_OFFSCREEN | FLAG_ENABLED, [Node('tree', FLAG_OFFSCREEN | FLAG_ENABLED, leaves('item', 50, FLAG_OFFSCREEN))]),
+        Node('disabled', 0, leaves('grey', 3)),
+        Node('editor', FLAG_ENABLED | FLAG_FOCUSABLE, leaves('line', 5)),
+        Node('toolbar', FLAG_ENABLED, leaves('button', 4, FLAG_ENABLED | FLAG_FOCUSABLE)),
+    ])
+
+
+@pytest.fixture
+def make_walker():
+    walkers = []
+
+    def make(root):
+        source = FakeSource(root)
+        walker = ProgressiveWalker(source=source, clock=source.clock)
+        walkers.append(walker)
+        return walker, source
+
+    yield make
+    for walker in walkers:
+        walker.shutdown()
+
+
+def test_deadline_returns_the_prioritised_elements_first(make_walker):
+    walker, source = make_walker(big_window())
+    result = walker.start(WalkBudget(deadline=3.0, walk_limit=1000))
+    names = result.snapshot.elements.names
+    assert source.expanded == ['window', 'editor', 'toolbar']
+    assert {'line0', 'button3'} <= set(names)
+    assert not any(name.startswith(('item', 'grey')) for name in names)
+    assert not result.complete and result.continuation and result.pending == 11
+
+
+def test_resume_finishes_the_walk(make_walker):
+    walker, source = make_walker(big_window())
+    first = walker.start(WalkBudget(deadline=3.0, walk_limit=1000))
+    rest = walker.resume(first.continuation, WalkBudget(deadline=100.0, walk_limit=1000))
+    assert rest.complete and rest.continuation is None
+    assert len(rest.snapshot.elements) == 1 + 4 + 1 + 50 + 3 + 5 + 4
+    assert source.expanded[-52:] == ['sidebar', 'tree', *(f'item{i}' for i in range(50))]  # off-screen last
+    with pytest.raises(KeyError):
+        walker.resume(first.continuation, WalkBudget())
+
+
+def test_walk_limit_stops_between_round_trips(make_walker):
+    walker, _ = make_walker(big_window())
+    result = walker.start(WalkBudget(deadline=100.0, walk_limit=3))
+    assert len(result.snapshot.elements) == 5  # the root's children arrive in one round trip
+    assert not result.complete
+
+
+def test_max_depth_bounds_the_walk(make_walker):
+    walker, source = make_walker(big_window())
+    result = walker.start(WalkBudget(deadline=100.0, walk_limit=1000, max_depth=1))
+    assert result.complete and len(result.snapshot.elements) == 5
+    assert source.expanded == ['window']
@@ -0,0 +1,93 @@
+import pytest
+
+from src.desktop.elements import FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_FOCUSED, ElementTableBuilder
+from src.desktop.selector import SelectorError, SelectorIndex, parse
+
+
+@pytest.fixture(scope='module')
+def index():
+    builder = ElementTableBuilder()
+    depths = {-1: -1}
+
+    def add(name, control_type, parent=-1, **fields):
+        row = builder.append(name, control_type, (0, 0, 10, 10), parent=parent, depth=depths[parent] + 1, **fields)
+        depths[row] = depths[parent] + 1
+        return row
+
+    window = add('Inbox - Mail', 'WindowControl')
+    toolbar = add('Toolbar', 'ToolBarControl', window)
+    add('Save', 'ButtonControl', toolbar, automation_id='SaveButton')
+    add('Save as', 'ButtonControl', toolbar, flags=0)
+    pane = add('Search', 'PaneControl', window, class_name='SearchPane')
+    add('Search mail', 'EditControl', pane, automation_id='SearchBox', value='report',
+        flags=FLAG_ENABLED | FLAG_FOCUSABLE | FLAG_FOCUSED)
+    messages = add('Messages', 'ListControl', window)
+    for subject in ('Quarterly report', 'Lunch?', 'Report draft'):
+        add(subject, 'ListItemControl', messages)
+    add('Received message', 'TextControl', window)
+    return SelectorIndex(builder.build())
+
+
+def names(index, selector, limit=None):
+    return [index.table.names[row] for row in index.select(selector, limit=limit).tolist()]
+
+
+def test_type_in_any_spelling(index):
+    expected = ['Save', 'Save as']
+    assert names(index, 'Button') == names(index, 'button') == names(index, 'ButtonControl') == expected
+    assert names(index, '[type^=list]') == ['Messages', 'Quarterly report', 'Lunch?', 'Report draft']
+
+
+def test_name_operators(index):
+    assert names(index, 'Button[name=save]') == ['Save']
+    assert names(index, '[name*=report]') == ['Quarterly report', 'Report draft']
+    assert names(index, 'ListItem[name^="report"]') == ['Report draft']
+    assert names(index, 'ListItem[name$=?]') == ['Lunch?']
+    assert names(index, r'ListItem[name~=^R\w+ d]') == ['Report draft']
+    assert names(index, 'ListItem[name~=^r]') == []  # regex is case-sensitive
+    assert names(index, 'Text[name%="recieved mesage"]') == ['Received message']
+    assert names(index, 'Edit[value=REPORT]') == ['Search mail']
+
+
+def test_automation_id_class_and_flags(index):
+    assert names(index, '#SaveButton') == ['Save']
+    assert names(index, 'Edit#searchbox') == ['Search mail']
+    assert names(index, '.SearchPane') == ['Search']
+    assert names(index, 'Button:enabled') == ['Save']
+    assert names(index, '*:focused:focusable') == ['Search mail']
+
+
+def test_ancestor_paths(index):
+    assert names(index, 'Window Button') == ['Save', 'Save as']
+    assert names(index, 'Window > Button') == []
+    assert names(index, 'Window > ToolBar > Button[name="Save as"]') == ['Save as']
+    assert names(index, 'Pane Edit') == ['Search mail']
+    assert names(index, 'List > ListItem') == ['Quarterly report', 'Lunch?', 'Report draft']
+
+
+def test_index_pseudos_and_limit(index):
+    assert names(index, 'ListItem:first') == ['Quarterly report']
+    assert names(index, 'ListItem:last') == ['Report draft']
+    assert names(index, 'ListItem:nth(2)') == ['Lunch?']
+    assert names(index, 'ListItem:nth(4)') == []
+    assert names(index, 'ListItem', limit=2) == ['Quarterly report', 'Lunch?']
+
+
+@pytest.mark.parametrize('selector, message, position', [
+    ('', 'Empty selector', 0),
+    ('Buton', "Unknown control type 'Buton'", 0),
+    ('Button[colour=red]', "Unknown attribute 'colour'", 13),
+    ('Button[name save]', 'Expected an operator', 12),
+    ('Button[name="Save]', 'Unterminated string', 12),
+    ('Button[name~=(]', 'Invalid regex: missing ), unterminated subpattern', 13),
+    ('Button[name~="a("]', 'Invalid regex', 15),
+    ('ListItem:nth(0)', 'Expected :nth(N) with N >= 1', 12),
+    ('Button:hovered', "Unknown pseudo-class ':hovered'", 14),
+    ('Button]', "Unexpected ']'", 6),
+])
+def test_selector_errors_name_the_problem_and_position(selector, message, position):
+    with pytest.raises(SelectorError) as error:
+        parse(selector)
+    assert str(error.value).startswith(message)
+    assert error.value.position == position
+    assert f'at position {position} in selector {selector!r}' in str(error.value)
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from src.desktop.elements import (
+    FLAG_ENABLED, FLAG_FOCUSABLE, FLAG_FOCUSED, FLAG_OFFSCREEN,
+    INFORMATIVE_CONTROL_TYPES, INTERACTIVE_CONTROL_TYPES, SCROLLABLE_CONTROL_TYPES,
+    ElementTableBuilder, TreeSnapshot,
+)
+from src.desktop.serialize import FORMATS, rank, render_state
+from src.desktop.state import DesktopState, TreeState
+
+
+def make_state(hidden=0):
+    builder = ElementTableBuilder()
+    builder.append('Mail', 'WindowControl', (0, 0, 1200, 800))
+    for i in range(30):
+        builder.append(f'Button {i}', 'ButtonControl', (20 + 35 * i, 10, 50 + 35 * i, 30), parent=0, depth=1)
+    builder.append('Search', 'EditControl', (600, 400, 800, 420), value='tab\there',
+                   flags=FLAG_ENABLED | FLAG_FOCUSABLE | FLAG_FOCUSED, parent=0, depth=1)
+    builder.append('Scrolled away', 'ButtonControl', (0, -500, 80, -480), flags=FLAG_ENABLED | FLAG_OFFSCREEN, parent=0, depth=1)
+    for i in range(20):
+        builder.append(f'Status line {i}', 'TextControl', (20, 500 + 12 * i, 400, 512 + 12 * i), parent=0, depth=1)
+    builder.append('Messages', 'ListControl', (0, 450, 1200, 800), parent=0, depth=1)
+    table = builder.build()
+    tree = TreeState(
+        elements=table,
+        interactive=table.indices_of(INTERACTIVE_CONTROL_TYPES),
+        informative=table.indices_of(INFORMATIVE_CONTROL_TYPES),
+        scrollable=table.indices_of(SCROLLABLE_CONTROL_TYPES),
+        hidden=hidden,
+    )
+    snapshot = TreeSnapshot(hwnd=1, window_name='Mail', elements=table)
+    return DesktopState('Mail', ['Mail - Outlook', 'Calculator'], tree, snapshot=snapshot)
+
+
+SEARCH = 31
+
+
+def reported(text, format):
+    if format == 'json':
+        return [element['name'] for element in json.loads(text)['elements']]
+    if format == 'tsv':
+        return [line.split('\t')[8] for line in text.splitlines() if not line.startswith('#')]
+    listed = text.split('List of Interactive Elements:')[1]
+    return [line[2:].split(' (')[0].split(' at (')[0] for line in listed.splitlines() if line.startswith('- ')]
+
+
+def test_ranking_puts_the_focused_element_first_and_offscreen_ones_last():
+    state = make_state()
+    tree = state.tree_state
+    ranked = rank(tree.elements, tree.rows()).tolist()
+    assert ranked[0] == SEARCH
+    assert ranked.index(SEARCH + 1) > ranked.index(SEARCH + 2)  # off-screen button below on-screen text
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_max_elements_keeps_the_most_relevant(format):
+    text = render_state(make_state(), format, max_elements=5)
+    names = reported(text, format)
+    assert len(names) == 5 and 'Search' in names and 'Scrolled away' not in names
+
+
+@pytest.mark.parametrize('format', FORMATS)
+@pytest.mark.parametrize('share', [0.3, 0.6, 0.9])
+def test_output_stays_within_max_chars(format, share):
+    state = make_state()
+    max_chars = int(len(render_state(state, format)) * share)
+    text = render_state(state, format, max_chars=max_chars)
+    assert len(text) <= max_chars
+    names = reported(text, format)
+    assert 'Search' in names
+    # The largest prefix of the ranking that fits: one more element would not.
+    assert len(render_state(state, format, max_elements=len(names) + 1)) > max_chars
+
+
+def test_json_reports_counts_and_notes():
+    document = json.loads(render_state(make_state(hidden=3), 'json', max_elements=10, token='s4', notes=['Partial']))
+    assert (document['snapshot'], document['omitted'], document['hidden']) == ('s4', 43, 3)
+    assert document['notes'] == ['Partial'] and document['apps'] == ['Mail - Outlook', 'Calculator']
+    search = next(e for e in document['elements'] if e['name'] == 'Search')
+    assert search == {'row': SEARCH, 'category': 'interactive', 'type': 'EditControl', 'name': 'Search',
+                      'rect': [600, 400, 800, 420], 'value': 'tab\there', 'focused': True}
+
+
+def test_tsv_legends():
+    lines = render_state(make_state(hidden=3), 'tsv', max_elements=10, token='s4', notes=['Partial\nwalk']).splitlines()
+    header = lines[:6]
+    assert header[:4] == ['#snapshot\ts4', '#focused\tMail', '#app\tMail - Outlook', '#app\tCalculator']
+    types = dict(item.split('=') for item in header[4].split('\t')[1:])
+    assert header[4].startswith('#types\t') and set(types.values()) <= {'Button', 'Edit', 'Text', 'List'}
+    assert header[5] == '#cats\ti=interactive\tt=informative\ts=scrollable'
+    assert lines[6] == '#cols\trow\tcat\ttype\tx\ty\tw\th\tflags\tname\tvalue'
+    search = next(line for line in lines if line.startswith(f'{SEARCH}\t'))
+    assert search.split('\t') == [str(SEARCH), 'i', search.split('\t')[2], '600', '400', '200', '20', str(FLAG_ENABLED | FLAG_FOCUSABLE | FLAG_FOCUSED), 'Search', 'tab here']
+    assert types[search.split('\t')[2]] == 'Edit'
+    assert lines[-3:] == ['#omitted\t43', '#hidden\t3', '#note\tPartial walk']  # notes lose their line breaks
+
+
+def test_text_keeps_its_sections_and_reports_omissions():
+    text = render_state(make_state(hidden=2), 'text', max_elements=3, token='s1')
+    assert text.startswith('Snapshot: s1\n\nFocused App:\nMail\n\nOpened Apps:\n- Mail - Outlook\n- Calculator')
+    assert 'List of Interactive Elements:\n- Button 18 (ButtonControl) at (650, 10)' in text
+    assert 'List of Scrollable Elements:\nNo scrollable elements found.' in text
+    assert '50 less relevant elements omitted' in text
+    assert '2 elements covered by other windows or off-screen were left out' in text
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        render_state(make_state(), 'xml')
@@ -0,0 +1,104 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.desktop.elements import ElementTable, TreeSnapshot, UIElement
+from src.desktop.serialize import render_diff
+from src.desktop.snapshots import SnapshotStore, diff_elements
+
+
+def button(name, rect=(0, 0, 80, 20), runtime_id=(), value=''):
+    return UIElement(name, 'ButtonControl', rect, value=value, runtime_id=runtime_id)
+
+
+def table(*elements):
+    return ElementTable.from_elements(elements)
+
+
+def snapshot(*elements):
+    return TreeSnapshot(hwnd=1, window_name='App', elements=table(*elements))
+
+
+OK, CANCEL, HELP = button('OK', runtime_id=(1,)), button('Cancel', runtime_id=(2,)), button('Help', runtime_id=(3,))
+
+
+def test_appeared_and_disappeared_elements():
+    diff = diff_elements(table(OK, CANCEL), table(OK, HELP), 's1', 's2')
+    assert [e.name for e in diff.added] == ['Help']
+    assert [e.name for e in diff.removed] == ['Cancel']
+    assert not diff.moved and not diff.changed
+
+
+def test_moved_element_is_matched_by_runtime_id():
+    moved = button('OK', (100, 50, 180, 70), runtime_id=(1,))
+    diff = diff_elements(table(OK, CANCEL), table(moved, CANCEL))
+    assert [(old.rect, new.rect) for old, new in diff.moved] == [((0, 0, 80, 20), (100, 50, 180, 70))]
+    assert not diff.added and not diff.removed
+
+
+def test_text_change_wins_over_a_move():
+    renamed = button('Apply', (5, 5, 85, 25), runtime_id=(1,))
+    diff = diff_elements(table(OK), table(renamed))
+    assert [(old.name, new.name) for old, new in diff.changed] == [('OK', 'Apply')]
+    assert not diff.moved
+    assert 'name: "OK" -> "Apply"' in diff.to_string()
+
+
+def test_elements_without_runtime_ids_match_by_type_and_name():
+    old = table(UIElement('Save', 'ButtonControl', (0, 0, 10, 10)))
+    new = table(UIElement('Save', 'ButtonControl', (0, 0, 10, 10), value='x'))
+    assert [new.value for _, new in diff_elements(old, new).changed] == ['x']
+
+
+def test_unchanged_tables_give_an_empty_diff():
+    diff = diff_elements(table(OK, CANCEL), table(OK, CANCEL), 's1', 's2')
+    assert diff.is_empty() and diff.to_string() == 'No changes since snapshot s1.'
+
+
+def test_store_diffs_by_token_until_evicted():
+    store = SnapshotStore(max_snapshots=2)
+    first = store.put(snapshot(OK))
+    second = store.put(snapshot(OK, CANCEL))
+    assert [e.name for e in store.diff(first, second).added] == ['Cancel']
+    third = store.put(snapshot(CANCEL))
+    assert store.diff(first, third) is None  # expired
+    assert [e.name for e in store.diff(second, third).removed] == ['OK']
+    assert store.stats() == {'snapshots': 2, 'elements': 3, 'evictions': 1}
+
+
+def test_storing_the_same_snapshot_again_reuses_its_token():
+    store = SnapshotStore()
+    shot = snapshot(OK)
+    assert store.put(shot) == store.put(shot)
+    assert store.stats()['snapshots'] == 1
+
+
+STATE = SimpleNamespace(active_app='App', active_app_to_string=lambda: 'App')
+
+
+def big_diff():
+    old = [button(f'b{i}', runtime_id=(i,)) for i in range(40)]
+    new = [button(f'b{i}', runtime_id=(i,), value='x' if i < 20 else '') for i in range(40)]
+    new += [button(f'new{i}', runtime_id=(100 + i,)) for i in range(40)]
+    return diff_elements(table(*old), table(*new), 's1', 's2')
+
+
+@pytest.mark.parametrize('format', ['text', 'json', 'tsv'])
+def test_diff_rendering_keeps_to_the_budgets(format):
+    diff = big_diff()
+    assert len(render_diff(STATE, diff, format, max_chars=1500)) <= 1500
+    text = render_diff(STATE, diff, format, max_elements=5)
+    assert 'b4' in text and 'b5' not in text and 'new0' not in text  # text changes first
+
+
+def test_diff_rendering_encodings():
+    diff = big_diff()
+    document = json.loads(render_diff(STATE, diff, 'json', max_elements=25))
+    assert (document['snapshot'], document['since'], document['omitted']) == ('s2', 's1', 35)
+    assert len(document['changed']) == 20 and len(document['added']) == 5
+    assert document['changed'][0]['before'] == {'value': ''}
+    lines = render_diff(STATE, diff, 'tsv', max_elements=21).splitlines()
+    assert lines[:3] == ['#snapshot\ts2', '#since\ts1', '#focused\tApp']
+    assert '#types\t0=Button' in lines and '#omitted\t39' in lines
+    assert lines.count('a\t0\t0\t0\t80\t20\tnew0\t\t') == 1
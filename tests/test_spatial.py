@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.desktop.elements import FLAG_ENABLED, FLAG_OFFSCREEN, ElementTableBuilder
+from src.desktop.spatial import SpatialIndex
+
+
+TYPES = ('ButtonControl', 'TextControl', 'PaneControl')
+
+
+@pytest.fixture(scope='module')
+def table():
+    rng = np.random.default_rng(7)
+    builder = ElementTableBuilder()
+    builder.append('Desktop pane', 'PaneControl', (0, 0, 1920, 1080))  # spans many cells
+    for i in range(400):
+        left, top = rng.integers(0, 1800), rng.integers(0, 1000)
+        width, height = rng.integers(0, 150), rng.integers(0, 80)  # some zero-size
+        flags = FLAG_OFFSCREEN | FLAG_ENABLED if i % 17 == 0 else FLAG_ENABLED
+        builder.append(f'e{i}', TYPES[i % 3], (int(left), int(top), int(left + width), int(top + height)),
+                       flags=flags, depth=int(rng.integers(1, 6)), parent=0)
+    return builder.build()
+
+
+@pytest.fixture(scope='module')
+def index(table):
+    return SpatialIndex(table)
+
+
+def indexed(table):
+    rects = table.rects
+    return [
+        row for row in range(len(table))
+        if rects[row, 2] > rects[row, 0] and rects[row, 3] > rects[row, 1] and not table.flags[row] & FLAG_OFFSCREEN
+    ]
+
+
+def points():
+    rng = np.random.default_rng(11)
+    return [(int(x), int(y)) for x, y in zip(rng.integers(-20, 1940, 200), rng.integers(-20, 1100, 200))]
+
+
+def test_offscreen_and_empty_elements_are_not_indexed(table, index):
+    assert len(index) == len(indexed(table)) < len(table)
+
+
+def test_at_matches_brute_force(table, index):
+    for x, y in points():
+        hits = [
+            row for row in indexed(table)
+            if table.rects[row, 0] <= x < table.rects[row, 2] and table.rects[row, 1] <= y < table.rects[row, 3]
+        ]
+        area = lambda row: int(table.rects[row, 2] - table.rects[row, 0]) * int(table.rects[row, 3] - table.rects[row, 1])
+        expected = min(hits, key=lambda row: (area(row), -int(table.depths[row]), -row)) if hits else None
+        assert index.at(x, y) == expected, (x, y)
+
+
+def test_at_filters_by_type(table, index):
+    for x, y in points()[:50]:
+        row = index.at(x, y, types=('ButtonControl',))
+        assert row is None or table.type_name(row) == 'ButtonControl'
+
+
+def test_nearest_matches_brute_force(table, index):
+    for x, y in points()[:50]:
+        def distance(row):
+            left, top, right, bottom = (int(v) for v in table.rects[row])
+            return math.hypot(max(left - x, 0, x - (right - 1)), max(top - y, 0, y - (bottom - 1)))
+
+        rows = [row for row in indexed(table) if table.type_name(row) == 'TextControl']
+        expected = sorted(distance(row) for row in rows)[:5]
+        found = index.nearest(x, y, k=5, types=('TextControl',))
+        assert [d for _, d in found] == pytest.approx(expected)
+        assert all(distance(row) == pytest.approx(d) for row, d in found)
+    assert index.nearest(0, 0, k=0) == []
+    assert all(d <= 10 for _, d in index.nearest(900, 500, k=50, max_distance=10))
+
+
+@pytest.mark.parametrize('overlap', [False, True])
+def test_within_matches_brute_force(table, index, overlap):
+    rect = (300, 200, 900, 700)
+    left, top, right, bottom = rect
+    expected = []
+    for row in indexed(table):
+        l, t, r, b = (int(v) for v in table.rects[row])
+        inside = l >= left and r <= right and t >= top and b <= bottom
+        overlaps = l < right and r > left and t < bottom and b > top
+        if overlaps if overlap else inside:
+            expected.append(row)
+    assert index.within(rect, overlap=overlap).tolist() == expected
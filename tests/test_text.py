@@ -0,0 +1,76 @@
+import pytest
+
+from src.input import CLIPBOARD, SENDINPUT, VALUE, FakeTextField, InjectionError, TextInjector
+
+
+LONG = 'x' * 100
+
+
+def injector(field, **options):
+    sleeps = []
+    options.setdefault('sleep', sleeps.append)
+    injector = TextInjector(field, field, **options)
+    injector.sleeps = sleeps
+    return injector
+
+
+def test_value_pattern_fills_an_empty_field():
+    field = FakeTextField()
+    report = injector(field).inject(field, 'héllo 👋')
+    assert (report.strategy, report.verified) == (VALUE, True)
+    assert field.value == 'héllo 👋' and field.calls == ['set_value']
+
+
+def test_long_text_is_pasted_and_the_clipboard_restored():
+    field = FakeTextField('abc', settable=False)
+    report = injector(field).inject(field, LONG)
+    assert (report.strategy, report.verified) == (CLIPBOARD, True)
+    assert field.value == 'abc' + LONG
+    assert field.clipboard_data == [(1, b'previous')]
+
+
+def test_unverifiable_paste_settles_before_restoring_the_clipboard():
+    field = FakeTextField(settable=False, readable=False, lag=1000)
+    settled = []
+
+    def settle():
+        settled.append(True)
+        field.flush()
+
+    report = injector(field, settle=settle).inject(field, LONG)
+    assert (report.strategy, report.verified) == (CLIPBOARD, None)
+    assert settled and field.value == LONG
+    assert field.clipboard_data == [(1, b'previous')]
+
+
+def test_unverifiable_paste_without_settle_waits_verify_timeout():
+    field = FakeTextField(settable=False, readable=False, lag=1000)
+    typist = injector(field, verify_timeout=0.5)
+    typist.inject(field, LONG)
+    assert typist.sleeps == [0.5]
+
+
+def test_verified_paste_does_not_settle():
+    field = FakeTextField(settable=False)
+    settled = []
+    injector(field, settle=lambda: settled.append(True)).inject(field, LONG)
+    assert settled == []
+
+
+def test_short_text_is_typed():
+    field = FakeTextField('abc', settable=False)
+    report = injector(field).inject(field, 'de')
+    assert report.strategy == SENDINPUT and field.value == 'abcde'
+
+
+def test_failed_value_readback_retypes_over_it():
+    field = FakeTextField(single_line=True)
+    report = injector(field, verify_timeout=0).inject(field, 'a\nb', clear=True)
+    assert report.strategy == SENDINPUT and report.skipped == (VALUE,)
+    assert report.verified is False
+
+
+def test_no_strategy_raises():
+    field = FakeTextField()
+    with pytest.raises(InjectionError):
+        injector(field, strategies=()).inject(field, 'x')
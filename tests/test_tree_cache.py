@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from src.desktop.elements import ElementTable, TreeSnapshot
+from src.desktop.tree_cache import ScriptedEventSource, TreeCache
+
+
+class Capture:
+    """Counts full walks; ``gate`` can hold a walk until the test releases it."""
+
+    def __init__(self):
+        self.calls = 0
+        self.threads = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.threads.append(threading.get_ident())
+        self.gate.wait(5)
+        return TreeSnapshot(hwnd=1, window_name=f'walk {self.calls}', elements=ElementTable.empty())
+
+
+@pytest.fixture
+def make_cache():
+    caches = []
+
+    def make(**options):
+        capture = Capture()
+        source = ScriptedEventSource()
+        options.setdefault('debounce', 0.05)
+        cache = TreeCache(capture, source, **options)
+        caches.append(cache)
+        return cache, source, capture
+
+    yield make
+    for cache in caches:
+        cache.stop()
+
+
+def test_burst_of_events_is_coalesced_into_one_refresh(make_cache):
+    cache, source, capture = make_cache(debounce=0.1, max_delay=2.0)
+    cache.start()
+    assert cache.wait_fresh(wait=2) is not None
+    for _ in range(20):
+        source.emit('structure')
+        time.sleep(0.005)
+    assert cache.wait_fresh(wait=2).window_name == 'walk 2'
+    time.sleep(0.2)
+    assert capture.calls == 2 and cache.event_count == 20
+
+
+def test_events_make_the_snapshot_stale_until_the_next_generation(make_cache):
+    cache, source, _ = make_cache()
+    cache.start()
+    first = cache.wait_fresh(wait=2)
+    assert cache.is_fresh() and cache.staleness() == 0.0 and first.generation == cache.generation == 1
+    source.emit('property')
+    assert not cache.is_fresh() and cache.staleness() > 0.0
+    assert cache.is_fresh(max_staleness=10)  # a caller may accept a slightly stale snapshot
+    second = cache.wait_fresh(wait=2)
+    assert second.generation == cache.generation == 2 and cache.is_fresh()
+
+
+def test_wait_fresh_times_out_while_a_refresh_is_stuck(make_cache):
+    cache, source, capture = make_cache()
+    cache.start()
+    cache.wait_fresh(wait=2)
+    capture.gate.clear()
+    source.emit('structure')
+    started = time.monotonic()
+    assert cache.wait_fresh(wait=0.1) is None
+    assert 0.1 <= time.monotonic() - started < 1.0
+    assert cache.stats()['misses'] == 1
+    capture.gate.set()
+    assert cache.wait_fresh(wait=2) is not None
+
+
+def test_invalid_cache_falls_back_to_a_full_walk_on_the_caller(make_cache):
+    cache, _, capture = make_cache()  # not started: nothing refreshes in the background
+    snapshot = cache.get(wait=0)
+    assert snapshot.window_name == 'walk 1' and capture.threads == [threading.get_ident()]
+    assert cache.get(wait=0) is snapshot
+    cache.invalidate()
+    assert cache.get(wait=0).window_name == 'walk 2'
+    assert cache.stats()['hits'] == 1
+
+
+def test_snapshot_older_than_max_age_is_not_served(make_cache):
+    cache, _, capture = make_cache(max_age=0.05)
+    cache.get(wait=0)
+    time.sleep(0.1)
+    assert not cache.is_fresh()
+    cache.get(wait=0)
+    assert capture.calls == 2
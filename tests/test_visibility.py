@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from src.desktop.elements import ElementTableBuilder, TreeSnapshot, WindowCapture
+from src.desktop.visibility import VisibilityFilter, viewport_bounds
+
+
+SCREEN = [(0, 0, 1920, 1080)]
+EDITOR, TERMINAL = 10, 20
+
+
+@pytest.fixture
+def snapshot():
+    builder = ElementTableBuilder()
+    builder.append('Editor', 'WindowControl', (0, 0, 1000, 800))
+    builder.append('Save', 'ButtonControl', (400, 100, 600, 140), parent=0, depth=1)  # right half under the terminal
+    builder.append('Open', 'ButtonControl', (100, 100, 200, 140), parent=0, depth=1)
+    builder.append('Empty', 'ButtonControl', (300, 300, 300, 340), parent=0, depth=1)  # zero width
+    builder.append('Files', 'ListControl', (0, 200, 300, 500), parent=0, depth=1)
+    builder.append('Visible row', 'ListItemControl', (0, 200, 300, 230), parent=4, depth=2)
+    builder.append('Scrolled row', 'ListItemControl', (0, 520, 300, 550), parent=4, depth=2)
+    builder.append('Covered', 'ButtonControl', (600, 300, 700, 340), parent=0, depth=1)  # fully under the terminal
+    builder.append('Terminal', 'WindowControl', (500, 0, 1200, 600))
+    builder.append('Prompt', 'EditControl', (520, 500, 900, 520), parent=8, depth=1)
+    table = builder.build()
+    return TreeSnapshot(hwnd=EDITOR, window_name='Editor', elements=table, windows=[
+        WindowCapture(EDITOR, 'Editor', 0, 8),
+        WindowCapture(TERMINAL, 'Terminal', 8, 10),
+    ])
+
+
+def measure(snapshot, windows, monitors=SCREEN):
+    return VisibilityFilter(lambda: windows, lambda: monitors).measure(snapshot)
+
+
+Z_ORDER = [(TERMINAL, (500, 0, 1200, 600)), (EDITOR, (0, 0, 1000, 800))]
+
+
+def test_element_half_covered_by_a_higher_window(snapshot):
+    result = measure(snapshot, Z_ORDER)
+    assert result.fraction[1] == pytest.approx(0.5) and result.visible[1]
+    assert result.fraction[2] == 1.0
+    assert result.occluded[7] and not result.offscreen[7] and result.fraction[7] == 0
+    assert result.fraction[9] == 1.0  # the terminal itself is on top
+
+
+def test_zero_size_element_is_offscreen(snapshot):
+    result = measure(snapshot, Z_ORDER)
+    assert result.offscreen[3] and not result.occluded[3] and result.hidden[3]
+    assert result.fraction[3] == 0
+
+
+def test_rows_outside_their_viewport_are_offscreen(snapshot):
+    result = measure(snapshot, Z_ORDER)
+    assert result.visible[5] and result.offscreen[6]
+    assert viewport_bounds(snapshot.elements)[6].tolist() == [0, 200, 300, 500]
+
+
+def test_raising_the_window_uncovers_its_elements(snapshot):
+    result = measure(snapshot, Z_ORDER[::-1])
+    assert result.fraction[1] == 1.0 and result.visible[7]
+    assert result.occluded[9]  # the editor now covers the whole prompt
+
+
+def test_monitor_bounds_and_missing_windows(snapshot):
+    result = measure(snapshot, [], monitors=[(0, 0, 550, 1080)])
+    assert result.fraction[1] == pytest.approx(0.75) and result.offscreen[7]  # 3 of 4 sample columns left of x=550
+    assert not result.occluded.any()  # windows absent from the z-order are never occluded
+    unknown = measure(snapshot, Z_ORDER, monitors=[])
+    assert np.array_equal(unknown.offscreen, measure(snapshot, Z_ORDER, monitors=[(-10**6, -10**6, 10**6, 10**6)]).offscreen)
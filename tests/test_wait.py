@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from src.input import Check, Not, Predicate, RegionStable, wait_until
+
+
+class Script(Predicate):
+    """Holds from the ``met_on``-th check on, or once ``flag`` is set; records check times."""
+
+    description = 'scripted condition'
+
+    def __init__(self, met_on=None, counter=None):
+        self.met_on = met_on
+        self.counter = counter
+        self.flag = threading.Event()
+        self.times = []
+        self.wake = None
+        self.closed = False
+
+    def check(self):
+        self.times.append(time.perf_counter())
+        return self.flag.is_set() or (self.met_on is not None and len(self.times) >= self.met_on)
+
+    def version(self):
+        return self.counter[0] if self.counter is not None else None
+
+    def open(self, wake):
+        self.wake = wake
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def later():
+    timers = []
+
+    def schedule(delay, action):
+        timer = threading.Timer(delay, action)
+        timers.append(timer)
+        timer.start()
+
+    yield schedule
+    for timer in timers:
+        timer.cancel()
+
+
+def gaps(predicate):
+    return [b - a for a, b in zip(predicate.times, predicate.times[1:])]
+
+
+def test_a_condition_that_already_holds_returns_after_one_check():
+    predicate = Script(met_on=1)
+    result = wait_until(predicate, timeout=5)
+    assert result.met and result.checks == 1 and result.wakeups == 0
+    assert predicate.closed
+
+
+def test_timeout_backs_off_between_checks():
+    predicate = Script()
+    result = wait_until(predicate, timeout=0.5, initial=0.02, factor=2, maximum=0.16)
+    assert not result.met and result.waited_ms >= 500
+    # Checks at 0, .02, .06, .14, .30, .46 and the deadline; never more.
+    assert 4 <= result.checks <= 7
+    planned = [0.02, 0.04, 0.08, 0.16]
+    assert all(gap >= delay * 0.95 for gap, delay in zip(gaps(predicate), planned))
+
+
+def test_a_version_change_forces_an_early_check(later):
+    counter = [0]
+    predicate = Check(lambda: counter[0] > 0, 'counter moved', version=lambda: counter[0])
+    later(0.05, lambda: counter.__setitem__(0, 1))
+    result = wait_until(predicate, timeout=5, initial=2, maximum=2, tick=0.005)
+    assert result.met and result.checks == 2 and result.wakeups == 1
+    assert result.waited_ms < 1000
+
+
+def test_a_pushed_wake_forces_an_early_check(later):
+    predicate = Script()
+
+    def fire():
+        predicate.flag.set()
+        predicate.wake()
+
+    later(0.05, fire)
+    result = wait_until(predicate, timeout=5, initial=2, maximum=2)
+    assert result.met and result.checks == 2 and result.wakeups == 1
+    assert result.waited_ms < 1000
+
+
+def test_a_wakeup_resets_the_backoff(later):
+    predicate = Script(met_on=5)
+    later(0.3, lambda: predicate.wake())
+    # Checks at 0, .01 and .11, then a 1 s wait the wake cuts short.
+    result = wait_until(predicate, timeout=5, initial=0.01, factor=10, maximum=1.0)
+    assert result.met and result.wakeups == 1
+    assert gaps(predicate)[-1] < 0.1  # back to the initial delay after the wake
+    assert result.waited_ms < 1000
+
+
+def test_cancel_stops_the_wait(later):
+    cancel = threading.Event()
+    later(0.05, cancel.set)
+    result = wait_until(Script(), timeout=5, cancel=cancel)
+    assert result.cancelled and not result.met
+    assert result.waited_ms < 1000 and 'cancelled' in str(result)
+
+
+def test_a_raising_predicate_counts_as_not_holding():
+    def check():
+        raise OSError('window gone')
+
+    result = wait_until(Not(Check(check, 'window open')), timeout=0.05)
+    assert not result.met and result.checks >= 1
+
+
+def test_region_is_stable_once_its_signature_holds_for_quiet_seconds():
+    signatures = iter(['a', 'b', 'b', 'b'])
+    times = iter([0.0, 0.1, 0.3, 0.7])
+    region = RegionStable((0, 0, 10, 10), quiet=0.5, signature=lambda bbox: next(signatures), clock=lambda: next(times))
+    assert [region.check() for _ in range(4)] == [False, False, False, True]
+    assert region.description == 'region (0, 0, 10, 10) unchanged for 0.5 s'
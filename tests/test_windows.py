@@ -0,0 +1,120 @@
+import pytest
+
+from src.desktop.tree_cache import ScriptedEventSource
+from src.desktop.windows import FakeWindow, FakeWindowBackend, WindowInfo, WindowTable, rank_windows
+
+
+def window(hwnd, title, process, pid=None):
+    return WindowInfo(hwnd, title, pid or hwnd, process)
+
+
+WINDOWS = [
+    window(1, 'notes.txt - Notepad', 'Notepad'),
+    window(2, 'Calculator', 'CalculatorApp'),
+    window(3, 'main.py - Visual Studio Code', 'Code'),
+    window(4, 'Inbox - Outlook', 'OUTLOOK'),
+    window(5, 'todo.txt - Notepad', 'Notepad'),
+]
+
+
+def ranked(query, windows=WINDOWS):
+    return [(score, info.hwnd) for score, info in rank_windows(query, windows)]
+
+
+def test_alias_matches_the_process_name():
+    assert ranked('calc')[0] == (100, 2)
+    assert ranked('vscode')[0] == (100, 3)
+
+
+def test_prefix_beats_substring():
+    assert ranked('outl') == [(90, 4)]
+    assert ranked('inbox') == [(80, 4)]
+
+
+def test_fuzzy_title_match_scores_below_substring():
+    score, hwnd = ranked('visual studo')[0]
+    assert hwnd == 3 and 70 <= score < 80
+
+
+def test_short_terms_only_match_a_process_name_exactly():
+    assert ranked('a') == []
+    assert ranked('no') == []
+    assert ranked('qq', [window(9, 'Chat', 'qq')]) == [(100, 9)]
+
+
+def test_ties_keep_z_order():
+    assert ranked('notepad') == [(100, 1), (100, 5)]
+
+
+def make_backend():
+    return FakeWindowBackend([
+        FakeWindow(1, 'notes.txt - Notepad', 10, 'Notepad'),
+        FakeWindow(2, 'Calculator', 20, 'CalculatorApp'),
+    ])
+
+
+def test_table_reuses_the_enumeration_until_an_event():
+    source = ScriptedEventSource()
+    table = WindowTable(make_backend(), source=source)
+    table.start()
+    table.windows()
+    table.windows()
+    assert table.stats()['refreshes'] == 1 and table.stats()['hits'] == 1
+    source.emit('window')
+    table.windows()
+    assert table.stats()['refreshes'] == 2 and table.event_count == 1
+
+
+def test_find_re_enumerates_when_the_table_has_no_match():
+    backend = make_backend()
+    table = WindowTable(backend, source=ScriptedEventSource())
+    table.start()
+    table.windows()
+    backend.windows.insert(0, FakeWindow(3, 'Paint', 30, 'mspaint'))  # no event arrives
+    matches = table.find('mspaint')
+    assert [info.hwnd for _, info in matches] == [3]
+    assert table.stats()['refreshes'] == 2
+
+
+def test_process_names_are_looked_up_once_per_pid():
+    backend = make_backend()
+    table = WindowTable(backend)
+    table.windows()
+    table.windows()
+    assert table.stats()['process_lookups'] == 2
+    backend.windows.pop()
+    table.windows()
+    assert table.stats()['processes'] == 1
+
+
+@pytest.fixture
+def desktop():
+    pytest.importorskip('uiautomation')
+    from src.desktop import Desktop
+
+    backend = FakeWindowBackend([
+        FakeWindow(1, 'notes.txt - Notepad', 10, 'Notepad'),
+        FakeWindow(2, 'todo.txt - Notepad', 11, 'Notepad'),
+        FakeWindow(3, 'Calculator', 20, 'CalculatorApp'),
+    ])
+    yield Desktop(window_backend=backend)
+
+
+def test_set_window_state_acts_on_the_best_match(desktop):
+    assert desktop.set_window_state('minimize', 'calc') == ('Minimized', 0)
+    assert desktop.set_window_state('resize', 'todo.txt', 640, 480) == ('Resized to 640x480', 0)
+    windows = {w.hwnd: w for w in desktop.window_backend.windows}
+    assert windows[3].state == 'minimize'
+    assert windows[2].rect[2:] == (640, 480)
+
+
+def test_set_window_state_refuses_an_ambiguous_close(desktop):
+    message, status = desktop.set_window_state('close', 'notepad')
+    assert status == 1 and 'matches 2 windows equally' in message
+    assert all(w.state != 'closed' for w in desktop.window_backend.windows)
+    assert desktop.set_window_state('close', 'todo.txt') == ('Closed', 0)
+
+
+def test_set_window_state_defaults_to_the_foreground_window(desktop):
+    assert desktop.set_window_state('maximize') == ('Maximized', 0)
+    assert desktop.window_backend.calls[-1] == ('maximize', 1)